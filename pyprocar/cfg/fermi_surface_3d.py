@@ -146,6 +146,11 @@ class FermiSurface3DConfig(BaseConfig):
         The interpolation factor to use for the Fermi surface.
     max_distance : float, optional (default 0.2)
         The maximum distance to keep points from the isosurface centers.
+    isosurface_workers : int, optional (default None)
+        The number of workers generating the band isosurfaces concurrently. 
+        None uses the number of available cpus, 1 generates them serially.
+    isosurface_executor : str, optional (default 'thread')
+        The pool of workers generating the band isosurfaces. Options are 'thread' and 'process'.
 
     Cross section Settings
     ----------------------
@@ -247,6 +252,8 @@ class FermiSurface3DConfig(BaseConfig):
     projection_accuracy: str = 'high'
     interpolation_factor: int = 1
     max_distance: float = 0.2
+    isosurface_workers: Optional[int] = None
+    isosurface_executor: str = 'thread'
 
     # Cross section Settings
     cross_section_slice_linewidth: float = 5.0
@@ -17,6 +17,8 @@ import numpy.typing as npt
 from scipy.interpolate import CubicSpline
 from sympy.physics.quantum.cg import CG
 
+from ..utils import mathematics
+
 
 # TODO When PEP 646 is introduced in numpy. need to update the python typing.
 
@@ -184,35 +186,133 @@ class DensityOfStates:
 
         """
 
-        projected = self.projected
-        
-        principal_q_numbers = np.array(principal_q_numbers)
-        if atoms is None:
-            atoms = np.arange(len(projected), dtype=int)
-        if spins is None:
-            spins = np.arange(len(projected[0][0][0]), dtype=int)
-        if orbitals is None:
-            orbitals = np.arange(len(projected[0][0]), dtype=int)
-        # print(orbitals)
-        # Adjusting for spin type calculation
-        if self.n_spins == 2:
-            ret = np.zeros(shape=( 2, self.n_dos))
-            for iatom in atoms:
-                for iprinc in principal_q_numbers:
-                    for ispin in spins:
-                        temp = np.array(projected[iatom][iprinc])
-                        ret[ispin, :] += temp[orbitals, ispin].sum(axis=0)
-        # This else covers colinear and non-colinear calcualtions
-        else:
-            ret = np.zeros(shape=(1, self.n_dos))
-            for iatom in atoms:
-                for iprinc in principal_q_numbers:
-                    for ispin in spins:
-                        temp = np.array(projected[iatom][iprinc])
-                        ret[0, :] += temp[orbitals, ispin].sum(axis=0)
+        selection = {'atoms':atoms, 
+                     'principal_q_numbers':principal_q_numbers, 
+                     'orbitals':orbitals, 
+                     'spins':spins}
+        return self.dos_sum_batch([selection])[0]
+
+    def dos_sum_batch(self, selections:List[dict]):
+        """Computes the summed density of states of many selections at once, 
+        i.e. all the contributions of a stacked plot.
 
+        Each selection is turned into the number of times each atom, principal quantum number,
+        orbital and spin is selected. The selections sharing their principal quantum numbers, 
+        orbitals and some atoms (e.g. a species and the whole structure) are reduced together: 
+        the projections of all their atoms are summed over the orbitals once, and then 
+        each selection sums its atoms. The other selections are reduced apart, only over 
+        the projections they select.
+
+        Parameters
+        ----------
+        selections : List[dict]
+            The selections, each one a dictionary with the arguments of dos_sum:
+            'atoms', 'principal_q_numbers', 'orbitals' and 'spins'. The missing keys
+            take the defaults of dos_sum
+
+        Returns
+        -------
+        np.ndarray
+            The summed density of states of each selection, (n_selections, 2, n_dos) 
+            in a spin polarized calculation or (n_selections, 1, n_dos) otherwise.
+            Each one equals dos_sum with the same arguments
+        """
+        projected = np.asarray(self.projected)
+        n_rows = 2 if self.n_spins == 2 else 1
+        ret = np.zeros(shape=(len(selections), n_rows, self.n_dos))
+        if len(selections) == 0:
+            return ret
+
+        counts = [self._selection_counts(selection, projected.shape) for selection in selections]
+
+        # the selections with the same principal quantum numbers and orbitals, that share 
+        # atoms (directly or through other selections) are reduced together
+        groups = {}
+        for iselection, (atom_counts, principal_counts, orbital_counts, _) in enumerate(counts):
+            key = (principal_counts.tobytes(), orbital_counts.tobytes())
+            components = groups.setdefault(key, [])
+            atoms = atom_counts > 0
+            overlapping = [component for component in components if np.any(component[0] & atoms)]
+            for component in overlapping:
+                components.remove(component)
+                atoms = atoms | component[0]
+            group = sorted([iselection] + [i for component in overlapping for i in component[1]])
+            components.append((atoms, group))
+        groups = [group for components in groups.values() for _, group in components]
+
+        for group in groups:
+            _, principal_counts, orbital_counts, _ = counts[group[0]]
+            atom_counts = np.array([counts[i][0] for i in group])
+            # only the selected atoms, principal quantum numbers and orbitals are read
+            group_atoms = np.flatnonzero(atom_counts.any(axis=0))
+            principals = np.flatnonzero(principal_counts)
+            orbitals = np.flatnonzero(orbital_counts)
+            selected = mathematics.take_indices(projected, principals, axis=1)
+            selected = mathematics.take_indices(selected, orbitals, axis=2)
+            selected = mathematics.take_indices(selected, group_atoms, axis=0)
+            # (atoms, spins, n_dos)
+            if np.all(principal_counts[principals] == 1) and np.all(orbital_counts[orbitals] == 1):
+                reduced = np.sum(selected, axis=(1, 2))
+            else:
+                reduced = np.einsum('apose,p,o->ase', selected, 
+                                    principal_counts[principals], 
+                                    orbital_counts[orbitals])
+            # (selections, spins, n_dos), each selection only sums its atoms
+            summed = np.zeros(shape=(len(group),) + reduced.shape[1:])
+            for isummed, atom_weights in enumerate(atom_counts[:, group_atoms]):
+                atoms = np.flatnonzero(atom_weights)
+                summed[isummed] = np.tensordot(atom_weights[atoms], 
+                                               mathematics.take_indices(reduced, atoms, axis=0), 
+                                               axes=1)
+            for isummed, iselection in enumerate(group):
+                spin_counts = counts[iselection][3][:, None]
+                # Adjusting for spin type calculation
+                if self.n_spins == 2:
+                    ret[iselection] = spin_counts * summed[isummed]
+                # This else covers colinear and non-colinear calcualtions
+                else:
+                    ret[iselection, 0] = np.sum(spin_counts * summed[isummed], axis=0)
         return ret
 
+    def _selection_counts(self, selection:dict, shape:tuple):
+        """Counts how many times each atom, principal quantum number, orbital and spin
+        is selected, a repeated index is summed as many times
+
+        Parameters
+        ----------
+        selection : dict
+            The selection, as in dos_sum_batch
+        shape : tuple
+            The shape of the projections
+
+        Returns
+        -------
+        List[np.ndarray]
+            The counts of the atoms, principal quantum numbers, orbitals and spins
+        """
+        atoms = selection.get('atoms', None)
+        principal_q_numbers = selection.get('principal_q_numbers', None)
+        orbitals = selection.get('orbitals', None)
+        spins = selection.get('spins', None)
+        if atoms is None:
+            atoms = np.arange(shape[0], dtype=int)
+        if principal_q_numbers is None:
+            principal_q_numbers = [-1]
+        if orbitals is None:
+            orbitals = np.arange(shape[2], dtype=int)
+        if spins is None:
+            spins = np.arange(shape[3], dtype=int)
+
+        counts = []
+        for index, size in zip([atoms, principal_q_numbers, orbitals, spins], shape[:4]):
+            index = np.array(index, dtype=int).reshape(-1)
+            # negative indices count from the end, as in numpy indexing
+            index = np.where(index < 0, index + size, index)
+            if np.any(index < 0) or np.any(index >= size):
+                raise IndexError(f"The indices {index} are out of bounds for an axis of size {size}")
+            counts.append(np.bincount(index, minlength=size).astype(float))
+        return counts
+
     def get_current_basis(self):
         """Returns a string of current orbital basis
 
@@ -9,9 +9,13 @@ Created on Sat Jan 16 2021
 """
 
 from typing import List
+import os
+import hashlib
 import itertools
 import copy
 from scipy.interpolate import CubicSpline
+from scipy import sparse, signal
+from scipy import fft as scipy_fft
 
 import numpy as np
 import networkx as nx
@@ -20,9 +24,11 @@ import pyvista
 
 from .kpath import KPath
 from .brillouin_zone import BrillouinZone
+from .dos import DensityOfStates
 from ..utils import  mathematics
 from pyprocar.utils.unfolder import Unfolder
 from pyprocar.utils import LOGGER
+from pyprocar.utils.config import CONFIG
 
 HBAR_EV = 6.582119 *10**(-16) #eV*s
 HBAR_J = 1.0545718 *10**(-34) #eV*s
@@ -30,6 +36,19 @@ METER_ANGSTROM = 10**(-10) #m /A
 EV_TO_J = 1.602*10**(-19)
 FREE_ELECTRON_MASS = 9.11*10**-31 #  kg
 
+# Upper bound in bytes of the block of projections read at once by the reductions
+PROJECTION_CHUNK_SIZE = 2**26
+
+# Methods of ElectronicBandStructure.get_dos
+DOS_METHODS = ['gaussian', 'methfessel_paxton', 'tetrahedron']
+# The smearing functions are cut at this number of widths
+DOS_SMEARING_CUTOFF = 6
+# Least number of points of the energy grid per smearing width
+DOS_SMEARING_RESOLUTION = 5
+
+# Methods of the derivatives of the bands on the kpoints mesh
+DERIVATIVE_METHODS = ['finite_difference', 'spectral']
+
 # TODO: Check hormonic average effective mass values
 # TODO: Check method to calculate the bands integral
 
@@ -58,6 +77,13 @@ class ElectronicBandStructure:
             The reciprocal lattice vector matrix. Will have the shape (3, 3), defaults to None
         shifted_to_efermi : bool, optional
              Boolean to determine if the fermi energy is shifted, defaults to False
+        derivative_method : str, optional
+            The method of the gradients and hessians of the bands on the mesh, 
+            one of DERIVATIVE_METHODS, defaults to 'finite_difference'. 
+            'spectral' differentiates the Fourier series of the periodic mesh
+        derivative_dtype : np.dtype, optional
+            The precision of the gradients and hessians, defaults to np.float64. 
+            np.float32 halves their memory
     """
 
     def __init__(
@@ -74,6 +100,8 @@ class ElectronicBandStructure:
         kpath:KPath=None,
         labels:List=None,
         reciprocal_lattice:np.ndarray=None,
+        derivative_method:str='finite_difference',
+        derivative_dtype:np.dtype=np.float64,
         ):
         LOGGER.info('Initializing the ElectronicBandStructure object')
         
@@ -101,6 +129,8 @@ class ElectronicBandStructure:
         self.ibz_projected = None
         self.ibz_projected_phase = None
         self.ibz_weights = None
+        # Maps of the full brillouin zone kpoints to the irreducible ones, see get_ibz2fbz_map
+        self._ibz2fbz_maps = {}
 
         self.initial_band_properties = ['bands','projected','projected_phase']
         self.band_derived_properties = ['bands_gradient', 'bands_hessian', 'fermi_velocity', 'harmonic_average_effective_mass', 'fermi_speed']
@@ -115,6 +145,10 @@ class ElectronicBandStructure:
         # Initialize array properties
         for prop in self.band_derived_properties :
             setattr(self, "_" + prop, None)
+        # Fourier transform of bands_mesh shared by the spectral derivatives
+        self._bands_spectrum = None
+        self.derivative_method = derivative_method
+        self.derivative_dtype = derivative_dtype
 
 
         self._n_kx=n_kx
@@ -261,6 +295,7 @@ class ElectronicBandStructure:
         """This is a setter for the kpoints property. 
         If the kpoints property gets changed, the cartesian kpoints will be recalculated"""
         self._kpoints = value
+        self._ibz2fbz_maps = {}
         self._kpoints_cartesian = self.reduced_to_cartesian(self._kpoints,self._reciprocal_lattice)
         self._n_kx=len(np.unique(self.kpoints[:,0]))
         self._n_ky=len(np.unique(self.kpoints[:,1]))
@@ -285,9 +320,38 @@ class ElectronicBandStructure:
         If the bands property gets changed, the bands_gradient and bands_hessian will be recalculated"""
         self._bands = value
 
-        # # If bands are changed, reset all the band derived properties
-        # for prop in self.band_derived_properties:
-        #     setattr(self, "_" + prop, None)
+        # If bands are changed, reset all the band derived properties
+        self._bands_mesh = None
+        self._reset_band_derived_properties()
+
+    @property
+    def derivative_method(self):
+        return self._derivative_method
+    @derivative_method.setter
+    def derivative_method(self, value):
+        """This is a setter for the derivative_method property. 
+        If the method gets changed, the band derived properties will be recalculated"""
+        if value not in DERIVATIVE_METHODS:
+            raise ValueError(f"The derivative method must be one of {DERIVATIVE_METHODS}, not {value}")
+        self._derivative_method = value
+        self._reset_band_derived_properties()
+
+    @property
+    def derivative_dtype(self):
+        return self._derivative_dtype
+    @derivative_dtype.setter
+    def derivative_dtype(self, value):
+        """This is a setter for the derivative_dtype property. 
+        If the precision gets changed, the band derived properties will be recalculated"""
+        self._derivative_dtype = np.dtype(value)
+        self._reset_band_derived_properties()
+
+    def _reset_band_derived_properties(self):
+        """Resets the cached band derived properties and the Fourier transform of the bands"""
+        for prop in self.band_derived_properties:
+            setattr(self, "_" + prop, None)
+            setattr(self, "_" + prop + "_mesh", None)
+        self._bands_spectrum = None
     
     @property
     def projected(self):
@@ -563,6 +627,21 @@ class ElectronicBandStructure:
                                                       nkz=self.n_kz)
         return self._weights_mesh
 
+    def _get_bands_spectrum(self):
+        """The real Fourier transform of bands_mesh over the kpoints axes, 
+        computed once for the gradients and the hessians
+
+        Returns
+        -------
+        np.ndarray
+            The spectrum. Shape = [n_kx,n_ky,n_kz//2+1,n_bands,n_spins]
+        """
+        if self._bands_spectrum is None:
+            self._bands_spectrum = scipy_fft.rfftn(self.bands_mesh.astype(self.derivative_dtype, copy=False), 
+                                                   axes=(0, 1, 2), 
+                                                   workers=CONFIG.get("fft_workers", 1) or 1)
+        return self._bands_spectrum
+
     @property
     def bands_gradient_mesh(self):
         """
@@ -577,8 +656,15 @@ class ElectronicBandStructure:
             where the first dimension represents d/dx,d/dy,d/dz  
         """
 
+        if self._bands_gradient_mesh is None and self.derivative_method == 'spectral':
+            self._bands_gradient_mesh = calculate_spectral_derivatives_on_meshgrid(self._get_bands_spectrum(), 
+                                                                                   self.bands_mesh.shape[:3], 
+                                                                                   order=1, 
+                                                                                   transform_matrix=self.reciprocal_lattice,
+                                                                                   scale=METER_ANGSTROM,
+                                                                                   dtype=self.derivative_dtype)
         if self._bands_gradient_mesh is None:
-            band_gradients=self.calculate_nd_scalar_derivatives(self.bands_mesh, self.reciprocal_lattice)
+            band_gradients=self.calculate_nd_scalar_derivatives(self.bands_mesh.astype(self.derivative_dtype, copy=False), self.reciprocal_lattice)
 
             # print(np.array_equal(scalar_diffs,scalar_diffs_2))
             # This is equivalent to the above
@@ -612,6 +698,14 @@ class ElectronicBandStructure:
             where the first and second dimension represent d/dx,d/dy,d/dz  
         """
 
+        if self._bands_hessian_mesh is None and self.derivative_method == 'spectral':
+            # the transform of the gradient is reused, the gradient itself is not needed
+            self._bands_hessian_mesh = calculate_spectral_derivatives_on_meshgrid(self._get_bands_spectrum(), 
+                                                                                  self.bands_mesh.shape[:3], 
+                                                                                  order=2, 
+                                                                                  transform_matrix=self.reciprocal_lattice,
+                                                                                  scale=METER_ANGSTROM**2,
+                                                                                  dtype=self.derivative_dtype)
         if self._bands_hessian_mesh is None:
             band_hessians=self.calculate_nd_scalar_derivatives(self.bands_gradient_mesh, self.reciprocal_lattice)
             
@@ -691,7 +785,7 @@ class ElectronicBandStructure:
             #                 for i in range(n_i):
             #                     hessian = self.bands_hessian_mesh[i,j,k,iband,ispin,...] * EV_TO_J / HBAR_J**2
             #                     self._harmonic_average_effective_mass_mesh[i,j,k,iband,ispin] = harmonic_average_effective_mass(hessian)
-            self._harmonic_average_effective_mass_mesh = self.calculate_harmonic_average_effective_mass(self.bands_hessian_mesh* EV_TO_J/ HBAR_J**2 )
+            self._harmonic_average_effective_mass_mesh = self.calculate_harmonic_average_effective_mass(self.bands_hessian_mesh * (EV_TO_J / HBAR_J**2))
             
         return self._harmonic_average_effective_mass_mesh
     
@@ -795,16 +889,12 @@ class ElectronicBandStructure:
         np.ndarray
             The transformed derivatives
         """
-        letters=['a','b','c','d','e','f','g','h']
-        scalar_diffs=calculate_scalar_differences(scalar_array)
-        n_dim=len(scalar_diffs.shape[3:])-1
-        transform_matrix_einsum_string='ij'
-        dim_letters=''.join(letters[0:n_dim])
-        scalar_array_einsum_string='uvw' + dim_letters + 'j'
-        transformed_scalar_string='uvw' + dim_letters + 'i'
-        ein_sum_string=transform_matrix_einsum_string + ',' + scalar_array_einsum_string + '->' + transformed_scalar_string
-        print(ein_sum_string)
-        scalar_gradients=np.einsum(ein_sum_string, reciprocal_lattice, scalar_diffs)
+        scalar_gradients=calculate_scalar_differences(scalar_array)
+        # (...,j) -> (...,i) with the matrix (i,j), in place plane by plane 
+        # and in the precision of the differences
+        transform_matrix=np.asarray(reciprocal_lattice, dtype=scalar_gradients.dtype)
+        for plane in scalar_gradients:
+            plane[...]=np.matmul(plane.reshape(-1, 3), transform_matrix.T).reshape(plane.shape)
 
         return scalar_gradients
 
@@ -842,31 +932,25 @@ class ElectronicBandStructure:
         
         return e_mass
     
-    @staticmethod
     def interpolate_mesh_grid(self, mesh_grid,interpolation_factor=2):
-        """This function will interpolate an Nd, 3d mesh grid
-        [...,nx,ny,nz]
+        """This function will interpolate a mesh grid of the kpoints, 
+        like the *_mesh properties, over its three kpoints axes
+        [n_kx,n_ky,n_kz,...]->[n_kx*f,n_ky*f,n_kz*f,...]
 
         Parameters
         ----------
         mesh_grid : np.ndarray
-            The mesh grid to interpolate
-        """
-        scalar_dims=mesh_grid.shape[:-3]
-        new_mesh=None
-        for i, idx in enumerate(np.ndindex(scalar_dims)):
-            # Creating slicing list. idx are the scalar dimensions, last 3 are the grid
-            mesh_idx = list(idx)
-            tmp = [slice(None)]*3
-            mesh_idx.extend(tmp)
-            new_grid = mathematics.fft_interpolate(mesh_grid[mesh_idx], interpolation_factor=interpolation_factor)
-            
-            if i==0:
-                new_dim = np.append(scalar_dims,new_grid.shape,axis=0)
-                new_mesh=np.zeros(shape=(new_dim))
+            The mesh grid to interpolate, shape = [n_kx,n_ky,n_kz,...]
+        interpolation_factor : int, optional
+            The interpolation factor f, by default 2
 
-            new_mesh[mesh_idx]=new_grid
-        return new_mesh
+        Returns
+        -------
+        np.ndarray
+            The interpolated mesh grid, shape = [n_kx*f,n_ky*f,n_kz*f,...]
+        """
+        # all the scalar slices are transformed at once
+        return mathematics.fft_interpolate_batch(mesh_grid, interpolation_factor=interpolation_factor, axes=(0, 1, 2))
     
     def update_weights(self, weights):
         self.weights = weights
@@ -880,20 +964,17 @@ class ElectronicBandStructure:
         ret : list float
             The IPR projections
         """
-        orbitals = np.arange(self.norbitals, dtype=int)
-        # sum over orbitals
-        proj = np.sum(self.projected[:, :, :, :, orbitals, :], axis=-2)
-        # keeping only the last principal quantum number
-        proj = proj[:, :, :, -1, :]
-        # selecting all atoms:
-        atoms = np.arange(self.natoms, dtype=int)
-        # the ipr is \frac{\sum_i |c_i|^4}{(\sum_i |c_i^2|)^2}
-        # mind, every c_i is c_{i,n,k} with n,k the band and k-point indexes
-        num = np.absolute(proj)**2
-        num = np.sum(num[:, :, atoms, :], axis=-2)
-        den = np.absolute(proj)**1 + 0.0001 # avoiding zero
-        den = np.sum(den[:, :, atoms, :], axis=-2)**2
-        IPR = num/den
+        IPR = np.zeros(shape=(self.nkpoints, self.nbands, self.nspins))
+        for kpoint_slice in self._kpoint_slices(self.projected):
+            # sum over orbitals keeping only the last principal quantum number
+            proj = np.sum(self.projected[kpoint_slice, :, :, -1, :, :], axis=-2)
+            # the ipr is \frac{\sum_i |c_i|^4}{(\sum_i |c_i^2|)^2}
+            # mind, every c_i is c_{i,n,k} with n,k the band and k-point indexes
+            num = np.absolute(proj)**2
+            num = np.sum(num, axis=-2)
+            den = np.absolute(proj)**1 + 0.0001 # avoiding zero
+            den = np.sum(den, axis=-2)**2
+            IPR[kpoint_slice] = num/den
         return IPR
 
     def ebs_ipr_atom(self):
@@ -915,20 +996,16 @@ class ElectronicBandStructure:
             The IPR projections
 
         """
-        orbitals = np.arange(self.norbitals, dtype=int)
-        # sum over orbitals
-        proj = np.sum(self.projected[:, :, :, :, orbitals, :], axis=-2)
-        # keeping only the last principal quantum number
-        proj = proj[:, :, :, -1, :]
-        # selecting all atoms:
-        atoms = np.arange(self.natoms, dtype=int)
-
-        # the partial pIPR is \frac{|c_j|^4}{(\sum_i |c_i^2|)^2}
-        # mind, every c_i is c_{i,n,k} with n,k the band and k-point indexes
-        num = np.absolute(proj)**2
-        den = np.absolute(proj)
-        den = np.sum(den[:, :, atoms, :], axis=-2)**2
-        pIPR = num/den[:,:,np.newaxis,:]
+        pIPR = np.zeros(shape=(self.nkpoints, self.nbands, self.natoms, self.nspins))
+        for kpoint_slice in self._kpoint_slices(self.projected):
+            # sum over orbitals keeping only the last principal quantum number
+            proj = np.sum(self.projected[kpoint_slice, :, :, -1, :, :], axis=-2)
+            # the partial pIPR is \frac{|c_j|^4}{(\sum_i |c_i^2|)^2}
+            # mind, every c_i is c_{i,n,k} with n,k the band and k-point indexes
+            num = np.absolute(proj)**2
+            den = np.absolute(proj)
+            den = np.sum(den, axis=-2)**2
+            pIPR[kpoint_slice] = num/den[:,:,np.newaxis,:]
         # print('pIPR', pIPR.shape)
         return pIPR
         
@@ -959,27 +1036,478 @@ class ElectronicBandStructure:
             The summed projections
         """
 
-        principal_q_numbers = np.array(principal_q_numbers)
-        if atoms is None:
-            atoms = np.arange(self.natoms, dtype=int)
-        if spins is None:
-            spins = np.arange(self.nspins, dtype=int)
-        if orbitals is None:
-            orbitals = np.arange(self.norbitals, dtype=int)
-        # sum over orbitals
-        ret = np.sum(self.projected[:, :, :, :, orbitals, :], axis=-2)
-        # sum over principle quantum number
-        ret = np.sum(ret[:, :, :, principal_q_numbers, :], axis=-2)
-        # sum over atoms
-        ret = np.sum(ret[:, :, atoms, :], axis=-2)
+        selection = {'atoms':atoms, 
+                     'principal_q_numbers':principal_q_numbers, 
+                     'orbitals':orbitals, 
+                     'spins':spins}
+        return self.ebs_sum_batch([selection], sum_noncolinear=sum_noncolinear)[0]
+
+    def ebs_sum_batch(self,
+                      selections:List[dict],
+                      sum_noncolinear:bool=True):
+        """Computes the summed projections of many selections in a single pass over the
+        projections, a block of kpoints at a time.
+
+        Each selection is the product of its atoms, principal quantum numbers and orbitals,
+        so a block of projections is first reduced once per distinct set of orbitals
+        (with their principal quantum numbers), over the atoms of the selections sharing it,
+        or once per distinct set of atoms if there are fewer of them. Each selection is 
+        then a small sum over the reduced block. Selections sharing their orbitals or 
+        their atoms are then reduced together, and memory mapped projections are read once.
+
+        Parameters
+        ----------
+        selections : List[dict]
+            The selections, each one a dictionary with the arguments of ebs_sum:
+            'atoms', 'principal_q_numbers', 'orbitals' and 'spins'. The missing keys
+            take the defaults of ebs_sum
+        sum_noncolinear : bool, optional
+            Determines if the projection should be summed in a non-colinear calculation, by default True
+
+        Returns
+        -------
+        np.ndarray
+            The summed projections of each selection, (nselections, nkpoints, nbands, nspins).
+            Each one equals ebs_sum with the same arguments
+        """
+        indices = self._selection_indices(selections)
+        atom_groups = self._group_selections([atoms for atoms, _, _ in indices])
+        orbital_groups = self._group_selections([(principals, orbitals) for _, principals, orbitals in indices])
+
+        ret = np.zeros(shape=(len(selections), self.nkpoints, self.nbands, self.nspins), 
+                       dtype=self.projected.dtype)
+        for kpoint_slice in self._kpoint_slices(self.projected):
+            proj = self.projected[kpoint_slice]
+            if len(orbital_groups) <= len(atom_groups):
+                for (principals, orbitals), group in orbital_groups:
+                    # only the atoms of the group are gathered, (kpoints, bands, atoms, spins).
+                    # einsum reduces the small inner axes much faster than np.sum
+                    group_atoms = np.unique(np.concatenate([indices[i][0] for i in group]))
+                    reduced = mathematics.take_indices(proj, group_atoms, axis=2)
+                    reduced = mathematics.take_indices(reduced, principals, axis=3)
+                    reduced = np.einsum('kbapos->kbas', mathematics.take_indices(reduced, orbitals, axis=4))
+                    for iselection in group:
+                        atoms = np.searchsorted(group_atoms, indices[iselection][0])
+                        ret[iselection, kpoint_slice] = np.einsum('kbas->kbs', mathematics.take_indices(reduced, atoms, axis=2))
+            else:
+                for atoms, group in atom_groups:
+                    # only the orbitals of the group are gathered, (kpoints, bands, principals, orbitals, spins)
+                    group_principals = np.unique(np.concatenate([indices[i][1] for i in group]))
+                    group_orbitals = np.unique(np.concatenate([indices[i][2] for i in group]))
+                    reduced = mathematics.take_indices(proj, group_principals, axis=3)
+                    reduced = mathematics.take_indices(reduced, group_orbitals, axis=4)
+                    reduced = np.einsum('kbapos->kbpos', mathematics.take_indices(reduced, atoms, axis=2))
+                    for iselection in group:
+                        principals = np.searchsorted(group_principals, indices[iselection][1])
+                        orbitals = np.searchsorted(group_orbitals, indices[iselection][2])
+                        selected = mathematics.take_indices(reduced, principals, axis=2)
+                        ret[iselection, kpoint_slice] = np.einsum('kbpos->kbs', mathematics.take_indices(selected, orbitals, axis=3))
+
         # sum over spins only in non collinear and reshaping for consistency (nkpoints, nbands, nspins)
         # in non-mag, non-colin nspin=1, in colin nspin=2
         if self.is_non_collinear and sum_noncolinear:
-            ret = np.sum(ret[:, :, spins], axis=-1).reshape(
-                self.nkpoints, self.nbands, 1
-            )
+            summed = np.zeros(shape=(len(selections), self.nkpoints, self.nbands, 1), dtype=ret.dtype)
+            for iselection, selection in enumerate(selections):
+                spins = selection.get('spins', None)
+                if spins is None:
+                    spins = np.arange(self.nspins, dtype=int)
+                summed[iselection, :, :, 0] = np.sum(ret[iselection][:, :, spins], axis=-1)
+            ret = summed
         return ret
 
+    def _selection_indices(self, selections:List[dict]):
+        """Converts the selections of ebs_sum_batch into arrays of non-negative 
+        indices of the atoms, principal quantum numbers and orbitals.
+        Repeated indices are kept, they are summed as many times as in ebs_sum
+
+        Parameters
+        ----------
+        selections : List[dict]
+            The selections, as in ebs_sum_batch
+
+        Returns
+        -------
+        List[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+            The sorted atoms, principal quantum numbers and orbitals of each selection
+        """
+        indices = []
+        for selection in selections:
+            atoms = selection.get('atoms', None)
+            principal_q_numbers = selection.get('principal_q_numbers', None)
+            orbitals = selection.get('orbitals', None)
+            if atoms is None:
+                atoms = np.arange(self.natoms, dtype=int)
+            if principal_q_numbers is None:
+                principal_q_numbers = [-1]
+            if orbitals is None:
+                orbitals = np.arange(self.norbitals, dtype=int)
+            
+            selection_indices = []
+            for index, size in zip([atoms, principal_q_numbers, orbitals], 
+                                   [self.natoms, self.nprincipals, self.norbitals]):
+                index = np.array(index, dtype=int).reshape(-1)
+                # negative indices count from the end, as in fancy indexing
+                index = np.where(index < 0, index + size, index)
+                if np.any(index < 0) or np.any(index >= size):
+                    raise IndexError(f"The indices {index} are out of bounds for an axis of size {size}")
+                selection_indices.append(np.sort(index))
+            indices.append(tuple(selection_indices))
+        return indices
+
+    @staticmethod
+    def _group_selections(keys:List):
+        """Groups the selections sharing the same indices
+
+        Parameters
+        ----------
+        keys : List
+            The index array (or tuple of index arrays) of each selection
+
+        Returns
+        -------
+        List[Tuple]
+            The distinct keys and the selections having each one, in order of appearance
+        """
+        groups = {}
+        for iselection, key in enumerate(keys):
+            arrays = key if isinstance(key, tuple) else (key,)
+            hashable = tuple(tuple(array.tolist()) for array in arrays)
+            if hashable not in groups:
+                groups[hashable] = (key, [])
+            groups[hashable][1].append(iselection)
+        return list(groups.values())
+
+    def _kpoint_slices(self, array):
+        """Splits the kpoints axis of an array in slices 
+        of at most PROJECTION_CHUNK_SIZE bytes
+
+        Parameters
+        ----------
+        array : np.ndarray
+            The array to split. The first axis are the kpoints
+
+        Returns
+        -------
+        List[slice]
+            The slices along the kpoints axis
+        """
+        kpoint_size = max(array[:1].nbytes, 1)
+        n_kpoints_chunk = max(PROJECTION_CHUNK_SIZE // kpoint_size, 1)
+        return [slice(start, start + n_kpoints_chunk) 
+                for start in range(0, array.shape[0], n_kpoints_chunk)]
+
+    def get_dos(self,
+                energies:np.ndarray=None,
+                method:str='gaussian',
+                sigma:float=0.1,
+                order:int=1,
+                n_energies:int=2001,
+                project:bool=True,
+                spin_degeneracy:float=None):
+        """Calculates the density of states of a mesh calculation from the 
+        bands, the weights of the kpoints and the projections.
+
+        The smearing methods broaden every state with a gaussian or a Methfessel-Paxton 
+        function. The states are binned on the energy grid and the bins are convolved 
+        with the smearing function, so every state is visited once and not once per energy.
+        The tetrahedron method interpolates linearly the bands in the tetrahedra 
+        of the kpoints mesh, it needs the full mesh, sorted like kpoints_mesh.
+        The kpoints, bands and tetrahedra are processed in chunks of about 
+        PROJECTION_CHUNK_SIZE bytes, the memory used is bound by the size of the 
+        returned density of states.
+
+        Parameters
+        ----------
+        energies : np.ndarray, optional
+            The energies of the density of states relative to the fermi energy, like 
+            the energies of the parsers. The smearing methods need an evenly spaced grid. 
+            By default n_energies points spanning the bands
+        method : str, optional
+            The method, one of DOS_METHODS, by default 'gaussian'
+        sigma : float, optional
+            The smearing width in eV, by default 0.1. 
+            The gaussian is exp(-((E - e)/sigma)^2) / (sigma sqrt(pi)), like vasp's SIGMA
+        order : int, optional
+            The order of the Methfessel-Paxton smearing, by default 1
+        n_energies : int, optional
+            The number of energies of the default grid, by default 2001
+        project : bool, optional
+            Boolean to calculate the projected density of states, by default True
+        spin_degeneracy : float, optional
+            The number of electrons of a state, by default 2 for calculations 
+            without spin polarization and 1 otherwise
+
+        Returns
+        -------
+        DensityOfStates
+            The density of states. The projections have the 
+            shape (n_atoms, n_principals, n_orbitals, n_spins, n_energies)
+
+        Raises
+        ------
+        ValueError
+            If the method is unknown, the energies are not evenly spaced for the smearing 
+            or the mesh dimensions are missing for the tetrahedron method
+        """
+        if method not in DOS_METHODS:
+            raise ValueError(f"The method of the density of states must be one of {DOS_METHODS}, not {method}")
+        if method == 'gaussian':
+            order = 0
+
+        bands = self.bands
+        if bands.ndim == 2:
+            bands = bands[:, :, np.newaxis]
+        n_band_spins = bands.shape[2]
+        projected = self.projected
+        if projected is not None and len(projected) == 0:
+            projected = None
+        non_collinear = projected is not None and self.is_non_collinear
+        if not project:
+            projected = None
+        if spin_degeneracy is None:
+            spin_degeneracy = 2 if n_band_spins == 1 and not non_collinear else 1
+
+        if energies is None:
+            margin = 0 if method == 'tetrahedron' else DOS_SMEARING_CUTOFF * sigma
+            energies = np.linspace(bands.min() - margin, bands.max() + margin, n_energies)
+        energies = np.asarray(energies, dtype=float)
+        grid = energies
+
+        if method == 'tetrahedron':
+            weight_matrices = self._tetrahedron_dos_weights(bands, grid, projected)
+        else:
+            if len(grid) < 2 or not np.allclose(np.diff(grid), grid[1] - grid[0]):
+                raise ValueError("The smearing needs evenly spaced energies")
+            # the bins are refined to resolve the smearing function
+            refine = max(int(np.ceil((grid[1] - grid[0]) * DOS_SMEARING_RESOLUTION / sigma)), 1)
+            step = (grid[1] - grid[0]) / refine
+            n_pad = int(np.ceil(DOS_SMEARING_CUTOFF * sigma / step))
+            n_fine = (len(grid) - 1) * refine + 1
+            kernel = mathematics.methfessel_paxton_delta(np.arange(-n_pad, n_pad + 1) * step / sigma, order) / sigma
+            # the padding keeps the tails of the states just out of the grid
+            grid = grid[0] + step * np.arange(-n_pad, n_fine + n_pad)
+            weight_matrices = self._smearing_dos_weights(bands, grid, projected)
+
+        n_grid = len(grid)
+        total = np.zeros((n_band_spins, n_grid))
+        projected_dos = None
+        if projected is not None:
+            n_proj_spins = projected.shape[5]
+            projected_dos = np.zeros((n_grid,) + projected.shape[2:])
+        gathered = None
+        for ispin, kpoints, band_slice, weights in weight_matrices:
+            # weights is a sparse matrix (energies, (kpoints, bands)), 
+            # consecutive matrices can share the same states
+            total[ispin] += np.bincount(weights.row, weights.data, minlength=n_grid)
+            if projected is None:
+                continue
+            # The non-colinear spin components share the bands
+            spins = [ispin] if n_band_spins == n_proj_spins else list(range(n_proj_spins))
+            if gathered is None or gathered[0] is not kpoints or gathered[1:3] != (band_slice, ispin):
+                proj = projected[kpoints, band_slice][..., spins]
+                proj = proj.reshape(proj.shape[0] * proj.shape[1], -1)
+                gathered = (kpoints, band_slice, ispin, proj)
+            proj = gathered[3]
+            projected_dos[..., spins] += (weights @ proj).reshape((n_grid,) + projected.shape[2:5] + (len(spins),))
+
+        if method != 'tetrahedron':
+            total = signal.fftconvolve(total, kernel[np.newaxis], mode='same', axes=1)
+            total = total[:, n_pad:n_pad + n_fine:refine]
+            if projected_dos is not None:
+                projected_dos = projected_dos.reshape(n_grid, -1)
+                n_columns = max(PROJECTION_CHUNK_SIZE // (16 * n_grid), 1)
+                smeared = np.empty((len(energies), projected_dos.shape[1]))
+                for start in range(0, projected_dos.shape[1], n_columns):
+                    columns = slice(start, start + n_columns)
+                    convolved = signal.fftconvolve(projected_dos[:, columns], kernel[:, np.newaxis], mode='same', axes=0)
+                    smeared[:, columns] = convolved[n_pad:n_pad + n_fine:refine]
+                projected_dos = smeared.reshape((len(energies),) + projected.shape[2:])
+
+        total *= spin_degeneracy
+        if projected_dos is not None:
+            projected_dos *= spin_degeneracy
+            projected_dos = np.ascontiguousarray(np.moveaxis(projected_dos, 0, -1))
+        return DensityOfStates(energies=energies, total=total, efermi=self.efermi, projected=projected_dos)
+
+    def _smearing_dos_weights(self, bands, grid, projected=None):
+        """Bins the states of chunks of kpoints on an evenly spaced energy grid. 
+        A state is shared by its two nearest energies, linearly
+
+        Parameters
+        ----------
+        bands : np.ndarray
+            The bands. shape = (n_kpoints, n_bands, n_spins)
+        grid : np.ndarray
+            The energies
+        projected : np.ndarray, optional
+            The projections, they set the size of the chunks
+
+        Yields
+        ------
+        tuple
+            The spin, the kpoints, the bands and the sparse matrix of 
+            the weights of the states (n_energies, n_kpoints * n_bands)
+        """
+        weights = np.ones(bands.shape[0]) if self.weights is None else np.ravel(self.weights).astype(float)
+        weights = weights / weights.sum()
+        step = grid[1] - grid[0]
+        for kpoint_slice in self._kpoint_slices(projected if projected is not None else bands):
+            for ispin in range(bands.shape[2]):
+                position = ((bands[kpoint_slice, :, ispin] - grid[0]) / step).ravel()
+                state_weights = np.repeat(weights[kpoint_slice], bands.shape[1])
+                inside = np.nonzero((position >= 0) & (position < len(grid) - 1))[0]
+                lower = np.floor(position[inside]).astype(int)
+                fraction = position[inside] - lower
+                state_weights = state_weights[inside]
+                matrix = sparse.coo_matrix(
+                    (np.concatenate([state_weights * (1 - fraction), state_weights * fraction]),
+                     (np.concatenate([lower, lower + 1]), np.concatenate([inside, inside]))),
+                    shape=(len(grid), len(position)))
+                yield ispin, kpoint_slice, slice(None), matrix
+
+    def _tetrahedron_corners(self):
+        """The corners of the six tetrahedra splitting a cell of the kpoints mesh. 
+        The tetrahedra share the shortest diagonal of the cell
+
+        Returns
+        -------
+        np.ndarray
+            The offsets of the corners in the mesh. shape = (6, 4, 3)
+        """
+        corners = []
+        for i, j in itertools.permutations(range(3), 2):
+            path = np.zeros((4, 3), dtype=int)
+            path[1:, i] = 1
+            path[2:, j] = 1
+            path[3] = 1
+            corners.append(path)
+        corners = np.array(corners)
+
+        # the diagonal from the corner flip to the opposite one
+        flips = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]])
+        flip = flips[0]
+        if self.reciprocal_lattice is not None:
+            mesh = np.array([self.n_kx, self.n_ky, self.n_kz])
+            lengths = np.linalg.norm(((1 - 2 * flips) / mesh) @ self.reciprocal_lattice, axis=1)
+            flip = flips[np.argmin(lengths)]
+        return np.abs(corners - flip)
+
+    def _tetrahedron_dos_weights(self, bands, grid, projected=None):
+        """Weights of the states of the kpoints mesh in the density of states 
+        of the linear tetrahedron method. The tetrahedra are processed by 
+        slabs of planes of the kx axis and chunks of bands
+
+        Parameters
+        ----------
+        bands : np.ndarray
+            The bands. shape = (n_kpoints, n_bands, n_spins)
+        grid : np.ndarray
+            The sorted energies
+        projected : np.ndarray, optional
+            The projections, they set the size of the chunks
+
+        Yields
+        ------
+        tuple
+            The spin, the kpoints, the bands and the sparse matrix of 
+            the weights of the states (n_energies, n_kpoints * n_bands). 
+            The states of a chunk are split in several matrices
+
+        Raises
+        ------
+        ValueError
+            If the mesh dimensions are missing or do not match the kpoints
+        """
+        if None in (self.n_kx, self.n_ky, self.n_kz):
+            raise ValueError("The tetrahedron method needs the dimensions n_kx, n_ky and n_kz of the kpoints mesh")
+        n_kx, n_ky, n_kz = self.n_kx, self.n_ky, self.n_kz
+        if n_kx * n_ky * n_kz != bands.shape[0]:
+            raise ValueError("The tetrahedron method needs the full kpoints mesh")
+        n_plane = n_ky * n_kz
+        corners = self._tetrahedron_corners()
+        # every tetrahedron is 1/6 of a cell of the mesh
+        volume = 1 / (6 * bands.shape[0])
+
+        kpoint_size = max((projected if projected is not None else bands)[:1].nbytes, 1)
+        n_planes = max(PROJECTION_CHUNK_SIZE // (kpoint_size * n_plane) - 1, 1)
+        for start in range(0, n_kx, n_planes):
+            n_slab = min(n_planes, n_kx - start)
+            # the slab and the next plane, which closes the cells
+            kpoints = ((start + np.arange(n_slab + 1)) % n_kx)[:, np.newaxis] * n_plane + np.arange(n_plane)
+            kpoints = kpoints.ravel()
+            # the corners of the tetrahedra, as indices of the kpoints of the slab
+            ix, iy, iz = np.meshgrid(np.arange(n_slab), np.arange(n_ky), np.arange(n_kz), indexing='ij')
+            ix, iy, iz = [index.reshape(-1, 1, 1) for index in (ix, iy, iz)]
+            tetrahedra = ((ix + corners[..., 0]) * n_plane + 
+                          (iy + corners[..., 1]) % n_ky * n_kz + 
+                          (iz + corners[..., 2]) % n_kz).reshape(-1, 4)
+
+            n_bands_chunk = max(PROJECTION_CHUNK_SIZE // (len(tetrahedra) * 4 * 8 * 4), 1)
+            for band_start in range(0, bands.shape[1], n_bands_chunk):
+                band_slice = slice(band_start, band_start + n_bands_chunk)
+                for ispin in range(bands.shape[2]):
+                    slab_bands = bands[kpoints, band_slice, ispin]
+                    n_bands = slab_bands.shape[1]
+                    # (tetrahedra * bands, 4)
+                    corner_energies = slab_bands[tetrahedra].transpose(0, 2, 1).reshape(-1, 4)
+                    low = np.searchsorted(grid, corner_energies.min(axis=1), side='right')
+                    high = np.searchsorted(grid, corner_energies.max(axis=1), side='left')
+                    active = np.nonzero(high > low)[0]
+                    low, counts = low[active], high[active] - low[active]
+                    # the corners of every tetrahedron are sorted once by energy
+                    order = np.argsort(corner_energies[active], axis=1)
+                    corner_energies = np.take_along_axis(corner_energies[active], order, axis=1)
+                    tetrahedron, band = np.divmod(active, n_bands)
+                    states = np.take_along_axis(tetrahedra[tetrahedron], order, axis=1) * n_bands + band[:, np.newaxis]
+
+                    # the pairs of tetrahedra and energies are processed in chunks too
+                    ends = np.cumsum(counts)
+                    n_pairs = max(PROJECTION_CHUNK_SIZE // (4 * 8 * 8), 1)
+                    first = 0
+                    while first < len(active):
+                        start = ends[first] - counts[first]
+                        last = max(np.searchsorted(ends, start + n_pairs, side='right'), first + 1)
+                        chunk_counts = counts[first:last]
+                        pairs = np.repeat(np.arange(first, last), chunk_counts)
+                        energy_index = low[pairs] + np.arange(len(pairs)) - np.repeat(ends[first:last] - chunk_counts - start, chunk_counts)
+                        weights = mathematics.tetrahedron_dos_weights(corner_energies[pairs], grid[energy_index], is_sorted=True)
+                        matrix = sparse.coo_matrix(
+                            (volume * weights.ravel(), (np.repeat(energy_index, 4), states[pairs].ravel())),
+                            shape=(len(grid), len(kpoints) * n_bands))
+                        yield ispin, kpoints, band_slice, matrix
+                        first = last
+
+    def memmap_projections(self, dirname:str, properties:List[str]=None):
+        """Moves the projection arrays to .npy files and replaces them by memory maps of 
+        these files, so only the slices used by ebs_sum, ebs_ipr or the mesh properties 
+        are read into memory. The maps are copy-on-write, the files are never modified.
+
+        Parameters
+        ----------
+        dirname : str
+            The directory where the .npy files are written
+        properties : List[str], optional
+            The properties to memory map, by default ['projected','projected_phase']
+
+        Returns
+        -------
+        None
+            None
+        """
+        if properties is None:
+            properties = ['projected', 'projected_phase']
+        os.makedirs(dirname, exist_ok=True)
+        for prop in properties:
+            value = getattr(self, prop)
+            if value is None:
+                continue
+            filename = os.path.join(dirname, f"{prop}.npy")
+            if not (isinstance(value, np.memmap) and value.filename == os.path.abspath(filename)):
+                np.save(filename, value)
+            setattr(self, prop, np.load(filename, mmap_mode='c'))
+            setattr(self, "_" + prop + "_mesh", None)
+        return None
+
     def unfold(self, transformation_matrix=None, structure=None):
         """The method helps unfold the bands. This is done by using the unfolder to find the new kpoint weights.
         The current weights are then updated
@@ -1013,6 +1541,56 @@ class ElectronicBandStructure:
                 setattr(self, prop, original_value[sorted_indices,...])
         return None
 
+    def get_ibz2fbz_map(self, rotations, decimals=4):
+        """Computes, from the kpoints alone, the map of the full brillouin zone 
+        kpoints to their irreducible kpoint and rotation. The map is cached on the 
+        object, keyed on a hash of the kpoints, the rotations and decimals, 
+        and the cache is cleared when the kpoints are set
+
+        Parameters
+        ----------
+        rotations : np.ndarray
+            The point symmetry operations of the lattice
+        decimals : int
+            The number of decimals to round the kpoints 
+            to when checking for uniqueness
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            The full brillouin zone kpoints sorted by kpoints, 
+            the index of the irreducible kpoint of each of them 
+            and the index of the rotation that maps it
+        """
+        rotations = np.asarray(rotations)
+        kpoints = np.ascontiguousarray(self.kpoints)
+        key = hashlib.sha1()
+        for array in (kpoints, np.ascontiguousarray(rotations)):
+            key.update(str((array.shape, array.dtype.str)).encode())
+            key.update(array.tobytes())
+        key = (key.hexdigest(), decimals)
+        if key in self._ibz2fbz_maps:
+            return self._ibz2fbz_maps[key]
+
+        n_kpoints = self.kpoints.shape[0]
+
+        # Rotate kpoints, the kpoints of rotation i are at i * n_kpoints
+        fbz_kpoints = np.matmul(self.kpoints, rotations.transpose(0, 2, 1)).reshape(-1, 3)
+
+        # Apply boundary conditions to kpoints
+        fbz_kpoints = -np.fmod(fbz_kpoints + 6.5, 1) + 0.5
+
+        # Floating point error can cause the kpoints to be off by 0.000001 or so
+        # causing the unique indices to misidentify the kpoints
+        fbz_kpoints = fbz_kpoints.round(decimals=decimals)
+        fbz_kpoints, unique_indices = np.unique(fbz_kpoints, axis=0, return_index=True)
+
+        ibz_indices = unique_indices % n_kpoints
+        rotation_indices = unique_indices // n_kpoints
+
+        self._ibz2fbz_maps[key] = (fbz_kpoints, ibz_indices, rotation_indices)
+        return self._ibz2fbz_maps[key]
+
     def ibz2fbz(self, rotations,decimals=4):
         """Applys symmetry operations to the kpoints, bands, and projections
 
@@ -1026,65 +1604,29 @@ class ElectronicBandStructure:
         """
         if not self.is_mesh:
             raise ValueError("This function only works for meshes")
-        
-        n_kpoints = self.kpoints.shape[0]
-        n_rotations = rotations.shape[0]
-
-        # Calculate new shape for kpoints and all properties
-        total_points = n_kpoints * n_rotations
-        new_shape = (total_points, 3)
 
         properties=self.initial_properties[2:]
-        # Initialize new arrays for kpoints and properties
-        new_kpoints = np.zeros(new_shape)
-    
+
+        # The map only depends on the kpoints, the properties are gathered once through it
+        fbz_kpoints, ibz_indices, _ = self.get_ibz2fbz_map(rotations, decimals=decimals)
+
         self.ibz_kpoints = self.kpoints
         self.ibz_kpoints_cartesian = self.kpoints_cartesian
-        new_properties = {}
         for prop in properties:
-            
             original_value = getattr(self, prop)
             if original_value is not None:
-                setattr(self, f'ibz_{prop}', original_value.copy())
-
-                prop_shape = (total_points,) + original_value.shape[1:]
-                new_properties[prop] = np.zeros(prop_shape)
-
-        # Apply rotations and copy properties
-        for i, rotation in enumerate(rotations):
-            start_idx = i * n_kpoints
-            end_idx = start_idx + n_kpoints
-
-            # Rotate kpoints
-            rotated_kpoints = self.kpoints.dot(rotation.T)
-            
-            new_kpoints[start_idx:end_idx] = rotated_kpoints
+                setattr(self, f'ibz_{prop}', original_value)
 
-            # Update properties
-            for prop in properties:
-                original_value = getattr(self, "ibz_" + prop)
-                if original_value is not None:
-                    new_properties[prop][start_idx:end_idx] = original_value
-
-        # Apply boundary conditions to kpoints
-        new_kpoints = -np.fmod(new_kpoints + 6.5, 1) + 0.5
-
-        # Floating point error can cause the kpoints to be off by 0.000001 or so
-        # causing the unique indices to misidentify the kpoints
-        new_kpoints = new_kpoints.round(decimals=decimals)
-        _, unique_indices = np.unique(new_kpoints, axis=0, return_index=True)
-
-        # Update the object's properties keeping only the unique kpoints
-        self.kpoints = new_kpoints[unique_indices]
+        # np.unique returns the kpoints already sorted by kpoints
+        self.kpoints = fbz_kpoints
         self.bz_kpoints = self.kpoints
         self.bz_kpoints_cartesian = self.kpoints_cartesian
         for prop in properties:
-            prop_value = getattr(self, prop)
-            if prop_value is not None:
-                setattr(self, prop, new_properties[prop][unique_indices])
-                setattr(self, "bz_" + prop, new_properties[prop][unique_indices])
- 
-        self._sort_by_kpoints()
+            original_value = getattr(self, "ibz_" + prop)
+            if original_value is not None:
+                new_value = original_value[ibz_indices]
+                setattr(self, prop, new_value)
+                setattr(self, "bz_" + prop, new_value)
         return None
 
     def ravel_array(self,mesh_grid):
@@ -1398,13 +1940,95 @@ def calculate_scalar_differences(scalar_mesh):
     scalar_mesh : np.ndarray
         The scalar mesh. shape = [n_kx,n_ky,n_kz,...,3]
     """
-    scalar_diffs_i=calculate_central_differences_on_meshgrid_axis(scalar_mesh,axis=0)
-    scalar_diffs_j=calculate_central_differences_on_meshgrid_axis(scalar_mesh,axis=1)
-    scalar_diffs_k=calculate_central_differences_on_meshgrid_axis(scalar_mesh,axis=2)
-    scalar_diffs=np.array([scalar_diffs_i,scalar_diffs_j,scalar_diffs_k])
-    scalar_diffs=np.moveaxis(scalar_diffs,0,-1)
+    dtype = scalar_mesh.dtype if np.issubdtype(scalar_mesh.dtype, np.inexact) else float
+    scalar_diffs = np.zeros(scalar_mesh.shape + (3,), dtype=dtype)
+    for axis in range(3):
+        # the periodic central differences are written in place, without index copies
+        mesh = np.moveaxis(scalar_mesh, axis, 0)
+        diffs = np.moveaxis(scalar_diffs[..., axis], axis, 0)
+        if mesh.shape[0] < 2:
+            continue
+        np.subtract(mesh[2:], mesh[:-2], out=diffs[1:-1])
+        np.subtract(mesh[1], mesh[-1], out=diffs[0])
+        np.subtract(mesh[0], mesh[-2], out=diffs[-1])
+        diffs /= 2
     return scalar_diffs
 
+def calculate_spectral_derivatives_on_meshgrid(spectrum, shape, order=1, transform_matrix=None, scale=1, dtype=np.float64):
+    """Calculates the first or second derivatives of a periodic scalar mesh 
+    from its real Fourier transform over the three kpoints axes. The derivatives 
+    are in units of the mesh steps, like the central differences, and are 
+    transformed by the matrix like calculate_nd_scalar_derivatives
+
+    Parameters
+    ----------
+    spectrum : np.ndarray
+        The real Fourier transform of the scalar mesh. shape = [n_kx,n_ky,n_kz//2+1,...]
+    shape : Tuple[int,int,int]
+        The shape of the kpoints axes of the scalar mesh
+    order : int, optional
+        1 for the gradient, 2 for the hessian, by default 1
+    transform_matrix : np.ndarray, optional
+        The matrix transforming the derivatives, by default the identity
+    scale : float, optional
+        Factor applied to the derivatives, by default 1
+    dtype : np.dtype, optional
+        The precision of the derivatives, by default np.float64
+
+    Returns
+    -------
+    np.ndarray
+        The gradient, shape = [n_kx,n_ky,n_kz,...,3], or the hessian, 
+        shape = [n_kx,n_ky,n_kz,...,3,3]
+    """
+    if order not in (1, 2):
+        raise ValueError("Only the first and second derivatives are available")
+    dtype = np.dtype(dtype)
+    if transform_matrix is None:
+        transform_matrix = np.eye(3)
+    workers = CONFIG.get("fft_workers", 1) or 1
+
+    # the wave numbers per mesh step of the axes, the last one only has the positive frequencies
+    wave_numbers = []
+    odd_wave_numbers = []
+    for axis, n in enumerate(shape):
+        frequencies = np.fft.rfftfreq(n) if axis == 2 else np.fft.fftfreq(n)
+        wave_number = (2 * np.pi * frequencies).astype(dtype)
+        broadcast_shape = [1] * spectrum.ndim
+        broadcast_shape[axis] = len(wave_number)
+        wave_numbers.append(wave_number.reshape(broadcast_shape))
+        # the nyquist frequency of an even axis has no odd derivative
+        odd_wave_number = wave_number.copy()
+        if n % 2 == 0:
+            odd_wave_number[n // 2] = 0
+        odd_wave_numbers.append(odd_wave_number.reshape(broadcast_shape))
+
+    derivatives = np.empty(tuple(shape) + spectrum.shape[3:] + (3,) * order, dtype=dtype)
+    for j in range(3):
+        for k in range(j, 3) if order == 2 else [None]:
+            if k is None:
+                factor = 1j * odd_wave_numbers[j]
+            elif j == k:
+                factor = -wave_numbers[j]**2
+            else:
+                factor = -odd_wave_numbers[j] * odd_wave_numbers[k]
+            derivative = scipy_fft.irfftn(spectrum * factor, s=shape, axes=(0, 1, 2), overwrite_x=True, workers=workers)
+            if k is None:
+                derivatives[..., j] = derivative
+            else:
+                derivatives[..., j, k] = derivative
+                derivatives[..., k, j] = derivative
+
+    # the derivatives on the mesh steps are transformed plane by plane
+    transform_matrix = np.asarray(transform_matrix, dtype=dtype)
+    for plane in derivatives:
+        transformed = np.matmul(plane.reshape(-1, 3), transform_matrix.T).reshape(plane.shape)
+        if order == 2:
+            # the hessian is symmetric, the transform of the other axis gives it transposed
+            transformed = np.matmul(np.swapaxes(transformed, -1, -2).reshape(-1, 3), transform_matrix.T).reshape(plane.shape)
+        plane[...] = transformed * scale
+    return derivatives
+
 def calculate_scalar_differences_2(scalar_mesh,transform_matrix):
     """Calculates the scalar gradient over the k mesh grid in cartesian coordinates
 
@@ -3,11 +3,13 @@ __maintainer__ = "Pedram Tavadze and Logan Lang"
 __email__ = "petavazohi@mail.wvu.edu, lllang@mix.wvu.edu"
 __date__ = "March 31, 2020"
 
+import os
 import random
 import math
 import sys
 import copy
 import itertools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import List, Tuple, Union
 
 import numpy as np
@@ -17,6 +19,7 @@ from matplotlib import colors as mpcolors
 from matplotlib import cm
 
 from . import Isosurface, Surface, BrillouinZone
+from .isosurface import map2matrix_mapping
 from pyprocar.utils import LOGGER
 import pyvista as pv
 np.set_printoptions(threshold=sys.maxsize)
@@ -28,6 +31,12 @@ METER_ANGSTROM = 10**(-10) #m /A
 EV_TO_J = 1.602*10**(-19)
 FREE_ELECTRON_MASS = 9.11*10**-31 #  kg
 
+def _band_isosurface(kwargs):
+    """Builds the Isosurface of a single band. 
+    Defined at the module level so it can be sent to a process pool. 
+    The band cache is returned as well, a process pool fills a copy of it"""
+    return Isosurface(**kwargs), kwargs["cache"]
+
 class FermiSurface3D(Surface):
 # class FermiSurface3D(pv.PolyData):
     """
@@ -52,6 +61,21 @@ class FermiSurface3D(Surface):
     supercell : list int
         This is used to add padding to the array 
         to assist in the calculation of the isosurface.
+    max_distance : float, optional
+        The maximum distance to keep points from the isosurface centers, by default 0.2
+    isosurface_workers : int, optional
+        The number of workers generating the band isosurfaces concurrently, 
+        by default None, which uses the number of available cpus like 
+        FermiSurface3DConfig. With a single worker the isosurfaces are generated serially
+    isosurface_executor : str, optional
+        The pool of workers, 'thread' or 'process', by default 'thread'.
+        The threads overlap the FFT interpolation, which releases the GIL, 
+        the processes also overlap the marching cubes
+    cache : dict, optional
+        A dict shared by the FermiSurface3D of the same ebs at different 
+        fermi energies, by default None. The brillouin zone, the kmesh mapping, 
+        the band grids and the extended kpoints do not depend on the fermi energy, 
+        they are stored in it the first time and reused afterwards
     """
 
     def __init__(
@@ -63,6 +87,9 @@ class FermiSurface3D(Surface):
         projection_accuracy: str="Normal",
         supercell: List[int]=[1, 1, 1],
         max_distance:float=0.2,
+        isosurface_workers:int=None,
+        isosurface_executor:str="thread",
+        cache:dict=None,
         ):
         LOGGER.info(f'___Initializing the FermiSurface3D object___')
 
@@ -83,6 +110,9 @@ class FermiSurface3D(Surface):
         self.interpolation_factor = interpolation_factor
         self.projection_accuracy = projection_accuracy
         self.max_distance=max_distance
+        self.isosurface_workers=isosurface_workers
+        self.isosurface_executor=isosurface_executor
+        self._extended_kpoints=None
 
         LOGGER.info(f'Iso-value used to find isosurfaces: {self.fermi}')
         LOGGER.info(f'Interpolation factor: {self.interpolation_factor}')
@@ -92,8 +122,18 @@ class FermiSurface3D(Surface):
 
         # Preocessing steps
         self._input_checks()
-        self.brillouin_zone = self._get_brillouin_zone(self.supercell)
-        self.isosurfaces = self._generate_isosurfaces()
+        if cache is not None and "brillouin_zone" in cache:
+            self.brillouin_zone = cache["brillouin_zone"]
+        else:
+            self.brillouin_zone = self._get_brillouin_zone(self.supercell)
+        self.isosurfaces = self._generate_isosurfaces(cache)
+        if cache is not None:
+            # The cache itself is not kept with the surface,
+            # it would be deep copied with it in extend_surface
+            cache["brillouin_zone"] = self.brillouin_zone
+            if "extended_kpoints" not in cache:
+                cache["extended_kpoints"] = self._get_extended_kpoints()
+            self._extended_kpoints = cache["extended_kpoints"]
         self.surface = self._combine_isosurfaces()
 
         # Initialize the Fermi Surface
@@ -110,12 +150,46 @@ class FermiSurface3D(Surface):
     def _input_checks(self):
         assert len(self.ebs.bands.shape)==2
 
-    def _generate_isosurfaces(self):
+    def _get_n_workers(self, n_tasks:int):
+        """Returns the number of workers used to generate the isosurfaces
+
+        Parameters
+        ----------
+        n_tasks : int
+            The number of isosurfaces to generate
+
+        Returns
+        -------
+        int
+            The number of workers, 1 means serial
+        """
+        n_workers = self.isosurface_workers
+        if n_workers is None:
+            if hasattr(os, "sched_getaffinity"):
+                n_workers = len(os.sched_getaffinity(0))
+            else:
+                n_workers = os.cpu_count() or 1
+        return max(min(n_workers, n_tasks), 1)
+
+    def _generate_isosurfaces(self, cache:dict=None):
         LOGGER.info(f'____Generating isosurfaces for each band___')
         isosurfaces=[]
         self.band_isosurface_index_map={}
+        band_caches = None
+        if cache is not None:
+            band_caches = cache.setdefault("bands", {})
+
+        # All the bands are on the same kmesh, they share its mapping to the regular grid
+        if cache is not None and "mapping" in cache:
+            mapping = cache["mapping"]
+        else:
+            mapping = map2matrix_mapping(self.ebs.kpoints)
+        if cache is not None:
+            cache["mapping"] = mapping
+
+        band_kwargs = []
         for iband in range(self.ebs.bands.shape[1]):
-            isosurface_band = Isosurface(
+            band_kwargs.append(dict(
                                 XYZ=self.ebs.kpoints,
                                 V=self.ebs.bands[:,iband],
                                 isovalue=self.fermi,
@@ -124,7 +198,27 @@ class FermiSurface3D(Surface):
                                 padding=self.supercell,
                                 transform_matrix=self.ebs.reciprocal_lattice,
                                 boundaries=self.brillouin_zone,
-                            )
+                                mapping=mapping,
+                                cache=None if band_caches is None else band_caches.setdefault(iband, {}),
+                            ))
+
+        n_workers = self._get_n_workers(len(band_kwargs))
+        LOGGER.info(f'Number of workers generating the isosurfaces: {n_workers}')
+        if n_workers == 1:
+            band_isosurfaces = map(_band_isosurface, band_kwargs)
+        else:
+            if self.isosurface_executor == "process":
+                executor_class = ProcessPoolExecutor
+            else:
+                executor_class = ThreadPoolExecutor
+            # map returns the isosurfaces in the band order
+            with executor_class(max_workers=n_workers) as executor:
+                band_isosurfaces = list(executor.map(_band_isosurface, band_kwargs))
+
+        for iband, (isosurface_band, band_cache) in enumerate(band_isosurfaces):
+            if band_caches is not None:
+                band_caches[iband] = band_cache
+
             # Check to see if the generated isosurface has points
             if isosurface_band.points.shape[0] == 0:
                 continue
@@ -197,6 +291,35 @@ class FermiSurface3D(Surface):
 
         return BrillouinZone(self.ebs.reciprocal_lattice, supercell)
 
+    def _get_extended_kpoints(self):
+        """
+        Returns the kpoints repeated in the supercell directions, in cartesian coordinates. 
+        They are the same for every band, so they are computed once
+
+        Returns
+        -------
+        Tuple[np.ndarray, int]
+            The extended kpoints and the number of copies of the kpoints
+        """
+        if self._extended_kpoints is not None:
+            return self._extended_kpoints
+
+        XYZ_extended = [self.ebs.kpoints]
+        for ix in range(3):
+            for iy in range(self.supercell[ix]):
+                temp = self.ebs.kpoints.copy()
+                temp[:, ix] += 1 * (iy + 1)
+                XYZ_extended.append(temp)
+                temp = self.ebs.kpoints.copy()
+                temp[:, ix] -= 1 * (iy + 1)
+                XYZ_extended.append(temp)
+        n_copies = len(XYZ_extended)
+        XYZ_extended = np.concatenate(XYZ_extended, axis=0)
+
+        XYZ_transformed = np.dot(XYZ_extended, self.ebs.reciprocal_lattice)
+        self._extended_kpoints = (XYZ_transformed, n_copies)
+        return self._extended_kpoints
+
     def _create_vector_texture(self,
                             vectors_array: np.ndarray, 
                             vectors_name: str="vector" ):
@@ -215,41 +338,14 @@ class FermiSurface3D(Surface):
         final_vectors_X = []
         final_vectors_Y = []
         final_vectors_Z = []
+        XYZ_extended, n_copies = self._get_extended_kpoints()
         for iband, isosurface in enumerate(self.isosurfaces):
-            XYZ_extended = self.ebs.kpoints.copy()
-            
-            vectors_extended_X = vectors_array[:,iband,0].copy()
-            vectors_extended_Y = vectors_array[:,iband,1].copy()
-            vectors_extended_Z = vectors_array[:,iband,2].copy()
-    
-            for ix in range(3):
-                for iy in range(self.supercell[ix]):
-                    temp = self.ebs.kpoints.copy()
-                    temp[:, ix] += 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, vectors_array[:,iband,0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, vectors_array[:,iband,1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, vectors_array[:,iband,2], axis=0
-                    )
-                    temp = self.ebs.kpoints.copy()
-                    temp[:, ix] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    vectors_extended_X = np.append(
-                        vectors_extended_X, vectors_array[:,iband,0], axis=0
-                    )
-                    vectors_extended_Y = np.append(
-                        vectors_extended_Y, vectors_array[:,iband,1], axis=0
-                    )
-                    vectors_extended_Z = np.append(
-                        vectors_extended_Z, vectors_array[:,iband,2], axis=0
-                    )
-    
-            XYZ_transformed = np.dot(XYZ_extended, self.ebs.reciprocal_lattice)
+            # The values are repeated in the same order as the extended kpoints
+            vectors_extended_X = np.tile(vectors_array[:,iband,0], n_copies)
+            vectors_extended_Y = np.tile(vectors_array[:,iband,1], n_copies)
+            vectors_extended_Z = np.tile(vectors_array[:,iband,2], n_copies)
+
+            XYZ_transformed = XYZ_extended
 
             near_isosurface_point=self._keep_points_near_subset(XYZ_transformed,isosurface.points,max_distance=self.max_distance)
             XYZ_transformed=XYZ_transformed[near_isosurface_point]
@@ -364,8 +460,9 @@ class FermiSurface3D(Surface):
         # Create a KDTree for efficient nearest neighbor search
         tree = KDTree(subset)
 
-        # Find the distance to the    
-        distances, _ = tree.query(points, k=3)
+        # Find the distance to the 3 nearest neighbors. Neighbors beyond max_distance 
+        # are not needed for the mask, bounding the search avoids walking the tree for the far points
+        distances, _ = tree.query(points, k=3, distance_upper_bound=max_distance)
 
         # Create a boolean mask for points within the max_distance
         mask = np.ones(distances.shape[0], dtype=bool)
@@ -396,22 +493,12 @@ class FermiSurface3D(Surface):
         LOGGER.info(f"____Starting Projecting atomic projections___")
 
         final_scalars = []
+        XYZ_extended, n_copies = self._get_extended_kpoints()
         for iband, isosurface in enumerate(self.isosurfaces):
-            XYZ_extended = self.ebs.kpoints.copy()
-            scalars_extended =  scalars_array[:,iband].copy()
-            for ix in range(3):
-                for iy in range(self.supercell[ix]):
-                
-                    temp = self.ebs.kpoints.copy()
-                    temp[:, ix] += 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    scalars_extended = np.append(scalars_extended,  scalars_array[:,iband], axis=0)
-                    temp = self.ebs.kpoints.copy()
-                    temp[:, ix] -= 1 * (iy + 1)
-                    XYZ_extended = np.append(XYZ_extended, temp, axis=0)
-                    scalars_extended = np.append(scalars_extended,  scalars_array[:,iband], axis=0)
-
-            XYZ_transformed = np.dot(XYZ_extended, self.ebs.reciprocal_lattice)
+            # The values are repeated in the same order as the extended kpoints
+            scalars_extended = np.tile(scalars_array[:,iband], n_copies)
+
+            XYZ_transformed = XYZ_extended
             LOGGER.debug(f"Number of points before projecting inside the Brillouin zone: {len(XYZ_transformed)}")
        
 
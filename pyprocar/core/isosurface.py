@@ -3,7 +3,7 @@ __maintainer__ = "Pedram Tavadze and Logan Lang"
 __email__ = "petavazohi@mail.wvu.edu, lllang@mix.wvu.edu"
 __date__ = "March 31, 2020"
 
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 
@@ -13,6 +13,7 @@ import pyvista as pv
 from .surface import Surface
 
 from pyprocar.utils import LOGGER
+from pyprocar.utils import mathematics
 
 class Isosurface(Surface):
     """
@@ -66,6 +67,15 @@ class Isosurface(Surface):
     boundaries : pyprocar.core.surface
         The default is None. The boundaries in which the isosurface will be clipped with
         for example the first brillouin zone
+    mapping : Tuple
+        The default is None. The mapping of XYZ to the regular grid 
+        returned by map2matrix_mapping. It can be shared by the isosurfaces 
+        of the same XYZ, if None it is computed
+    cache : dict
+        The default is None. A dict shared by the isosurfaces of the same V at 
+        different isovalues. The grids that do not depend on the isovalue 
+        (V_matrix, the padded and the interpolated matrices) are stored in it 
+        the first time and reused afterwards.
 
     """
 
@@ -80,6 +90,8 @@ class Isosurface(Surface):
             padding:List[int]=None,
             transform_matrix:np.ndarray=None,
             boundaries=None,
+            mapping:Tuple=None,
+            cache:dict=None,
         ):
         LOGGER.info(f'____ Initializing Isosurface ____')
 
@@ -94,15 +106,23 @@ class Isosurface(Surface):
         self.transform_matrix = transform_matrix
         self.boundaries = boundaries
         self.algorithm = self._get_algorithm(self.algorithm)
+        self.cache = cache
 
         if self.V_matrix is None:
-            self.V_matrix = map2matrix(self.XYZ, self.V)
+            if self.cache is not None and "V_matrix" in self.cache:
+                self.V_matrix = self.cache["V_matrix"]
+            else:
+                self.V_matrix = map2matrix(self.XYZ, self.V, mapping=mapping)
+            if self.cache is not None:
+                self.cache["V_matrix"] = self.V_matrix
 
         self.padding = self._get_padding(self.nX,self.nY,self.nZ)
 
         verts, faces, normals, values = self._get_isosurface(interpolation_factor)
         verts,faces = self._process_isosurface(verts,faces)
- 
+
+        # The cached grids are not kept with the surface
+        self.cache = None
         super().__init__(verts=verts, faces=faces)
 
         return None
@@ -216,15 +236,7 @@ class Isosurface(Surface):
 
         """
 
-        padding_x = self.padding[0]
-        padding_y = self.padding[1]
-        padding_z = self.padding[2]
-
-        eigen_matrix = np.pad(
-            self.V_matrix,
-            ((padding_x, padding_x), (padding_y, padding_y), (padding_z, padding_z)),
-            "wrap",
-        )
+        eigen_matrix = self._get_padded_matrix()
         try:
             verts, faces, normals, values = measure.marching_cubes(
                 eigen_matrix, self.isovalue
@@ -371,6 +383,57 @@ class Isosurface(Surface):
 
         return verts,faces
 
+    def _get_padded_matrix(self):
+        """
+        The helper method pads V_matrix periodically with the amount of kpoints 
+        needed to fully sample the 1st BZ. The result is stored in the cache if there is one
+
+        Returns
+        -------
+        np.ndarray
+            The padded V_matrix
+        """
+        key = ("padded_matrix", tuple(self.padding))
+        if self.cache is not None and key in self.cache:
+            return self.cache[key]
+
+        padding_x = self.padding[0]
+        padding_y = self.padding[1]
+        padding_z = self.padding[2]
+
+        eigen_matrix = np.pad(
+            self.V_matrix,
+            ((padding_x, padding_x), (padding_y, padding_y), (padding_z, padding_z)),
+            "wrap",
+        )
+        if self.cache is not None:
+            self.cache[key] = eigen_matrix
+        return eigen_matrix
+
+    def _get_interpolated_matrix(self, interp_factor:float):
+        """
+        The helper method Fourier interpolates the padded V_matrix. 
+        The result is stored in the cache if there is one
+
+        Parameters
+        ----------
+        interp_factor : float
+            Interpolation factor
+
+        Returns
+        -------
+        np.ndarray
+            The interpolated padded V_matrix
+        """
+        key = ("interpolated_matrix", tuple(self.padding), interp_factor)
+        if self.cache is not None and key in self.cache:
+            return self.cache[key]
+
+        eigen_matrix = fft_interpolate(self._get_padded_matrix(), interp_factor)
+        if self.cache is not None:
+            self.cache[key] = eigen_matrix
+        return eigen_matrix
+
     def _get_isosurface(self, interp_factor:float=1):
         """
         The helper method will try to find the iso surface by using the marching cubes algorithm
@@ -393,24 +456,14 @@ class Isosurface(Surface):
 
         """
 
-        # Amount of kpoints needed to add on to fully sample 1st BZ
-
-        padding_x = self.padding[0]
-        padding_y = self.padding[1]
-        padding_z = self.padding[2]
-
-        eigen_matrix = np.pad(
-            self.V_matrix,
-            ((padding_x, padding_x), (padding_y, padding_y), (padding_z, padding_z)),
-            "wrap",
-        )
+        eigen_matrix = self._get_padded_matrix()
 
         bnd = self.surface_boundaries
 
         if interp_factor != 1:
             # Fourier interpolate the mapped function E(x,y,z)
 
-            eigen_matrix = fft_interpolate(eigen_matrix, interp_factor)
+            eigen_matrix = self._get_interpolated_matrix(interp_factor)
 
             # after the FFT we loose the center of the BZ, using numpy roll we
             # bring back the center of the BZ
@@ -442,55 +495,66 @@ class Isosurface(Surface):
 
 
     
-def map2matrix(XYZ, V):
+def map2matrix_mapping(XYZ):
     """
-    Maps an Irregular grid to a regular grid
+    Computes the mapping of an irregular grid to a regular grid. 
+    It only depends on the points, so it can be shared by all the values 
+    defined on the same points, for example all the bands of a kmesh
 
     Parameters
     ----------
     XYZ : np.ndarray
         The points of the irregular grid.
-    V : np.ndarray
-        The values of the irregular grid.
 
     Returns
     -------
-    mapped_func : np.ndarray
-        The points of the regular grid.
+    Tuple[np.ndarray, np.ndarray, Tuple[int,int,int]]
+        The flat indices of the regular grid cells that have a point, 
+        the index of the point of each of these cells and the shape of the regular grid.
+        If several points fall in the same cell, the first one is used
 
     """
-    XYZ = XYZ
-    V = V
-
-    X = np.unique(XYZ[:, 0])
-    Y = np.unique(XYZ[:, 1])
-    Z = np.unique(XYZ[:, 2])
-
-    mapped_func = np.zeros(shape=(len(X), len(Y), len(Z)))
-    # kpoint_matrix = np.zeros(shape=(len(kx), len(ky), len(kz), 3)) This was added to check if the mesh grid is working
-
-    count = 0
-    for ix in range(len(X)):
-        condition1 = XYZ[:, 0] == X[ix]
-        count += 1
+    grid_indices = []
+    shape = []
+    for i_coord in range(3):
+        unique_coords, inverse = np.unique(XYZ[:, i_coord], return_inverse=True)
+        grid_indices.append(inverse.reshape(-1))
+        shape.append(len(unique_coords))
+    shape = tuple(shape)
+
+    flat_indices = np.ravel_multi_index(grid_indices, shape)
+    cell_indices, point_indices = np.unique(flat_indices, return_index=True)
+    return cell_indices, point_indices, shape
+
+def map2matrix(XYZ, V, mapping=None):
+    """
+    Maps an Irregular grid to a regular grid
 
-        for iy in range(len(Y)):
-            condition2 = XYZ[:, 1] == Y[iy]
+    Parameters
+    ----------
+    XYZ : np.ndarray
+        The points of the irregular grid.
+    V : np.ndarray
+        The values of the irregular grid. Extra dimensions after the first one 
+        are kept, for example (n_points, n_bands) gives (nx, ny, nz, n_bands)
+    mapping : Tuple, optional
+        The mapping returned by map2matrix_mapping for XYZ, by default None. 
+        If None, it is computed
 
-            # print(count)
-            for iz in range(len(Z)):
+    Returns
+    -------
+    mapped_func : np.ndarray
+        The points of the regular grid. The cells without a point are nan
 
-                condition3 = XYZ[:, 2] == Z[iz]
-                tot_cond = np.all([condition1, condition2, condition3], axis=0)
-                if len(V[tot_cond]) != 0:
+    """
+    if mapping is None:
+        mapping = map2matrix_mapping(XYZ)
+    cell_indices, point_indices, shape = mapping
 
-                    mapped_func[ix, iy, iz] = V[tot_cond][0]
-                    # kpoint_matrix[ikx, iky, ikz] = [
-                    #     kx[ikx], ky[iky], kz[ikz]]
-                else:
-                    mapped_func[ix, iy, iz] = np.nan
-                    # kpoint_matrix[ikx, iky, ikz] = [np.nan, np.nan, np.nan]
-    return mapped_func
+    V = np.asarray(V)
+    mapped_func = np.full((np.prod(shape),) + V.shape[1:], np.nan)
+    mapped_func[cell_indices] = V[point_indices]
+    return mapped_func.reshape(shape + V.shape[1:])
 
 def fft_interpolate(function, interpolation_factor=2):
     """
@@ -513,20 +577,5 @@ def fft_interpolate(function, interpolation_factor=2):
         The interpolated points
     """
 
-    eigen_fft = np.fft.fftn(function)
-    shifted_fft = np.fft.fftshift(eigen_fft)
-    nx, ny, nz = np.array(shifted_fft.shape)
-    pad_x = nx * (interpolation_factor - 1) // 2
-    pad_y = ny * (interpolation_factor - 1) // 2
-    pad_z = nz * (interpolation_factor - 1) // 2
-    new_matrix = np.pad(
-        shifted_fft,
-        ((pad_x, pad_x), (pad_y, pad_y), (pad_z, pad_z)),
-        "constant",
-        constant_values=0,
-    )
-
-    new_matrix = np.fft.ifftshift(new_matrix)
-    interpolated = np.real(np.fft.ifftn(new_matrix)) * (interpolation_factor ** 3)
-
-    return interpolated
+    # real to complex transforms, the threads are set by CONFIG['fft_workers']
+    return mathematics.fft_interpolate_batch(function, interpolation_factor=interpolation_factor, axes=(0, 1, 2))
@@ -10,4 +10,5 @@ from . import dftbplus
 from .procarparser import ProcarParser
 
 from .parser import Parser
+from .cache import ParserCache
 
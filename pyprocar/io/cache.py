@@ -0,0 +1,587 @@
+"""This module defines an on-disk cache for the objects built by
+:class:`pyprocar.io.Parser`, so a calculation that is plotted many times
+is only parsed once.
+"""
+
+import os
+import glob
+import json
+import shutil
+import hashlib
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+from ..core import ElectronicBandStructure, DensityOfStates, Structure, KPath
+from ..version import version
+from ..utils.config import CONFIG
+
+# Increase when the layout of a cache entry changes
+CACHE_FORMAT = 3
+
+# The objects stored in an entry
+CACHED_ARTIFACTS = ("ebs", "dos", "structure", "kpath")
+
+# The files each code reads, relative to the calculation directory
+SOURCE_FILES = {
+    "vasp": ["OUTCAR", "POSCAR", "KPOINTS", "PROCAR", "PROCAR.gz", "vasprun.xml", "DOSCAR"],
+    "qe": ["*.in", "*.out", "*.xml", "*.pdos*", "**/atomic_proj.xml", "**/data-file-schema.xml"],
+    "abinit": ["abinit.out", "KPOINTS", "*PROCAR*", "abinito_DOS*"],
+    "elk": ["elk.in", "*.OUT"],
+    "siesta": ["*.fdf", "*.bands", "*STRUCT_OUT"],
+    "lobster": ["lobsterin", "lobsterout", "DOSCAR.lobster", "FATBAND*.lobster",
+                "*.in", "OUTCAR", "POSCAR", "KPOINTS", "PROCAR", "vasprun.xml"],
+    "dftb+": ["eigenvec.out", "band.out", "detailed.out", "detailed.xml", "KPOINTS"],
+}
+
+# The CONFIG keys that change the objects parsed for each code, 
+# the entries of different values are stored separately
+PARSE_OPTIONS = {
+    "vasp": ["vasp_dos_source"],
+}
+
+# Number of bytes hashed at the start and at the end of each source file
+# when the files are not hashed in full
+HASH_SAMPLE_SIZE = 2**20
+
+# Number of bytes read at once when a file is hashed in full
+HASH_CHUNK_SIZE = 2**24
+
+# File of the cache directory recording the source files known not to need repairing
+CLEAN_MARKERS_FILE = "clean_files.json"
+
+
+def get_cache_dir(cache_dir:str=None) -> str:
+    """Returns the directory of the on-disk cache
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        The directory of the cache, by default CONFIG['parser_cache_dir'] 
+        or ~/.cache/pyprocar
+
+    Returns
+    -------
+    str
+        The directory of the cache
+    """
+    if cache_dir is None:
+        cache_dir = CONFIG.get("parser_cache_dir", None)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "pyprocar")
+    return cache_dir
+
+def file_fingerprint(filename:str, full_hash:bool=None) -> Dict:
+    """Computes the fingerprint of a file
+
+    Parameters
+    ----------
+    filename : str
+        The file
+    full_hash : bool, optional
+        Boolean to hash the whole file. Otherwise only the first and last 
+        HASH_SAMPLE_SIZE bytes are hashed, so an edit in the middle of a file 
+        that keeps its size and modification time goes unnoticed. 
+        By default CONFIG['parser_cache_full_hash']
+
+    Returns
+    -------
+    Dict
+        The path, size, modification time and the hash of the file
+    """
+    if full_hash is None:
+        full_hash = CONFIG.get("parser_cache_full_hash", True)
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as rf:
+        if full_hash:
+            for chunk in iter(lambda: rf.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        else:
+            digest.update(rf.read(HASH_SAMPLE_SIZE))
+            if stat.st_size > 2 * HASH_SAMPLE_SIZE:
+                rf.seek(-HASH_SAMPLE_SIZE, os.SEEK_END)
+                digest.update(rf.read(HASH_SAMPLE_SIZE))
+    return {
+        "path": filename,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": digest.hexdigest(),
+    }
+
+def _load_clean_markers(cache_dir:str) -> Dict:
+    try:
+        with open(os.path.join(cache_dir, CLEAN_MARKERS_FILE), "r") as rf:
+            return json.load(rf)
+    except (OSError, ValueError):
+        return {}
+
+def is_marked_clean(filename:str, cache_dir:str=None) -> bool:
+    """Boolean to determine if a file was marked as not needing repairs 
+    and did not change since
+
+    Parameters
+    ----------
+    filename : str
+        The file
+    cache_dir : str, optional
+        The directory of the cache, by default None
+
+    Returns
+    -------
+    bool
+        Boolean to determine if the file is known to be clean
+    """
+    markers = _load_clean_markers(get_cache_dir(cache_dir))
+    marker = markers.get(os.path.abspath(filename))
+    if marker is None:
+        return False
+    try:
+        return marker == file_fingerprint(filename)
+    except OSError:
+        return False
+
+def mark_clean(filename:str, cache_dir:str=None):
+    """Records that a file does not need repairs, until its fingerprint changes. 
+    Nothing is recorded if the cache directory is not writable
+
+    Parameters
+    ----------
+    filename : str
+        The file
+    cache_dir : str, optional
+        The directory of the cache, by default None
+    """
+    cache_dir = get_cache_dir(cache_dir)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        markers = _load_clean_markers(cache_dir)
+        # markers of files that no longer exist are dropped
+        markers = {path: marker for path, marker in markers.items() if os.path.isfile(path)}
+        markers[os.path.abspath(filename)] = file_fingerprint(filename)
+
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, prefix=".tmp-")
+        with os.fdopen(fd, "w") as wf:
+            json.dump(markers, wf)
+        os.replace(tmp_file, os.path.join(cache_dir, CLEAN_MARKERS_FILE))
+    except OSError:
+        pass
+    return None
+
+
+class ParserCache:
+    """
+    An on-disk cache of the ElectronicBandStructure, DensityOfStates, Structure and
+    KPath objects parsed from a calculation directory.
+
+    Each entry is a directory holding one .npy file per array, which are memory
+    mapped when loaded, and a metadata.json file with the scalars and the
+    fingerprints (path, size, modification time and content hash) of the 
+    source files. An entry is discarded as soon as one of the
+    source files changes, and the least recently used entries are evicted when
+    the cache directory grows beyond ``max_size``. The values of the PARSE_OPTIONS 
+    of the code are part of the key of the entry.
+
+    Parameters
+    ----------
+    code : str
+        The code of the calculation, as passed to pyprocar.io.Parser
+    dirname : str
+        The directory of the calculation
+    cache_dir : str, optional
+        The directory where the entries are stored, by default CONFIG['parser_cache_dir']
+        or ~/.cache/pyprocar
+    max_size : float, optional
+        The maximum size of the cache directory in MB, by default CONFIG['parser_cache_max_size']
+    full_hash : bool, optional
+        Boolean to hash the whole source files instead of their first and last 
+        HASH_SAMPLE_SIZE bytes, by default CONFIG['parser_cache_full_hash']
+    """
+
+    def __init__(self, code:str, dirname:str, cache_dir:str=None, max_size:float=None, full_hash:bool=None):
+        self.code = code
+        self.dirname = os.path.abspath(dirname)
+        cache_dir = get_cache_dir(cache_dir)
+        if max_size is None:
+            max_size = CONFIG.get("parser_cache_max_size", 10240)
+        if full_hash is None:
+            full_hash = CONFIG.get("parser_cache_full_hash", True)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.full_hash = full_hash
+        self.options = {name: CONFIG.get(name, None) for name in PARSE_OPTIONS.get(self.code.split("_")[0], [])}
+
+        options = json.dumps(self.options, sort_keys=True)
+        key = hashlib.sha1(f"{self.code}{os.sep}{self.dirname}{os.sep}{options}".encode()).hexdigest()
+        self.entry_dir = os.path.join(self.cache_dir, key)
+
+    @property
+    def is_supported(self):
+        """Boolean to determine if the source files of this code are known
+
+        Returns
+        -------
+        bool
+            Boolean to determine if the source files of this code are known
+        """
+        return self.code.split("_")[0] in SOURCE_FILES
+
+    def source_files(self) -> List[str]:
+        """Finds the source files of the calculation
+
+        Returns
+        -------
+        List[str]
+            The sorted list of the source files that exist in the directory
+        """
+        filenames = set()
+        for pattern in SOURCE_FILES[self.code.split("_")[0]]:
+            for filename in glob.glob(os.path.join(self.dirname, pattern), recursive=True):
+                if os.path.isfile(filename):
+                    filenames.add(os.path.abspath(filename))
+        return sorted(filenames)
+
+    def fingerprint(self) -> List[Dict]:
+        """Computes the fingerprints of the source files
+
+        Returns
+        -------
+        List[Dict]
+            The path, size, modification time and content hash of each source file
+        """
+        return [file_fingerprint(filename, full_hash=self.full_hash) for filename in self.source_files()]
+
+    def _load_metadata(self, fingerprints:List[Dict]=None) -> Dict:
+        """Loads the metadata of the entry if it is still valid, 
+        an outdated entry is removed
+
+        Parameters
+        ----------
+        fingerprints : List[Dict], optional
+            The current fingerprints of the source files, by default None
+
+        Returns
+        -------
+        Dict
+            The metadata, or None if there is no valid entry
+        """
+        metadata_file = os.path.join(self.entry_dir, "metadata.json")
+        if not self.is_supported or not os.path.isfile(metadata_file):
+            return None
+        try:
+            with open(metadata_file, "r") as rf:
+                metadata = json.load(rf)
+        except (OSError, ValueError):
+            return None
+
+        if fingerprints is None:
+            fingerprints = self.fingerprint()
+        if (
+            metadata.get("format") != CACHE_FORMAT
+            or metadata.get("version") != version
+            or metadata.get("options") != self.options
+            or metadata.get("fingerprints") != fingerprints
+            ):
+            shutil.rmtree(self.entry_dir, ignore_errors=True)
+            return None
+        return metadata
+
+    def load(self) -> Dict:
+        """Loads the cached objects if the entry is still valid
+
+        Returns
+        -------
+        Dict
+            The objects stored in the entry among ebs, dos, structure and kpath,
+            or None if there is no valid entry
+        """
+        metadata = self._load_metadata()
+        if metadata is None:
+            return None
+
+        try:
+            objects = self._from_arrays(metadata)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(self.entry_dir, ignore_errors=True)
+            return None
+
+        # the modification time of the metadata is the last access for the LRU eviction
+        os.utime(os.path.join(self.entry_dir, "metadata.json"))
+        return {name: objects[name] for name in metadata["artifacts"]}
+
+    def save(self,
+            ebs:ElectronicBandStructure=None,
+            dos:DensityOfStates=None,
+            structure:Structure=None,
+            kpath:KPath=None,
+            artifacts:List[str]=None):
+        """Stores the objects in the cache and evicts old entries if needed
+
+        Parameters
+        ----------
+        ebs : ElectronicBandStructure, optional
+            The electronic band structure, by default None
+        dos : DensityOfStates, optional
+            The density of states, by default None
+        structure : Structure, optional
+            The structure, by default None
+        kpath : KPath, optional
+            The kpath, by default None
+        artifacts : List[str], optional
+            The names of the objects being stored, by default None which stores all of them. 
+            The other objects of a valid entry are kept
+        """
+        if not self.is_supported:
+            return None
+        if artifacts is None:
+            artifacts = CACHED_ARTIFACTS
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # the source files are fingerprinted before anything else can modify them
+        fingerprints = self.fingerprint()
+        metadata = {
+            "format": CACHE_FORMAT,
+            "version": version,
+            "code": self.code,
+            "dirname": self.dirname,
+            "options": self.options,
+            "fingerprints": fingerprints,
+        }
+        previous_metadata = self._load_metadata(fingerprints)
+
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            arrays = {}
+            to_arrays = {
+                "ebs": (self._ebs_to_arrays, ebs),
+                "dos": (self._dos_to_arrays, dos),
+                "structure": (self._structure_to_arrays, structure),
+                "kpath": (self._kpath_to_arrays, kpath),
+            }
+            stored = []
+            for name in CACHED_ARTIFACTS:
+                metadata[name] = None
+                if name in artifacts:
+                    function, value = to_arrays[name]
+                    metadata[name] = function(value, arrays)
+                    stored.append(name)
+                elif previous_metadata is not None and name in previous_metadata["artifacts"]:
+                    # the arrays of the objects that are kept are linked into the new entry
+                    metadata[name] = previous_metadata[name]
+                    for filename in glob.glob(os.path.join(self.entry_dir, f"{name}.*.npy")):
+                        self._link(filename, os.path.join(tmp_dir, os.path.basename(filename)))
+                    stored.append(name)
+            metadata["artifacts"] = stored
+
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), array, allow_pickle=False)
+            with open(os.path.join(tmp_dir, "metadata.json"), "w") as wf:
+                json.dump(metadata, wf)
+
+            self._replace_entry(tmp_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.evict()
+        return None
+
+    def evict(self):
+        """Removes the least recently used entries until
+        the cache directory is smaller than max_size
+        """
+        if not os.path.isdir(self.cache_dir):
+            return None
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            metadata_file = os.path.join(entry_dir, "metadata.json")
+            if not os.path.isfile(metadata_file):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            entries.append((os.stat(metadata_file).st_mtime, size, entry_dir))
+
+        total_size = sum(entry[1] for entry in entries)
+        max_size = self.max_size * 1024**2
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= max_size:
+                break
+            # the entry that was just written is never evicted
+            if entry_dir == self.entry_dir:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+        return None
+
+    def _replace_entry(self, tmp_dir):
+        """Replaces the entry by the files of tmp_dir
+
+        Parameters
+        ----------
+        tmp_dir : str
+            The directory of the new entry, it is moved or removed
+        """
+        shutil.rmtree(self.entry_dir, ignore_errors=True)
+        if not os.path.exists(self.entry_dir):
+            os.replace(tmp_dir, self.entry_dir)
+            return None
+
+        # Files that are still open cannot be removed on Windows, e.g. the arrays 
+        # memory-mapped by the objects of a previous load, so the new files are 
+        # copied over the old entry instead. The metadata is copied last so the 
+        # entry is not valid until all the arrays are in place
+        metadata_file = os.path.join(self.entry_dir, "metadata.json")
+        try:
+            if os.path.exists(metadata_file):
+                os.remove(metadata_file)
+            filenames = sorted(os.listdir(tmp_dir), key=lambda x: x == "metadata.json")
+            for filename in filenames:
+                src = os.path.join(tmp_dir, filename)
+                dst = os.path.join(self.entry_dir, filename)
+                # the arrays that were linked from the old entry are already in place
+                if os.path.exists(dst) and os.path.samefile(src, dst):
+                    continue
+                shutil.copyfile(src, dst)
+        except OSError:
+            # an array that is still open is not overwritten, the entry is left 
+            # without metadata so it is rewritten by the next save
+            pass
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+
+    @staticmethod
+    def _link(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def clear(self):
+        """Removes the entry of this calculation"""
+        shutil.rmtree(self.entry_dir, ignore_errors=True)
+        return None
+
+    def _load_array(self, name):
+        # copy-on-write so the parser can still shift the energies in place
+        return np.load(os.path.join(self.entry_dir, f"{name}.npy"), mmap_mode="c")
+
+    def _from_arrays(self, metadata):
+        kpath = None
+        if metadata["kpath"] is not None:
+            kpath = KPath(
+                knames=metadata["kpath"]["knames"],
+                kticks=metadata["kpath"]["kticks"],
+                special_kpoints=np.array(self._load_array("kpath.special_kpoints")),
+                ngrids=metadata["kpath"]["ngrids"],
+                has_time_reversal=metadata["kpath"]["has_time_reversal"],
+            )
+
+        structure = None
+        if metadata["structure"] is not None:
+            rotations = None
+            if metadata["structure"]["has_rotations"]:
+                rotations = np.array(self._load_array("structure.rotations"))
+            structure = Structure(
+                atoms=metadata["structure"]["atoms"],
+                fractional_coordinates=np.array(self._load_array("structure.fractional_coordinates")),
+                lattice=np.array(self._load_array("structure.lattice")),
+                rotations=rotations,
+            )
+
+        dos = None
+        if metadata["dos"] is not None:
+            projected = None
+            if metadata["dos"]["has_projected"]:
+                projected = self._load_array("dos.projected")
+            dos = DensityOfStates(
+                energies=self._load_array("dos.energies"),
+                total=self._load_array("dos.total"),
+                efermi=metadata["dos"]["efermi"],
+                projected=projected,
+            )
+
+        ebs = None
+        if metadata["ebs"] is not None:
+            arrays = {}
+            for name in ["projected", "projected_phase", "weights", "reciprocal_lattice"]:
+                arrays[name] = None
+                if name in metadata["ebs"]["arrays"]:
+                    arrays[name] = self._load_array(f"ebs.{name}")
+            # the bands are stored already shifted, so they are
+            # passed with a zero fermi energy which is set afterwards
+            ebs = ElectronicBandStructure(
+                kpoints=self._load_array("ebs.kpoints"),
+                bands=self._load_array("ebs.bands"),
+                efermi=0.0,
+                n_kx=metadata["ebs"]["n_kx"],
+                n_ky=metadata["ebs"]["n_ky"],
+                n_kz=metadata["ebs"]["n_kz"],
+                projected=arrays["projected"],
+                projected_phase=arrays["projected_phase"],
+                weights=arrays["weights"],
+                kpath=kpath,
+                labels=metadata["ebs"]["labels"],
+                reciprocal_lattice=arrays["reciprocal_lattice"],
+            )
+            ebs.efermi = metadata["ebs"]["efermi"]
+
+        return {"ebs": ebs, "dos": dos, "structure": structure, "kpath": kpath}
+
+    @staticmethod
+    def _ebs_to_arrays(ebs, arrays):
+        if ebs is None:
+            return None
+        names = []
+        for name in ["kpoints", "bands", "projected", "projected_phase", "weights", "reciprocal_lattice"]:
+            value = getattr(ebs, name)
+            if value is not None:
+                arrays[f"ebs.{name}"] = np.asarray(value)
+                names.append(name)
+        labels = ebs.labels
+        if labels is not None:
+            labels = [str(x) for x in labels]
+        return {
+            "arrays": names,
+            "efermi": float(ebs.efermi),
+            "n_kx": None if ebs.n_kx is None else int(ebs.n_kx),
+            "n_ky": None if ebs.n_ky is None else int(ebs.n_ky),
+            "n_kz": None if ebs.n_kz is None else int(ebs.n_kz),
+            "labels": labels,
+        }
+
+    @staticmethod
+    def _dos_to_arrays(dos, arrays):
+        if dos is None:
+            return None
+        arrays["dos.energies"] = np.asarray(dos.energies)
+        arrays["dos.total"] = np.asarray(dos.total)
+        # DensityOfStates stores a missing projection as an object array of None
+        has_projected = dos.projected is not None and np.asarray(dos.projected).dtype != object
+        if has_projected:
+            arrays["dos.projected"] = np.asarray(dos.projected)
+        return {"efermi": float(dos.efermi), "has_projected": bool(has_projected)}
+
+    @staticmethod
+    def _structure_to_arrays(structure, arrays):
+        if structure is None or structure.fractional_coordinates is None:
+            return None
+        arrays["structure.fractional_coordinates"] = np.asarray(structure.fractional_coordinates, dtype=float)
+        arrays["structure.lattice"] = np.asarray(structure.lattice, dtype=float)
+        has_rotations = structure.rotations is not None
+        if has_rotations:
+            arrays["structure.rotations"] = np.asarray(structure.rotations)
+        return {"atoms": [str(x) for x in structure.atoms], "has_rotations": has_rotations}
+
+    @staticmethod
+    def _kpath_to_arrays(kpath, arrays):
+        if kpath is None:
+            return None
+        arrays["kpath.special_kpoints"] = np.asarray(kpath.special_kpoints, dtype=float)
+        return {
+            "knames": [[str(x[0]), str(x[1])] for x in kpath.knames],
+            "kticks": [int(x) for x in kpath.kticks],
+            "ngrids": [int(x) for x in kpath.ngrids],
+            "has_time_reversal": bool(kpath.has_time_reversal),
+        }
@@ -1,10 +1,86 @@
 #!/usr/bin/env python
 
 import re
+import io
 import numpy as np
 import os
+from collections import OrderedDict
 
 from ..pyposcar.poscar import Poscar
+from ..core import Structure, ElectronicBandStructure
+from .vasp import Kpoints
+from .loader import ConcurrentLoader
+
+
+def read_kpoint_blocks(filename):
+  """Streams eigenvec.out, yielding the lines of one k-point at a time. If
+  there is a single k-point (no `K-point:` labels) the whole file is a
+  single block."""
+  block = []
+  current = None
+  with open(filename, 'r') as f:
+    for line in f:
+      if line.lstrip().startswith('K-point'):
+        ikpoint = line.split()[1]
+        if current is not None and ikpoint != current and len(block) != 0:
+          yield block
+          block = []
+        current = ikpoint
+      block.append(line)
+  if len(block) != 0:
+    yield block
+
+
+def decode_kpoint_block(lines):
+  """Decodes the eigenvectors of a single k-point of eigenvec.out. It is
+  a module function so it can be sent to a process pool.
+
+  Returns the band index, atom index, orbital name and coefficient of
+  each line. The Mulliken populations are ignored.
+  """
+  bands = []
+  atoms = []
+  orbitals = []
+  numbers = []
+  iband = -1
+  iatom = -1
+  is_complex = False
+  for line in lines:
+    if 'Eigenvector' in line:
+      if '(up)' not in line:
+        raise RuntimeError('Spin polarization not supported')
+      iband += 1
+      iatom = -1
+      continue
+    # Coefficients and Mulliken populations of the atomic orbitals
+    if iband < 0:
+      continue
+    # complex data is written as: orbital ( Re Im ) Mulliken
+    if '(' in line:
+      is_complex = True
+      line = line.replace('(', ' ').replace(')', ' ')
+    tokens = line.split()
+    if len(tokens) == 0:
+      continue
+    # the first orbital of an atom carries the atom index and its name
+    if tokens[0].isdigit():
+      iatom += 1
+      tokens = tokens[2:]
+    bands.append(iband)
+    atoms.append(iatom)
+    orbitals.append(tokens[0])
+    numbers.extend(tokens[1:])
+
+  # Re, Im, Mulliken or Re, Mulliken
+  numbers = np.array(numbers, dtype=float)
+  if is_complex:
+    numbers.shape = (len(orbitals), 3)
+    values = numbers[:,0] + 1j*numbers[:,1]
+  else:
+    numbers.shape = (len(orbitals), 2)
+    values = numbers[:,0]
+  return np.array(bands, dtype=int), np.array(atoms, dtype=int), np.array(orbitals, dtype=str), values
+
 
 class DFTB_evec:
   def __init__(self, filename, verbose): # , normalize=False):
@@ -34,17 +110,13 @@ class DFTB_evec:
     self.occupancies = None # (Nkpoints, Nbands), to be set externally.
 
     
-  def load(self):
-    self.f = open(self.filename, 'r')
-    self.f = self.f.read()
-    # The syntax is different whether there are more than one k-point
-    # or just a single k-point.
-    klist = re.findall(r'K-point\s*:\s*\d+', self.f)
-    klist = set(klist) # using `set` to remove repeated elements
-    self.Nkpoints = len(klist)
-    # if no kpoints found, there is only one
-    if self.Nkpoints == 0:
-      self.Nkpoints = 1
+  def load(self, n_workers=None):
+    """Streams the file one k-point at a time, the k-points are decoded
+    by `n_workers` processes (by default CONFIG['parser_workers'])"""
+    with ConcurrentLoader(n_workers=n_workers, use_processes=True) as loader:
+      blocks = list(loader.map(decode_kpoint_block, read_kpoint_blocks(self.filename)))
+
+    self.Nkpoints = len(blocks)
     if self.verbose:
       print('Number of k-points: ', self.Nkpoints)
     if self.Nkpoints == 1:
@@ -54,124 +126,41 @@ class DFTB_evec:
     if self.verbose:
       print('Looking for complex data?', self.is_complex)
 
-    # How many eigenvectors?
-    band_list = re.findall(r'Eigenvector\s*:\s*\d+', self.f)
-    up_list = re.findall(r'Eigenvector\s*:\s*\d+\s*\(up\)', self.f)
-    if len(band_list) != len(up_list):
-      print('Number of bands: ', len(band_list), ' Number of UP bands: ', len(up_list))
-      raise RuntimeError('Spin polarization not supported')
-    up_list = set(up_list)
-    self.Nbands = len(up_list)
+    kpoints = np.concatenate([np.full(len(block[0]), i) for i, block in enumerate(blocks)])
+    bands, atoms, orbitals, values = [np.concatenate(x) for x in zip(*blocks)]
+    self.Nbands = bands.max() + 1
+    self.Natoms = atoms.max() + 1
     if self.verbose:
       print('Number of bands: ', self.Nbands)
-
-    # How many atoms?
-    atoms_list = re.findall('^\s*\d+\s+\w+', self.f, re.MULTILINE)
-    atoms_list = set(atoms_list)
-    self.Natoms = len(atoms_list)
-    if self.verbose:
-      print('Number of atoms: ', len(atoms_list))
-      # print(atoms_list)
-      
-    # How many orbitals?
-    orb_list = re.findall(r'[ ]+([a-zA-Z]+[-_a-zA-z\d]*)[ ]+[.(\d\-]+', self.f)
-    self.Norbs = len(set(orb_list))
-    print('Orbitals found:', set(orb_list))
-    if self.verbose:
-      print('Number of orbitals: ', self.Norbs)
-
-    # also, we are going to create a Dict of the unique orbitals,
-    # assigning them an index to store them into the arrays.
-    # We are faking an orderedSet by using an orderedDict
-    from collections import OrderedDict
-    d = OrderedDict.fromkeys(orb_list)
-    i = 0
-    for key in d.keys():
-      d[key] = i
-      i = i+1
-    self.orbDict = d
+      print('Number of atoms: ', self.Natoms)
+
+    # We are going to create a Dict of the unique orbitals, assigning
+    # them an index (in order of appearance) to store them into the
+    # arrays.
+    names, first, inverse = np.unique(orbitals, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    self.orbDict = OrderedDict((str(names[i]), j) for j, i in enumerate(order))
+    self.Norbs = len(self.orbDict)
+    print('Orbitals found:', set(self.orbDict))
     if self.verbose:
       print('Set of orbitals and their indexes: ', self.orbDict)
-  
-      
-    # Creating a big array with all the info. It needs to be
-    # initialized to zero, since not all fields are present in the
-    # file
+
+    # It needs to be initialized to zero, since not all fields are
+    # present in the file
     if self.is_complex:
       self.spd = np.zeros([self.Nkpoints, self.Nbands, self.Natoms,
                            self.Norbs], dtype=complex)
     else:
       self.spd = np.zeros([self.Nkpoints, self.Nbands, self.Natoms,
                            self.Norbs], dtype=float)
-      
-    # splitting the file by Eigenvector (and perhaps K-point):
-    #
-    # The first match is 'Coefficients and Mulliken populations of the
-    # atomic orbitals', and needs to be discarded
-
-    if self.Nkpoints == 1:
-      # Eigenvector:   1    (up)
-      evecs = re.split(r'Eigenvector:\s*\d+\s*\(up\)\s*', self.f)[1:]
-    else:
-      # K-point:    1    Eigenvector:    1    (up)
-      evecs = re.split(r'K-point:\s*\d+\s*Eigenvector:\s*\d+\s*\(up\)\s*', self.f)[1:]
-    if self.verbose:
-      print('We got :', len(evecs), 'Eigenvector entries (expected: ',
-            self.Nkpoints*self.Nbands, ')' )
-    # temporal storage of the evecs as an Nkpoint*Nbands array
-    evecs = np.array(evecs)
-    evecs.shape = (self.Nkpoints, self.Nbands)
-
-    # going to parse all the data, iterating over:
-    # Kpoints->Bands->Atoms (and assignation at orbital level)
-
-    
-    for cKpoint in range(self.Nkpoints):
-      for cEvec in range(self.Nbands):
-        # just dealing with the data of the current block
-        evec = evecs[cKpoint, cEvec]
-        # splitting by atom
-        evec = re.split(r'\n*\s*\d+\s*[a-zA-Z]+\s+', evec)
-        # the first match should be '', and should be discarded
-        if evec[0] == '':
-          evec.pop(0)
-        #if self.verbose:
-        #  print('number of atoms in the block',  len(evec))
-    
-        cAtom = 0 # a counter of atoms
-        for atom in evec:
-          # next we search for the orbitals involved
-          orbNames = (re.findall(r'[a-zA-Z_]+[-_a-zA-z\d]*', atom))
-          # what is the index of each orbital? 
-          orbIndexes = [self.orbDict[x] for x in orbNames]
-          #print(orbNames, orbIndexes)
-          # getting all the floating numbers
-          numbers = re.findall('[\-0-9]+\.\d+', atom)
-          numbers = np.array(numbers, dtype=float)
-          # if they are complex, we need to cast them. The last column
-          # nneds to be ignored.
-          if self.is_complex:
-            numbers.shape = (len(orbIndexes), 3) # Re, Im, Mulliken
-            numbers = numbers[:,0] + 1j*numbers[:,1]
-          else:
-            numbers.shape = (len(orbIndexes), 2) # Re. Mulliken
-            numbers = numbers[:,0]
-          # print(numbers)
-          self.spd[cKpoint, cEvec, cAtom, orbIndexes] = numbers
-          cAtom = cAtom + 1
+      values = values.real
+    self.spd[kpoints, bands, atoms, rank[inverse]] = values
     if self.verbose:
       print('file', self.filename, 'loaded')
 
     print('Overlap Populations (Mulliken) are ignored')
-    # if self.normalized:
-    #   if self.verbose:
-    #     print('The projection of eigenvectors will be normalized')
-    #   #norms = np.zeros((self.Nkpoints, self.Nbands), dtype=float)
-    #   for k in range(self.Nkpoints):
-    #     for b in range(self.Nbands):
-    #       self.spd[k,b] /= np.linalg.norm(self.spd[k,b])
-    #       #norms[k,b] = np.linalg.norm(self.spd[k,b])
-    #     #self.spd = self.spd/norms
     return
 
   def set_bands(self, bands, occupancies):
@@ -202,7 +191,7 @@ class DFTB_evec:
                          str((self.Nkpoints, 4)))
     return
 
-  def writeProcar(self):
+  def writeProcar(self, filename='PROCAR'):
     # changing the coefficients to its module: 
     self.spd = np.array((self.spd * np.conjugate(self.spd)).real, dtype=float)
 
@@ -248,7 +237,7 @@ class DFTB_evec:
 
     # writing the data
       
-    f = open('PROCAR', 'w')
+    f = open(filename, 'w')
     # the header
     f.write('PROCAR lm decomposed\n')
     # # of k-points:  165         # of bands:    6         # of ions:    10
@@ -364,7 +353,7 @@ class DFTB_utils:
     return typenames, occurences, positions
 
 
-  def writePoscar(self, detailed_xml):
+  def writePoscar(self, detailed_xml, filename='POSCAR'):
     # the positions are written in Bohrs and Cartesain coordinates
     
     
@@ -389,11 +378,11 @@ class DFTB_utils:
     
     p = Poscar('', verbose=False)
     p.parse(fromString=poscarStr)
-    p.write('POSCAR', direct=True)
+    p.write(filename, direct=True)
     return
   
-  def writeOutcar(self, detailed_out, detailed_xml):
-    f = open('OUTCAR', 'w')
+  def writeOutcar(self, detailed_out, detailed_xml, filename='OUTCAR'):
+    f = open(filename, 'w')
     efermi = self.find_fermi(detailed_out)
     f.write('E-fermi : ' + str(efermi) + ' \n')
     
@@ -426,47 +415,30 @@ class DFTB_bands:
     return
   
   def load(self):
-    data = open(self.filename, 'r')
-    data = data.read()
+    with open(self.filename, 'r') as f:
+      data = f.read()
 
     # Spin-polarized data is not supproted yet, if there exist, we
     # need to raise an exception
-    spinful = re.findall(r'SPIN\s*2', data)
-    if len(spinful) == 2:
-      raise RuntimeError("Spinful calculations are not supported")
-    
-    # splitting by k-point
     #  KPT            1  SPIN            1  KWEIGHT    1.0000000000000000
-    kpoints = re.split(r'\s*KPT\s*\d+\s*\w+\s*1\s*\w+\s*[-.0-9E]+\s*', data)
-    # the first value has to be empty ('') there is nothing before the
-    # first match
-    if kpoints[0] != '':
-      print("WARNING, the first match wasn\'t empty. It content is: ", kpoints[0])
-    kpoints.pop(0)
-    self.Nkpoints = len(kpoints)
+    spins = re.findall(r'^\s*KPT\s*\d+\s*SPIN\s*(\d+)', data, re.MULTILINE)
+    if any(spin != '1' for spin in spins):
+      raise RuntimeError("Spinful calculations are not supported")
+    self.Nkpoints = len(spins)
     if self.verbose:
       print('Number of Kpoints (bands): ', self.Nkpoints)
-    
-    # splitting the numbers at each kpoint, only the numbers at the
-    # middleand end are needed :
+
+    # only the numbers at the middle and end are needed, the KPT lines
+    # are skipped as comments:
     #
     #     1   -20.981  2.00000
-    evalues = []
-    occs = [] # occupancies
-    for kpoint in kpoints:
-      occ = re.findall(r'\d+\s+[0-9.\-]+\s+([0-9.\-]+)\s*\n?', kpoint)
-      kpoint = re.findall(r'\d+\s+([0-9.\-]+)\s+[0-9.\-]+\s*\n?', kpoint)
-      #kpoint = np.array(kpoint, dtype=float)
-      evalues.append(kpoint)
-      occs.append(occ)
-    evalues = np.array(evalues, dtype=float)
-    occs = np.array(occs, dtype=float)
+    values = np.loadtxt(io.StringIO(data), comments='KPT', usecols=(1,2), ndmin=2)
+    values.shape = (self.Nkpoints, -1, 2)
+    evalues = values[:,:,0]
+    occs = values[:,:,1]
     if self.verbose:
       print('Bands found (Nkpoints. Nbands): ', evalues.shape)
 
-    # # removed
-    # evalues = evalues - self.eFermi
-    # eFermi = 0
     self.Bands = evalues
     self.Occupancies = occs
     return
@@ -687,7 +659,8 @@ class DFTB_input:
 
 
 class DFTBParser:
-  """The class parses the input form DFTB+.
+  """The class parses the input form DFTB+. The band structure and the
+    structure are built in memory, without writing VASP files.
     
     Parameters
     ----------
@@ -702,68 +675,91 @@ class DFTBParser:
         The file with the Fermi energy, by default 'detailed.out'
     detailed_xml : str, optional
         The file with the list of kpoints, by default 'detailed.xml'
+    kpoints_filename : str, optional
+        A VASP-like KPOINTS file with the kpath, by default 'KPOINTS'
+    parse_ebs : bool, optional
+        Boolean to parse the eigenvectors and the bands and build the
+        ebs, by default True. If False, ebs is None
+    n_workers : int, optional
+        The number of processes decoding the k-points of the
+        eigenvectors, by default CONFIG['parser_workers']
+    write_vasp_files : bool, optional
+        Boolean to also write the PROCAR, POSCAR and OUTCAR files of
+        the previous versions in dirname, by default False
   """
   def __init__(self,
                dirname:str = '',
                eigenvec_filename:str = 'eigenvec.out',
                bands_filename:str = 'band.out',
                detailed_out:str = 'detailed.out',
-               detailed_xml:str = 'detailed.xml'
+               detailed_xml:str = 'detailed.xml',
+               kpoints_filename:str = 'KPOINTS',
+               parse_ebs:bool = True,
+               n_workers:int = None,
+               write_vasp_files:bool = False,
                ):
 
-    
-    
-    # Searching for the Fermi level
+    eigenvec_filename = os.path.join(dirname, eigenvec_filename)
+    bands_filename = os.path.join(dirname, bands_filename)
+    detailed_out = os.path.join(dirname, detailed_out)
+    detailed_xml = os.path.join(dirname, detailed_xml)
+    kpoints_filename = os.path.join(dirname, kpoints_filename)
+
+    # Searching for the Fermi level and the structure
     utils = DFTB_utils(verbose=False)
-    
-    # Loading the bands
+    self.efermi = utils.find_fermi(detailed_out)
+    lattice = utils.find_lattice(detailed_xml)
+    typenames, occurences, positions = utils.find_atoms(detailed_xml)
+    atoms = [name for name, n in zip(typenames, occurences) for i in range(n)]
+    self.structure = Structure(atoms=atoms,
+                               cartesian_coordinates=positions,
+                               lattice=lattice)
+
+    self.kpath = None
+    if os.path.exists(kpoints_filename):
+      try:
+        self.kpath = Kpoints(kpoints_filename).kpath
+      except Exception as e:
+        self.kpath = None
+
+    self.ebs = None
+    if not parse_ebs:
+      return
+
+    # Loading the bands and the kpoints (in direct coordinates, the
+    # last column are the weights)
     bands = DFTB_bands(filename=bands_filename, verbose=False)
     bands.load()
-    
-    # Loading the kpoints
-    if detailed_xml:
-      kpoints = utils.get_kpoints(detailed_xml)
-      # otherwise, a plain set of kpoints is spanned. Physically meaningless
-    else:
-      Nkpoints = evec.Nkpoints
-      kpoints = np.linspace(0,1, num=Nkpoints)
-      print('A list of k-points was not provided. Creating a fake and meaningless '
-            'of K-points')
-    
-    utils.writeOutcar(detailed_out=detailed_out, detailed_xml=detailed_xml)
+    kpoints = utils.get_kpoints(detailed_xml)
 
-    utils.writePoscar(detailed_xml=detailed_xml)
-
-
-
-    # I need to find if I need to create the VASP files, just the
-    # PROCAR, the other are trivial
-
-    create_procar = True
-    try:
-      mtime_procar = os.path.getmtime('PROCAR')
-      mtime_evec = os.path.getmtime(eigenvec_filename)
-      if mtime_evec > mtime_procar:
-        create_procar = True        
-      else:
-        create_procar = False
-    except OSError:
-      # Handle file not found or other errors
-      create_procar = True
-    if create_procar == False:
-      return
-
-    print('Going to create a PROCAR file from eigenvec.txt, it migth take a'
-          ' while but will be done done just once')
-    
     evec = DFTB_evec(filename = eigenvec_filename,
-                           verbose = False)
-    evec .load()
+                     verbose = False)
+    evec.load(n_workers=n_workers)
 
     # setting the bands and kpoints to the class with eigenvectors
     evec.set_bands(bands.Bands, bands.Occupancies)
     evec.set_kpoints(kpoints)
-    
-    evec.writeProcar()
-  
+
+    # The projections are the square modulus of the coefficients,
+    # (Nkpoints, Nbands, Natoms, Nprincipals, Norbs, Nspins)
+    projected = np.abs(evec.spd)**2
+    projected = projected[:, :, :, np.newaxis, :, np.newaxis]
+
+    self.ebs = ElectronicBandStructure(
+                            kpoints=kpoints[:, :3],
+                            bands=evec.bands[:, :, np.newaxis],
+                            projected=projected,
+                            efermi=self.efermi,
+                            kpath=self.kpath,
+                            projected_phase=None,
+                            labels=list(evec.orbDict.keys()),
+                            reciprocal_lattice=self.structure.reciprocal_lattice,
+                            )
+
+    if write_vasp_files:
+      utils.writeOutcar(detailed_out=detailed_out, detailed_xml=detailed_xml,
+                        filename=os.path.join(dirname, 'OUTCAR'))
+      utils.writePoscar(detailed_xml=detailed_xml,
+                        filename=os.path.join(dirname, 'POSCAR'))
+      evec.writeProcar(filename=os.path.join(dirname, 'PROCAR'))
     return
@@ -5,6 +5,7 @@ __date__ = "March 29, 2023"
 
 import re
 import os
+from functools import partial
 
 from pathlib import Path
 from typing import Union, List, Tuple, Optional
@@ -15,6 +16,7 @@ from pyprocar.core.dos import DensityOfStates
 from pyprocar.core.ebs import ElectronicBandStructure
 from pyprocar.core.structure import Structure
 from pyprocar.core.kpath import KPath
+from pyprocar.io.loader import ConcurrentLoader
 
 HARTREE_TO_EV = 27.211386245988
 
@@ -36,11 +38,53 @@ def parse_dos_block(dos_block: str) -> Tuple[np.array, np.array]:
         return None, None
     return X[:, 0], X[:, 1]
 
+def read_band_blocks(filename: Union[str, List[str]], nkpoints: int, nbands: int = None) -> np.ndarray:
+    """Reads a BANDS.OUT or BAND_S*_A*.OUT file in one call. The files have a 
+    block of nkpoints lines per band, separated by empty lines.
+
+    Parameters
+    ----------
+    filename : str or List[str]
+        The filename or the lines of the file
+    nkpoints : int
+        The number of kpoints
+    nbands : int, optional
+        The number of bands to keep, by default None which keeps all of them
+
+    Returns
+    -------
+    np.ndarray
+        The columns of the file with the shape (nkpoints, nbands, ncolumns)
+    """
+    values = np.loadtxt(filename, ndmin=2)
+    values = values.reshape(-1, nkpoints, values.shape[1])
+    if nbands is not None:
+        values = values[:nbands]
+    return values.transpose(1, 0, 2)
+
 class ElkParser:
-    def __init__(self, path, kdirect=True):
+    def __init__(self, path, kdirect=True, parse_ebs=True, parse_dos=True, n_workers=None):
+        """The class is used to parse the information of an elk calculation
+
+        Parameters
+        ----------
+        path : str
+            The directory of the calculation
+        kdirect : bool, optional
+            Boolean for the kpoints in reduced coordinates, by default True
+        parse_ebs : bool, optional
+            Boolean to read the bands and build the ebs and kpath 
+            of a bands calculation, by default True
+        parse_dos : bool, optional
+            Boolean to read TDOS.OUT and the PDOS files, by default True
+        n_workers : int, optional
+            The number of processes reading the BAND_S*_A*.OUT files, 
+            by default CONFIG['parser_workers']
+        """
 
         # elk specific input parameters
         self.dir = path
+        self.n_workers = n_workers
         self.fin = os.path.join(self.dir,"elk.in")
         self.file_names = []
         self.elkin = None
@@ -93,17 +137,18 @@ class ElkParser:
         self._read_fermi()
         self._read_elkin()
         self._read_structure()
-        if self.is_bands_calculation:
+        if parse_ebs and self.is_bands_calculation:
             self._read_kpoints_info()
             self._read_bands()
-        self._read_dos()
+        if parse_dos:
+            self._read_dos()
         
         
         has_time_reversal=True
         
 
         # Checks if file_names exists, if not it is not a bands calculation
-        if self.is_bands_calculation:
+        if parse_ebs and self.is_bands_calculation:
             self.kpath = KPath(
                             knames=self.knames,
                             special_kpoints=self.special_kpoints,
@@ -267,7 +312,9 @@ class ElkParser:
             lines = rf.readlines()
             rf.close()
 
-            raw_nbands = int(len(lines) / (self.nkpoints + 1))
+            # (nkpoints, raw_nbands, ncolumns), the second column is the energy
+            raw_bands = read_band_blocks(lines, self.nkpoints)
+            raw_nbands = raw_bands.shape[1]
 
             rf = open(os.path.join(self.dir,"BANDLINES.OUT"), "r")
             bandLines = rf.readlines()
@@ -306,18 +353,7 @@ class ElkParser:
             if not self.kdirect:
                 self.kpoints = np.dot(self.kpoints, self.reclat)
 
-            rf = open(self.file_names[0], "r")
-            lines = rf.readlines()
-            rf.close()
-
-            iline = 0
-            raw_bands = np.zeros(shape=(self.nkpoints, raw_nbands))
-            for iband in range(raw_nbands):
-                for ikpoint in range(self.nkpoints):
-                    raw_bands[ikpoint, iband] = float(lines[iline].split()[1])
-                    iline += 1
-                if ikpoint == self.nkpoints - 1:
-                    iline += 1
+            raw_bands = raw_bands[:, :, 1]
             raw_bands *= HARTREE_TO_EV
 
             if self.nspin == 1:
@@ -350,20 +386,13 @@ class ElkParser:
             if idx_bands_out != None:
                 del self.file_names[idx_bands_out]
 
-            for ifile in range(self.natom):
-                rf = open(self.file_names[ifile], "r")
-                lines = rf.readlines()
-                rf.close()
-                iline = 0
-
-                for iband in range(self.nbands):
-                    for ikpoint in range(self.nkpoints):
-                        temp = np.array([float(x) for x in lines[iline].split()])
-                        self.spd[ikpoint, iband, 0, ifile, 0] = ifile + 1
-                        self.spd[ikpoint, iband, 0, ifile, 1:-1] = temp[2:]
-                        iline += 1
-                    if ikpoint == self.nkpoints - 1:
-                        iline += 1
+            # The files of the atoms are decoded concurrently, each fills its own atom
+            read_atom = partial(read_band_blocks, nkpoints=self.nkpoints, nbands=self.nbands)
+            with ConcurrentLoader(n_workers=self.n_workers, use_processes=True) as loader:
+                atom_blocks = loader.map(read_atom, self.file_names[:self.natom])
+                for ifile, values in enumerate(atom_blocks):
+                    self.spd[:, :, 0, ifile, 0] = ifile + 1
+                    self.spd[:, :, 0, ifile, 1:-1] = values[:, :, 2:]
             # self.spd[:,:,:,-1,:] = self.spd.sum(axis=3)
             self.spd[:, :, :, :, -1] = np.sum(self.spd[:, :, :, :, 1:-1], axis=4)
             self.spd[:, :, :, -1, :] = self.spd.sum(axis=3)
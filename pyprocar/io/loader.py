@@ -0,0 +1,129 @@
+"""This module defines a small worker pool that reads the independent files 
+of a calculation concurrently for :class:`pyprocar.io.Parser`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from ..utils.config import CONFIG
+
+
+class ConcurrentLoader:
+    """Loads the independent files of a calculation in a thread or process pool.
+
+    The tasks are submitted by name and their results are requested by name.
+    With a single worker the tasks are run serially, when their result is
+    requested, so both modes read the files in the same order of the code that
+    requests them. An exception raised by a task is raised again when its
+    result is requested, so the error a caller sees does not depend on which
+    thread finishes first.
+
+    Parameters
+    ----------
+    n_workers : int, optional
+        The number of threads reading files, by default CONFIG['parser_workers'].
+        1 loads the files serially
+    use_processes : bool, optional
+        Boolean to use a process pool for the decoding bound by the cpu, by default False. 
+        The functions and their arguments must then be picklable
+    """
+
+    def __init__(self, n_workers:int=None, use_processes:bool=False):
+        if n_workers is None:
+            n_workers = CONFIG.get("parser_workers", 1)
+        if n_workers is None or n_workers < 1:
+            n_workers = 1
+        self.n_workers = int(n_workers)
+
+        self._tasks = {}
+        self._results = {}
+        self._executor = None
+        if self.n_workers > 1 and use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+        elif self.n_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.n_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        return False
+
+    def __contains__(self, name:str):
+        return name in self._tasks or name in self._results
+
+    def submit(self, name:str, function, *args, **kwargs):
+        """Submits a task, it starts right away if the loader is concurrent
+
+        Parameters
+        ----------
+        name : str
+            The name the result is requested with
+        function : Callable
+            The function loading the file
+        """
+        if name in self:
+            raise ValueError(f"A task named {name} was already submitted")
+        if self._executor is None:
+            self._tasks[name] = (function, args, kwargs)
+        else:
+            self._tasks[name] = self._executor.submit(function, *args, **kwargs)
+        return None
+
+    def result(self, name:str):
+        """Returns the result of a task, waiting for it if it is still running
+
+        Parameters
+        ----------
+        name : str
+            The name of the task
+
+        Returns
+        -------
+        Any
+            The value returned by the task
+
+        Raises
+        ------
+        Exception
+            The exception raised by the task
+        """
+        if name in self._results:
+            return self._results[name]
+        if name not in self._tasks:
+            raise ValueError(f"No task named {name} was submitted")
+
+        task = self._tasks.pop(name)
+        if self._executor is None:
+            function, args, kwargs = task
+            self._results[name] = function(*args, **kwargs)
+        else:
+            self._results[name] = task.result()
+        return self._results[name]
+
+    def map(self, function, iterable):
+        """Applies a function to every item, the items are loaded concurrently 
+        but the results are yielded in the order of the items
+
+        Parameters
+        ----------
+        function : Callable
+            The function loading an item
+        iterable : Iterable
+            The items
+
+        Returns
+        -------
+        Iterator
+            The results. The exception of an item is raised when its result is reached
+        """
+        if self._executor is None:
+            return map(function, iterable)
+        return self._executor.map(function, iterable)
+
+    def shutdown(self):
+        """Waits for the running tasks and releases the workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return None
@@ -1,17 +1,49 @@
 import re
 import os
+import io
 
 import numpy as np
 import xml.etree.ElementTree as ET
 
 from pyprocar.core import DensityOfStates, Structure, ElectronicBandStructure, KPath
 from . import qe, vasp
+from .loader import ConcurrentLoader
 
 # Physics Contstnats
 HARTREE_TO_EV = 27.211386245988  #eV/Hartree
 
+# The orbitals of the projected density of states, in the order of their columns
+DOS_ORBITALS = ['s', 'p_y', 'p_z', 'p_x', 'd_xy', 'd_yz', 'd_z^2', 'd_xz', 'd_x^2-y^2']
+
 def str2bool(v):
   return v.lower() in ("true") 
+
+def read_fatband_file(filename):
+    """Reads a FATBAND file in a single pass. 
+    It is a module function so it can be sent to a process pool
+
+    Parameters
+    ----------
+    filename : str
+        The FATBAND filename
+
+    Returns
+    -------
+    Tuple[str, str, np.ndarray]
+        The ion, the orbital without its principal number and 
+        the energies and weights with the shape (n_kpoints, n_lines per kpoint, 2)
+    """
+    with open(filename, "r") as rf:
+        projFile = rf.read()
+
+    fatbands_info =  re.findall("#\sFATBAND\sfor(.*)",projFile)[0].split()
+    n_kpoints = len(re.findall("# K-Point",projFile))
+
+    # The comments are the headers of the file and of the kpoints, 
+    # the second and third columns are the energy and the weight
+    values = np.loadtxt(io.StringIO(projFile), comments="#", usecols=(1,2), ndmin=2)
+    values = values.reshape(n_kpoints, -1, 2)
+    return fatbands_info[0], fatbands_info[1][1:], values
         
 class LobsterParser():
     """The class helps parse the information from a lobster calculation
@@ -36,6 +68,13 @@ class LobsterParser():
         The procar for vasp calculations, by default 'PROCAR'
     dos_interpolation_factor : _type_, optional
         The interpolation factor on the density of states, by default None
+    parse_ebs : bool, optional
+        Boolean to parse the FATBAND files and build the ebs, by default True
+    parse_dos : bool, optional
+        Boolean to parse DOSCAR.lobster, by default True
+    n_workers : int, optional
+        The number of processes reading the FATBAND files, by default CONFIG['parser_workers']. 
+        1 reads them serially
 
     """
     def __init__(self,
@@ -47,7 +86,10 @@ class LobsterParser():
         outcar = 'OUTCAR',
         poscar = 'POSCAR',
         procar = 'PROCAR',
-        dos_interpolation_factor = None ):
+        dos_interpolation_factor = None,
+        parse_ebs = True,
+        parse_dos = True,
+        n_workers = None ):
         
 
         if dirname != "":
@@ -57,6 +99,7 @@ class LobsterParser():
 
         self.dirname = dirname
         self.code = code
+        self.n_workers = n_workers
 
         rf = open(f"{self.dirname}{lobsterin}", "r")
         self.lobsterin = rf.read()
@@ -115,7 +158,7 @@ class LobsterParser():
 
         # For band structures
         
-        if len(self.kticks) != 0:
+        if parse_ebs and len(self.kticks) != 0:
             self._readFileNames()
             self._readFatBands()
             self._createKPath()     
@@ -133,7 +176,7 @@ class LobsterParser():
                                         # shifted_to_efermi=False,
                                     )
 
-        if os.path.exists(f"{self.dirname}DOSCAR.lobster"):
+        if parse_dos and os.path.exists(f"{self.dirname}DOSCAR.lobster"):
             self.data = self._parse_doscar(f"{self.dirname}DOSCAR.lobster")
 
     @property
@@ -441,122 +484,40 @@ class LobsterParser():
         ValueError
             DOSCAR seems truncated
         """
-        rf = open(filename)
-        data = rf.readlines()
-        rf.close()
-
-        if len(data) < 5:
-            raise ValueError('DOSCAR seems truncated')
-
-  
-        # Skipping the first lines of header
-        iline = 5
+        doscar = vasp.Doscar(filename)
+        total_dos = doscar.total
 
-        header = [float(x) for x in data[iline].strip().split()]
-        ndos = int(header[2])
-        iline += 1
-
-        total_dos = [[float(x) for x in y.split()] for y in data[iline:iline + ndos]]
-        total_dos = np.array(total_dos)
+        # In case there are more blocks of data, they are the projected DOS
+        if len(doscar.projected) == 0:
+            return {'total': total_dos}
 
-        iline += ndos
         ndos, total_ncols = total_dos.shape
-        is_spin_polarized = False
-        if total_ncols == 5:
-            is_spin_polarized = True
-            spins = ['dos_up','dos_down']
-        # In case there are more lines of data, they are the projected DOS
-        if len(data) > iline:
-
-            projected_dos = []
-            proj_orbitals = []
-            ion_index =0
-            
-            while iline < len(data):
-       
-                header = [float(x) for x in data[iline].split(";")[0].split()]
-                
-                #print(header)
-                ionsList = re.findall("calculating FatBand for Element: (.*) Orbital.*", self.lobsterout)
-                proj_ions = re.findall("calculating FatBand for Element: (.*) Orbital\(s\):\s*.*", self.lobsterout)
-  
-                proj_orbitals.append((proj_ions[ion_index],data[iline].split(";")[2]))
-                #print(proj_orbitals)
-                ion_index += 1    
-                
-                
-                ndos = int(header[2])
-                iline += 1
-                tmp_dos = [[float(x) for x in y.split()] for y in data[iline:iline + ndos]]
-                tmp_dos = np.array(tmp_dos)
-                
-                projected_dos.append(tmp_dos)
-               
-                iline += ndos
-                
-            final_projected = []
-            
-            for i_ion in range(len(projected_dos)):
-                tmp_dos = np.zeros(shape = [len(projected_dos[i_ion][:,0]),10,2])
-                for ilabel, label in enumerate(proj_orbitals[i_ion][1].split(),1): 
-                    if is_spin_polarized == False :
-                        tmp_dos[:,0,0] = projected_dos[i_ion][:,0]
-                        if (label.find('s') == True):
-                            tmp_dos[:,1,0] += projected_dos[i_ion][:,ilabel] 
-                        elif(label.find('p_y') == True):
-                            tmp_dos[:,2,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('p_z') == True):
-                            tmp_dos[:,3,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('p_x') == True):
-                            tmp_dos[:,4,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('d_xy') == True):
-                            tmp_dos[:,5,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('d_yz') == True):
-                            tmp_dos[:,6,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('d_z^2') == True):
-                            tmp_dos[:,7,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('d_xz') == True):
-                            tmp_dos[:,8,0] += projected_dos[i_ion][:,ilabel]
-                        elif(label.find('d_x^2-y^2') == True):
-                            tmp_dos[:,9,0] += projected_dos[i_ion][:,ilabel]
-                    else:
-                        tmp_dos[:,0,0] = projected_dos[i_ion][:,0]
-                        tmp_dos[:,0,1] = projected_dos[i_ion][:,0]
-                        if (label.find('s') == True):
-                            tmp_dos[:,1,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,1,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('p_y') == True):
-                            tmp_dos[:,2,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,2,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('p_z') == True):
-                            tmp_dos[:,3,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,3,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('p_x') == True):
-                            tmp_dos[:,4,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,4,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('d_xy') == True):
-                            tmp_dos[:,5,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,5,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('d_yz') == True):
-                            tmp_dos[:,6,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,6,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('d_z^2') == True):
-                            tmp_dos[:,7,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,7,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('d_xz') == True):
-                            tmp_dos[:,8,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,8,1] += projected_dos[i_ion][:,2*ilabel]
-                        elif(label.find('d_x^2-y^2') == True):
-                            tmp_dos[:,9,0] += projected_dos[i_ion][:,2*ilabel-1]
-                            tmp_dos[:,9,1] += projected_dos[i_ion][:,2*ilabel]
-                final_projected.append(tmp_dos)
-                final_labels_index = {'energies':None,'s':0,'p_y':1,'p_z':2, 'p_x':3 , 'd_xy': 4,  'd_yz': 5, 'd_z^2': 6, 'd_xz':7,'d_x^2-y^2':8}
-                final_labels = list(final_labels_index.keys())        
-            return {'total': total_dos, 'projected': final_projected, 'projected_labels_info':final_labels , 'ions':ionsList}
+        is_spin_polarized = total_ncols == 5
+        n_spin = 2 if is_spin_polarized else 1
+
+        ionsList = re.findall("calculating FatBand for Element: (.*) Orbital.*", self.lobsterout)
+
+        final_projected = []
+        for projected_dos, labels in zip(doscar.projected, doscar.projected_labels):
+            tmp_dos = np.zeros(shape = [len(projected_dos[:,0]),10,2])
+            tmp_dos[:,0,:n_spin] = projected_dos[:,[0]]
+            # The orbital labels of a block, e.g 3s 2p_y, are the third field of its header
+            for ilabel, label in enumerate(labels[1].split(),1):
+                iorbital = None
+                for i, orbital in enumerate(DOS_ORBITALS, 1):
+                    if label.find(orbital) == 1:
+                        iorbital = i
+                        break
+                if iorbital is None:
+                    continue
+                if is_spin_polarized:
+                    tmp_dos[:,iorbital,:] += projected_dos[:,2*ilabel-1:2*ilabel+1]
+                else:
+                    tmp_dos[:,iorbital,0] += projected_dos[:,ilabel]
+            final_projected.append(tmp_dos)
 
-        else:
-            
-            return {'total': total_dos}
+        final_labels = ['energies'] + DOS_ORBITALS
+        return {'total': total_dos, 'projected': final_projected, 'projected_labels_info':final_labels , 'ions':ionsList}
 
     def _readFileNames(self):
         """Helper method to parse filenames form the lobster outfile
@@ -616,42 +577,33 @@ class LobsterParser():
         )
 
         self.bands = np.zeros(shape=(self.kpointsCount, self.bandsCount,self.nspin))
-        for file in range(len(self.file_names)):
-            rf = open(self.file_names[file], "r")
-            projFile = rf.read()
-            rf.close()
 
-            fatbands_info =  re.findall("#\sFATBAND\sfor(.*)",projFile)[0].split()
-            current_ion = fatbands_info[0]
-            current_orbital = fatbands_info[1][1:]
-
-            iion = 0
-            iorbital = 0
-            for i in range(len(self.ionsList)):
-                if self.ionsList[i] == current_ion:
-                    iion = i
-            for i in range(len(self.orbitals)):
-                if self.orbitals[i] == current_orbital:
-                    iorbital = i + 1
-
-            fatbands = re.split("# K-Point",projFile)[1:]
-            for ik,fatband in enumerate(fatbands[:]):
-
-                for iband ,band in enumerate(fatband.split('\n')[1:-1]):
-                    if self.nspin == 2:
-                        if iband < self.bandsCount:
-                            self.bands[ik, iband, 0] = float(band.split()[1])
-                            self.bands[ik, iband, 1] = float(fatband.split('\n')[1:][iband + self.bandsCount].split()[1])
-
-                            self.spd[ik, iband, 0, iion, iorbital] = float(band.split()[2])
-                            self.spd[ik, iband, 1, iion, iorbital] = float(fatband.split('\n')[1:-1][iband + self.bandsCount].split()[2])
-
-                    else:
-                        self.bands[ik, iband, 0] =  float(band.split()[1])
-                        self.spd[ik, iband, 0, iion, iorbital] = float(band.split()[2])
-            self.spd[:, :, :, :, -1] = np.sum(self.spd[:, :, :, :, 1:-1], axis=4)
-            self.spd[:, :, :, -1, :] = np.sum(self.spd[:, :, :, 0:-1, :], axis=3)
-            self.spd[:, :, :, -1, 0] = 0
+        # The ion and orbital index of the projections in the spd array. 
+        # Unknown ions go to the first ion and unknown orbitals to the first column
+        ion_indices = {ion : i for i, ion in enumerate(self.ionsList)}
+        orbital_indices = {orbital : i + 1 for i, orbital in enumerate(self.orbitals)}
+
+        # Each file fills its own (ion, orbital) projection, they are decoded in parallel 
+        # and stored in the order of the files
+        with ConcurrentLoader(n_workers=self.n_workers, use_processes=True) as loader:
+            for current_ion, current_orbital, values in loader.map(read_fatband_file, self.file_names):
+                iion = ion_indices.get(current_ion, 0)
+                iorbital = orbital_indices.get(current_orbital, 0)
+
+                if self.nspin == 2:
+                    # The spin down bands follow the spin up bands of each kpoint
+                    values = values[:, :2 * self.bandsCount]
+                    values = values.reshape(self.kpointsCount, 2, self.bandsCount, 2).transpose(0, 2, 1, 3)
+                    self.bands[:, :, :] = values[:, :, :, 0]
+                    self.spd[:, :, :, iion, iorbital] = values[:, :, :, 1]
+                else:
+                    n_lines = values.shape[1]
+                    self.bands[:, :n_lines, 0] = values[:, :, 0]
+                    self.spd[:, :n_lines, 0, iion, iorbital] = values[:, :, 1]
+
+        self.spd[:, :, :, :, -1] = np.sum(self.spd[:, :, :, :, 1:-1], axis=4)
+        self.spd[:, :, :, -1, :] = np.sum(self.spd[:, :, :, 0:-1, :], axis=3)
+        self.spd[:, :, :, -1, 0] = 0
                         
         return None
 
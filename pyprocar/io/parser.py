@@ -1,319 +1,593 @@
 import os
+from typing import List
 
 import numpy as np
 
 from ..core import ElectronicBandStructure
 from ..core import DensityOfStates
 from ..core import Structure
-from ..utils import UtilsProcar
+from ..core import KPath
+from ..utils.config import CONFIG
 from . import vasp, qe, abinit, lobster, siesta, frmsf, bxsf, elk, dftbplus
+from .cache import ParserCache
+from .loader import ConcurrentLoader
+
+# The objects a Parser provides
+ARTIFACTS = ("ebs", "dos", "structure", "kpath")
 
 class Parser:
     """
     The parser class will be the main object to be used through out the code. 
     This class will handle getting the main inputs (ebs,dos,structure,kpath,reciprocal_lattice) from the various dft parsers.
+
+    The objects are parsed lazily, on their first access, and only the files 
+    they need are read. For example, the dos of a vasp calculation only reads vasprun.xml 
+    and its ebs never reads vasprun.xml.
+
+    Parameters
+    ----------
+    code : str
+        The code of the calculation
+    dir : str
+        The directory of the calculation
+    use_cache : bool, optional
+        Boolean to store the parsed objects in an on-disk cache and to load them 
+        from it while the source files do not change, by default CONFIG['use_parser_cache']
+    artifacts : List[str], optional
+        The objects the caller needs among 'ebs', 'dos', 'structure' and 'kpath', 
+        by default None. They are parsed together when the Parser is initialized, 
+        the others are still parsed on their first access. If None, nothing is parsed 
+        until it is accessed
+    n_workers : int, optional
+        The number of threads reading the independent files of the calculation 
+        concurrently, by default CONFIG['parser_workers']. 1 reads them serially
+    memmap_dir : str, optional
+        Directory where the vasp PROCAR arrays are allocated as memory-mapped files, 
+        by default CONFIG['procar_memmap_dir']. If None, they are kept in memory
     """
     code : str = None
     dir : str = None
-    ebs : ElectronicBandStructure = None
-    dos : DensityOfStates = None
-    structure : Structure = None
 
-    def __init__(self,code:str , dir : str):
+    def __init__(self,code:str , dir : str, use_cache:bool=None, artifacts:List[str]=None, n_workers:int=None, memmap_dir:str=None):
         self.code = code
         self.dir = dir
+        if use_cache is None:
+            use_cache = CONFIG.get("use_parser_cache", False)
+        self.use_cache = use_cache
+        if n_workers is None:
+            n_workers = CONFIG.get("parser_workers", 1)
+        self.n_workers = n_workers
+        if memmap_dir is None:
+            memmap_dir = CONFIG.get("procar_memmap_dir", None)
+        self.memmap_dir = memmap_dir
+
+        # The parsed objects and the readers shared by several of them
+        self._artifacts = {}
+        self._readers = {}
+
+        if artifacts is not None:
+            self.parse(artifacts)
+
+    @property
+    def ebs(self) -> ElectronicBandStructure:
+        """The ElectronicBandStructure of the calculation, parsed on first access"""
+        return self._get_artifact("ebs")
+
+    @ebs.setter
+    def ebs(self, value):
+        self._artifacts["ebs"] = value
+
+    @property
+    def dos(self) -> DensityOfStates:
+        """The DensityOfStates of the calculation, parsed on first access"""
+        return self._get_artifact("dos")
+
+    @dos.setter
+    def dos(self, value):
+        self._artifacts["dos"] = value
+
+    @property
+    def structure(self) -> Structure:
+        """The Structure of the calculation, parsed on first access"""
+        return self._get_artifact("structure")
+
+    @structure.setter
+    def structure(self, value):
+        self._artifacts["structure"] = value
+
+    @property
+    def kpath(self) -> KPath:
+        """The KPath of the calculation, parsed on first access"""
+        return self._get_artifact("kpath")
+
+    @kpath.setter
+    def kpath(self, value):
+        self._artifacts["kpath"] = value
+
+    def _get_artifact(self, name:str):
+        if name not in self._artifacts:
+            self.parse([name])
+        return self._artifacts.get(name)
+
+    def parse(self, artifacts:List[str]=None):
+        """Parses the objects that were not parsed yet
+
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse among 'ebs', 'dos', 'structure' and 'kpath', 
+            by default None which parses all of them
+        """
+        if artifacts is None:
+            artifacts = ARTIFACTS
+        for name in artifacts:
+            if name not in ARTIFACTS:
+                raise ValueError(f"Unknown artifact {name}, it must be one of {ARTIFACTS}")
+        missing = [name for name in ARTIFACTS if name in artifacts and name not in self._artifacts]
+        if len(missing) == 0:
+            return None
+
+        cache = None
+        parsed = {}
+        if self.use_cache:
+            cache = ParserCache(code=self.code, dirname=self.dir)
+            cached = cache.load()
+            if cached is not None:
+                parsed = {name: cached[name] for name in missing if name in cached}
+
+        missing = [name for name in missing if name not in parsed]
+        if len(missing) != 0:
+            new_objects = self._parse_code(missing)
+            if cache is not None:
+                cache.save(artifacts=list(new_objects), **new_objects)
+            parsed.update(new_objects)
+
+        # The backends can provide more objects than requested
+        for name, value in parsed.items():
+            if name not in self._artifacts:
+                self._artifacts[name] = value
+                self._shift_efermi(name, value)
+        return None
+
+    @staticmethod
+    def _shift_efermi(name, value):
+        """Shifts the bands and dos energies back by the fermi energy"""
+        if name == "ebs" and value:
+            value.bands += value.efermi
 
-        self.parse()
+        if name == "dos" and value:
+            value.energies += value.efermi
+        return None
+
+    def _reader(self, name:str, factory):
+        """Returns a reader shared by the objects parsed from the same file, 
+        it is created on the first call
 
-    def parse(self):
-        """Handles which DFT parser to use"""
+        Parameters
+        ----------
+        name : str
+            The name of the reader
+        factory : Callable
+            Creates the reader
 
+        Returns
+        -------
+        Any
+            The reader
+        """
+        if name not in self._readers:
+            self._readers[name] = factory()
+        return self._readers[name]
+
+    def _parse_code(self, artifacts:List[str]):
+        """Calls the parser of the code
+
+        Parameters
+        ----------
+        artifacts : List[str]
+            The objects to parse
+
+        Returns
+        -------
+        Dict
+            The parsed objects, it can have more objects than requested
+        """
+        parsed = {}
         is_lobster_calc = self.code.split("_")[0] == "lobster"
         if is_lobster_calc:
-            self.parse_lobster()
+            self.parse_lobster(artifacts, parsed)
 
         elif self.code == "abinit":
-            self.parse_abinit()
+            self.parse_abinit(artifacts, parsed)
 
         elif self.code == "bxsf":
-            self.parse_bxsf()
+            self.parse_bxsf(artifacts, parsed)
             
         elif self.code == "qe":
-            self.parse_qe()
+            self.parse_qe(artifacts, parsed)
 
         elif self.code == "siesta":
-            self.parse_siesta()
+            self.parse_siesta(artifacts, parsed)
 
         elif self.code == "vasp":
-            self.parse_vasp()
+            self.parse_vasp(artifacts, parsed)
 
         elif self.code == "elk":
-            self.parse_elk()
+            self.parse_elk(artifacts, parsed)
 
         elif self.code == "dftb+":
-            self.parse_dftbplus()
-            
-        if self.ebs:
-            self.ebs.bands += self.ebs.efermi
+            self.parse_dftbplus(artifacts, parsed)
 
-        if self.dos:
-            self.dos.energies += self.dos.efermi
-        return None
+        # unknown codes and missing objects stay as None
+        for name in artifacts:
+            parsed.setdefault(name, None)
+        return parsed
 
-    def parse_abinit(self):
+    def parse_abinit(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
         """parses abinit files
 
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
+
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
+        if parsed is None:
+            parsed = {}
         outfile = f"{self.dir}{os.sep}abinit.out"
         kpointsfile = f"{self.dir}{os.sep}KPOINTS"
-        abinit_output = abinit.Output(abinit_output=outfile)
-        abinit_kpoints = abinit.AbinitKpoints(filename=kpointsfile)
-
-        parser =  abinit.AbinitProcar(  
-                                        dirname=self.dir,
-                                        abinit_output=outfile,
-                                        kpath=abinit_kpoints.kpath,
-                                        reciprocal_lattice=abinit_output.reclat,
-                                        efermi=abinit_output.fermi
-                                        )
-        
-        abinit_dos = abinit.AbinitDOSParser(dirname=self.dir)
 
-        self.dos = abinit_dos.dos
-        self.ebs = parser.abinitprocarobject.ebs
-        self.kpath = parser.abinitprocarobject.ebs.kpath
-        self.structure = abinit_output.structure
-        
+        if "ebs" in artifacts or "kpath" in artifacts or "structure" in artifacts:
+            abinit_output = self._reader("abinit_output", lambda : abinit.Output(abinit_output=outfile))
+            parsed["structure"] = abinit_output.structure
 
-        return None
+        if "ebs" in artifacts or "kpath" in artifacts:
+            abinit_kpoints = abinit.AbinitKpoints(filename=kpointsfile)
+
+            parser =  abinit.AbinitProcar(  
+                                            dirname=self.dir,
+                                            abinit_output=outfile,
+                                            kpath=abinit_kpoints.kpath,
+                                            reciprocal_lattice=abinit_output.reclat,
+                                            efermi=abinit_output.fermi
+                                            )
+            parsed["ebs"] = parser.abinitprocarobject.ebs
+            parsed["kpath"] = parser.abinitprocarobject.ebs.kpath
+
+        if "dos" in artifacts:
+            abinit_dos = abinit.AbinitDOSParser(dirname=self.dir)
+            parsed["dos"] = abinit_dos.dos
+
+        return parsed
     
-    def parse_bxsf(self):
+    def parse_bxsf(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
         """parses bxsf files.
 
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
+
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
+        if parsed is None:
+            parsed = {}
         
-        parser = bxsf.BxsfParser(infile = 'in.frmsf')
-
+        parser = self._reader("bxsf", lambda : bxsf.BxsfParser(infile = 'in.frmsf'))
 
-        self.ebs = parser.ebs
-        self.kpath = parser.kpath
-        self.structure = parser.structure
-        self.dos = parser.dos
+        for name in ARTIFACTS:
+            parsed[name] = getattr(parser, name)
 
-        return None
+        return parsed
     
-    def parse_elk(self):
-        """parses bxsf files.
+    def parse_elk(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
+        """parses elk files.
+
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
 
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
-        # try:
-        #     dos = elk.read_dos(path = self.dir)
-        #     self.dos = dos
-        # except:
-        #     self.dos = None
+        if parsed is None:
+            parsed = {}
 
+        parse_dos = "dos" in artifacts
+        parse_ebs = "ebs" in artifacts or "kpath" in artifacts
         try:
-            parser=elk.ElkParser(path=self.dir)
-            self.dos = parser.dos
-            self.structure = parser.structure
-            
+            parser=elk.ElkParser(path=self.dir, parse_ebs=parse_ebs, parse_dos=parse_dos, n_workers=self.n_workers)
+            parsed["structure"] = parser.structure
         except Exception as e:
-
-            self.dos = None
-            self.structure = None
-
-        
-        if not self.dos:
-
-            try:
-                parser=elk.ElkParser(path=self.dir)
-                self.ebs = parser.ebs
-                self.kpath = parser.kpath
-                self.structure = parser.structure
-            except Exception as e:
-                self.ebs = None
-                self.kpath = None
-                self.structure = None
-        return None
+            parser = None
+            parsed["structure"] = None
+
+        if parse_dos:
+            parsed["dos"] = getattr(parser, "dos", None)
+        if parse_ebs:
+            parsed["ebs"] = getattr(parser, "ebs", None)
+            parsed["kpath"] = getattr(parser, "kpath", None)
+        return parsed
     
-    def parse_frmsf(self):
+    def parse_frmsf(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
         """parses frmsf files. Needs to be finished
 
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
+
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
-        parser = frmsf.FrmsfParser(infile = 'in.frmsf')
+        if parsed is None:
+            parsed = {}
+        parser = self._reader("frmsf", lambda : frmsf.FrmsfParser(infile = 'in.frmsf'))
 
-        self.ebs = parser.ebs
-        self.kpath = parser.kpath
-        self.structure = parser.structure
-        self.dos = parser.dos
+        for name in ARTIFACTS:
+            parsed[name] = getattr(parser, name)
 
-        return None
+        return parsed
     
-    def parse_lobster(self):
+    def parse_lobster(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
         """parses lobster files
 
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
+
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
+        if parsed is None:
+            parsed = {}
         code_type = self.code.split("_")[1]
+        parse_dos = "dos" in artifacts
+        parse_ebs = "ebs" in artifacts or "kpath" in artifacts
         parser = lobster.LobsterParser(
                             dirname = self.dir, 
                             code = code_type,
-                            dos_interpolation_factor = None 
+                            dos_interpolation_factor = None,
+                            parse_ebs = parse_ebs,
+                            parse_dos = parse_dos,
+                            n_workers = self.n_workers,
                             )
 
-        self.ebs = parser.ebs
-        self.structure = parser.structure
-        self.kpath = parser.kpath
-        self.dos = parser.dos
+        parsed["structure"] = parser.structure
+        if parse_ebs:
+            parsed["ebs"] = getattr(parser, "ebs", None)
+            parsed["kpath"] = getattr(parser, "kpath", None)
+        if parse_dos:
+            parsed["dos"] = parser.dos
 
-        return None
+        return parsed
     
-    def parse_qe(self):
+    def parse_qe(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
         """parses qe files
 
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
+
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
+        if parsed is None:
+            parsed = {}
 
+        parse_dos = "dos" in artifacts
+        parse_ebs = "ebs" in artifacts
         parser = qe.QEParser(
                             dirname = self.dir,
                             scf_in_filename = "scf.in", 
                             bands_in_filename = "bands.in", 
                             pdos_in_filename = "pdos.in", 
                             kpdos_in_filename = "kpdos.in", 
-                            atomic_proj_xml = "atomic_proj.xml"
+                            atomic_proj_xml = "atomic_proj.xml",
+                            parse_ebs = parse_ebs,
+                            parse_dos = parse_dos,
+                            n_workers = self.n_workers,
                             )
 
-        self.ebs = parser.ebs
-        self.kpath = parser.kpath
-        self.structure = parser.structure
-        self.dos = parser.dos
-        return None
+        parsed["kpath"] = parser.kpath
+        parsed["structure"] = parser.structure
+        if parse_ebs:
+            parsed["ebs"] = parser.ebs
+        if parse_dos:
+            parsed["dos"] = parser.dos
+        return parsed
     
-    def parse_siesta(self):
+    def parse_siesta(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
         """parses siesta files. Needs to be finished
 
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
+
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
+        if parsed is None:
+            parsed = {}
         
+        parse_ebs = "ebs" in artifacts or "dos" in artifacts
         parser = siesta.SiestaParser(
-                            fdf_filename = f"{self.dir}{os.sep}SIESTA.fdf",
+                            fdf_file = f"{self.dir}{os.sep}SIESTA.fdf",
+                            parse_ebs = parse_ebs,
                             )
 
-        self.ebs = parser.ebs
-        self.kpath = parser.kpath
-        self.structure = parser.structure
-        self.dos = parser.dos
+        parsed["kpath"] = getattr(parser, "kpath", None)
+        parsed["structure"] = parser.structure
+        if parse_ebs:
+            parsed["ebs"] = getattr(parser, "ebs", None)
+            parsed["dos"] = getattr(parser, "dos", None)
 
-        return None
+        return parsed
 
-    def parse_vasp(self):
-        """parses vasp files
+    def parse_vasp(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
+        """parses vasp files. Only the files the requested objects need are read, 
+        the ebs reads OUTCAR, POSCAR, KPOINTS and PROCAR and the dos only vasprun.xml, 
+        or DOSCAR if CONFIG['vasp_dos_source'] is 'doscar' or vasprun.xml does not exist. 
+        KPOINTS, OUTCAR and vasprun.xml are read concurrently when n_workers is larger than 1
+
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
 
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
         """
+        if parsed is None:
+            parsed = {}
         
         outcar = f"{self.dir}{os.sep}OUTCAR"
         poscar = f"{self.dir}{os.sep}POSCAR"
         procar = f"{self.dir}{os.sep}PROCAR"
         kpoints = f"{self.dir}{os.sep}KPOINTS"
         vasprun = f"{self.dir}{os.sep}vasprun.xml"
+        doscar = f"{self.dir}{os.sep}DOSCAR"
 
-        repairhandle = UtilsProcar()
-        repairhandle.ProcarRepair(procar, procar)
-        
-        outcar = vasp.Outcar(outcar)
-
-        try:
-            poscar = vasp.Poscar(poscar,rotations = outcar.rotations)
-        except:
-            poscar = vasp.Poscar(poscar,rotations = None)
-
-        try:
-            kpoints = vasp.Kpoints(kpoints)
-            self.kpath = kpoints.kpath
-        except Exception as e:
-            self.kpath=None
-
-    
-
-        procar = vasp.Procar(
-                            filename=procar,
-                            structure=poscar.structure,
-                            reciprocal_lattice=poscar.structure.reciprocal_lattice,
-                            kpath=self.kpath,
-                            n_kx=outcar.n_kx,
-                            n_ky=outcar.n_ky,
-                            n_kz=outcar.n_kz,
-                            efermi=outcar.efermi,
-                            interpolation_factor=1
-                            )
-        
-        try:
-            vasprun = vasp.VaspXML(filename = vasprun)
-        except:
-            pass
-        
-        self.ebs = procar.ebs
-
-        self.structure = poscar.structure
-
-        try:
-            self.dos = vasprun.dos
-        except Exception as e:
-            self.dos = None
-
-        return None
-
-    def parse_dftbplus(self):
-        """parses DFTB+ files, these files do not have an array-like
-        structure, and the process is *slow* . 
+        def read_kpath():
+            try:
+                return vasp.Kpoints(kpoints).kpath
+            except Exception as e:
+                return None
+
+        def read_dos():
+            # DOSCAR is a lighter source of the dos than vasprun.xml
+            use_doscar = CONFIG.get("vasp_dos_source", "vasprun") == "doscar"
+            if use_doscar or (not os.path.exists(vasprun) and os.path.exists(doscar)):
+                try:
+                    return vasp.Doscar(filename = doscar).dos
+                except Exception as e:
+                    return None
+            try:
+                return vasp.VaspXML(filename = vasprun, sections=["dos", "structure"]).dos
+            except Exception as e:
+                return None
 
-        Then, they are converted to VASP-like files and parsed by the
-        standard `parse_vasp`
+        def read_poscar(outcar):
+            try:
+                return vasp.Poscar(poscar,rotations = outcar.rotations)
+            except:
+                return vasp.Poscar(poscar,rotations = None)
+
+        read_structure = "ebs" in artifacts or "structure" in artifacts
+        # The files are submitted at once and the results are awaited in a fixed order, 
+        # so the same file raises the error whatever the number of workers
+        with ConcurrentLoader(n_workers=self.n_workers) as loader:
+            if "ebs" in artifacts or "kpath" in artifacts:
+                loader.submit("kpath", read_kpath)
+            if "dos" in artifacts:
+                loader.submit("dos", read_dos)
+            if read_structure and "vasp_outcar" not in self._readers:
+                loader.submit("vasp_outcar", vasp.Outcar, outcar)
+
+            if read_structure:
+                # The malformed fields of the PROCAR are repaired by vasp.Procar while it is read
+                outcar = self._reader("vasp_outcar", lambda : loader.result("vasp_outcar"))
+                poscar = self._reader("vasp_poscar", lambda : read_poscar(outcar))
+                parsed["structure"] = poscar.structure
+
+            if "ebs" in artifacts or "kpath" in artifacts:
+                parsed["kpath"] = loader.result("kpath")
+
+            if "ebs" in artifacts:
+                procar = vasp.Procar(
+                                    filename=procar,
+                                    structure=poscar.structure,
+                                    reciprocal_lattice=poscar.structure.reciprocal_lattice,
+                                    kpath=parsed["kpath"],
+                                    n_kx=outcar.n_kx,
+                                    n_ky=outcar.n_ky,
+                                    n_kz=outcar.n_kz,
+                                    efermi=outcar.efermi,
+                                    interpolation_factor=1,
+                                    memmap_dir=self.memmap_dir,
+                                    use_cache=self.use_cache,
+                                    )
+                parsed["ebs"] = procar.ebs
+
+            if "dos" in artifacts:
+                parsed["dos"] = loader.result("dos")
+
+        return parsed
+
+    def parse_dftbplus(self, artifacts:List[str]=ARTIFACTS, parsed:dict=None):
+        """parses DFTB+ files. eigenvec.out and band.out are streamed into arrays, 
+        the k-points of the eigenvectors are decoded in parallel and the 
+        objects are built in memory
+
+        Parameters
+        ----------
+        artifacts : List[str], optional
+            The objects to parse, by default all of them
+        parsed : dict, optional
+            The dict the parsed objects are stored in, by default None
 
         Returns
         -------
-        None
-            None
+        Dict
+            The parsed objects
 
         """
-        # This creates the vasp files, if needed
+        if parsed is None:
+            parsed = {}
+
+        parse_ebs = "ebs" in artifacts
         parser = dftbplus.DFTBParser(dirname = self.dir,
                                      eigenvec_filename = 'eigenvec.out',
                                      bands_filename = 'band.out',
                                      detailed_out = 'detailed.out',
-                                     detailed_xml = 'detailed.xml'
+                                     detailed_xml = 'detailed.xml',
+                                     parse_ebs = parse_ebs,
+                                     n_workers = self.n_workers,
                                      )
-        
-        self.parse_vasp()
-        
-        return None
 
+        parsed["structure"] = parser.structure
+        parsed["kpath"] = parser.kpath
+        if parse_ebs:
+            parsed["ebs"] = parser.ebs
+        if "dos" in artifacts:
+            parsed["dos"] = None
+        return parsed
@@ -12,9 +12,26 @@ import xml.etree.ElementTree as ET
 import numpy as np
 
 from pyprocar.core import DensityOfStates, Structure, ElectronicBandStructure, KPath
+from pyprocar.io.loader import ConcurrentLoader
 
 
 HARTREE_TO_EV = 27.211386245988  #eV/Hartree
+
+# The indices in self.orbitals of the projections of a pdos file, by orbital name
+COLINEAR_PDOS_ORBITALS = {
+    's' : [0],
+    'p' : [1,2,3],
+    'd' : [4,5,6,7,8],
+}
+# The same for non colinear calculations, by orbital name and total angular momentum
+NONCOLINEAR_PDOS_ORBITALS = {
+    ('s', 0.5) : [0,1],
+    ('p', 0.5) : [2,3],
+    ('p', 1.5) : [4,5,6,7],
+    ('d', 0.5) : [2,3],
+    ('d', 1.5) : [8,9,10,11],
+    ('d', 2.5) : [12,13,14,15,16,17],
+}
 class QEParser():
     """The class is used to parse Quantum Expresso files. 
         The most important objects that comes from this parser are the .ebs and .dos
@@ -33,6 +50,15 @@ class QEParser():
             The kpdos filename, by default "kpdos.in"
         atomic_proj_xml : str, optional
             The atomic projection xml name. This is located in the where the outdir is and in the {prefix}.save directory, by default "atomic_proj.xml"
+        parse_ebs : bool, optional
+            Boolean to parse the projections and build the ebs, by default True. 
+            If False, atomic_proj.xml is not read and ebs is None
+        parse_dos : bool, optional
+            Boolean to parse the density of states, by default True. 
+            If False, the pdos files are not read and dos is None
+        n_workers : int, optional
+            The number of threads reading the projections and the pdos files concurrently, 
+            by default CONFIG['parser_workers']. 1 reads them serially
     """
 
     def __init__(self,
@@ -42,9 +68,14 @@ class QEParser():
                         pdos_in_filename:str = "pdos.in", 
                         kpdos_in_filename:str = "kpdos.in", 
                         atomic_proj_xml:str = "atomic_proj.xml", 
+                        parse_ebs:bool = True,
+                        parse_dos:bool = True,
+                        n_workers:int = None,
         ):
         
 
+        self.n_workers = n_workers
+
         # Handles the pathing to the files
         self.dirname, prefix, xml_root, atomic_proj_xml_filename, pdos_in_filename,bands_in_filename,proj_out_filename = self._initialize_filenames(dirname, scf_in_filename, bands_in_filename,pdos_in_filename)
         
@@ -56,16 +87,24 @@ class QEParser():
         self._parse_symmetries(main_xml_root=xml_root)
         
  
-        # Parsing projections spd array and spd phase arrays
-        if os.path.exists(atomic_proj_xml_filename):
-            self._parse_wfc_mapping(proj_out_filename=proj_out_filename)
-            self._parse_atomic_projections(atomic_proj_xml_filename=atomic_proj_xml_filename)
-
-        # Parsing density of states files
-        if os.path.exists(pdos_in_filename):
-            self.dos = self._parse_pdos(pdos_in_filename=pdos_in_filename,dirname=dirname)
-        else:
+        # The projections and the density of states only share the structural information, 
+        # they are read concurrently and awaited in this order
+        with ConcurrentLoader(n_workers=n_workers) as loader:
+            # Parsing projections spd array and spd phase arrays
+            if parse_ebs and os.path.exists(atomic_proj_xml_filename):
+                loader.submit("projections", self._parse_projections, 
+                              proj_out_filename=proj_out_filename, 
+                              atomic_proj_xml_filename=atomic_proj_xml_filename)
+
+            # Parsing density of states files
             self.dos = None
+            if parse_dos and os.path.exists(pdos_in_filename):
+                loader.submit("dos", self._parse_pdos, pdos_in_filename=pdos_in_filename, dirname=dirname)
+
+            if "projections" in loader:
+                loader.result("projections")
+            if "dos" in loader:
+                self.dos = loader.result("dos")
         # Parsing information related to the bandstructure calculations kpath and klabels
         self.kticks = None
         self.knames = None
@@ -80,6 +119,9 @@ class QEParser():
         #     self.is_dos_fermi_calc = True
         # if self.kpath is not None:
         # self.bands -= self.efermi
+        self.ebs = None
+        if not parse_ebs:
+            return None
         self.ebs = ElectronicBandStructure(
                                 kpoints=self.kpoints,
                                 n_kx=self.nkx,
@@ -204,9 +246,8 @@ class QEParser():
         energies, total_dos = self._parse_dos_total(dos_total_filename=f"{dirname}{os.sep}{self.pdos_prefix}.pdos_tot")
 
         # Finding all the density of states projections files
-        # print(self.wfc_filenames)
-        wfc_filenames = self._parse_available_wfc_filenames(dirname = self.dirname)
-        projected_dos, projected_labels = self._parse_dos_projections(wfc_filenames=wfc_filenames, n_energy = len(energies))    
+        wfc_index = self._index_wfc_files(dirname = self.dirname)
+        projected_dos, projected_labels = self._parse_dos_projections(wfc_index=wfc_index, n_energy = len(energies))    
         
         # print(projected_labels)
         dos = DensityOfStates(energies=energies,
@@ -255,129 +296,110 @@ class QEParser():
         energies -= self.efermi
         return energies, total_dos
    
-    def _parse_dos_projections(self,wfc_filenames,n_energy):
-        """Helper method to parse the dos projection files
+    def _parse_dos_projections(self,wfc_index,n_energy):
+        """Helper method to parse the dos projection files. 
+        The files are read on a thread pool and their projections are added to the 
+        projected dos array in the order of the index
 
         Parameters
         ----------
-        wfc_filenames : List[str]
-            A List of projection filenames.
+        wfc_index : Dict[str, Tuple]
+            The index of the projection files, see _index_wfc_files
         n_energy : int
             The number of energies for which the density of states is calculated at.
 
         Returns
         -------
-        _type_
-            _description_
+        Tuple[np.ndarray, List[str]]
+            The projected dos array and the orbital names
 
         Raises
         ------
         ValueError
-            _description_
+            If a pdos file is not found
         """
         n_principal_number = 1
         projected_dos_array =  np.zeros(shape=(self.n_atoms,n_principal_number,self.n_orbitals,self.n_spin,n_energy))
-        for filename in wfc_filenames[:]:
-            if not os.path.exists(filename):
-                raise ValueError('ERROR: pdos file not found')   
-            with open(filename) as f:
-                pdos_text = ''.join(f.readlines()[1:])
 
-            # -1 because indexing starts at 0
-            atom_num = int(re.findall("#(\d*)",filename)[0]) - 1
-            wfc_Name = re.findall("atm#\d*\(([a-zA-Z0-9]*)\)",filename)[0]
-            orbital_name = re.findall("wfc#\d*\(([_a-zA-Z0-9.]*)\)",filename)[0]
-            n_orbitial = len(self.orbitals)
-            
-
-            # For noncolinear caluclations
+        # The files which do not map to self.orbitals are not read.
+        # In the noncolinear case these are the files in the uncoupled basis
+        atom_nums = []
+        orbital_nums = []
+        filenames = []
+        for filename, (atom_num, wfc_num, l_orbital_name, tot_ang_mom) in wfc_index.items():
             if self.is_non_colinear:
-                # In the noncolinear case there are some files that are not used. They are in the uncoupled basis
-                try:
-                    tot_ang_mom = float(orbital_name.split('j')[-1])
-                except:
-                    continue
-                
-                # This controls the mapping from raw orbital projection data to structured orbital projection data
-                # as defined by the order in self.orbitals
-                l_orbital_name = orbital_name.split('_')[0]
-                if l_orbital_name == 's':
-                    if tot_ang_mom == 0.5:
-                        m_js = np.linspace(-0.5,0.5,2)
-                        orbital_nums = [0,1]
-                elif l_orbital_name == 'p':
-                    if tot_ang_mom == 0.5:
-                        m_js = np.linspace(-0.5,0.5,2)
-                        orbital_nums = [2,3]
-                    elif tot_ang_mom == 1.5:
-                        m_js = np.linspace(-1.5,1.5,4)
-                        orbital_nums = [4,5,6,7]
-                elif l_orbital_name == 'd':
-                    if tot_ang_mom == 0.5:
-                        m_js = np.linspace(-0.5,0.5,2)
-                        orbital_nums = [2,3]
-                    elif tot_ang_mom == 1.5:
-                        m_js = np.linspace(-1.5,1.5,4)
-                        orbital_nums = [8,9,10,11]
-                    elif tot_ang_mom == 2.5:
-                        m_js = np.linspace(-2.5,2.5,6)
-                        orbital_nums = [12,13,14,15,16,17]
-
-                # Filters unwanted empty character from the regular expression search
-                raw_energy_blocks = list(filter(None,re.findall('([\s\S]*?)(?=\n \n)',pdos_text)))
-
-                # Loop through the energies
-                for i_energy, raw_energy_block in enumerate(raw_energy_blocks[:]):
-                    #Strippng unwanted space characters before and after the block
-                    raw_energy_block =raw_energy_block.lstrip().rstrip()
-                    # Orbital_num is the index in the final array, i_orbital is the index in the raw_data
-                    for i_orbital,orbital_num in enumerate(orbital_nums):
-                        # Loop through spins
-                        for i_spin,spin_comp in enumerate([1,2,3]):
-                            # Totals
-                            # if i_spin == 0:
-                            #     projected_dos_array[atom_num,0,orbital_num,i_spin,i_energy] += float(raw_energy_block.split('\n')[0].split()[2+i_orbital])
-                            # # spin components
-                            # else:
-                            #     projected_dos_array[atom_num,0,orbital_num,i_spin,i_energy] += float(raw_energy_block.split('\n')[i_spin+1].split()[1+i_orbital])
-                                
-                            projected_dos_array[atom_num,0,orbital_num,spin_comp,i_energy] += float(raw_energy_block.split('\n')[i_spin+2].split()[1+i_orbital])
-                        
-            # For colinear calculations
+                orbitals = NONCOLINEAR_PDOS_ORBITALS.get((l_orbital_name, tot_ang_mom))
             else:
-                current_orbital_name =  orbital_name
-
-                # This controls the mapping from raw orbital projection data to structured orbital projection data
-                # as defined by the order in self.orbitals
-                if current_orbital_name == 's':
-                    m_s = np.linspace(0,0,1)
-                    orbital_nums = [0]
-                elif current_orbital_name == 'p':
-                    m_s = np.linspace(-1,1,3)
-                    orbital_nums = [1,2,3]
-                elif current_orbital_name == 'd':
-                    m_s = np.linspace(-2,2,5)
-                    orbital_nums = [4,5,6,7,8]
+                orbitals = COLINEAR_PDOS_ORBITALS.get(l_orbital_name)
+            if orbitals is None:
+                continue
+            atom_nums.append(atom_num)
+            orbital_nums.append(orbitals)
+            filenames.append(filename)
+
+        with ConcurrentLoader(n_workers=self.n_workers) as loader:
+            projections = loader.map(self._read_pdos_file, filenames)
+            for atom_num, orbitals, projection in zip(atom_nums, orbital_nums, projections):
+                # projection has the shape (n_orbitals of the file, n_spin components, n_energy)
+                n_orbital = len(orbitals)
+                n_rows = projection.shape[-1]
+                if self.is_non_colinear:
+                    projected_dos_array[atom_num,0,orbitals,1:4,:n_rows] += projection[:n_orbital]
+                else:
+                    projected_dos_array[atom_num,0,orbitals,:,:n_rows] += projection[:n_orbital]
 
-                # Filters unwanted empty character from the regular expression search
-                raw_energy_blocks = pdos_text.rstrip().split('\n')
+        if self.is_non_colinear:
+            projected_dos_array[:,:,:,0,:] = (projected_dos_array[:,:,:,1,:]**2 + projected_dos_array[:,:,:,2,:]**2 + projected_dos_array[:,:,:,3,:]**2)**0.5 
+        return projected_dos_array, self.orbital_names
 
-                # Loop through the energies
-                for i_energy, raw_energy_block in enumerate(raw_energy_blocks):
-                    raw_energy_block =raw_energy_block.lstrip().rstrip()
-                    raw_projections = raw_energy_block.split()[1+self.n_spin:]
+    def _read_pdos_file(self, filename):
+        """Helper method to read the projections of a pdos file
 
-                    # Orbital_num is the index in the final array, i_orbital is the index in the raw_data
-                    for i_orbital, orbital_num in enumerate(orbital_nums):
+        Parameters
+        ----------
+        filename : str
+            The pdos filename
 
-                        # Loop through spins
-                        for i_spin in range(self.n_spin):
-                            projected_dos_array[atom_num,0,orbital_num,i_spin,i_energy] += float(raw_projections[i_spin::self.n_spin][i_orbital])
+        Returns
+        -------
+        np.ndarray
+            The projections with the shape (n_orbitals of the file, n_spin components, n_energy).
+            For noncolinear calculations the spin components are the three spin directions
 
+        Raises
+        ------
+        ValueError
+            If the pdos file is not found
+        """
+        if not os.path.exists(filename):
+            raise ValueError('ERROR: pdos file not found')
 
         if self.is_non_colinear:
-            projected_dos_array[:,:,:,0,:] = (projected_dos_array[:,:,:,1,:]**2 + projected_dos_array[:,:,:,2,:]**2 + projected_dos_array[:,:,:,3,:]**2)**0.5 
-        return projected_dos_array, self.orbital_names
+            with open(filename) as f:
+                # Skips the header
+                f.readline()
+                pdos_text = f.read()
+            # Each energy is a block of lines ending with an empty line, 
+            # the spin components are on its third to fifth lines. 
+            # The text after the last empty line is not a complete block
+            raw_energy_blocks = [block.strip() for block in pdos_text.split('\n \n')[:-1]]
+            rows = [row for block in raw_energy_blocks if block for row in block.split('\n')[2:5]]
+            if len(rows) == 0:
+                return np.zeros(shape=(0,3,0))
+            n_columns = len(rows[0].split())
+            # The first column is not a projection
+            values = np.array(' '.join(rows).split()).reshape(-1, 3, n_columns)[:,:,1:].astype(np.float64)
+            return values.transpose(2,1,0)
+
+        values = np.loadtxt(filename, skiprows=1, ndmin=2)
+        if values.size == 0:
+            return np.zeros(shape=(0,self.n_spin,0))
+        # The energy and the local dos of each spin come before the projections, 
+        # which alternate between the spins
+        n_energy = values.shape[0]
+        values = values[:,1+self.n_spin:]
+        values = values[:,:values.shape[1] // self.n_spin * self.n_spin]
+        return values.reshape(n_energy, -1, self.n_spin).transpose(1,2,0)
 
     def getKpointLabels(self):
         """
@@ -524,8 +546,8 @@ class QEParser():
         
         return dirname, prefix, root, atomic_proj_xml, pdos_in_filename,bands_in_filename,proj_out_filename
 
-    def _parse_available_wfc_filenames(self, dirname):
-        """Helper method to parse the projection filename from the pdos.out file
+    def _index_wfc_files(self, dirname):
+        """Helper method to index the projection files of the pdos calculation with one directory scan
 
         Parameters
         ----------
@@ -534,13 +556,12 @@ class QEParser():
 
         Returns
         -------
-        List
-            Returns a list of projection file names
+        Dict[str, Tuple[int, int, str, float]]
+            Maps the projection filenames to their atom index, wfc number, 
+            orbital name and total angular momentum. The total angular momentum is 
+            None if the file is not in the coupled basis. The files are sorted by atom and wfc numbers
         """
-
-        wfc_filenames = []
-        tmp_wfc_filenames = []
-        atms_wfc_num = []
+        wfc_index = {}
 
         # Parsing projection filnames for identification information
         for file in os.listdir(f"{self.dirname}"):
@@ -550,23 +571,25 @@ class QEParser():
                 file.endswith(".projwfc_down") and not 
                 file.endswith(".projwfc_up")and not 
                 file.endswith(".xml")):
-                
+
+                match = re.search("_atm#([0-9]*)\(([A-Za-z]*[0-9]*)\)_wfc#([0-9]*)\(([_A-Za-z0-9.]*)\)", file)
+                if match is None:
+                    continue
+                atm_num, atm, wfc_num, wfc = match.groups()
+
+                # In the noncolinear case the orbital names have the total angular momentum, e.g d_j2.5
+                l_orbital_name = wfc.split('_')[0]
+                try:
+                    tot_ang_mom = float(wfc.split('j')[-1])
+                except ValueError:
+                    tot_ang_mom = None
+
+                # -1 because indexing starts at 0
                 filename = f"{self.dirname}{os.sep}{file}"
-                tmp_wfc_filenames.append(filename )
-            
-                atm_num = int(re.findall("_atm#([0-9]*)\(.*",filename)[0])
-                wfc_num = int(re.findall("_wfc#([0-9]*)\(.*",filename)[0])
-                wfc = re.findall("_wfc#[0-9]*\(([_A-Za-z0-9.]*)\).*",filename)[0]
-                atm = re.findall("_atm#[0-9]*\(([A-Za-z]*[0-9]*)\).*",filename)[0]
- 
-                atms_wfc_num.append((atm_num,atm,wfc_num,wfc))
-        
-        # sort density of states projections files by atom number
-        sorted_file_num = sorted(atms_wfc_num, key= lambda a: a[0])
-        for index in sorted_file_num:
-            wfc_filenames.append(f"{self.dirname}{os.sep}{self.pdos_prefix}.pdos_atm#{index[0]}({index[1]})_wfc#{index[2]}({index[3]})")
+                wfc_index[filename] = (int(atm_num) - 1, int(wfc_num), l_orbital_name, tot_ang_mom)
 
-        return wfc_filenames
+        # sort density of states projections files by atom number
+        return dict(sorted(wfc_index.items(), key= lambda item: item[1][:2]))
 
     def _parse_wfc_mapping(self, proj_out_filename):
         """Helper method which creates a mapping between wfc number and the orbtial and atom numbers
@@ -615,11 +638,13 @@ class QEParser():
 
         return None
 
-    def _parse_atomic_projections(self,atomic_proj_xml_filename):
-        """A Helper method to parse the atomic projection xml file
+    def _parse_projections(self, proj_out_filename, atomic_proj_xml_filename):
+        """Helper method to parse the wfc mapping and the atomic projections
 
         Parameters
         ----------
+        proj_out_filename : str
+            The proj out filename
         atomic_proj_xml_filename : str
             The atomic_proj.xml filename
 
@@ -628,17 +653,25 @@ class QEParser():
         None
             None
         """
-        atmProj_tree = ET.parse(atomic_proj_xml_filename)
-        atm_proj_root = atmProj_tree.getroot()
+        self._parse_wfc_mapping(proj_out_filename=proj_out_filename)
+        self._parse_atomic_projections(atomic_proj_xml_filename=atomic_proj_xml_filename)
+        return None
 
-        root_header = atm_proj_root.findall(".//HEADER")[0]
+    def _parse_atomic_projections(self,atomic_proj_xml_filename):
+        """A Helper method to parse the atomic projection xml file. 
+        The file is streamed one PROJS element at a time, so the tree is never fully in memory, 
+        and the projections of each k-point are decoded and scattered as whole blocks.
 
-        nbnd = int(root_header.get("NUMBER_OF_BANDS"))
-        nk = int(root_header.get("NUMBER_OF_K-POINTS"))
-        nwfc = int(root_header.get("NUMBER_OF_ATOMIC_WFC"))
-        norb = len(self.orbitals) 
-        natm = len(self.species)
+        Parameters
+        ----------
+        atomic_proj_xml_filename : str
+            The atomic_proj.xml filename
 
+        Returns
+        -------
+        None
+            None
+        """
         self.spd = np.zeros(shape = (self.n_k, self.n_band , self.n_spin ,self.n_atoms+1,self.n_orbitals + 2,))
 
         self.spd_phase = np.zeros(
@@ -647,54 +680,31 @@ class QEParser():
             ),
             dtype=np.complex_,
         )
-        # print(self.wfc_mapping)
-        ik = -1
-        for ieigenstate, eigenstates_element in enumerate(atm_proj_root.findall(".//EIGENSTATES")[0]):
-            # print(eigenstates_element.tag)
-            if eigenstates_element.tag == 'K-POINT':
 
+        wfc_atoms, wfc_orbitals = self._wfc_mapping_arrays()
+
+        nk = None
+        ik = -1
+        eigenstates = None
+        for event, element in ET.iterparse(atomic_proj_xml_filename, events=("start", "end")):
+            if event == "start":
+                if element.tag == "HEADER":
+                    nk = int(element.get("NUMBER_OF_K-POINTS"))
+                elif element.tag == "EIGENSTATES" and eigenstates is None:
+                    eigenstates = element
+                continue
+
+            if element.tag == 'K-POINT':
                 # sets ik back to zero for other spin channel
                 if ik==nk-1:
                     ik=0
                 else:
                     ik+=1
-                
-            if eigenstates_element.tag == 'PROJS':
-                
-                for i, projs_element in enumerate(eigenstates_element):
-                    iwfc = int(projs_element.get('index'))
-                    iorb = self.wfc_mapping[f"wfc_{iwfc}"]["orbital"]
-                    iatm = self.wfc_mapping[f"wfc_{iwfc}"]["atom"]
-
-                    if self.is_non_colinear:
-                        # Skips the total projections
-                        if projs_element.tag == "ATOMIC_WFC":
-                            ispin = int(projs_element.get('spin'))-1
-                            continue
-                        # Parse spin components. -1 to align index with spd array
-                        if projs_element.tag == "ATOMIC_SIGMA_PHI":
-                            ispin = int(projs_element.get('ipol'))
-                    else:
-                        if projs_element.tag == "ATOMIC_WFC":
-                            ispin = int(projs_element.get('spin'))-1
-                       
-
-                    projections = projs_element.text.split("\n")[1:-1]
-                    for iband, band_projection in enumerate(projections):
-                        real = float(band_projection.split()[0])
-                        imag = float(band_projection.split()[1])
-                        comp = complex(real , imag)
-                        comp_squared = np.absolute(comp)**2
-
-                        
-                        self.spd_phase[ik,iband,ispin,iatm - 1,iorb + 1] = complex(real , imag)
-
-                        # The spd will depend on of the calculation is a non colinear or colinear. Noncolinear
-                        if self.is_non_colinear:
-                            
-                            self.spd[ik,iband,ispin,iatm - 1,iorb + 1] = real
-                        else:
-                            self.spd[ik,iband,ispin,iatm - 1,iorb + 1] = comp_squared
+
+            elif element.tag == 'PROJS':
+                self._scatter_projections(element, ik, wfc_atoms, wfc_orbitals)
+                # The decoded k-points are dropped from the tree
+                eigenstates.clear()
 
         if self.is_non_colinear:
             
@@ -711,6 +721,96 @@ class QEParser():
 
         return None
                 
+    def _wfc_mapping_arrays(self):
+        """Helper method which converts the wfc mapping to index arrays
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The atom and orbital indices of the spd array for each wfc number, 
+            the wfc numbers not in the mapping are -1
+        """
+        iwfcs = [int(key.split("_")[1]) for key in self.wfc_mapping]
+        wfc_atoms = np.full(max(iwfcs) + 1, -1, dtype=int)
+        wfc_orbitals = np.full(max(iwfcs) + 1, -1, dtype=int)
+        for iwfc, key in zip(iwfcs, self.wfc_mapping):
+            wfc_atoms[iwfc] = self.wfc_mapping[key]["atom"] - 1
+            wfc_orbitals[iwfc] = self.wfc_mapping[key]["orbital"] + 1
+        return wfc_atoms, wfc_orbitals
+
+    def _scatter_projections(self, projs_element, ik, wfc_atoms, wfc_orbitals):
+        """Helper method which decodes the projections of a PROJS element 
+        and stores them in the spd and spd_phase arrays
+
+        Parameters
+        ----------
+        projs_element : xml.etree.ElementTree.Element
+            The PROJS element of a k-point
+        ik : int
+            The kpoint index
+        wfc_atoms : np.ndarray
+            The atom index of each wfc number
+        wfc_orbitals : np.ndarray
+            The orbital index of each wfc number
+
+        Returns
+        -------
+        None
+            None
+        """
+        iwfcs = []
+        ispins = []
+        texts = []
+        for projs in projs_element:
+            if self.is_non_colinear:
+                # Skips the total projections
+                if projs.tag == "ATOMIC_WFC":
+                    continue
+                # Parse spin components
+                if projs.tag == "ATOMIC_SIGMA_PHI":
+                    ispins.append(int(projs.get('ipol')))
+            elif projs.tag == "ATOMIC_WFC":
+                ispins.append(int(projs.get('spin'))-1)
+            else:
+                continue
+            iwfcs.append(int(projs.get('index')))
+            texts.append(projs.text)
+
+        if len(texts) == 0:
+            return None
+
+        iwfcs = np.array(iwfcs)
+        if iwfcs.max() >= len(wfc_atoms) or np.any(wfc_atoms[iwfcs] == -1):
+            missing = next(iwfc for iwfc in iwfcs if iwfc >= len(wfc_atoms) or wfc_atoms[iwfc] == -1)
+            raise KeyError(f"wfc_{missing}")
+        ispins = np.array(ispins)
+
+        # Each block has a (real, imaginary) pair per band
+        values = np.array(" ".join(texts).split(), dtype=np.float64).reshape(len(texts), -1, 2)
+        n_band = values.shape[1]
+        projections = values[:, :, 0] + 1j * values[:, :, 1]
+
+        iatoms = wfc_atoms[iwfcs]
+        iorbitals = wfc_orbitals[iwfcs]
+
+        # When several wfcs map to the same projection, the last one is kept
+        keys = np.stack([ispins, iatoms, iorbitals], axis=1)[::-1]
+        _, last = np.unique(keys, axis=0, return_index=True)
+        last = len(texts) - 1 - last
+
+        ispins = ispins[last]
+        iatoms = iatoms[last]
+        iorbitals = iorbitals[last]
+        projections = projections[last].T
+
+        self.spd_phase[ik][:n_band, ispins, iatoms, iorbitals] = projections
+        # The spd will depend on of the calculation is a non colinear or colinear. Noncolinear
+        if self.is_non_colinear:
+            self.spd[ik][:n_band, ispins, iatoms, iorbitals] = projections.real
+        else:
+            self.spd[ik][:n_band, ispins, iatoms, iorbitals] = np.absolute(projections)**2
+        return None
+
     def _parse_structure(self,main_xml_root):
         """A helper method to parse the structure tag of the main xml file
 
@@ -17,13 +17,16 @@ from pyprocar.core import DensityOfStates, Structure, ElectronicBandStructure, K
 HARTREE_TO_EV = 27.211386245988  #eV/Hartree
 class SiestaParser():
     def __init__(self,
-                    fdf_file:str ):
+                    fdf_file:str,
+                    parse_ebs:bool=True ):
         """The class is used to parse information in a siesta calculation
 
         Parameters
         ----------
         fdf_file : str
             The .fdf file that has the inputs for the Siesta calculation
+        parse_ebs : bool, optional
+            Boolean to parse the .bands file, by default True
         """
 
         self.dirname = os.path.dirname(fdf_file)
@@ -33,7 +36,8 @@ class SiestaParser():
         self._parse_fdf(fdf_file=fdf_file)
 
         # parses the bands file. This will initiate the bands array
-        self._parse_bands(bands_file=f'{self.dirname}{os.sep}{self.prefix}.bands')
+        if parse_ebs:
+            self._parse_bands(bands_file=f'{self.dirname}{os.sep}{self.prefix}.bands')
 
 
         # self._parse_struct_out(struct_out_file=f"{self.prefix}{os.sep}STRUCT_OUT")
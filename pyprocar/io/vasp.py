@@ -1,7 +1,10 @@
 import os
 import re
+import shutil
+import tempfile
 import collections
 import gzip
+import itertools
 from typing import List, Tuple, Union, Dict, Any, Optional
 from pathlib import Path
 from functools import cached_property
@@ -13,6 +16,8 @@ import xml.etree.ElementTree as ET
 
 from ..core import Structure, DensityOfStates, ElectronicBandStructure, KPath
 from ..utils.strings import remove_comment
+from ..utils.config import CONFIG
+from .cache import is_marked_clean, mark_clean
 
 class Outcar(collections.abc.Mapping):
     """
@@ -529,6 +534,135 @@ class Kpoints(collections.abc.Mapping):
         return self.variables.__len__()
 
 
+class Doscar(collections.abc.Mapping):
+    """
+    A class to parse the DOSCAR file of vasp and the DOSCAR.lobster file of lobster. 
+    The blocks are located from the number of energies of their headers and each 
+    block is decoded with a single vectorized call.
+
+    Parameters
+    ----------
+    filename : str, optional
+        The DOSCAR filename, by default "DOSCAR"
+    dos_interpolation_factor : float, optional
+        The interpolation factor of the density of states, by default 1.0
+    """
+    def __init__(self, filename:Union[str, Path]="DOSCAR", dos_interpolation_factor:float=1.0):
+
+        self.variables = {}
+        self.filename = filename
+        self.dos_interpolation_factor = dos_interpolation_factor
+        self.n_spin_components = None
+        self.efermi = None
+        self.total = None
+        self.projected = []
+        self.projected_labels = []
+        self._parse_doscar()
+
+    def _parse_doscar(self):
+        """A helper method to parse the DOSCAR
+
+        Raises
+        ------
+        ValueError
+            DOSCAR seems truncated
+        """
+        with open(self.filename, "r") as rf:
+            lines = rf.readlines()
+
+        if len(lines) < 6:
+            raise ValueError('DOSCAR seems truncated')
+
+        # The fourth number of the first line is 1, 2 or 4 for non spin-polarized, 
+        # spin-polarized and non colinear calculations
+        first_line = lines[0].split()
+        if len(first_line) >= 4 and first_line[3].isdigit():
+            self.n_spin_components = int(first_line[3])
+
+        # Skipping the first lines of header
+        iline = 5
+        while iline < len(lines) and len(lines[iline].strip()) != 0:
+            # The headers of the lobster blocks have more fields separated by ;
+            fields = lines[iline].split(";")
+            header = [float(x) for x in fields[0].split()]
+            ndos = int(header[2])
+            iline += 1
+
+            block_lines = lines[iline:iline + ndos]
+            if len(block_lines) < ndos:
+                raise ValueError('DOSCAR seems truncated')
+            block = np.array(" ".join(block_lines).split(), dtype=np.float64).reshape(ndos, -1)
+            iline += ndos
+
+            if self.total is None:
+                self.efermi = header[3]
+                self.total = block
+            else:
+                self.projected.append(block)
+                self.projected_labels.append([field.strip() for field in fields[1:]])
+
+        self.variables["efermi"] = self.efermi
+        self.variables["total"] = self.total
+        self.variables["projected"] = self.projected
+        return None
+
+    @property
+    def n_spin(self):
+        """The number of spin channels of the total density of states"""
+        if self.total.shape[1] == 5:
+            return 2
+        return 1
+
+    @property
+    def dos(self):
+        """The pyprocar.core.DensityOfStates Object, built without vasprun.xml. 
+        The projections have the orbitals of the DOSCAR columns
+
+        Returns
+        -------
+        pyprocar.core.DensityOfStates
+            Returns the pyprocar.core.DensityOfStates for the calculation
+        """
+        energies = self.total[:, 0] - self.efermi
+        total = self.total[:, 1:1 + self.n_spin].T
+
+        projected = None
+        if len(self.projected) != 0:
+            n_spin_components = self.n_spin_components
+            if n_spin_components is None:
+                n_spin_components = self.n_spin
+            # (n_atoms, n_energies, n_orbitals * n_spin_components), the spin components 
+            # of an orbital are adjacent columns
+            projected = np.array([block[:, 1:] for block in self.projected])
+            n_atoms, n_energies, n_columns = projected.shape
+            projected = projected.reshape(n_atoms, n_energies, n_columns // n_spin_components, n_spin_components)
+            # (n_atoms, n_principals, n_orbitals, n_spins, n_energies)
+            projected = projected.transpose(0, 2, 3, 1)[:, np.newaxis]
+            # The interpolation replaces the projections one at a time
+            if self.dos_interpolation_factor not in [1, 0]:
+                projected = projected.tolist()
+
+        return DensityOfStates(
+            energies=energies,
+            total=total,
+            efermi=self.efermi,
+            projected=projected,
+            interpolation_factor=self.dos_interpolation_factor,
+        )
+
+    def __contains__(self, x):
+        return x in self.variables
+
+    def __getitem__(self, x):
+        return self.variables.__getitem__(x)
+
+    def __iter__(self):
+        return self.variables.__iter__()
+
+    def __len__(self):
+        return self.variables.__len__()
+
+
 class Procar(collections.abc.Mapping):
     """
     A class to parse the PROCAR file
@@ -549,6 +683,19 @@ class Procar(collections.abc.Mapping):
         The fermi energy, by default None
     interpolation_factor : int, optional
         The interpolation factor, by default 1
+    stream : bool, optional
+        Boolean to parse the file in a single streaming pass that fills 
+        preallocated arrays instead of running regexes over the whole file, 
+        by default True. The malformed fields are repaired on the fly. Falls back 
+        to the full-file parser if the file has an unexpected layout.
+    memmap_dir : str, optional
+        Directory where the spd and projected arrays are allocated as memory-mapped 
+        .npy files instead of in memory, by default CONFIG['procar_memmap_dir']. 
+        Each Procar writes its files in its own subdirectory of it. 
+        Only used by the streaming parser.
+    use_cache : bool, optional
+        Boolean to remember in the cache directory the files that do not need repairs 
+        and to skip their repair scan, by default CONFIG['use_parser_cache']
         """
     def __init__(
         self,
@@ -561,11 +708,26 @@ class Procar(collections.abc.Mapping):
         n_kz:int=None,
         efermi:float=None,
         interpolation_factor:float=1,
+        stream:bool=True,
+        memmap_dir:str=None,
+        use_cache:bool=None,
     ):
         
         self.variables = {}
         self.filename = filename
+        self.stream = stream
+        if memmap_dir is None:
+            memmap_dir = CONFIG.get("procar_memmap_dir", None)
+        self.memmap_dir = memmap_dir
+        # the subdirectory of memmap_dir with the files of this Procar
+        self.memmap_path = None
+        if use_cache is None:
+            use_cache = CONFIG.get("use_parser_cache", False)
+        self.use_cache = use_cache
         self.meta_lines = []
+        self.source_filename = None
+        self.n_repaired_fields = 0
+        self.known_clean = False
 
         self.reciprocal_lattice = reciprocal_lattice
         self.file_str = None
@@ -573,6 +735,7 @@ class Procar(collections.abc.Mapping):
         self.kpoints = None
         self.bands = None
         self.occupancies = None
+        self.weights = None
         self.spd = None
         self.spd_phase = None
         self.kpointsCount = None
@@ -701,6 +864,7 @@ class Procar(collections.abc.Mapping):
         
         # checking that the file exist
         if os.path.isfile(self.filename):
+            self.source_filename = self.filename
             # Checking if compressed
             if self.filename[-2:] == "gz":
                 in_file = gzip.open(self.filename, mode="rt")
@@ -710,6 +874,7 @@ class Procar(collections.abc.Mapping):
 
         # otherwise a gzipped version may exist
         elif os.path.isfile(self.filename + ".gz"):
+            self.source_filename = self.filename + ".gz"
             in_file = gzip.open(self.filename + ".gz", mode="rt")
 
         else:
@@ -719,7 +884,60 @@ class Procar(collections.abc.Mapping):
 
     def _read(self):
         """
-        Helper method to parse the procar file
+        Helper method to parse the procar file. The streaming parser is tried 
+        first, the full-file parser (which is able to repair the file) is used 
+        if it is disabled or if the file has an unexpected layout.
+        """
+        if self.stream:
+            try:
+                self._read_stream()
+                return
+            except ValueError as e:
+                print(f"Streaming PROCAR parser failed: {e}")
+                print("Falling back to the full-file PROCAR parser")
+                self.meta_lines = []
+            # the arrays of the failed pass are released with the exception
+            if self.memmap_path is not None:
+                shutil.rmtree(self.memmap_path, ignore_errors=True)
+                self.memmap_path = None
+        # the full-file parser always works in memory
+        self.memmap_dir = None
+        self._read_full()
+        return
+
+    def _allocate(self, name, shape, dtype=float):
+        """
+        Helper method to allocate a zero filled array, which is a memory-mapped 
+        .npy file in the subdirectory of memmap_dir of this Procar if it was given, 
+        so several Procar can share memmap_dir
+
+        Parameters
+        ----------
+        name : str
+            The name of the array, used as filename
+        shape : Tuple[int]
+            The shape of the array
+        dtype : np.dtype, optional
+            The dtype of the array, by default float
+
+        Returns
+        -------
+        np.ndarray
+            The allocated array
+        """
+        if self.memmap_dir is None:
+            return np.zeros(shape=shape, dtype=dtype)
+        if self.memmap_path is None:
+            os.makedirs(self.memmap_dir, exist_ok=True)
+            self.memmap_path = tempfile.mkdtemp(prefix="procar-", dir=self.memmap_dir)
+        return np.lib.format.open_memmap(
+            os.path.join(self.memmap_path, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape
+        )
+
+    def _read_full(self):
+        """
+        Helper method to parse the procar file, the whole file is loaded as a 
+        string and parsed with regular expressions
         """
 
         rf = self._open_file()
@@ -745,13 +963,18 @@ class Procar(collections.abc.Mapping):
         # reading all the rest of the file to be parsed below
 
         self.file_str = rf.read()
-        if (
-            len(re.findall(r"(band\s)(\*\*\*)", self.file_str)) != 0
-            or len(re.findall(r"(\.\d{8})(\d{2}\.)", self.file_str)) != 0
-            or len(re.findall(r"(\d)-(\d)", self.file_str)) != 0
-            or len(re.findall(r"\*+", self.file_str)) != 0
-        ):
-            self.repair()
+        # files known to be clean are not scanned again
+        self.known_clean = self.use_cache and is_marked_clean(self.source_filename)
+        if not self.known_clean:
+            if (
+                len(re.findall(r"(band\s)(\*\*\*)", self.file_str)) != 0
+                or len(re.findall(r"(\.\d{8})(\d{2}\.)", self.file_str)) != 0
+                or len(re.findall(r"(\d)-(\d)", self.file_str)) != 0
+                or len(re.findall(r"\*+", self.file_str)) != 0
+            ):
+                self.repair()
+            elif self.use_cache:
+                mark_clean(self.source_filename)
 
         self._read_kpoints()
         self._read_bands()
@@ -761,6 +984,463 @@ class Procar(collections.abc.Mapping):
         rf.close()
         return
 
+    def _read_stream(self):
+        """
+        Helper method to parse the procar file in a single streaming pass.
+
+        The file is consumed one k-point block at a time and each block is
+        decoded straight into arrays preallocated from the counts in the
+        header, so the file is read only once and is never held in memory
+        as a string. The fields that VASP wrote malformed are repaired in the 
+        block being decoded, the file itself is not rewritten. A ValueError 
+        is raised if a block does not have the expected layout.
+        """
+        rf = self._open_file()
+        self.n_repaired_fields = 0
+        # the blocks of files known to be clean are decoded without trying to repair them
+        self.known_clean = self.use_cache and is_marked_clean(self.source_filename)
+        try:
+            with warnings.catch_warnings():
+                # np.fromstring only warns when it can not decode a whole block
+                warnings.filterwarnings(
+                    "error",
+                    message="string or file could not be read",
+                    category=DeprecationWarning,
+                )
+                self._read_stream_blocks(rf)
+        finally:
+            rf.close()
+
+        if self.n_repaired_fields != 0:
+            print(f"Repaired {self.n_repaired_fields} malformed fields of the PROCAR while reading it")
+        elif self.use_cache and not self.known_clean:
+            mark_clean(self.source_filename)
+        return
+
+    def _read_stream_blocks(self, rf):
+        """
+        Helper method that walks through the k-point blocks of an opened
+        procar file and fills the kpoints, weights, bands, occupancies, spd
+        and spd_phase arrays
+
+        Parameters
+        ----------
+        rf : TextIO
+            The opened procar file
+        """
+        # Line 1: PROCAR lm decomposed
+        self.meta_lines.append(rf.readline())
+        self.has_phase = "phase" in self.meta_lines[-1]
+        # Line 2: # of k-points:  816   # of bands:  52   # of ions:   8
+        self.meta_lines.append(rf.readline())
+        self.kpointsCount, self.bandsCount, self.ionsCount = map(
+            int, re.findall(r"#[^:]+:([^#]+)", self.meta_lines[-1])
+        )
+        nkpoints = self.kpointsCount
+        nbands = self.bandsCount
+
+        # blank lines do not carry any information
+        lines = (line for line in rf if not line.isspace())
+
+        kpoints = np.zeros(shape=(nkpoints, 3))
+        weights = np.zeros(shape=(nkpoints,))
+        bands = [np.zeros(shape=(nkpoints, nbands))]
+        occupancies = [np.zeros(shape=(nkpoints, nbands))]
+        spd = None
+        spd_phase = None
+        layout = None
+
+        ikpoint = 0
+        pending = None
+        while True:
+            line = next(lines, None) if pending is None else pending
+            pending = None
+            if line is None:
+                break
+
+            # the spin down channel starts by repeating the counts header
+            if line.startswith("#"):
+                if ikpoint != nkpoints or len(bands) == 2 or spd is None:
+                    raise ValueError("Unexpected header line: {}".format(line.strip()))
+                bands.append(np.zeros(shape=(nkpoints, nbands)))
+                occupancies.append(np.zeros(shape=(nkpoints, nbands)))
+                # the spin up channel is moved to the density/magnetization layout
+                # and the spin down channel is written directly into it
+                spd = self._spin_polarized_block("spd_density_magnetization", spd)
+                spd_target = spd[:, nbands:, :1]
+                if self.has_phase:
+                    spd_phase = self._spin_polarized_block("spd_phase_raw_density_magnetization", spd_phase)
+                    spd_phase_target = spd_phase[:, nbands:, :1]
+                ikpoint = 0
+                continue
+
+            if ikpoint == nkpoints:
+                raise ValueError("More k-points than stated in the header")
+            kpoint, weight = self._parse_kpoint_line(line)
+
+            if layout is None:
+                # the layout of a band block is taken from the first band
+                chunk = [next(lines, "")]
+                for line in lines:
+                    if line.startswith(("band", "#")) or line.lstrip().startswith("k-point"):
+                        pending = line
+                        break
+                    chunk.append(line)
+                layout = self._get_band_layout(chunk)
+                n_lines, n_rows = layout
+                n_blocks = n_rows // (self.ionsCount + 1)
+
+                spd = self._allocate(
+                    "spd",
+                    (nkpoints, nbands, n_blocks, self.ionsCount + 1, self.orbitalCount + 1),
+                )
+                spd_target = spd
+                if self.has_phase:
+                    spd_phase = self._allocate(
+                        "spd_phase_raw",
+                        (nkpoints, nbands, 1, self.ionsCount + 1, self.orbitalCount * 2),
+                    )
+                    spd_phase_target = spd_phase
+
+                n_missing = nbands * n_lines - len(chunk)
+                if pending is not None and n_missing > 0:
+                    chunk.append(pending)
+                    pending = None
+                    n_missing -= 1
+                chunk.extend(itertools.islice(lines, n_missing))
+            else:
+                chunk = list(itertools.islice(lines, nbands * layout[0]))
+
+            energies, occupations, spd_block, spd_phase_block = self._decode_kpoint_block(chunk, layout)
+
+            ispin = len(bands) - 1
+            if ispin == 0:
+                kpoints[ikpoint] = kpoint
+                weights[ikpoint] = weight
+            elif not np.array_equal(kpoints[ikpoint], kpoint):
+                raise RuntimeError("Bad Kpoints list.")
+            bands[ispin][ikpoint] = energies
+            occupancies[ispin][ikpoint] = occupations
+            spd_target[ikpoint] = spd_block
+            if self.has_phase:
+                spd_phase_target[ikpoint, :, 0] = spd_phase_block
+            ikpoint += 1
+
+        if layout is None or ikpoint != nkpoints:
+            raise ValueError("Number of k-points do not match with the header")
+
+        if len(bands) == 2:
+            self.ispin = 2
+            self._finish_spin_polarized_block(spd)
+            if self.has_phase:
+                self._finish_spin_polarized_block(spd_phase)
+            self.bands = np.stack(bands, axis=-1)
+        else:
+            self.ispin = 4 if spd.shape[2] == 4 else 1
+            self.bands = bands[0].reshape(nkpoints, nbands, 1)
+
+        self.kpoints = kpoints
+        self.weights = weights
+        self.occupancies = np.stack(occupancies, axis=-1)
+        self.spd = spd
+        if self.has_phase:
+            self.spd_phase = self._phase_to_complex(spd_phase)
+            self._release(spd_phase)
+        return
+
+    @staticmethod
+    def _release(array):
+        """
+        Helper method to remove the file behind an intermediate memory-mapped array. 
+        The array is unmapped first, a mapped file can not be removed on Windows, 
+        it must not be used afterwards
+
+        Parameters
+        ----------
+        array : np.ndarray
+            The intermediate array
+        """
+        if isinstance(array, np.memmap) and array.filename is not None:
+            filename = array.filename
+            if array._mmap is not None:
+                array._mmap.close()
+            os.remove(filename)
+        return
+
+    def _parse_kpoint_line(self, line):
+        """
+        Helper method to parse a k-point header. A typical k-point line is:
+        k-point    1 :    0.00000000 0.00000000 0.00000000  weight = 0.00003704
+
+        Parameters
+        ----------
+        line : str
+            The k-point line
+
+        Returns
+        -------
+        Tuple[np.ndarray, float]
+            The reduced coordinates of the k-point and its weight
+        """
+        if not line.lstrip().startswith("k-point"):
+            raise ValueError("Expected a k-point line, found: {}".format(line.strip()))
+        coordinates, _, weight = line.partition("weight")
+        try:
+            kpoint = self._decode_fields(coordinates.partition(":")[2], (3,))
+        except ValueError:
+            kpoint = self._repair_kpoint_fields(coordinates)
+        weight = weight.partition("=")[2]
+        weight = float(weight) if weight.strip() else 0.0
+        return kpoint, weight
+
+    def _repair_kpoint_fields(self, coordinates):
+        """
+        Helper method to decode the coordinates of a k-point line whose fields 
+        run into each other, for example 0.00000000-0.50000000 or 0.1234567810.00000000. 
+        VASP writes them in fixed columns: ' k-point ',I5,' :',3X,3F11.8
+
+        Parameters
+        ----------
+        coordinates : str
+            The k-point line up to the weight
+
+        Returns
+        -------
+        np.ndarray
+            The reduced coordinates of the k-point
+        """
+        start = coordinates.find(":") + 4
+        fields = [coordinates[start + 11 * i : start + 11 * (i + 1)] for i in range(3)]
+        try:
+            kpoint = np.array([float(x) for x in fields])
+        except ValueError:
+            raise ValueError("Malformed k-point line: {}".format(coordinates.strip()))
+        self.n_repaired_fields += 1
+        return kpoint
+
+    def _repair_fields(self, text, shape):
+        """
+        Helper method to decode numbers whose fixed width fields VASP wrote 
+        without separation (0.123-0.456) or overflowed (*******). 
+        The same replacements as UtilsProcar.ProcarRepair, an overflowed field is -10.0
+
+        Parameters
+        ----------
+        text : str
+            The text to decode
+        shape : Tuple[int]
+            The expected shape of the decoded array
+
+        Returns
+        -------
+        np.ndarray
+            The decoded array
+        """
+        text = re.sub(r"(\d)-(\d)", r"\1 -\2", text)
+        if "*" in text:
+            while "**" in text:
+                text = text.replace("**", "*")
+            text = text.replace("*", " -10.0000 ")
+        values = self._decode_fields(text, shape)
+        self.n_repaired_fields += 1
+        return values
+
+    def _decode_or_repair_fields(self, text, shape):
+        """
+        Helper method to decode whitespace separated numbers into an array, 
+        the text is repaired only if it can not be decoded as it is 
+        and the file is not known to be clean
+
+        Parameters
+        ----------
+        text : str
+            The text to decode
+        shape : Tuple[int]
+            The expected shape of the decoded array
+
+        Returns
+        -------
+        np.ndarray
+            The decoded array
+        """
+        if self.known_clean:
+            return self._decode_fields(text, shape)
+        try:
+            return self._decode_fields(text, shape)
+        except ValueError:
+            return self._repair_fields(text, shape)
+
+    def _get_band_layout(self, band_lines):
+        """
+        Helper method to find the layout of a band block from the 
+        non-blank lines of the first band
+
+        Parameters
+        ----------
+        band_lines : List[str]
+            The non-blank lines of the first band block
+
+        Returns
+        -------
+        Tuple[int, int]
+            The number of lines of a band block and the number of spd rows in it
+        """
+        if len(band_lines) < 3 or not band_lines[0].startswith("band") or not band_lines[1].startswith("ion"):
+            raise ValueError("Unexpected band block")
+        self._set_orbital_names(band_lines[1].split()[1:])
+
+        phase_headers = [i for i, x in enumerate(band_lines) if i > 1 and x.startswith("ion")]
+        if self.has_phase:
+            if len(phase_headers) != 1:
+                raise ValueError("Unexpected phase block")
+            n_rows = phase_headers[0] - 2
+            n_phase_rows = len(band_lines) - phase_headers[0] - 1
+            if n_phase_rows != self.ionsCount + 1 or not band_lines[-1].startswith("charge"):
+                raise ValueError("Unexpected phase block")
+        else:
+            if len(phase_headers) != 0:
+                raise ValueError("Unexpected phase block")
+            n_rows = len(band_lines) - 2
+
+        # one block of ions + total, or 4 for the non-collinear case
+        if n_rows not in (self.ionsCount + 1, 4 * (self.ionsCount + 1)):
+            raise ValueError("Unexpected number of ion lines in a band block")
+        return len(band_lines), n_rows
+
+    def _decode_kpoint_block(self, chunk, layout):
+        """
+        Helper method to decode the non-blank lines of all the bands of a 
+        k-point
+
+        Parameters
+        ----------
+        chunk : List[str]
+            The non-blank lines of the band blocks of a k-point
+        layout : Tuple[int, int]
+            The number of lines of a band block and the number of spd rows in it
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            The band energies, occupations, spd and phase blocks of the k-point
+        """
+        n_lines, n_rows = layout
+        nbands = self.bandsCount
+        natoms = self.ionsCount
+        if len(chunk) != nbands * n_lines:
+            raise ValueError("Truncated k-point block")
+        band_lines = chunk[::n_lines]
+        if not all(x.startswith("band") for x in band_lines) or not all(
+            x.startswith("ion") for x in chunk[1::n_lines]
+        ):
+            raise ValueError("Misaligned band blocks")
+
+        # band     1 # energy   -7.11986315 # occ.  1.00000000
+        band_fields = [x.split("#") for x in band_lines]
+        energies = np.array([float(x[1].split()[1]) for x in band_fields])
+        occupations = np.array([float(x[2].split()[1]) for x in band_fields])
+
+        # the total lines are kept with a 0 in place of the atom index
+        starts = range(0, len(chunk), n_lines)
+        spd_text = "".join(
+            itertools.chain.from_iterable(chunk[i + 2 : i + 2 + n_rows] for i in starts)
+        ).replace("tot", "0")
+        spd_block = self._decode_or_repair_fields(
+            spd_text,
+            (nbands, n_rows // (natoms + 1), natoms + 1, self.orbitalCount + 1),
+        )
+        if natoms == 1:
+            spd_block[:, :, 1, :] = spd_block[:, :, 0, :]
+
+        spd_phase_block = None
+        if self.has_phase:
+            start = 2 + n_rows + 1
+            phase_text = "".join(
+                itertools.chain.from_iterable(chunk[i + start : i + n_lines - 1] for i in starts)
+            )
+            charge_lines = chunk[n_lines - 1 :: n_lines]
+            if not all(x.startswith("charge") for x in charge_lines):
+                raise ValueError("Misaligned phase blocks")
+            charge_text = "".join(x[len("charge"):] for x in charge_lines)
+
+            spd_phase_block = np.zeros(shape=(nbands, natoms + 1, self.orbitalCount * 2))
+            spd_phase_block[:, :-1, :] = self._decode_or_repair_fields(
+                phase_text, (nbands, natoms, self.orbitalCount * 2)
+            )
+            # the charge line only has the real part
+            spd_phase_block[:, -1, 1::2] = self._decode_or_repair_fields(
+                charge_text, (nbands, self.orbitalCount)
+            )
+            if natoms == 1:
+                spd_phase_block[:, 1, :] = spd_phase_block[:, 0, :]
+
+        return energies, occupations, spd_block, spd_phase_block
+
+    @staticmethod
+    def _decode_fields(text, shape):
+        """
+        Helper method to decode whitespace separated numbers into an array 
+
+        Parameters
+        ----------
+        text : str
+            The text to decode
+        shape : Tuple[int]
+            The expected shape of the decoded array
+
+        Returns
+        -------
+        np.ndarray
+            The decoded array
+        """
+        try:
+            values = np.fromstring(text, sep=" ")
+        except DeprecationWarning:
+            values = None
+        if values is None or values.size != np.prod(shape):
+            raise ValueError("Malformed numerical fields")
+        return values.reshape(shape)
+
+    def _spin_polarized_block(self, name, up):
+        """
+        Helper method that allocates the (density, magnetization) array of a 
+        spin polarized calculation and copies the spin up channel into it
+
+        Parameters
+        ----------
+        name : str
+            The name of the array
+        up : np.ndarray
+            The spin up array. Has the shape [n_kpoints,n_band,1,...]
+
+        Returns
+        -------
+        np.ndarray
+            The spin polarized array. Has the shape [n_kpoints,2*n_band,2,...]
+        """
+        nkpoints, nbands = up.shape[:2]
+        full = self._allocate(name, (nkpoints, 2 * nbands, 2) + up.shape[3:], dtype=up.dtype)
+        full[:, :nbands, 0] = up[:, :, 0]
+        self._release(up)
+        return full
+
+    @staticmethod
+    def _finish_spin_polarized_block(full):
+        """
+        Helper method that fills the magnetization channel of a spin polarized 
+        array once both spin channels were read. Same layout as the full-file parser:
+        density = (up, down) and magnetization = (up, -down) along the bands axis
+
+        Parameters
+        ----------
+        full : np.ndarray
+            The spin polarized array. Has the shape [n_kpoints,2*n_band,2,...]
+        """
+        nbands = full.shape[1] // 2
+        full[:, :, 1] = full[:, :, 0]
+        full[:, nbands:, 1] *= -1
+        return
+
     def _read_kpoints(self):
         """
         Reads the k-point headers. A typical k-point line is:
@@ -945,25 +1625,7 @@ class Procar(collections.abc.Mapping):
         self.spd = re.findall(r"ion(.+)", self.file_str)
 
         # testing if the orbital names are known (the standard ones)
-        FoundOrbs = self.spd[0].split()
-        size = len(FoundOrbs)
-        # only the first 'size' orbital
-        StdOrbs = self.orbitalName[: size - 1] + self.orbitalName[-1:]
-        StdOrbs_short = self.orbitalName_short[: size -
-                                               1] + self.orbitalName_short[-1:]
-        StdOrbs_old = self.orbitalName_old[: size -
-                                           1] + self.orbitalName_old[-1:]
-        if (
-            FoundOrbs != (StdOrbs)
-            and FoundOrbs != (StdOrbs_short)
-            and FoundOrbs != (StdOrbs_old)
-            ):
-            print(
-                str(size) + " orbitals. (Some of) They are unknow (if "
-                "you did 'filter' them it is OK)."
-            )
-        self.orbitalCount = size
-        self.orbitalNames = self.spd[0].split()
+        self._set_orbital_names(self.spd[0].split())
 
         # Now reading the bulk of data
         # The case of just one atom is handled differently since the VASP
@@ -1063,6 +1725,36 @@ class Procar(collections.abc.Mapping):
 
         return
 
+    def _set_orbital_names(self, FoundOrbs):
+        """
+        Helper method to store the orbital names found in the header of an 
+        ion block, warning if they are not the standard ones
+
+        Parameters
+        ----------
+        FoundOrbs : List[str]
+            The orbital names of the ion header, without the 'ion' label
+        """
+        size = len(FoundOrbs)
+        # only the first 'size' orbital
+        StdOrbs = self.orbitalName[: size - 1] + self.orbitalName[-1:]
+        StdOrbs_short = self.orbitalName_short[: size -
+                                               1] + self.orbitalName_short[-1:]
+        StdOrbs_old = self.orbitalName_old[: size -
+                                           1] + self.orbitalName_old[-1:]
+        if (
+            FoundOrbs != (StdOrbs)
+            and FoundOrbs != (StdOrbs_short)
+            and FoundOrbs != (StdOrbs_old)
+            ):
+            print(
+                str(size) + " orbitals. (Some of) They are unknow (if "
+                "you did 'filter' them it is OK)."
+            )
+        self.orbitalCount = size
+        self.orbitalNames = list(FoundOrbs)
+        return
+
     def _read_phases(self):
         """
         Helped method to parse the projection phases
@@ -1149,24 +1841,7 @@ class Procar(collections.abc.Mapping):
                 self.ionsCount+1,
                 self.orbitalCount * 2,
             )
-        temp = np.zeros(
-            shape=(
-                self.spd_phase.shape[0],
-                self.spd_phase.shape[1],
-                self.spd_phase.shape[2],
-                self.spd_phase.shape[3],
-                int(self.spd_phase.shape[4] / 2) + 1,
-            ),
-            dtype=np.complex_,
-        )
-
-        for i in range(1, (self.orbitalCount) * 2 - 2, 2):
-            temp[:, :, :, :, (i + 1) // 2].real = self.spd_phase[:, :, :, :, i]
-            temp[:, :, :, :, (i + 1) //
-                 2].imag = self.spd_phase[:, :, :, :, i + 1]
-        temp[:, :, :, :, 0].real = self.spd_phase[:, :, :, :, 0]
-        temp[:, :, :, :, -1].real = self.spd_phase[:, :, :, :, -1]
-        self.spd_phase = temp
+        self.spd_phase = self._phase_to_complex(self.spd_phase)
 
         if self.ionsCount == 1:
             self.spd_phase = np.pad(self.spd_phase,((0,0),(0,0),(0,0),(0,1),(0,0)) , 'constant',constant_values=(0))
@@ -1174,6 +1849,41 @@ class Procar(collections.abc.Mapping):
 
         return
 
+    def _phase_to_complex(self, spd_phase):
+        """
+        Helper method to convert the real and imaginary columns of the 
+        phase blocks to a complex array
+
+        Parameters
+        ----------
+        spd_phase : np.ndarray
+            The raw phase array. Has the shape [n_kpoints,n_band,n_spins,n_atoms+1,2*n_orbitals]
+
+        Returns
+        -------
+        np.ndarray
+            The complex phase array. Has the shape [n_kpoints,n_band,n_spins,n_atoms+1,n_orbitals+1]
+        """
+        temp = self._allocate(
+            "spd_phase",
+            (
+                spd_phase.shape[0],
+                spd_phase.shape[1],
+                spd_phase.shape[2],
+                spd_phase.shape[3],
+                int(spd_phase.shape[4] / 2) + 1,
+            ),
+            dtype=np.complex_,
+        )
+
+        for i in range(1, (self.orbitalCount) * 2 - 2, 2):
+            temp[:, :, :, :, (i + 1) // 2].real = spd_phase[:, :, :, :, i]
+            temp[:, :, :, :, (i + 1) //
+                 2].imag = spd_phase[:, :, :, :, i + 1]
+        temp[:, :, :, :, 0].real = spd_phase[:, :, :, :, 0]
+        temp[:, :, :, :, -1].real = spd_phase[:, :, :, :, -1]
+        return temp
+
     def _spd2projected(self, spd, nprinciples=1):
         """
         Helpermethod to project the spd array to the projected array 
@@ -1218,14 +1928,15 @@ class Procar(collections.abc.Mapping):
             nbands = int(spd.shape[1] / 2)
         else:
             nbands = spd.shape[1]
-        projected = np.zeros(
-            shape=(nkpoints, nbands, natoms, nprinciples, norbitals, nspins),
+        name = "projected_phase" if np.iscomplexobj(spd) else "projected"
+        projected = self._allocate(
+            name,
+            (nkpoints, nbands, natoms, nprinciples, norbitals, nspins),
             dtype=spd.dtype,
         )
 
-        temp_spd = spd.copy()
         # (nkpoints,nbands, nspin, natom, norbital)
-        temp_spd = np.swapaxes(temp_spd, 2, 4)
+        temp_spd = np.swapaxes(spd, 2, 4)
         # (nkpoints,nbands, norbital , natom , nspin)
         temp_spd = np.swapaxes(temp_spd, 2, 3)
         # (nkpoints,nbands, natom, norbital, nspin)
@@ -1361,6 +2072,99 @@ class Procar(collections.abc.Mapping):
         return self.variables.__len__()
 
 
+# The headers of vasprun.xml always decoded by VaspXML.parse_vasprun_stream, 
+# they are small and give the sizes of the arrays
+VASPXML_STREAM_HEADERS = ("kpoints", "parameters", "atominfo")
+# The children of a calculation tag which are not decoded as general arrays. 
+# The section of a varray or a separator is its name attribute, 
+# e.g. 'forces', 'stress' or 'orbital magnetization'
+VASPXML_CALCULATION_SECTIONS = ("scstep", "structure", "varray", "separator")
+
+class _XMLArrayBuffer:
+    """A helper class to decode the nested <set> tags of an <array> 
+    of vasprun.xml into a numpy array, one innermost <set> at a time
+
+    Parameters
+    ----------
+    element : xml.etree.ElementTree.Element
+        The array element, its dimension and field tags are read when the first set opens
+    sizes : dict
+        The expected size of the dimensions by name, used to preallocate the array.
+        The array grows if a dimension is larger than expected
+    """
+    def __init__(self, element, sizes:dict):
+        self.element = element
+        self.sizes = sizes
+        self.dimensions = None
+        self.fields = None
+        self.data = None
+        # index of the open sets and number of sets seen at each depth
+        self.index = []
+        self.counts = [0]
+        self.extent = None
+
+    def open_set(self):
+        """Registers the start of a set tag
+        """
+        if self.dimensions is None:
+            self.dimensions = [x.text.strip() for x in self.element.findall("dimension")]
+            self.fields = [x.text.strip(" ") for x in self.element.findall("field")]
+        depth = len(self.index)
+        self.index.append(self.counts[depth])
+        self.counts[depth] += 1
+        if len(self.counts) == depth + 1:
+            self.counts.append(0)
+        self.counts[depth + 1] = 0
+
+    def close_set(self, element):
+        """Decodes the <r> rows of a set tag, if any, into the array
+
+        Parameters
+        ----------
+        element : xml.etree.ElementTree.Element
+            The set element
+        """
+        rows = [x.text for x in element if x.tag == "r"]
+        if len(rows) != 0:
+            # the outermost set wraps the whole array
+            index = tuple(self.index[1:])
+            block = np.fromstring(" ".join(rows), sep=" ").reshape(len(rows), -1)
+            self._store(index, block)
+        self.index.pop()
+
+    def _store(self, index, block):
+        if self.data is None:
+            # the set levels match the dimensions from the outermost to the second
+            level_dimensions = self.dimensions[:0:-1]
+            if len(level_dimensions) != len(index):
+                level_dimensions = [None]*len(index)
+            shape = [self.sizes.get(x, 1) for x in level_dimensions]
+            self.data = np.zeros(shape=tuple(shape) + block.shape)
+            self.extent = [0]*len(index)
+        if any(i >= n for i, n in zip(index, self.data.shape)):
+            shape = [max(2*n, i + 1) if i >= n else n for i, n in zip(index, self.data.shape)]
+            data = np.zeros(shape=tuple(shape) + block.shape)
+            data[tuple(slice(0, n) for n in self.data.shape)] = self.data
+            self.data = data
+        self.data[index] = block
+        self.extent = [max(n, i + 1) for i, n in zip(index, self.extent)]
+
+    def to_dict(self):
+        """The decoded array in the format of VaspXML.get_general
+
+        Returns
+        -------
+        dict
+            The fields as info, the dimensions and the array as data
+        """
+        if self.data is None:
+            data = np.zeros(shape=(0, len(self.fields or [])))
+        elif list(self.data.shape[:len(self.extent)]) != self.extent:
+            data = self.data[tuple(slice(0, n) for n in self.extent)].copy()
+        else:
+            data = self.data
+        return {"info": self.fields, "dimensions": self.dimensions, "data": data}
+
 class VaspXML(collections.abc.Mapping):
     """A class to parse the vasprun xml file
 
@@ -1370,6 +2174,12 @@ class VaspXML(collections.abc.Mapping):
         The vasprun.xml filename, by default "vasprun.xml"
     dos_interpolation_factor : float, optional
         The interpolation factor, by default None
+    sections : List[str], optional
+        The vasprun.xml tags to decode, e.g. ['dos'] or ['eigenvalues','structure'], 
+        the varrays and separators of the calculations by their name, e.g. ['forces','stress']. 
+        If given, the file is parsed incrementally and the arrays are decoded into numpy arrays, 
+        the other sections are skipped. The fermi energy is read from the 'dos' section, 
+        the structures from the 'structure' section. By default None, the whole file is parsed
 
     Raises
     ------
@@ -1378,10 +2188,12 @@ class VaspXML(collections.abc.Mapping):
     """
     def __init__(self, 
                 filename="vasprun.xml", 
-                dos_interpolation_factor:float=1.0):
+                dos_interpolation_factor:float=1.0,
+                sections:List[str]=None):
         
         self.variables = {}
         self.dos_interpolation_factor = dos_interpolation_factor
+        self.sections = sections
 
         if not os.path.isfile(filename):
             raise ValueError("File not found " + filename)
@@ -1390,7 +2202,10 @@ class VaspXML(collections.abc.Mapping):
 
         self.data = self.read()
 
-        spins = list(self.data["general"]["dos"]["total"]["array"]["data"].keys())
+        if "dos" in self.data["general"]:
+            spins = self._array_labels(self.data["general"]["dos"]["total"]["array"]["data"])
+        else:
+            spins = []
         if len(spins)==4:
             self.is_noncolinear = True
             self.spins_dict = {"spin 1": "Spin-Total", 
@@ -1412,8 +2227,17 @@ class VaspXML(collections.abc.Mapping):
             Returns a dict of information about the calculation.
 
         """
+        if self.sections is not None:
+            return self.parse_vasprun_stream(self.filename, self.sections)
         return self.parse_vasprun(self.filename)
 
+    def _array_labels(self, data, label="spin"):
+        """The labels of the outermost sets of an array, 
+        the comments of the sets or the labels of the first axis of a streamed array"""
+        if isinstance(data, np.ndarray):
+            return [f"{label} {i + 1}" for i in range(data.shape[0])]
+        return list(data.keys())
+
     @property
     def bands(self):
         """ Parses the electronic bands
@@ -1423,6 +2247,16 @@ class VaspXML(collections.abc.Mapping):
         np.ndarray
             The electronic bands
         """
+        eigen_array = self.data["general"]["eigenvalues"]["array"]["data"]
+        if isinstance(eigen_array, np.ndarray):
+            # spin, kpoint, band, field
+            eigen_values = {}
+            for ispin, spin in enumerate(self._array_labels(eigen_array)):
+                eigen_values[spin] = {}
+                eigen_values[spin]["eigen_values"] = eigen_array[ispin, :, :, 0].T - self.fermi
+                eigen_values[spin]["occupancies"] = eigen_array[ispin, :, :, 1].T.copy()
+            return eigen_values
+
         spins = list(self.data["general"]["eigenvalues"]
                      ["array"]["data"].keys())
         kpoints_list = list(
@@ -1464,35 +2298,33 @@ class VaspXML(collections.abc.Mapping):
         """
         # projected[iatom][ikpoint][iband][iprincipal][iorbital][ispin]
         labels = self.data["general"]["projected"]["array"]["info"]
-        spins = list(self.data["general"]["projected"]["array"]["data"].keys())
-        kpoints_list = list(
-            self.data["general"]["projected"]["array"]["data"][spins[0]].keys()
-        )
-        bands_list = list(
-            self.data["general"]["projected"]["array"]["data"][spins[0]][
-                kpoints_list[0]
-            ][kpoints_list[0]].keys()
-        )
         bands_projected = {"labels": labels}
-
-        nspins = len(spins)
-        nkpoints = len(kpoints_list)
-        nbands = len(bands_list)
+        projected_array = self.data["general"]["projected"]["array"]["data"]
         norbitals = len(labels)
         natoms = self.initial_structure.natoms
-        bands_projected["projection"] = np.zeros(
-            shape=(nspins, nkpoints, nbands, natoms, norbitals)
-        )
-        for ispin, spn in enumerate(spins):
-            for ikpoint, kpt in enumerate(kpoints_list):
-                for iband, bnd in enumerate(bands_list):
-                    bands_projected["projection"][
-                        ispin, ikpoint, iband, :, :
-                    ] = np.array(
-                        self.data["general"]["projected"]["array"]["data"][spn][kpt][
-                            kpt
-                        ][bnd][bnd]
-                    )
+        if isinstance(projected_array, np.ndarray):
+            # spin, kpoint, band, ion, orbital
+            nspins, nkpoints, nbands = projected_array.shape[:3]
+            bands_projected["projection"] = projected_array
+        else:
+            spins = list(projected_array.keys())
+            kpoints_list = list(projected_array[spins[0]].keys())
+            bands_list = list(
+                projected_array[spins[0]][kpoints_list[0]][kpoints_list[0]].keys()
+            )
+
+            nspins = len(spins)
+            nkpoints = len(kpoints_list)
+            nbands = len(bands_list)
+            bands_projected["projection"] = np.zeros(
+                shape=(nspins, nkpoints, nbands, natoms, norbitals)
+            )
+            for ispin, spn in enumerate(spins):
+                for ikpoint, kpt in enumerate(kpoints_list):
+                    for iband, bnd in enumerate(bands_list):
+                        bands_projected["projection"][
+                            ispin, ikpoint, iband, :, :
+                        ] = np.array(projected_array[spn][kpt][kpt][bnd][bnd])
         # ispin, ikpoint, iband, iatom, iorbital
         bands_projected["projection"] = np.swapaxes(
             bands_projected["projection"], 0, 3)
@@ -1514,16 +2346,21 @@ class VaspXML(collections.abc.Mapping):
         tuple
             Returns the dos_total info as a dict and the a list of labels
         """
-        spins = list(self.data["general"]["dos"]
-                     ["total"]["array"]["data"].keys())
-        energies = np.array(
-            self.data["general"]["dos"]["total"]["array"]["data"][spins[0]]
-        )[:, 0]
+        total_array = self.data["general"]["dos"]["total"]["array"]["data"]
+        spins = self._array_labels(total_array)
+        if isinstance(total_array, np.ndarray):
+            # spin, gridpoint, field
+            dos_total = {"energies": total_array[0, :, 0].copy()}
+            for ispin, spin_name in enumerate(spins):
+                dos_total[self.spins_dict[spin_name]] = total_array[ispin, :, 1]
+            return dos_total, list(dos_total.keys())
+
+        energies = np.array(total_array[spins[0]])[:, 0]
         dos_total = {"energies": energies}
 
         for spin_name in spins:
             dos_total[self.spins_dict[spin_name]] = np.array(
-                self.data["general"]["dos"]["total"]["array"]["data"][spin_name]
+                total_array[spin_name]
             )[:, 1]
 
         return dos_total, list(dos_total.keys())
@@ -1549,9 +2386,17 @@ class VaspXML(collections.abc.Mapping):
             ion_list = [
                 "ion %s" % str(x + 1) for x in atoms
             ]  # using this name as vasrun.xml uses ion #
+            partial_array = self.data["general"]["dos"]["partial"]["array"]["data"]
             for i in range(len(ion_list)):
                 iatom = ion_list[i]
                 name = self.initial_structure.atoms[atoms[i]] + str(atoms[i])
+                if isinstance(partial_array, np.ndarray):
+                    # ion, spin, gridpoint, field
+                    atom_array = partial_array[atoms[i]]
+                    dos_projected[name] = {"energies": atom_array[0, :, 0].copy()}
+                    for ispin, spin_name in enumerate(self._array_labels(atom_array)):
+                        dos_projected[name][self.spins_dict[spin_name]] = atom_array[ispin, :, 1:]
+                    continue
                 spins = list(
                     self.data["general"]["dos"]["partial"]["array"]["data"][
                         iatom
@@ -2034,189 +2879,371 @@ class VaspXML(collections.abc.Mapping):
         tree = ET.parse(vasprun)
         root = tree.getroot()
 
-        calculation = []
-        structures = []
-        forces = []
-        stresses = []
-        orbital_magnetization = {}
-        run_info = {}
-        incar = {}
-        general = {}
-        kpoints_info = {}
-        vasp_params = {}
-        kpoints_list = []
-        k_weights = []
-        atom_info = {}
+        ret = self._empty_vasprun_data()
         for ichild in root:
-
-            if ichild.tag == "generator":
+            if ichild.tag == "calculation":
                 for ielement in ichild:
-                    run_info[ielement.attrib["name"]] = ielement.text
-
-            elif ichild.tag == "incar":
-                incar = self.get_params(ichild, incar)
+                    self._parse_calculation_element(ielement, ret)
+            else:
+                self._parse_root_element(ichild, ret)
+            # NEED TO ADD ORBITAL MAGNETIZATION
 
-            # Skipping 1st structure which is primitive cell
-            elif ichild.tag == "kpoints":
+        return ret
 
-                for ielement in ichild:
-                    if ielement.items()[0][0] == "param":
-                        kpoints_info["mode"] = ielement.items()[0][1]
-                        if kpoints_info["mode"] == "listgenerated":
-                            kpoints_info["kpoint_vertices"] = []
-                            for isub in ielement:
-
-                                if isub.attrib == "divisions":
-                                    kpoints_info["ndivision"] = int(isub.text)
-                                else:
-                                    if len(isub.text.split()) != 3:
-                                        continue
-                                    kpoints_info["kpoint_vertices"].append(
-                                        [float(x) for x in isub.text.split()]
-                                    )
-                        else:
-                            for isub in ielement:
-                                if isub.attrib["name"] == "divisions":
-                                    kpoints_info["kgrid"] = [
-                                        int(x) for x in isub.text.split()
-                                    ]
-                                elif isub.attrib["name"] == "usershift":
-                                    kpoints_info["user_shift"] = [
-                                        float(x) for x in isub.text.split()
-                                    ]
-                                elif isub.attrib["name"] == "genvec1":
-                                    kpoints_info["genvec1"] = [
-                                        float(x) for x in isub.text.split()
-                                    ]
-                                elif isub.attrib["name"] == "genvec2":
-                                    kpoints_info["genvec2"] = [
-                                        float(x) for x in isub.text.split()
-                                    ]
-                                elif isub.attrib["name"] == "genvec3":
-                                    kpoints_info["genvec3"] = [
-                                        float(x) for x in isub.text.split()
-                                    ]
-                                elif isub.attrib["name"] == "shift":
-                                    kpoints_info["shift"] = [
-                                        float(x) for x in isub.text.split()
-                                    ]
-
-                    elif ielement.items()[0][1] == "kpointlist":
-                        for ik in ielement:
-                            kpoints_list.append([float(x)
-                                                 for x in ik.text.split()])
-                        kpoints_list = array(kpoints_list)
-                    elif ielement.items()[0][1] == "weights":
-                        for ik in ielement:
-                            k_weights.append(float(ik.text))
-                        k_weights = array(k_weights)
-
-            # Vasp Parameters
-            elif ichild.tag == "parameters":
-                vasp_params = self.get_params(ichild, vasp_params)
-
-            # Atom info
-            elif ichild.tag == "atominfo":
+    def parse_vasprun_stream(self, vasprun, sections):
+        """Parses vasprun.xml incrementally with ET.iterparse, only the requested 
+        sections are decoded. The arrays of eigenvalues, projected, dos and the other 
+        <calculation> children are decoded straight into numpy buffers, which replace 
+        the nested dicts of parse_vasprun in data[...]["array"]["data"].
+        Every element is cleared once it is used.
 
-                for ielement in ichild:
-                    if ielement.tag == "atoms":
-                        atom_info["natom"] = int(ielement.text)
-                    elif ielement.tag == "types":
-                        atom_info["nspecies"] = int(ielement.text)
-                    elif ielement.tag == "array":
-                        if ielement.attrib["name"] == "atoms":
-                            for isub in ielement:
-                                if isub.tag == "set":
-                                    atom_info["symbols"] = []
-                                    for isym in isub:
-                                        atom_info["symbols"].append(
-                                            isym[0].text)
-                        elif ielement.attrib["name"] == "atomtypes":
-                            atom_info["atom_types"] = {}
-                            for isub in ielement:
-                                if isub.tag == "set":
-                                    for iatom in isub:
-                                        atom_info["atom_types"][iatom[1].text] = {}
-                                        atom_info["atom_types"][iatom[1].text][
-                                            "natom_per_specie"
-                                        ] = int(iatom[0].text)
-                                        atom_info["atom_types"][iatom[1].text][
-                                            "mass"
-                                        ] = float(iatom[2].text)
-                                        atom_info["atom_types"][iatom[1].text][
-                                            "valance"
-                                        ] = float(iatom[3].text)
-                                        atom_info["atom_types"][iatom[1].text][
-                                            "pseudopotential"
-                                        ] = iatom[4].text.strip()
-
-            elif ichild.tag == "structure":
-                if ichild.attrib["name"] == "initialpos":
-                    initial_pos = self.get_structure(ichild)
-                elif ichild.attrib["name"] == "finalpos":
-                    final_pos = self.get_structure(ichild)
-
-            elif ichild.tag == "calculation":
-                for ielement in ichild:
-                    if ielement.tag == "scstep":
-                        calculation.append(self.get_scstep(ielement))
-                    elif ielement.tag == "structure":
-                        structures.append(self.get_structure(ielement))
-                    elif ielement.tag == "varray":
-                        if ielement.attrib["name"] == "forces":
-                            forces.append(self.get_varray(ielement))
-                        elif ielement.attrib["name"] == "stress":
-                            stresses.append(self.get_varray(ielement))
-
-                    # elif ielement.tag == 'eigenvalues':
-                    #     for isub in ielement[0] :
-                    #         if isub.tag == 'set':
-                    #             for iset in isub :
-                    #                 eigen_values[iset.attrib['comment']] = {}
-                    #                 for ikpt in iset :
-                    #                     eigen_values[iset.attrib['comment']][ikpt.attrib['comment']] = get_varray(ikpt)
-
-                    elif ielement.tag == "separator":
-                        if ielement.attrib["name"] == "orbital magnetization":
-                            for isub in ielement:
-                                orbital_magnetization[isub.attrib["name"]] = [
-                                    float(x) for x in isub.text.split()
-                                ]
+        Parameters
+        ----------
+        vasprun : str
+            The vasprun.xml filename
+        sections : List[str]
+            The xml tags to decode, the varrays and separators of the calculations by their name 
+            (e.g. 'forces', 'stress', 'orbital magnetization'). The small headers in 
+            VASPXML_STREAM_HEADERS are always decoded
 
-                    # elif ielement.tag == 'dos':
-                    #     for isub in ielement :
-                    #         if 'name' in isub.attrib:
-                    #             if isub.attrib['name'] == 'efermi' :
-                    #                 dos['efermi'] = float(isub.text)
-                    #             else :
-                    #                 dos[isub.tag] = {}
-                    #                 dos[isub.tag]['info'] = []
-                    #               for iset in isub[0]  :
-                    #                   if iset.tag == 'set' :
-                    #                       for isub_set in iset:
-                    #                           dos[isub.tag] = get_set(isub_set,dos[isub.tag])
-                    #                   elif iset.tag == 'field' :
-                    #                       dos[isub.tag]['info'].append(iset.text.strip(' '))
+        Returns
+        -------
+        dict
+            Returns a dict of information about the calculation.
+        """
+        sections = set(sections).union(VASPXML_STREAM_HEADERS)
+        ret = self._empty_vasprun_data()
+
+        context = ET.iterparse(vasprun, events=("start", "end"))
+        _, root = next(context)
+        # parallel stacks of the open elements below root and of how they are handled.
+        # keep: decoded when the subtree ends, stream: decoded set by set, skip: discarded
+        elements = []
+        modes = []
+        buffers = []
+        for event, elem in context:
+            parent_mode = modes[-1] if modes else None
+            # fast path of the skipped sections and of the rows, the bulk of the file
+            if event == "start":
+                if parent_mode == "skip" or elem.tag == "r":
+                    elements.append(elem)
+                    modes.append(parent_mode)
+                    continue
+            elif len(modes) > 1 and (modes[-1] == "skip" or elem.tag == "r"):
+                elements.pop()
+                mode = modes.pop()
+                if mode == "skip":
+                    elem.clear()
+                    if modes[-1] == "skip":
+                        elements[-1].clear()
+                continue
+            if event == "start":
+                if parent_mode is None:
+                    if elem.tag == "calculation":
+                        mode = "calculation"
                     else:
-                        general[ielement.tag] = {}
-                        general[ielement.tag] = self.get_general(
-                            ielement, general[ielement.tag]
-                        )
-            # NEED TO ADD ORBITAL MAGNETIZATION
+                        mode = "keep" if elem.tag in sections else "skip"
+                elif parent_mode == "calculation":
+                    section = elem.tag
+                    if elem.tag in ("varray", "separator"):
+                        section = elem.attrib.get("name", elem.tag)
+                    if section not in sections:
+                        mode = "skip"
+                    elif elem.tag in VASPXML_CALCULATION_SECTIONS:
+                        mode = "keep"
+                    else:
+                        mode = "stream"
+                        ret["general"][elem.tag] = {}
+                else:
+                    mode = parent_mode
+
+                if mode == "stream" and elem.tag == "array":
+                    buffers.append(_XMLArrayBuffer(elem, self._vasprun_sizes(ret)))
+                elif mode == "stream" and elem.tag == "set":
+                    buffers[-1].open_set()
+                elements.append(elem)
+                modes.append(mode)
+                continue
 
+            if elem is root:
+                break
+            elements.pop()
+            mode = modes.pop()
+            parent = elements[-1] if elements else root
+            parent_mode = modes[-1] if modes else None
+            if mode == "keep":
+                if parent_mode == "keep":
+                    # needed by the parent
+                    continue
+                if parent_mode is None:
+                    self._parse_root_element(elem, ret)
+                else:
+                    self._parse_calculation_element(elem, ret)
+            elif mode == "stream":
+                if elem.tag in ("r", "dimension", "field"):
+                    # needed by the parent
+                    continue
+                if elem.tag == "set":
+                    buffers[-1].close_set(elem)
+                elif elem.tag == "array":
+                    self._general_dest(ret, elements)["array"] = buffers.pop().to_dict()
+                elif elem.tag == "i" and elem.attrib.get("name") == "efermi":
+                    self._general_dest(ret, elements)["efermi"] = float(elem.text)
+            elem.clear()
+            # the cleared elements are not kept in the tree
+            if mode == parent_mode == "skip" or (mode == "stream" and parent.tag == "set"):
+                parent.clear()
+            elif parent is root:
+                root.clear()
+
+        return ret
+
+    def _general_dest(self, ret, elements):
+        """The dict of ret["general"] matching the open elements of a calculation"""
+        dest = ret["general"]
+        for elem in elements[1:]:
+            dest = dest.setdefault(elem.tag, {})
+        return dest
+
+    def _vasprun_sizes(self, ret):
+        """Guesses the size of each dimension of the vasprun arrays from the headers, 
+        used to preallocate the buffers of parse_vasprun_stream
+
+        Parameters
+        ----------
+        ret : dict
+            The data decoded so far
+
+        Returns
+        -------
+        dict
+            The size of the dimensions by dimension name
+        """
+        sizes = {}
+        params = ret["vasp_params"]
+        nbands = self._find_param(params, "NBANDS")
+        nedos = self._find_param(params, "NEDOS")
+        ispin = self._find_param(params, "ISPIN")
+        if nbands is not None:
+            sizes["band"] = nbands
+        if nedos is not None:
+            sizes["gridpoints"] = nedos
+        if self._find_param(params, "LNONCOLLINEAR"):
+            sizes["spin"] = 4
+        elif ispin is not None:
+            sizes["spin"] = ispin
+        if "natom" in ret["atom_info"]:
+            sizes["ion"] = ret["atom_info"]["natom"]
+        if len(ret["kpoints"]["kpoints_list"]) != 0:
+            sizes["kpoint"] = len(ret["kpoints"]["kpoints_list"])
+        return sizes
+
+    def _find_param(self, params, name):
+        """Finds a parameter in the nested separators of the vasp parameters
+
+        Parameters
+        ----------
+        params : dict
+            The vasp parameters
+        name : str
+            The name of the parameter
+
+        Returns
+        -------
+        Any
+            The value of the parameter, None if it is not found
+        """
+        if name in params:
+            return params[name]
+        for value in params.values():
+            if isinstance(value, dict):
+                found = self._find_param(value, name)
+                if found is not None:
+                    return found
+        return None
+
+    def _empty_vasprun_data(self):
+        """The dict filled by parse_vasprun and parse_vasprun_stream
+        """
         return {
-            "calculation": calculation,
-            "structures": structures,
-            "forces": forces,
-            "run_info": run_info,
-            "incar": incar,
-            "general": general,
-            "kpoints_info": kpoints_info,
-            "vasp_params": vasp_params,
-            "kpoints": {"kpoints_list": kpoints_list, "k_weights": k_weights},
-            "atom_info": atom_info,
+            "calculation": [],
+            "structures": [],
+            "forces": [],
+            "stresses": [],
+            "orbital_magnetization": {},
+            "run_info": {},
+            "incar": {},
+            "general": {},
+            "kpoints_info": {},
+            "vasp_params": {},
+            "kpoints": {"kpoints_list": [], "k_weights": []},
+            "atom_info": {},
         }
 
+    def _parse_root_element(self, ichild, ret):
+        """Parses an element directly below the root of vasprun.xml 
+        other than the calculations into ret"""
+        run_info = ret["run_info"]
+        kpoints_info = ret["kpoints_info"]
+        atom_info = ret["atom_info"]
+        if ichild.tag == "generator":
+            for ielement in ichild:
+                run_info[ielement.attrib["name"]] = ielement.text
+
+        elif ichild.tag == "incar":
+            ret["incar"] = self.get_params(ichild, ret["incar"])
+
+        # Skipping 1st structure which is primitive cell
+        elif ichild.tag == "kpoints":
+
+            for ielement in ichild:
+                if ielement.items()[0][0] == "param":
+                    kpoints_info["mode"] = ielement.items()[0][1]
+                    if kpoints_info["mode"] == "listgenerated":
+                        kpoints_info["kpoint_vertices"] = []
+                        for isub in ielement:
+
+                            if isub.attrib == "divisions":
+                                kpoints_info["ndivision"] = int(isub.text)
+                            else:
+                                if len(isub.text.split()) != 3:
+                                    continue
+                                kpoints_info["kpoint_vertices"].append(
+                                    [float(x) for x in isub.text.split()]
+                                )
+                    else:
+                        for isub in ielement:
+                            if isub.attrib["name"] == "divisions":
+                                kpoints_info["kgrid"] = [
+                                    int(x) for x in isub.text.split()
+                                ]
+                            elif isub.attrib["name"] == "usershift":
+                                kpoints_info["user_shift"] = [
+                                    float(x) for x in isub.text.split()
+                                ]
+                            elif isub.attrib["name"] == "genvec1":
+                                kpoints_info["genvec1"] = [
+                                    float(x) for x in isub.text.split()
+                                ]
+                            elif isub.attrib["name"] == "genvec2":
+                                kpoints_info["genvec2"] = [
+                                    float(x) for x in isub.text.split()
+                                ]
+                            elif isub.attrib["name"] == "genvec3":
+                                kpoints_info["genvec3"] = [
+                                    float(x) for x in isub.text.split()
+                                ]
+                            elif isub.attrib["name"] == "shift":
+                                kpoints_info["shift"] = [
+                                    float(x) for x in isub.text.split()
+                                ]
+
+                elif ielement.items()[0][1] == "kpointlist":
+                    kpoints_list = []
+                    for ik in ielement:
+                        kpoints_list.append([float(x)
+                                             for x in ik.text.split()])
+                    ret["kpoints"]["kpoints_list"] = array(kpoints_list)
+                elif ielement.items()[0][1] == "weights":
+                    k_weights = []
+                    for ik in ielement:
+                        k_weights.append(float(ik.text))
+                    ret["kpoints"]["k_weights"] = array(k_weights)
+
+        # Vasp Parameters
+        elif ichild.tag == "parameters":
+            ret["vasp_params"] = self.get_params(ichild, ret["vasp_params"])
+
+        # Atom info
+        elif ichild.tag == "atominfo":
+
+            for ielement in ichild:
+                if ielement.tag == "atoms":
+                    atom_info["natom"] = int(ielement.text)
+                elif ielement.tag == "types":
+                    atom_info["nspecies"] = int(ielement.text)
+                elif ielement.tag == "array":
+                    if ielement.attrib["name"] == "atoms":
+                        for isub in ielement:
+                            if isub.tag == "set":
+                                atom_info["symbols"] = []
+                                for isym in isub:
+                                    atom_info["symbols"].append(
+                                        isym[0].text)
+                    elif ielement.attrib["name"] == "atomtypes":
+                        atom_info["atom_types"] = {}
+                        for isub in ielement:
+                            if isub.tag == "set":
+                                for iatom in isub:
+                                    atom_info["atom_types"][iatom[1].text] = {}
+                                    atom_info["atom_types"][iatom[1].text][
+                                        "natom_per_specie"
+                                    ] = int(iatom[0].text)
+                                    atom_info["atom_types"][iatom[1].text][
+                                        "mass"
+                                    ] = float(iatom[2].text)
+                                    atom_info["atom_types"][iatom[1].text][
+                                        "valance"
+                                    ] = float(iatom[3].text)
+                                    atom_info["atom_types"][iatom[1].text][
+                                        "pseudopotential"
+                                    ] = iatom[4].text.strip()
+
+        elif ichild.tag == "structure":
+            if ichild.attrib["name"] == "initialpos":
+                initial_pos = self.get_structure(ichild)
+            elif ichild.attrib["name"] == "finalpos":
+                final_pos = self.get_structure(ichild)
+        return ret
+
+    def _parse_calculation_element(self, ielement, ret):
+        """Parses an element of a calculation tag of vasprun.xml into ret"""
+        if ielement.tag == "scstep":
+            ret["calculation"].append(self.get_scstep(ielement))
+        elif ielement.tag == "structure":
+            ret["structures"].append(self.get_structure(ielement))
+        elif ielement.tag == "varray":
+            if ielement.attrib["name"] == "forces":
+                ret["forces"].append(self.get_varray(ielement))
+            elif ielement.attrib["name"] == "stress":
+                ret["stresses"].append(self.get_varray(ielement))
+
+        # elif ielement.tag == 'eigenvalues':
+        #     for isub in ielement[0] :
+        #         if isub.tag == 'set':
+        #             for iset in isub :
+        #                 eigen_values[iset.attrib['comment']] = {}
+        #                 for ikpt in iset :
+        #                     eigen_values[iset.attrib['comment']][ikpt.attrib['comment']] = get_varray(ikpt)
+
+        elif ielement.tag == "separator":
+            if ielement.attrib["name"] == "orbital magnetization":
+                for isub in ielement:
+                    ret["orbital_magnetization"][isub.attrib["name"]] = [
+                        float(x) for x in isub.text.split()
+                    ]
+
+        # elif ielement.tag == 'dos':
+        #     for isub in ielement :
+        #         if 'name' in isub.attrib:
+        #             if isub.attrib['name'] == 'efermi' :
+        #                 dos['efermi'] = float(isub.text)
+        #             else :
+        #                 dos[isub.tag] = {}
+        #                 dos[isub.tag]['info'] = []
+        #               for iset in isub[0]  :
+        #                   if iset.tag == 'set' :
+        #                       for isub_set in iset:
+        #                           dos[isub.tag] = get_set(isub_set,dos[isub.tag])
+        #                   elif iset.tag == 'field' :
+        #                       dos[isub.tag]['info'].append(iset.text.strip(' '))
+        else:
+            ret["general"][ielement.tag] = {}
+            ret["general"][ielement.tag] = self.get_general(
+                ielement, ret["general"][ielement.tag]
+            )
+        return ret
+
     def __contains__(self, x):
         return x in self.variables
 
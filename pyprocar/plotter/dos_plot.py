@@ -395,6 +395,45 @@ class DOSPlot:
                 lc.set_linestyle(self.config['linestyle']['value'][ispin])
                 self.handles.append(handle)
 
+    def _stack_dos(self,
+            species:List[str]=None,
+            atoms:List[int]=None,
+            orbitals:List[List[int]]=None,
+            principal_q_numbers:List[int]=[-1],
+            spins:List[int]=None,
+        ):
+        """Sums all the stacked contributions in a single reduction, see DensityOfStates.dos_sum_batch.
+        There is one contribution per species, over the atoms of that species, or, when no 
+        species are given, one per orbital group over the given atoms.
+
+        Parameters
+        ----------
+        species : List[str], optional
+            The species of the contributions, by default None
+        atoms : List[int], optional
+            The atoms of all the contributions when the species are not given, by default None
+        orbitals : List[List[int]], optional
+            The orbitals of each contribution, by default None
+        principal_q_numbers : List[int], optional
+            A list of principal quantum numbers, by default [-1]
+        spins : List[int], optional
+            A list of spins, by default None
+
+        Returns
+        -------
+        np.ndarray
+            The dos of each contribution, as returned by DensityOfStates.dos_sum_batch
+        """
+        if species is not None:
+            atoms = [list(np.where(np.array(self.structure.atoms) == specie)[0]) for specie in species]
+        else:
+            atoms = [atoms] * len(orbitals)
+        selections = [{'atoms':contribution_atoms,
+                       'principal_q_numbers':principal_q_numbers,
+                       'orbitals':contribution_orbitals,
+                       'spins':spins} for contribution_atoms, contribution_orbitals in zip(atoms, orbitals)]
+        return self.dos.dos_sum_batch(selections)
+
     def plot_stack_species(
             self,
             principal_q_numbers:List[int]=[-1],
@@ -485,17 +524,16 @@ class DOSPlot:
             else:
                 self.set_ylim([-self.dos.total.max(),self.dos.total.max()])
 
+            dos_stack = self._stack_dos(species=self.structure.species,
+                                        orbitals=[orbitals] * len(self.structure.species),
+                                        principal_q_numbers=principal_q_numbers,
+                                        spins=spin_projections)
+
             for spins_index , ispin in enumerate(spins):
                 # bottom = np.zeros_like(self.dos.energies[cond])
                 bottom = np.zeros_like(self.dos.energies)
                 for specie in range(len(self.structure.species)):
-                    idx = (np.array(self.structure.atoms) == self.structure.species[specie])
-                    atoms = list(np.where(idx)[0])
-
-                    dos_projected = self.dos.dos_sum(atoms=atoms,
-                                        principal_q_numbers=principal_q_numbers,
-                                        orbitals=orbitals,
-                                        spins=spin_projections)
+                    dos_projected = dos_stack[specie]
 
                     x = self.dos.energies
                     y = (dos_projected[ispin]  / dos_projected_total[ispin] ) * dos_total[ispin]
@@ -559,17 +597,16 @@ class DOSPlot:
                 self.set_xlim([-self.dos.total.max(),self.dos.total.max()])
             self.set_ylim([self.dos.energies.min(),self.dos.energies.max()])
 
+            dos_stack = self._stack_dos(species=self.structure.species,
+                                        orbitals=[orbitals] * len(self.structure.species),
+                                        principal_q_numbers=principal_q_numbers,
+                                        spins=spin_projections)
+
             for spins_index , ispin in enumerate(spins):
                 # bottom = np.zeros_like(self.dos.energies[cond])
                 bottom = np.zeros_like(self.dos.energies)
                 for specie in range(len(self.structure.species)):
-                    idx = (np.array(self.structure.atoms) == self.structure.species[specie])
-                    atoms = list(np.where(idx)[0])
-
-                    dos = self.dos.dos_sum(atoms=atoms,
-                                        principal_q_numbers=principal_q_numbers,
-                                        orbitals=orbitals,
-                                        spins=spin_projections)
+                    dos = dos_stack[specie]
 
                     x = self.dos.energies
                     y = (dos[ispin] * dos_total[ispin]) / dos_projected_total[ispin]
@@ -691,14 +728,16 @@ class DOSPlot:
             else:
                 self.set_ylim([-self.dos.total.max(),self.dos.total.max()])
 
+            dos_stack = self._stack_dos(atoms=atoms,
+                                        orbitals=orb_l,
+                                        principal_q_numbers=principal_q_numbers,
+                                        spins=spins)
+
             for spins_index , ispin in enumerate(spins):
                 bottom = np.zeros_like(self.dos.energies)
 
                 for iorb in range(len(orb_l)):
-                    dos = self.dos.dos_sum(atoms=atoms,
-                                        principal_q_numbers=principal_q_numbers,
-                                        orbitals=orb_l[iorb],
-                                        spins=spins)
+                    dos = dos_stack[iorb]
 
                     x = self.dos.energies
                     y = (dos[ispin] * dos_total[ispin]) / dos_projected_total[ispin]
@@ -764,14 +803,16 @@ class DOSPlot:
                 self.set_xlim([-self.dos.total.max(),self.dos.total.max()])
             self.set_ylim([self.dos.energies.min(),self.dos.energies.max()])
 
+            dos_stack = self._stack_dos(atoms=atoms,
+                                        orbitals=orb_l,
+                                        principal_q_numbers=principal_q_numbers,
+                                        spins=spins)
+
             for spins_index , ispin in enumerate(spins):
                 bottom = np.zeros_like(self.dos.energies)
 
                 for iorb in range(len(orb_l)):
-                    dos = self.dos.dos_sum(atoms=atoms,
-                                        principal_q_numbers=principal_q_numbers,
-                                        orbitals=orb_l[iorb],
-                                        spins=spins)
+                    dos = dos_stack[iorb]
 
                     x = self.dos.energies
                     y = (dos[ispin] * dos_total[ispin]) / dos_projected_total[ispin]
@@ -893,17 +934,17 @@ class DOSPlot:
             else:
                 self.set_ylim([0,self.dos.total.max()])
 
+            dos_stack = dict(zip(items, self._stack_dos(species=list(items),
+                                                        orbitals=list(items.values()),
+                                                        spins=spin_projections)))
+
             for ispin in spins:
 
                 bottom = np.zeros_like(self.dos.energies)
                 for specie in items:
-                    idx = np.array(self.structure.atoms) == specie
-                    atoms = list(np.where(idx)[0])
                     orbitals = items[specie]
 
-                    dos = self.dos.dos_sum(atoms=atoms,
-                                        spins=spin_projections,
-                                        orbitals=orbitals)
+                    dos = dos_stack[specie]
 
                     label = "-"
                     # For coupled basis
@@ -999,17 +1040,17 @@ class DOSPlot:
                 
             self.set_ylim([self.dos.energies.min(),self.dos.energies.max()])
 
+            dos_stack = dict(zip(items, self._stack_dos(species=list(items),
+                                                        orbitals=list(items.values()),
+                                                        spins=spins)))
+
             for ispin in spins:
 
                 bottom = np.zeros_like(self.dos.energies)
                 for specie in items:
-                    idx = np.array(self.structure.atoms) == specie
-                    atoms = list(np.where(idx)[0])
                     orbitals = items[specie]
 
-                    dos = self.dos.dos_sum(atoms=atoms,
-                                        spins=spins,
-                                        orbitals=orbitals)
+                    dos = dos_stack[specie]
 
                     label = "-"
                     # coupled basis
@@ -280,7 +280,8 @@ class FermiDataHandler:
     def get_surface_data(self,
                     property_name=None,
                     fermi:float=None,
-                    fermi_shift: float=0.0):
+                    fermi_shift: float=0.0,
+                    surface_caches:dict=None):
         LOGGER.info(f'____ Getting Fermi Surface Data ____')
         if self.config.mode is None:
             raise "You must call process data function before get_surface"
@@ -301,16 +302,21 @@ class FermiDataHandler:
                                             projection_accuracy=self.config.projection_accuracy,
                                             supercell=self.config.supercell,
                                             max_distance=self.config.max_distance,
+                                            isosurface_workers=self.config.isosurface_workers,
+                                            isosurface_executor=self.config.isosurface_executor,
+                                            cache=None if surface_caches is None else surface_caches.setdefault(spin, {}),
                                         )
             self.property_name=property_name
 
             band_to_surface_indices=list(fermi_surface3D.band_isosurface_index_map.keys())
+            # The properties are those of all the bands and spins, the bands of the copy were reduced
+            ebs_band_indices=np.asarray(self.bands_to_keep)[band_to_surface_indices]
             if self.property_name=='fermi_speed':
-                fermi_surface3D.project_fermi_speed(fermi_speed=ebs.fermi_speed[...,band_to_surface_indices,ispin])
+                fermi_surface3D.project_fermi_speed(fermi_speed=self.ebs.fermi_speed[...,ebs_band_indices,spin])
             elif self.property_name=='fermi_velocity':
-                fermi_surface3D.project_fermi_velocity(fermi_velocity=ebs.fermi_velocity[...,band_to_surface_indices,ispin,:])
+                fermi_surface3D.project_fermi_velocity(fermi_velocity=self.ebs.fermi_velocity[...,ebs_band_indices,spin,:])
             elif self.property_name=='harmonic_effective_mass':
-                fermi_surface3D.project_harmonic_effective_mass(harmonic_effective_mass=ebs.harmonic_average_effective_mass[...,band_to_surface_indices,ispin])
+                fermi_surface3D.project_harmonic_effective_mass(harmonic_effective_mass=self.ebs.harmonic_average_effective_mass[...,ebs_band_indices,spin])
             if self.config.mode =='parametric':
                 fermi_surface3D.project_atomic_projections(self.spd[:,band_to_surface_indices,ispin])
             if self.config.mode =='spin_texture':
@@ -322,6 +328,39 @@ class FermiDataHandler:
         self.fermi_surface=self._merge_fermi_surfaces(fermi_surfaces)
         LOGGER.info(f'____ Retrieived Fermi Surface Data ____')
         return self.fermi_surface
+
+    def get_surfaces_data(self,
+                    fermi_values:List[float],
+                    property_name=None,
+                    fermi_shift: float=0.0):
+        """
+        Generates the fermi surfaces of several fermi energies. 
+        The band grids, the brillouin zone and the extended kpoints 
+        do not depend on the fermi energy, they are computed once per spin 
+        and reused by all the surfaces
+
+        Parameters
+        ----------
+        fermi_values : List[float]
+            The fermi energies of the surfaces
+        property_name : str, optional
+            The property to project on the surfaces, by default None
+        fermi_shift : float, optional
+            Value to shift fermi energy, by default 0.0
+
+        Returns
+        -------
+        List[FermiSurface3D]
+            The fermi surfaces in the order of fermi_values
+        """
+        surface_caches = {}
+        fermi_surfaces = []
+        for fermi in fermi_values:
+            fermi_surfaces.append(self.get_surface_data(property_name=property_name, 
+                                                        fermi=fermi, 
+                                                        fermi_shift=fermi_shift, 
+                                                        surface_caches=surface_caches))
+        return fermi_surfaces
     
 class FermiVisualizer:
 
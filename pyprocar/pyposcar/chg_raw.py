@@ -9,6 +9,7 @@
 
 import argparse
 import os
+import mmap
 import numpy as np
 import poscar
 import re
@@ -18,6 +19,272 @@ import matplotlib.pyplot as plt
 import warnings
 import plot3d
 
+# The line with the grid size, NGFx NGFy NGFz, after the blank line
+# closing the POSCAR-like header
+NGF_PATTERN = re.compile(rb'\n\s*\n(\s+\d+\s+\d+\s+\d+)\n')
+AUGMENTATION = b'augmentation occupancies'
+# grid values decoded at once when streaming a data block
+CHUNK_SIZE = 2**22
+# bytes of a data block read at once when decoding it
+READ_SIZE = 2**24
+# the index of each axis in NGF and the axis of the data array (z, y, x)
+# along it
+AXES = {'a':(0, 2), 'b':(1, 1), 'c':(2, 0)}
+
+
+class Chg_index:
+  def __init__(self, filename='CHGCAR', verbose=False):
+    """Byte-offset index of a CHG-like file (CHG, CHGCAR, LOCPOT,
+    ELFCAR). The file is scanned once, without decoding the grid, to
+    find where each frame starts and ends. The data blocks of a frame
+    are located the first time the frame is requested. Any data block
+    can then be decoded alone, straight from the file, by
+    `read_block`.
+
+    args:
+
+    `filename`: the CHG-like file
+
+    `verbose`: verbosity level. Three values are accepted {False, True, 'debug'}
+
+    """
+    self.filename = filename
+    self.verbose = verbose
+    if not os.path.isfile(filename):
+      print("ERROR: can't open the file, please check:", filename)
+      raise RuntimeError('File does not exist')
+    self.comment = None
+    # [(start, end)] bytes of each frame
+    self.frames = []
+    # {frame: (header_end, NGF, [(start, end)] of each data block)}
+    self._blocks = {}
+    self._scan()
+
+  def _scan(self):
+    """Finds the frames. Each frame starts with the same comment line"""
+    with open(self.filename, 'rb') as f:
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        comment = mm[:mm.find(b'\n') + 1]
+        starts = [0]
+        pos = mm.find(b'\n' + comment, 1)
+        while pos >= 0:
+          starts.append(pos + 1)
+          pos = mm.find(b'\n' + comment, pos + len(comment))
+    self.comment = comment.decode()
+    self.frames = list(zip(starts, starts[1:] + [size]))
+    if self.verbose == 'debug':
+      print('DEBUG: Comment line:')
+      print(self.comment)
+      print('DEBUG: Number of frames found:', len(self.frames))
+
+  def blocks(self, frame=0):
+    """Locates the data blocks of a frame.
+
+    The first block is the charge (or potential), the second (if
+    present) is the magnetization and the 3rd and 4th are the
+    magnetization along y and z in a non-collinear calculation. The
+    augmentation occupancies (if any) are left out of the blocks.
+
+    returns:
+
+    `header_end`: the end of the POSCAR-like header
+
+    `NGF`: np.array with NGFx NGFy NGFz
+
+    `blocks`: list with the (start, end) bytes of each data block
+
+    """
+    if frame in self._blocks:
+      return self._blocks[frame]
+    start, end = self.frames[frame]
+    with open(self.filename, 'rb') as f:
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        match = NGF_PATTERN.search(mm, start, end)
+        if match is None:
+          raise RuntimeError('NGFline should have one and only one occurrence')
+        NGFline = match.group(1)
+        header_end = match.start(1)
+        # each data block is preceded by the NGF line
+        marks = [(match.start(1), match.end())]
+        pos = mm.find(NGFline, match.end(), end)
+        while pos >= 0:
+          newline = mm.find(b'\n', pos + len(NGFline), end)
+          data_start = end if newline < 0 else newline + 1
+          marks.append((pos, data_start))
+          pos = mm.find(NGFline, data_start, end)
+        blocks = []
+        for i, (_, data_start) in enumerate(marks):
+          data_end = marks[i + 1][0] if i + 1 < len(marks) else end
+          aug = mm.find(AUGMENTATION, data_start, data_end)
+          if aug >= 0:
+            data_end = aug
+          blocks.append((data_start, data_end))
+    NGF = np.array(NGFline.split(), dtype=int)
+    if self.verbose == 'debug':
+      print('DEBUG: grid size,', NGF)
+      print('DEBUG: data blocks (bytes),', blocks)
+    self._blocks[frame] = (header_end, NGF, blocks)
+    return self._blocks[frame]
+
+  def header(self, frame=0):
+    """The POSCAR-like string of a frame (the comment line included)"""
+    header_end = self.blocks(frame)[0]
+    start = self.frames[frame][0]
+    with open(self.filename, 'rb') as f:
+      f.seek(start)
+      return f.read(header_end - start).decode()
+
+  def _decode(self, data_start, data_end, counts):
+    """Decodes consecutive runs of values of the bytes
+    [`data_start`, `data_end`) of the file. The bytes are read by
+    chunks of READ_SIZE, split at the last whitespace so no number is
+    cut, and only the tokens of the range are decoded.
+
+    yields:
+
+    `values`: 1D np.array with the next `count` values, for each
+    `count` in `counts`. It is shorter than `count` if the range has
+    less values
+
+    returns the number of values in the range after the last run
+
+    """
+    with open(self.filename, 'rb') as f:
+      f.seek(data_start)
+      remaining = data_end - data_start
+      tail = b''
+      pending = np.array([])
+      for count in counts:
+        parts = [pending]
+        n = len(pending)
+        while n < count and (remaining > 0 or tail):
+          buf = tail + f.read(min(READ_SIZE, remaining))
+          remaining = data_end - f.tell()
+          tail = b''
+          if remaining > 0:
+            # the last token can continue in the next chunk
+            cut = max(buf.rfind(b' '), buf.rfind(b'\n'))
+            if cut < 0:
+              tail = buf
+              continue
+            buf, tail = buf[:cut], buf[cut:]
+          values = np.array(buf.split(), dtype=float)
+          parts.append(values)
+          n += len(values)
+        values = np.concatenate(parts)
+        pending = values[count:]
+        yield values[:count]
+      return len(pending) + len(tail.split()) + len(f.read(max(remaining, 0)).split())
+
+  def read_block(self, frame, block, count):
+    """Decodes the first `count` values of a data block into a float
+    array.
+
+    returns:
+
+    `values`: 1D np.array, shorter than `count` if the block has less
+    values
+
+    `nextra`: the number of values in the block after the first
+    `count` (i.e. the extra data of a LOCPOT)
+
+    """
+    data_start, data_end = self.blocks(frame)[2][block]
+    decoder = self._decode(data_start, data_end, [count])
+    values = next(decoder)
+    try:
+      next(decoder)
+    except StopIteration as stop:
+      nextra = stop.value
+    return values, nextra
+
+  def iter_planes(self, frame, block, NGF, nplanes, norm=1):
+    """Streams a data block by chunks of planes of constant c, in the
+    order of the file. Only one chunk is in memory at a time.
+
+    args:
+
+    `NGF`: the grid size, NGFx NGFy NGFz
+
+    `nplanes`: the number of planes of a chunk
+
+    `norm`: the values are divided by it (i.e. the number of grid points
+    of a CHGCAR)
+
+    yields:
+
+    `z0`: the first plane of the chunk
+
+    `values`: np.array (nplanes, NGFy, NGFx), the last one can be shorter
+
+    returns the number of values in the block after the grid (i.e. the
+    extra data of a LOCPOT)
+
+    """
+    data_start, data_end = self.blocks(frame)[2][block]
+    ngfx, ngfy, ngfz = NGF[0], NGF[1], NGF[2]
+    z0s = range(0, ngfz, nplanes)
+    counts = [min(nplanes, ngfz - z0)*ngfx*ngfy for z0 in z0s]
+    decoder = self._decode(data_start, data_end, counts)
+    for z0, count in zip(z0s, counts):
+      values = next(decoder)
+      if len(values) != count:
+        raise RuntimeError('Grid points do not agree')
+      if norm != 1:
+        values /= norm
+      yield z0, values.reshape(-1, ngfy, ngfx)
+    try:
+      next(decoder)
+    except StopIteration as stop:
+      return stop.value
+
+
+def reduce_planes(planes, NGF, cuts=()):
+  """Planar averages along the three axes and cuts of a grid, in a
+  single pass over its chunks of planes of constant c (see
+  `Chg_index.iter_planes`).
+
+  args:
+
+  `planes`: iterable of (z0, np.array (nplanes, NGFy, NGFx))
+
+  `NGF`: the grid size, NGFx NGFy NGFz
+
+  `cuts`: list of (axis, level), with axis in {'a', 'b', 'c'} and the
+  level in grid points
+
+  returns:
+
+  `averages`: dict {axis: 1D np.array} with the average of each plane
+  along the axis
+
+  `cuts`: dict {(axis, level): 2D np.array}, as data[level],
+  data[:,level,:] or data[:,:,level] for 'c', 'b' and 'a'
+
+  """
+  ngfx, ngfy, ngfz = NGF[0], NGF[1], NGF[2]
+  sum_a, sum_b, sum_c = np.zeros(ngfx), np.zeros(ngfy), np.zeros(ngfz)
+  shapes = {'a':(ngfz, ngfy), 'b':(ngfz, ngfx), 'c':(ngfy, ngfx)}
+  planes_cut = {(axis, level):np.empty(shapes[axis]) for axis, level in cuts}
+  for z0, chunk in planes:
+    z1 = z0 + len(chunk)
+    sum_c[z0:z1] = chunk.sum(axis=(1,2))
+    sum_b += chunk.sum(axis=(0,2))
+    sum_a += chunk.sum(axis=(0,1))
+    for (axis, level), plane in planes_cut.items():
+      if axis == 'c' and z0 <= level < z1:
+        plane[:] = chunk[level - z0]
+      elif axis == 'b':
+        plane[z0:z1] = chunk[:,level,:]
+      elif axis == 'a':
+        plane[z0:z1] = chunk[:,:,level]
+  averages = {'a':sum_a/(ngfy*ngfz),
+              'b':sum_b/(ngfx*ngfz),
+              'c':sum_c/(ngfx*ngfy)}
+  return averages, planes_cut
+
+
 class Chg_base:
   def __init__(self):
     self.comment = None
@@ -32,14 +299,30 @@ class Chg_base:
     self.Data3 = np.array([])
     self.is_chg = True
     self.is_locpot = None
+    self.verbose = False
+    self.index = None
+    self.frame = 0
     
-  def Load(self, filename='CHGCAR', frame=0, is_chg=None, verbose=None):
+  def Load(self, filename='CHGCAR', frame=0, is_chg=None, verbose=None,
+           spin=None, sidecar=False):
     """Load a CHG-like file 
 
     `verbose` = False: No verbosity
               = True: verbose output
               = 'debug': usually unwanted verbosity level
 
+    `spin`: the data blocks to decode, an int or a list of them (0:
+    rho, 1: magnetization or Sx, 2: Sy, 3: Sz). By default all of
+    them. The blocks not decoded are left empty.
+
+    `spin`=[] only reads the header, the data can still be streamed
+    by `iter_planes`.
+
+    `sidecar`: if True, the grid of the frame is stored (with all its
+    blocks) in a binary file `<filename>.frame<frame>.<tag>.npy` and
+    the data are memory-mapped from it. Later loads reuse it, without
+    parsing the text, while it is newer than `filename`.
+
     """
     if verbose != None:
       self.verbose = verbose
@@ -49,44 +332,18 @@ class Chg_base:
       print("\nINFO: Loading a CHG-like with the following parameters:")
       print("INFO: Filename: ", filename)
       print("INFO: is_chg:   ", self.is_chg)
-    # checking if the file exist
-    if not os.path.isfile(filename):
-      print("ERROR: can't open the file, please check:", filename)
-      raise RuntimeError('File does not exist')
-    self.File = open(filename, 'r').read()
-        
-    # getting how many ionic steps were loaded
-    self.comment = re.findall(r'^[^\n]*\n', self.File)[0]
-    if self.verbose == 'debug':
-      print('DEBUG: Comment line:')
-      print(self.comment)
-
-    Nframes = len(re.findall(self.comment, self.File))
-    if self.verbose == 'debug':
-      print('DEBUG: Number of frames found:', Nframes)
+    # checking if the file exist and finding the frames and blocks
+    # without reading the grid
+    self.index = Chg_index(filename, verbose=self.verbose)
+    self.comment = self.index.comment
+    self.frame = frame
 
     if self.verbose:
       print('INFO: Selecting the frame:', frame)
-    frames = re.split(self.comment, self.File)
-    # if the first frame is empty (a `re` thing), should be discarded
-    if len(frames[0]) == 0:
-      frames.pop(0)
-    self.File = frames[frame]
-
-    # next string to find is the line with
-    # NGFx NGFy NGFz
-    NGFline = re.findall(r'\n\s*\n(\s+\d+\s+\d+\s+\d+)\n', self.File)
-    if verbose:
-      print('INFO: NGFx NGFy NGFz', NGFline)
-    if len(NGFline) != 1:
-      raise RuntimeError('NGFline should have one and only one occurrence')
-    NGFline = NGFline[0]
-    self.NGF = np.array(NGFline.split(), dtype=int)
-    if verbose == 'debug':
-      print('DEBUG: grid size,', self.NGF)
-
-    data = re.split(NGFline, self.File)
-    ndata = len(data)
+    header_end, self.NGF, blocks = self.index.blocks(frame)
+    if self.verbose:
+      print('INFO: NGFx NGFy NGFz', self.NGF)
+    ndata = len(blocks) + 1
     if self.verbose:
       print('INFO: number of data blocks', ndata)
     
@@ -107,88 +364,281 @@ class Chg_base:
       raise RuntimeError('Number of block data is unexpected,' + str(ndata))
 
     # The poscar-like string would be passed to a POSCAR class
-    poscarString = self.comment + data.pop(0)
-    # print(poscarString)
+    poscarString = self.index.header(frame)
     self.poscar = poscar.Poscar(filename=None)
     self.poscar.parse(fromString=poscarString)
     if self.verbose == 'debug':
       print('DEBUG: POSCAR-like info:')
       print('\n'.join(self.poscar.poscar))
     
-    # Now we will search for augmentation charges
-    # 'augmentation occupancies'
-    # That info will be discarded
-    temp = []
-    for block in data:
-      temp.append(re.split(r'augmentation occupancies', block)[0])
-    data = temp
-    
     # The grid data will be processed
     Ndata = self.NGF[0]*self.NGF[1]*self.NGF[2]
     if self.verbose == 'debug':
       print('DEBUG: Data points expected:', Ndata)
+
+    if spin is None:
+      spin = range(self.Ispin)
+    spin = np.atleast_1d(spin).astype(int)
+    if np.any(spin >= self.Ispin) or np.any(spin < 0):
+      raise RuntimeError('No such spin channel, ' + str(spin))
+
+    if sidecar:
+      data = self._load_sidecar(filename, frame)
+      if data is None:
+        data = self._write_sidecar(filename, frame)
+    else:
+      data = {i:self._read_block(frame, i) for i in spin}
       
-    self.Data0 = data[0].split()
+    self.Data0 = data.get(0, np.array([]))
+    self.Data1 = data.get(1, np.array([]))
+    self.Data2 = data.get(2, np.array([]))
+    self.Data3 = data.get(3, np.array([]))
+    if self.is_chg and self.verbose and 0 in data:
+      print('Total charge', np.sum(self.Data0))
+    if self.is_chg and self.verbose and 1 in data and self.Ispin == 2:
+      print('INFO: total magnetization,', np.sum(self.Data1))
+
+  def _read_block(self, frame, block):
+    """Decodes one data block of the frame as a (NGFz, NGFy, NGFx)
+    array, normalized if `self.is_chg`.
+
+    """
     ngfx, ngfy, ngfz = self.NGF[0], self.NGF[1], self.NGF[2]
+    Ndata = ngfx*ngfy*ngfz
+    values, nextra = self.index.read_block(frame, block, Ndata)
+    if len(values) != Ndata:
+      raise RuntimeError('Grid points do not agree')
+    self._check_extra(block, nextra, values)
+    values = values.reshape(ngfz,ngfy,ngfx)
+    if self.is_chg:
+      values /= Ndata
+    return values
+
+  def _check_extra(self, block, nextra, values=None):
+    """Checks the values of a data block after the grid, only a LOCPOT
+    has them, after the first block
 
+    """
     # If the grid points don't agree it could be a LOCPOT with residual data 
-    if len(self.Data0) != Ndata:
+    if nextra != 0:
       N = self.poscar.Ntotal
-      if len(self.Data0) == Ndata + N:
+      if block == 0 and nextra == N:
         self.is_locpot = True
-        self.Data0 = np.array(self.Data0[:-N], dtype=float).reshape(ngfz,ngfy,ngfx)
         if self.verbose == 'debug':
           print('INFO: a LOCTOP file was detected')
         if self.is_chg and self.is_locpot:
-          if self.verbose == 'debug':
+          if self.verbose == 'debug' and values is not None:
             print('DEBUG: The number of grid points is not what I was expecting. '
                   'The data I got is:')
-            print(self.Data0[:30])
-            print(self.Data0[-30:])
+            print(values[:30])
+            print(values[-30:])
           raise RuntimeError('The file is flagged as a CHGCAR-like file'
                              ' and as a LOCPOT at the same time. This is inconsistent')
       else:
         raise RuntimeError('Grid points do not agree')
-    else:
-      self.Data0 = np.array(self.Data0, dtype=float).reshape(ngfz,ngfy,ngfx)
 
-    if self.is_chg:
-      self.Data0 = self.Data0 / Ndata
+  def iter_planes(self, spin=0, nplanes=None):
+    """Streams a data block by chunks of planes of constant c. The
+    chunks are slices of the data if they are loaded (or
+    memory-mapped), otherwise they are decoded from the file one at a
+    time.
+
+    args:
+
+    `spin`: the data block (0: rho, 1: magnetization or Sx, 2: Sy, 3: Sz)
+
+    `nplanes`: the number of planes of a chunk, by default as many as
+    fit in CHUNK_SIZE values
+
+    yields:
+
+    `z0`, `values`: the first plane of the chunk and the np.array
+    (nplanes, NGFy, NGFx)
+
+    """
+    if spin < 0 or spin >= self.Ispin:
+      raise RuntimeError('No such spin channel, ' + str(spin))
+    ngfx, ngfy, ngfz = self.NGF[0], self.NGF[1], self.NGF[2]
+    if nplanes is None:
+      nplanes = max(1, CHUNK_SIZE//(ngfx*ngfy))
+    data = getattr(self, 'Data' + str(spin))
+    if data.size:
+      for z0 in range(0, ngfz, nplanes):
+        yield z0, np.asarray(data[z0:z0 + nplanes])
+      return
+    norm = ngfx*ngfy*ngfz if self.is_chg else 1
+    nextra = yield from self.index.iter_planes(self.frame, spin, self.NGF,
+                                               nplanes, norm=norm)
+    self._check_extra(spin, nextra)
+
+  def _sidecar_name(self, filename, frame, tag):
+    return filename + '.frame' + str(frame) + '.' + tag + '.npy'
+
+  def _load_sidecar(self, filename, frame):
+    """Memory-maps the binary copy of the frame, if it exists and is
+    newer than `filename`. Otherwise returns None
+
+    """
+    # the normalized data are stored apart from the raw ones
+    tags = ['chg'] if self.is_chg else ['raw', 'locpot']
+    nblocks = len(self.index.blocks(frame)[2])
+    shape = (nblocks, self.NGF[2], self.NGF[1], self.NGF[0])
+    for tag in tags:
+      name = self._sidecar_name(filename, frame, tag)
+      if not os.path.isfile(name):
+        continue
+      if os.path.getmtime(name) < os.path.getmtime(filename):
+        continue
+      data = np.load(name, mmap_mode='r')
+      if data.shape != shape:
+        continue
       if self.verbose:
-        print('Total charge', np.sum(self.Data0))
-      
-    if self.Ispin > 1:
-      self.Data1 = data[1].split()
-      if len(self.Data1) != Ndata:
-        raise RuntimeError('Grid points do not agree')
-      self.Data1 = np.array(self.Data1, dtype=float).reshape(ngfz,ngfy,ngfx)
-      if self.is_chg:
-        self.Data1 = self.Data1 / Ndata
-        if self.verbose and self.Ispin == 2:
-          print('INFO: total magnetization,', np.sum(self.Data1))
-
-    if self.Ispin == 4:
-      self.Data2 = data[2].split()
-      self.Data3 = data[3].split()
-      if len(self.Data2) != Ndata or len(self.Data3) != Ndata:
-        raise RuntimeError('Grid points do not agree')
-      self.Data2 = np.array(self.Data2, dtype=float).reshape(ngfz,ngfy,ngfx)
-      self.Data3 = np.array(self.Data3, dtype=float).reshape(ngfz,ngfy,ngfx)
-      if self.is_chg:
-        self.Data2 = self.Data2 / Ndata
-        self.Data3 = self.Data3 / Ndata
+        print('INFO: loading the grid from', name)
+      if tag == 'locpot':
+        self.is_locpot = True
+      return {i:data[i] for i in range(nblocks)}
+    return None
+
+  def _write_sidecar(self, filename, frame):
+    """Decodes all the blocks of the frame into a binary copy, one
+    block at a time, and memory-maps it
+
+    """
+    nblocks = len(self.index.blocks(frame)[2])
+    shape = (nblocks, self.NGF[2], self.NGF[1], self.NGF[0])
+    # the first block tells if the file is a LOCPOT
+    first = self._read_block(frame, 0)
+    if self.is_chg:
+      tag = 'chg'
+    elif self.is_locpot:
+      tag = 'locpot'
+    else:
+      tag = 'raw'
+    name = self._sidecar_name(filename, frame, tag)
+    if self.verbose:
+      print('INFO: writing the grid to', name)
+    temp = name + '.part'
+    data = np.lib.format.open_memmap(temp, mode='w+', dtype=float, shape=shape)
+    data[0] = first
+    del first
+    for i in range(1, nblocks):
+      data[i] = self._read_block(frame, i)
+    data.flush()
+    del data
+    os.replace(temp, name)
+    data = np.load(name, mmap_mode='r')
+    return {i:data[i] for i in range(nblocks)}
   
 
 class Chg:
-  def __init__(self, filename='CHG', is_chg=True, verbose=False):
+  def __init__(self, filename='CHG', is_chg=True, verbose=False, sidecar=False,
+               lazy=False):
+    """args:
+
+    `sidecar`: keeps a memory-mapped binary copy of the grid, see
+    `Chg_base.Load`
+
+    `lazy`: if True, the grid is not decoded, the averages and cuts
+    are streamed from the file (or the sidecar) chunk by chunk
+
+    """
     self.chg = Chg_base()
     self.filename = filename
     self.is_chg = is_chg
     self.verbose = verbose
+    self.sidecar = sidecar
+    self.lazy = lazy
+    # planar averages and cuts already computed, by frame and spin, of
+    # the file as it was at `_reductions_mtime`
+    self._reductions_cache = {}
+    self._reductions_mtime = None
     self.chg.Load(filename=self.filename,
                   frame=0,
                   is_chg=self.is_chg,
-                  verbose=self.verbose)
+                  verbose=self.verbose,
+                  spin=[] if (lazy and not sidecar) else None,
+                  sidecar=self.sidecar)
+
+  def _reductions(self, spin):
+    # the reductions of a file that changed are dropped
+    mtime = os.path.getmtime(self.filename)
+    if mtime != self._reductions_mtime:
+      self._reductions_cache = {}
+      self._reductions_mtime = mtime
+    return self._reductions_cache.setdefault((self.chg.frame, spin),
+                                             {'average':None, 'cut':{}})
+
+  def _level(self, axis, level):
+    # the grid is periodic, the level after the last one is the first
+    return int(level) % self.chg.NGF[AXES[axis][0]]
+
+  def reduce(self, spin=0, cuts=()):
+    """Computes the planar averages along the three axes and the cuts
+    requested in a single pass over the grid (see `reduce_planes`). The
+    results are kept by the object, by frame, spin channel and axis, only
+    the missing ones trigger a new pass.
+
+    args:
+
+    `spin`: the spin channel
+
+    `cuts`: list of (axis, level) with the level in grid points
+
+    """
+    cache = self._reductions(spin)
+    cuts = [(axis, self._level(axis, level)) for axis, level in cuts]
+    missing = sorted(set(cut for cut in cuts if cut not in cache['cut']))
+    if cache['average'] is not None and len(missing) == 0:
+      return cache
+    if self.verbose:
+      print('INFO: reducing the grid of spin', spin, 'cuts:', missing)
+    averages, planes = reduce_planes(self.chg.iter_planes(spin), self.chg.NGF,
+                                     missing)
+    cache['average'] = averages
+    cache['cut'].update(planes)
+    return cache
+
+  def cut(self, axis, level, spin=0):
+    """The data at a grid `level` of `axis`, as data[level],
+    data[:,level,:] or data[:,:,level] for 'c', 'b' and 'a'"""
+    level = self._level(axis, level)
+    return self.reduce(spin, cuts=[(axis, level)])['cut'][(axis, level)]
+
+  def planar_average(self, axis, spin=0):
+    """The average of the data over each plane perpendicular to
+    `axis`.
+
+    returns:
+
+    `x`: the position of the planes, in Angstroms along `axis`
+
+    `data`: the average of each plane
+
+    """
+    data = self.reduce(spin)['average'][axis]
+    length = np.linalg.norm(self.chg.poscar.lat[AXES[axis][0]])
+    x = np.linspace(0, length, len(data))
+    return x, data
+
+  def macroscopic_average(self, axis, period, spin=0):
+    """The planar average, further averaged over a window of length
+    `period` (Angstroms) along `axis`, i.e. the interlayer distance of
+    the bulk. It removes the oscillations of the planar average, the
+    step across an interface is the interface dipole.
+
+    returns:
+
+    `x`, `data`: as `planar_average`
+
+    """
+    x, data = self.planar_average(axis, spin)
+    npoints = len(data)
+    length = np.linalg.norm(self.chg.poscar.lat[AXES[axis][0]])
+    window = max(1, int(round(period/length*npoints)))
+    # the grid is periodic
+    padded = np.concatenate([data[-window:], data, data[:window]])
+    data = np.convolve(padded, np.ones(window)/window, mode='same')
+    return x, data[window:window + npoints]
 
   def Zplot(self, level=None, spin=0, cart_level=None, direct_level=None):
     """it plots the CHG-like file at an specific z-value, given by
@@ -247,18 +697,10 @@ class Chg:
       if self.verbose == 'debug':
         print('INFO: default is the midpoint of the axis', level_floor)
       
-    if spin == 0:
-      data = self.chg.Data0
-    elif spin == 1:
-      data = self.chg.Data1
-    elif spin == 2:
-      data = self.chg.Data2
-    elif spin == 3:
-      data = self.chg.Data3
-    else:
-      raise RuntimeError('No such spin channel, ' + str(spin))
-    
-    zcolor = data[level_floor]*delta_floor + data[level_ceil]*delta_ceil
+    # both planes are cut in a single pass over the grid
+    self.reduce(spin, cuts=[('c', level_floor), ('c', level_ceil)])
+    zcolor = (self.cut('c', level_floor, spin)*delta_floor
+              + self.cut('c', level_ceil, spin)*delta_ceil)
       
     Agrid, Bgrid = np.mgrid[0:1:self.chg.NGF[0]*1j, 0:1:self.chg.NGF[1]*1j]
     #cartesian value of each point of the grid
@@ -361,20 +803,13 @@ class Chg:
       if self.verbose == 'debug':
         print('INFO: default is the midpoint of the axis', level_floor)
 
-    if spin == 0:
-      data = self.chg.Data0
-    elif spin == 1:
-      data = self.chg.Data1
-    elif spin == 2:
-      data = self.chg.Data2
-    elif spin == 3:
-      data = self.chg.Data3
-    else:
-      raise RuntimeError('No such spin channel, ' + str(spin))
+    # both planes are cut in a single pass over the grid
+    self.reduce(spin, cuts=[(axis, level_floor), (axis, level_ceil)])
+    zcolor = (self.cut(axis, level_floor, spin)*delta_floor
+              + self.cut(axis, level_ceil, spin)*delta_ceil)
 
     # building a grid with existent points
     if axis == 'c':
-      zcolor = data[level_floor]*delta_floor + data[level_ceil]*delta_ceil
       # a regular orthogonal grid
       Agrid, Bgrid = np.mgrid[0:1:self.chg.NGF[0]*1j, 0:1:self.chg.NGF[1]*1j]
       # cartesian grid
@@ -382,13 +817,11 @@ class Chg:
       ygrid = Agrid*self.chg.poscar.lat[0,1] + Bgrid*self.chg.poscar.lat[1,1]
   
     elif axis == 'b':
-      zcolor = data[:,level_floor,:]*delta_floor + data[:,level_ceil,:]*delta_ceil
       Agrid, Bgrid = np.mgrid[0:1:self.chg.NGF[2]*1j, 0:1:self.chg.NGF[0]*1j]
       xgrid = Agrid*self.chg.poscar.lat[2,2] + Bgrid*self.chg.poscar.lat[0,2]
       ygrid = Agrid*self.chg.poscar.lat[2,0] + Bgrid*self.chg.poscar.lat[0,0]
 
     elif axis == 'a':
-      zcolor = data[:,:,level_floor]*delta_floor + data[:,:,level_ceil]*delta_ceil
       Agrid, Bgrid = np.mgrid[0:1:self.chg.NGF[1]*1j, 0:1:self.chg.NGF[2]*1j]
       # xgrid = Agrid*self.chg.poscar.lat[1,1] + Bgrid*self.chg.poscar.lat[1,2]
       # ygrid = Agrid*self.chg.poscar.lat[2,1] + Bgrid*self.chg.poscar.lat[2,2]
@@ -438,22 +871,9 @@ class Chg:
     p3d.cut_plane(axis=np.array([0.0, 0.0, 1.0]), value=10)
     pass
   
-  def average(self, axis):
-    data = self.chg.Data0
-    if axis == 'c':
-      data = np.average(data, axis=2)
-      data = np.average(data, axis=1)
-      length = np.linalg.norm(self.chg.poscar.lat[2])
-    if axis == 'b':
-      data = np.average(data, axis=2)
-      data = np.average(data, axis=0)
-      length = np.linalg.norm(self.chg.poscar.lat[1])
-    if axis == 'a':
-      data = np.average(data, axis=1)
-      data = np.average(data, axis=0)
-      length = np.linalg.norm(self.chg.poscar.lat[0])
+  def average(self, axis, spin=0):
+    x, data = self.planar_average(axis, spin)
     print('Averaged Data shape, ', data.shape)
-    x = np.linspace(0, length, len(data))
     plt.plot(x, data)
     plt.show()
     
@@ -476,6 +896,11 @@ if __name__ == "__main__":
                       ' tested methods')
   parser.add_argument('-p', '--average', action='store_true', help='averages the '
                       'potential (or charge) along a given axis')
+  parser.add_argument('--lazy', action='store_true', help='does not load the grid,'
+                      ' the averages and cuts are streamed from the file')
+  parser.add_argument('-s', '--sidecar', action='store_true', help='keeps a binary'
+                      ' copy of the grid next to the input file, the later runs'
+                      ' load it instead of parsing the text')
   group = parser.add_mutually_exclusive_group()
   group.add_argument('-l', '--direct_level', type=float,
                       help='level to plot, in direct coords')
@@ -501,7 +926,8 @@ if __name__ == "__main__":
   is_chg = not args.no_scale
       
   
-  chg = Chg(filename=args.inputfile, is_chg=is_chg, verbose=args.verbose)
+  chg = Chg(filename=args.inputfile, is_chg=is_chg, verbose=args.verbose,
+            sidecar=args.sidecar, lazy=args.lazy)
 
   
   
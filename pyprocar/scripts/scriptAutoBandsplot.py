@@ -19,7 +19,7 @@ from scipy.signal import argrelextrema
 
 class AutoBandsPlot:
     def __init__(self, code='vasp', dirname='.'):
-        self.parser = io.Parser(code = 'vasp', dir = dirname)
+        self.parser = io.Parser(code = 'vasp', dir = dirname, artifacts = ["ebs", "structure", "kpath"])
         self.code = code
         self.ebs = self.parser.ebs
         self.dirname = dirname
@@ -378,13 +378,15 @@ class AutoBandsPlot:
         emin, emax = self.eLim
         clim = []
         
-        for atoms in atoms_list:
-            p_up = self.ebs.ebs_sum(atoms=atoms)[:,:,0]
+        # the projections of every group of atoms, in a single pass
+        projections = self.ebs.ebs_sum_batch([{'atoms':atoms} for atoms in atoms_list])
+        for projection in projections:
+            p_up = projection[:,:,0]
             values = p_up[(self.bands_up > emin) & (self.bands_up < emax)]
             vmax_up = np.max(values)
             vmax_down = 0
             if self.ispin == 2:
-                p_down = self.ebs.ebs_sum(atoms=atoms)[:,:,1]
+                p_down = projection[:,:,1]
                 values = p_down[(self.bands_down > emin) & (self.bands_down < emax)]
                 vmax_down = np.max(values)
             vmax = max(vmax_up, vmax_down)
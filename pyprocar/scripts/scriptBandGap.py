@@ -32,7 +32,7 @@ def bandgap(procar:str=None,
 
     bandGap = None
 
-    parser = io.Parser(code = code, dir = dirname)
+    parser = io.Parser(code = code, dir = dirname, artifacts = ["ebs"])
     ebs = parser.ebs
 
     if fermi is None:
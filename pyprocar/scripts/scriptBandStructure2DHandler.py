@@ -76,7 +76,7 @@ class BandStructure2DHandler:
         self.repair = repair
         self.apply_symmetry = apply_symmetry
         
-        parser = io.Parser(code = code, dir = dirname)
+        parser = io.Parser(code = code, dir = dirname, artifacts = ["ebs", "structure"])
         self.ebs = parser.ebs
 
         if fermi is not None:
@@ -101,7 +101,7 @@ def bandsplot(
         for key,value in default_config.as_dict().items():
             print(key,':',value)
 
-    parser = io.Parser(code = code, dir = dirname)
+    parser = io.Parser(code = code, dir = dirname, artifacts = ["ebs", "structure", "kpath"])
     ebs = parser.ebs
     structure = parser.structure
     kpath = parser.kpath
@@ -158,32 +158,31 @@ def bandsplot(
       
         
     elif mode in ["overlay", "overlay_species", "overlay_orbitals"]:
-        weights = []
+        # the weights of all the overlays are computed in a single pass over the projections
+        selections = []
         
         if mode == "overlay_species":
             for ispc in structure.species:
                 labels.append(ispc)
                 atoms = np.where(structure.atoms == ispc)[0]
-                w = ebs_plot.ebs.ebs_sum(
+                selections.append(dict(
                     atoms=atoms,
                     principal_q_numbers=[-1],
                     orbitals=orbitals,
                     spins=spins,
-                )
-                weights.append(w)
+                ))
         if mode == "overlay_orbitals":
             for iorb,orb in enumerate(["s", "p", "d", "f"]):
                 if orb == "f" and not ebs_plot.ebs.norbitals > 9:
                     continue
                 orbitals = orbital_names[orb]
                 labels.append(orb)
-                w = ebs_plot.ebs.ebs_sum(
+                selections.append(dict(
                     atoms=atoms,
                     principal_q_numbers=[-1],
                     orbitals=orbitals,
                     spins=spins,
-                )
-                weights.append(w)
+                ))
 
         elif mode == "overlay":
             if isinstance(items, dict):
@@ -201,13 +200,13 @@ def bandsplot(
                         else:
                             orbitals = it[ispc]
                             labels.append(ispc + "-" + "_".join(str(x) for x in it[ispc]))
-                        w = ebs_plot.ebs.ebs_sum(
+                        selections.append(dict(
                             atoms=atoms,
                             principal_q_numbers=[-1],
                             orbitals=orbitals,
                             spins=spins,
-                        )
-                        weights.append(w)
+                        ))
+        weights = ebs_plot.ebs.ebs_sum_batch(selections)
         ebs_plot.plot_parameteric_overlay(spins=spins,weights=weights)
     else:
         if atoms is not None and isinstance(atoms[0], str):
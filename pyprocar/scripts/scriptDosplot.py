@@ -275,7 +275,7 @@ def dosplot(
         orientation = 'vertical'
 
     
-    parser = io.Parser(code = code, dir = dirname)
+    parser = io.Parser(code = code, dir = dirname, artifacts = ["dos", "structure"])
     dos = parser.dos
     structure = parser.structure
 
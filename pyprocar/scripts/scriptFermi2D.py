@@ -136,7 +136,7 @@ def fermi2D(
             print(key,':',value)
 
 
-    parser = io.Parser(code = code, dir = dirname)
+    parser = io.Parser(code = code, dir = dirname, artifacts = ["ebs", "structure"])
     ebs = parser.ebs
     structure = parser.structure
 
@@ -56,7 +56,7 @@ class FermiHandler:
         self.dirname=dirname
         self.repair = repair
         self.apply_symmetry = apply_symmetry
-        parser = io.Parser(code = code, dir = dirname)
+        parser = io.Parser(code = code, dir = dirname, artifacts = ["ebs", "structure"])
         self.ebs = parser.ebs
 
 
@@ -219,11 +219,8 @@ class FermiHandler:
             energy_values=iso_values
 
 
-        e_surfaces = []
-        for e_value in energy_values:
-            surface=self.data_handler.get_surface_data(property_name=config.property_name,fermi=e_value)
-            e_surfaces.append(surface)
-
+        e_surfaces = self.data_handler.get_surfaces_data(fermi_values=energy_values, property_name=config.property_name)
+        for e_value, surface in zip(energy_values, e_surfaces):
             LOGGER.debug(f'___Getting surface for {e_value}__')
             LOGGER.debug(f'Surface shape: {surface.points.shape}')
             LOGGER.debug(f'Surface shape: {surface.point_data}')
@@ -291,14 +288,12 @@ class FermiHandler:
             energy_values=iso_values
 
 
-        e_surfaces = []
-        for e_value in energy_values:
-            surface=self.data_handler.get_surface_data(fermi=e_value,property_name=config.property_name)
+        e_surfaces = self.data_handler.get_surfaces_data(fermi_values=energy_values, property_name=config.property_name)
+        for e_value, surface in zip(energy_values, e_surfaces):
             LOGGER.debug(f'___Getting surface for {e_value}__')
             LOGGER.debug(f'Surface shape: {surface.points.shape}')
             LOGGER.debug(f'Surface shape: {surface.point_data}')
             LOGGER.debug(f'Surface shape: {surface.point_data}')
-            e_surfaces.append(surface)
 
         visualizer = FermiVisualizer(self.data_handler,config)
         
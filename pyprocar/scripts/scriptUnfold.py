@@ -87,7 +87,7 @@ def unfold(
         for key,value in plot_opt.items():
             print(key,':',value)
     
-    parser = io.Parser(code = code, dir = dirname)
+    parser = io.Parser(code = code, dir = dirname, artifacts = ["ebs", "structure", "kpath"])
     ebs = parser.ebs
     structure = parser.structure
     kpath = parser.kpath
@@ -141,7 +141,8 @@ def unfold(
                 spins=spins)
         ebs_plot.handles = ebs_plot.handles[:ebs_plot.nspins]
     elif mode in ["overlay", "overlay_species", "overlay_orbitals"]:
-        weights = []
+        # the weights of all the overlays are computed in a single pass over the projections
+        selections = []
 
 
         if mode == "overlay_species":
@@ -149,26 +150,24 @@ def unfold(
             for ispc in structure.species:
                 labels.append(ispc)
                 atoms = np.where(structure.atoms == ispc)[0]
-                w = ebs_plot.ebs.ebs_sum(
+                selections.append(dict(
                     atoms=atoms,
                     principal_q_numbers=[-1],
                     orbitals=orbitals,
                     spins=spins,
-                )
-                weights.append(w)
+                ))
         if mode == "overlay_orbitals":
             for iorb in ["s", "p", "d", "f"]:
                 if iorb == "f" and not ebs_plot.ebs.norbitals > 9:
                     continue
                 labels.append(iorb)
                 orbitals = orbital_names[iorb]
-                w = ebs_plot.ebs.ebs_sum(
+                selections.append(dict(
                     atoms=atoms,
                     principal_q_numbers=[-1],
                     orbitals=orbitals,
                     spins=spins,
-                )
-                weights.append(w)
+                ))
 
         elif mode == "overlay":
             if isinstance(items, dict):
@@ -188,13 +187,13 @@ def unfold(
                         else:
                             orbitals = it[ispc]
                             labels.append(ispc + "-" + "_".join(it[ispc]))
-                        w = ebs_plot.ebs.ebs_sum(
+                        selections.append(dict(
                             atoms=atoms,
                             principal_q_numbers=[-1],
                             orbitals=orbitals,
                             spins=spins,
-                        )
-                        weights.append(w)
+                        ))
+        weights = ebs_plot.ebs.ebs_sum_batch(selections)
         ebs_plot.plot_parameteric_overlay(
             spins=spins, vmin=vmin, vmax=vmax, weights=weights
         )
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
+from scipy import fft as scipy_fft
+
+from .config import CONFIG
+
+# Upper bound in bytes of the spectra transformed at once by fft_interpolate_batch
+FFT_CHUNK_SIZE = 2**26
 
 
 def get_angle(v, w, radians=False):
@@ -34,6 +40,33 @@ def get_angle(v, w, radians=False):
 
 
 
+def take_indices(array, index, axis):
+    """
+    Gathers sorted indices along an axis. A range of indices is returned
+    as a view instead of a copy
+
+    Parameters
+    ----------
+    array : np.ndarray
+        The array
+    index : np.ndarray
+        The sorted indices, repeated indices are gathered as many times
+    axis : int
+        The axis
+
+    Returns
+    -------
+    np.ndarray
+        The gathered array
+    """
+    index = np.asarray(index, dtype=int)
+    if len(index) > 0 and index[-1] - index[0] == len(index) - 1 and np.all(np.diff(index) == 1):
+        slices = [slice(None)] * array.ndim
+        slices[axis] = slice(index[0], index[-1] + 1)
+        return array[tuple(slices)]
+    return np.take(array, index, axis=axis)
+
+
 def fft_interpolate(function, interpolation_factor=2, axis=None):
     """
     This method will interpolate using a Fast-Fourier Transform
@@ -48,40 +81,155 @@ def fft_interpolate(function, interpolation_factor=2, axis=None):
         The values array to do the interpolation on.
     interpolation_factor : int, optional
         Interpolation Factor, by default 2
+    axis : int or List[int], optional
+        The axes interpolated, by default all of them
 
     Returns
     -------
     np.ndarray
         The interpolated points
     """
-
+    function = np.asarray(function)
     if axis is None:
         axis = np.arange(function.ndim)
     if type(axis) is int:
         axis = [axis]
-    function = np.array(function)
-    eigen_fft = np.fft.fftn(function)
-    shifted_fft = np.fft.fftshift(eigen_fft)
-    pad_width = []
-    factor = 0
-    for idim in range(function.ndim):
-        if idim in axis:
-            n = shifted_fft.shape[idim]
-            pad = n * (interpolation_factor - 1) // 2
-            factor += 1
-        else:
-            pad = 0
-        pad_width.append([pad, pad])
-    new_matrix = np.pad(shifted_fft, pad_width, "constant", constant_values=0)
-    new_matrix = np.fft.ifftshift(new_matrix)
-    if "complex" in function.dtype.name:
-        interpolated = np.fft.ifftn(new_matrix) * (interpolation_factor * factor)
+    return fft_interpolate_batch(function, interpolation_factor=interpolation_factor, axes=axis)
+
+
+def fft_interpolate_batch(array, interpolation_factor=2, axes=(-3, -2, -1), workers=None):
+    """
+    Fourier interpolates all the slices of an array along some axes. 
+    The slices along the other axes are transformed together by multi-axis FFTs, 
+    in chunks of about FFT_CHUNK_SIZE bytes of spectrum. Real arrays use real to 
+    complex transforms and keep their precision
+
+    Parameters
+    ----------
+    array : np.ndarray
+        The values array, for example a mesh (nx, ny, nz, n_bands, ...) 
+        or a stack of meshes (..., nx, ny, nz)
+    interpolation_factor : float, optional
+        An axis of n points gets round(n * interpolation_factor) points, by default 2
+    axes : List[int], optional
+        The periodic axes interpolated, by default (-3, -2, -1)
+    workers : int, optional
+        The number of threads of the FFTs, by default CONFIG['fft_workers']. 
+        -1 uses all the cpus
+
+    Returns
+    -------
+    np.ndarray
+        The interpolated array, with the axes in the same order
+
+    Raises
+    ------
+    ValueError
+        If an axis is out of bounds or the interpolation factor reduces the number of points
+    """
+    array = np.asarray(array)
+    if workers is None:
+        workers = CONFIG.get("fft_workers", 1) or 1
+    axes = [int(iaxis) for iaxis in np.atleast_1d(axes)]
+    if any(iaxis < -array.ndim or iaxis >= array.ndim for iaxis in axes):
+        raise ValueError(f"The axes {axes} are out of bounds for an array of dimension {array.ndim}")
+    axes = sorted(set(iaxis % array.ndim for iaxis in axes))
+    sizes = [array.shape[iaxis] for iaxis in axes]
+    new_sizes = [max(int(round(n * interpolation_factor)), 1) for n in sizes]
+    if any(m < n for n, m in zip(sizes, new_sizes)):
+        raise ValueError("The interpolation factor must not reduce the number of points")
+    is_complex = np.iscomplexobj(array)
+    if not is_complex and not np.issubdtype(array.dtype, np.floating):
+        array = array.astype(float)
+
+    new_shape = list(array.shape)
+    for iaxis, m in zip(axes, new_sizes):
+        new_shape[iaxis] = m
+    interpolated = np.empty(new_shape, dtype=array.dtype)
+
+    # The batch axes are split in chunks along one axis, the batch axes before it are looped over
+    batch_axes = [iaxis for iaxis in range(array.ndim) if iaxis not in axes]
+    slice_bytes = 16 * np.prod(new_sizes)
+    chunk_axis = None
+    for ibatch, iaxis in enumerate(batch_axes):
+        inner = np.prod([array.shape[jaxis] for jaxis in batch_axes[ibatch + 1:]])
+        chunk_axis = ibatch
+        if inner * slice_bytes <= FFT_CHUNK_SIZE:
+            break
+    if chunk_axis is None:
+        chunks = [(slice(None),) * array.ndim]
     else:
-        interpolated = np.real(np.fft.ifftn(new_matrix)) * (
-            interpolation_factor * factor
-        )
+        inner = np.prod([array.shape[jaxis] for jaxis in batch_axes[chunk_axis + 1:]])
+        n_chunk = max(int(FFT_CHUNK_SIZE // (inner * slice_bytes)), 1)
+        outer_axes = batch_axes[:chunk_axis]
+        chunks = []
+        for outer in np.ndindex(*[array.shape[iaxis] for iaxis in outer_axes]):
+            for start in range(0, array.shape[batch_axes[chunk_axis]], n_chunk):
+                index = [slice(None)] * array.ndim
+                for iaxis, i in zip(outer_axes, outer):
+                    index[iaxis] = slice(i, i + 1)
+                index[batch_axes[chunk_axis]] = slice(start, start + n_chunk)
+                chunks.append(tuple(index))
+
+    for index in chunks:
+        chunk = array[index]
+        # the forward normalization keeps the values when the spectrum is padded
+        if is_complex:
+            spectrum = scipy_fft.fftn(chunk, axes=axes, norm='forward', workers=workers)
+            for iaxis, n, m in zip(axes, sizes, new_sizes):
+                spectrum = _pad_spectrum(spectrum, iaxis, n, m)
+            interpolated[index] = scipy_fft.ifftn(spectrum, axes=axes, norm='forward', workers=workers)
+        else:
+            spectrum = scipy_fft.rfftn(chunk, axes=axes, norm='forward', workers=workers)
+            for iaxis, n, m in zip(axes[:-1], sizes[:-1], new_sizes[:-1]):
+                spectrum = _pad_spectrum(spectrum, iaxis, n, m)
+            spectrum = _pad_spectrum(spectrum, axes[-1], sizes[-1], new_sizes[-1], half=True)
+            interpolated[index] = scipy_fft.irfftn(spectrum, s=new_sizes, axes=axes, norm='forward', workers=workers)
     return interpolated
 
+
+def _pad_spectrum(spectrum, axis, n, m, half=False):
+    """
+    Pads with zeros the high frequencies of a spectrum along an axis. The nyquist 
+    frequency of an even number of points is split between the positive and negative ones
+
+    Parameters
+    ----------
+    spectrum : np.ndarray
+        The spectrum
+    axis : int
+        The axis
+    n : int
+        The number of points of the axis
+    m : int
+        The new number of points of the axis
+    half : bool, optional
+        Boolean if the axis only has the positive frequencies of a real transform. 
+        The default is False.
+
+    Returns
+    -------
+    np.ndarray
+        The padded spectrum
+    """
+    if m == n:
+        return spectrum
+    spectrum = np.moveaxis(spectrum, axis, 0)
+    if half:
+        padded = np.zeros((m // 2 + 1,) + spectrum.shape[1:], dtype=spectrum.dtype)
+        padded[:n // 2 + 1] = spectrum
+        if n % 2 == 0:
+            padded[n // 2] *= 0.5
+    else:
+        padded = np.zeros((m,) + spectrum.shape[1:], dtype=spectrum.dtype)
+        n_positive = (n + 1) // 2
+        padded[:n_positive] = spectrum[:n_positive]
+        padded[m - (n - n_positive):] = spectrum[n_positive:]
+        if n % 2 == 0:
+            padded[m - n // 2] *= 0.5
+            padded[n // 2] = padded[m - n // 2]
+    return np.moveaxis(padded, 0, axis)
+
 def change_of_basis(tensor,A,B):
     """changes the basis of a tensor given the column vectors of A and B
 
@@ -105,3 +253,100 @@ def change_of_basis(tensor,A,B):
         tensor_b = transform_inv.dot(tensor).dot(transform)
         # tensor_b = transform.dot(tensor).dot(transform_inv)
     return tensor_b
+
+
+def methfessel_paxton_delta(x, order=0):
+    """
+    Methfessel-Paxton approximation of the delta function. The order 0 
+    is a gaussian
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The energies in units of the smearing width, (E - e)/sigma
+    order : int, optional
+        The order of the approximation. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        The delta function in units of 1/sigma
+    """
+    x = np.asarray(x, dtype=float)
+    # D_N(x) = \sum_{n=0}^N A_n H_{2n}(x) e^{-x^2}, A_n = (-1)^n / (n! 4^n \sqrt{\pi})
+    coefficients = np.zeros(2 * order + 1)
+    for n in range(order + 1):
+        coefficients[2 * n] = (-1)**n / (np.prod(np.arange(1, n + 1)) * 4**n * np.sqrt(np.pi))
+    return np.polynomial.hermite.hermval(x, coefficients) * np.exp(-x**2)
+
+
+def tetrahedron_dos_weights(corner_energies, energies, is_sorted=False):
+    """
+    Weights of the corners of tetrahedra in the density of states of the 
+    linear tetrahedron method. The density of a tetrahedron at an energy is 
+    the area of the section of the tetrahedron at that energy, the weight of 
+    a corner is the share of the section interpolated from that corner, so 
+    the weights also integrate quantities linear in the tetrahedron
+
+    Parameters
+    ----------
+    corner_energies : np.ndarray
+        The energies of the four corners of the tetrahedra. shape = (n, 4)
+    energies : np.ndarray
+        The energy evaluated for each tetrahedron. shape = (n, )
+    is_sorted : bool, optional
+        Boolean if the corners of every tetrahedron are already sorted by energy. 
+        The default is False.
+
+    Returns
+    -------
+    np.ndarray
+        The weights of the corners, they add up to the density of states 
+        of a tetrahedron of unit volume. shape = (n, 4)
+    """
+    corner_energies = np.asarray(corner_energies, dtype=float)
+    energies = np.asarray(energies, dtype=float)
+    if is_sorted:
+        e = corner_energies
+    else:
+        order = np.argsort(corner_energies, axis=1)
+        e = np.take_along_axis(corner_energies, order, axis=1)
+    weights = np.zeros_like(e)
+
+    def fractions(mask, edges):
+        # the fraction of the edge (i, j) from the corner j to the section
+        energy = energies[mask]
+        corners = e[mask]
+        return energy, corners, [(energy - corners[:, j]) / (corners[:, i] - corners[:, j]) for i, j in edges]
+
+    # The section is a triangle between the two lowest corners
+    mask = (e[:, 0] < energies) & (energies <= e[:, 1])
+    if np.any(mask):
+        energy, corners, (a21, a31, a41) = fractions(mask, [(1, 0), (2, 0), (3, 0)])
+        volume = a21 * a31 * a41 / (energy - corners[:, 0])
+        weights[mask] = volume[:, np.newaxis] * np.stack(
+            [3 - a21 - a31 - a41, a21, a31, a41], axis=1)
+
+    # The section is a quadrilateral, split in two triangles
+    mask = (e[:, 1] < energies) & (energies <= e[:, 2])
+    if np.any(mask):
+        energy, corners, (a31, a41, a32, a42) = fractions(mask, [(2, 0), (3, 0), (2, 1), (3, 1)])
+        a13, a14, a23, a24 = 1 - a31, 1 - a41, 1 - a32, 1 - a42
+        volume_1 = (a31 * a41 * a24 / (energy - corners[:, 0]))[:, np.newaxis]
+        volume_2 = (a23 * a31 * a42 / (energy - corners[:, 0]))[:, np.newaxis]
+        weights[mask] = (volume_1 * np.stack([a13 + a14, a24, a31, a41 + a42], axis=1) +
+                         volume_2 * np.stack([a13, a23 + a24, a31 + a32, a42], axis=1))
+
+    # The section is a triangle between the two highest corners
+    mask = (e[:, 2] < energies) & (energies < e[:, 3])
+    if np.any(mask):
+        energy, corners, (a14, a24, a34) = fractions(mask, [(0, 3), (1, 3), (2, 3)])
+        volume = a14 * a24 * a34 / (corners[:, 3] - energy)
+        weights[mask] = volume[:, np.newaxis] * np.stack(
+            [a14, a24, a34, 3 - a14 - a24 - a34], axis=1)
+
+    if is_sorted:
+        return weights
+    unsorted_weights = np.empty_like(weights)
+    np.put_along_axis(unsorted_weights, order, weights, axis=1)
+    return unsorted_weights
@@ -1,5 +1,9 @@
 import numpy as np
-from pyprocar.core.structure import Structure
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+
+# Upper bound in bytes of the block of eigenvectors contracted at once by Unfolder.weights
+UNFOLD_CHUNK_SIZE = 2**26
 
 class Unfolder:
     def __init__(
@@ -85,30 +89,33 @@ class Unfolder:
         can just ignore them? Will it change the energy spectrum?
 
         """
-        a1 = Structure(
-            atoms=["H"], fractional_coordinates=[[0, 0, 0]], lattice=np.diag([1, 1, 1])
-        )
-        sc = a1.transform(self.trans_mat)
-        rs = sc.fractional_coordinates
-
-        # a1 = Atoms(symbols="H", positions=[(0, 0, 0)], cell=[1, 1, 1])
-        # sc = make_supercell(a1, self.trans_mat)
-        # rs = sc.get_scaled_positions()
-
-        positions = self.positions
+        # the translations are the lattice points of the unit cell inside the supercell.
+        # N*inv(trans_mat) is an integer matrix, so every one of them is reached from [0,N)^3
+        N = abs(int(np.linalg.det(self.trans_mat).round()))
+        grid = np.indices((N, N, N)).reshape(3, -1).T
+        rs = np.dot(grid, np.linalg.inv(self.trans_mat))
+        rs = np.round(rs - np.floor(np.round(rs, 8)), 8) + 0.0
+        rs = np.unique(rs, axis=0)
+
+        # the labels of the basis as integers
+        _, labels = np.unique(self.basis, return_inverse=True)
+        # periodic tree of the basis positions, wrapped in [0,1).
+        # The chebyshev distance matches the tolerance on every component
+        positions = np.mod(np.array(self.positions, dtype=float), 1.0)
+        positions[positions == 1.0] = 0.0
+        tree = cKDTree(positions, boxsize=1.0)
         indices = np.zeros([len(rs), len(positions)], dtype="int32")
         for i, ri in enumerate(rs):
-            Tpositions = positions + np.array(ri)
-            def close_to_int(x): return np.all(
-                np.abs(x - np.round(x)) < self.tol_radius)
-            for i_basis, pos in enumerate(positions):
-                for j_basis, Tpos in enumerate(Tpositions):
-                    dpos = Tpos - pos
-
-                    if close_to_int(dpos) and (
-                        self.basis[i_basis] == self.basis[j_basis]
-                    ):
-                        indices[i, j_basis] = i_basis
+            Tpositions = np.mod(positions + np.array(ri), 1.0)
+            Tpositions[Tpositions == 1.0] = 0.0
+            pairs = tree.sparse_distance_matrix(cKDTree(Tpositions, boxsize=1.0), 
+                                                max_distance=self.tol_radius, 
+                                                p=np.inf, 
+                                                output_type="ndarray")
+            i_basis, j_basis = pairs["i"], pairs["j"]
+            same_basis = labels[i_basis] == labels[j_basis]
+            # the last matching basis is kept
+            np.maximum.at(indices[i], j_basis[same_basis], i_basis[same_basis])
         self.trans_rs = rs
         self.trans_indices = indices
 
@@ -149,6 +156,43 @@ class Unfolder:
 
         return weight.real
 
+    def _get_weights(self, evecs, qpts, G=None):
+        """
+        get the weights of all the modes of a set of qpoints at once,
+        same as _get_weight for every mode. The translations are summed
+        into a single sparse operator, built from trans_indices, so that
+
+        W_KJ = Re <KJ| A |KJ>,  A[indices[i][j], j] = 1/N sum_i e^{-j G.r_i}
+
+        and the weights are a contraction of the eigenvectors with the
+        translated eigenvectors.
+
+        evecs: the eigenvectors of shape (nqpts, nmodes, nbasis)
+        qpts: the qpoints of shape (nqpts, 3)
+        """
+        if G is None:
+            G = np.zeros_like(qpts)
+        N = self.nfold
+        nbasis = evecs.shape[-1]
+        rows = np.reshape(self.trans_indices, (-1,))
+        cols = np.tile(np.arange(nbasis), len(self.trans_rs))
+        weights = np.zeros(evecs.shape[:2])
+        unique_G, G_index = np.unique(G, axis=0, return_inverse=True)
+        G_index = np.reshape(G_index, (-1,))
+        for iG, G_i in enumerate(unique_G):
+            phases = np.exp(-1j * 2 * np.pi * np.dot(self.trans_rs, G_i)) / N
+            translation = coo_matrix(
+                (np.repeat(phases, nbasis), (rows, cols)), shape=(nbasis, nbasis)
+            ).tocsc()
+            iqpts = np.nonzero(G_index == iG)[0]
+            evecs_G = np.reshape(evecs[iqpts], (-1, nbasis))
+            translated = translation.T.dot(evecs_G.T).T
+            weights[iqpts] = np.reshape(
+                np.einsum("ij,ij->i", np.conj(evecs_G), translated).real,
+                (len(iqpts), -1),
+            )
+        return weights
+
     @property
     def weights(self):
         """
@@ -156,11 +200,13 @@ class Unfolder:
         """
         nqpts, nfreqs = self.eigenvectors.shape[0], self.eigenvectors.shape[1]
         weights = np.zeros([nqpts, nfreqs, self.ebs.nspins])
+        # the qpoints are processed in chunks to bound the memory of the gathered eigenvectors
+        qpt_size = max(self.eigenvectors[:1, :, :, 0].nbytes, 1)
+        nqpts_chunk = max(UNFOLD_CHUNK_SIZE // qpt_size, 1)
         for ispin in range(self.ebs.nspins):
-            for iqpt in range(nqpts):
-                for ifreq in range(nfreqs):
-                    weights[iqpt, ifreq, ispin] = self._get_weight(
-                        self.eigenvectors[iqpt, ifreq,
-                                          :, ispin], self.qpoints[iqpt]
-                    )
-            return weights
+            for start in range(0, nqpts, nqpts_chunk):
+                chunk = slice(start, start + nqpts_chunk)
+                weights[chunk, :, ispin] = self._get_weights(
+                    self.eigenvectors[chunk, :, :, ispin], self.qpoints[chunk]
+                )
+        return weights
@@ -0,0 +1,53 @@
+import pytest
+import numpy as np
+from pyprocar.core import DensityOfStates
+
+N_ATOMS, N_PRINCIPALS, N_ORBITALS, N_DOS = 4, 2, 9, 50
+
+def make_dos(n_spins):
+    rng = np.random.default_rng(n_spins)
+    energies = np.linspace(-5, 5, N_DOS)
+    projected = rng.random((N_ATOMS, N_PRINCIPALS, N_ORBITALS, n_spins, N_DOS))
+    total = projected.sum(axis=(0, 1, 2))
+    if n_spins != 2:
+        total = total[:1]
+    return DensityOfStates(energies=energies, total=total, efermi=0.0, projected=projected)
+
+def dos_sum_loop(dos, atoms=None, principal_q_numbers=[-1], orbitals=None, spins=None):
+    """The summation one projection at a time"""
+    projected = dos.projected
+    if atoms is None:
+        atoms = np.arange(len(projected), dtype=int)
+    if spins is None:
+        spins = np.arange(len(projected[0][0][0]), dtype=int)
+    if orbitals is None:
+        orbitals = np.arange(len(projected[0][0]), dtype=int)
+    ret = np.zeros(shape=(2 if dos.n_spins == 2 else 1, dos.n_dos))
+    for iatom in atoms:
+        for iprinc in principal_q_numbers:
+            for ispin in spins:
+                temp = np.array(projected[iatom][iprinc])
+                ret[ispin if dos.n_spins == 2 else 0, :] += temp[orbitals, ispin].sum(axis=0)
+    return ret
+
+SELECTIONS = [{},
+              {'atoms':[0, 2]},
+              {'atoms':[1], 'orbitals':[1, 2, 3]},
+              {'atoms':[0, 0, 3], 'principal_q_numbers':[0, -1], 'orbitals':[4, 4, 8]},
+              {'spins':[0]},
+              {'atoms':[2, 3], 'orbitals':[0], 'spins':[0]}]
+
+@pytest.mark.parametrize("n_spins", [1, 2, 4])
+@pytest.mark.parametrize("selection", SELECTIONS)
+def test_dos_sum_matches_loop(n_spins, selection):
+    dos = make_dos(n_spins)
+    assert np.allclose(dos.dos_sum(**selection), dos_sum_loop(dos, **selection))
+
+@pytest.mark.parametrize("n_spins", [1, 2, 4])
+def test_dos_sum_batch_matches_dos_sum(n_spins):
+    dos = make_dos(n_spins)
+    batch = dos.dos_sum_batch(SELECTIONS)
+    assert batch.shape == (len(SELECTIONS), 2 if n_spins == 2 else 1, N_DOS)
+    for summed, selection in zip(batch, SELECTIONS):
+        assert np.allclose(summed, dos_sum_loop(dos, **selection))
+    assert dos.dos_sum_batch([]).shape == (0, 2 if n_spins == 2 else 1, N_DOS)
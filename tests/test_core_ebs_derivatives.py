@@ -0,0 +1,89 @@
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure
+from pyprocar.core.ebs import METER_ANGSTROM, calculate_central_differences_on_meshgrid_axis
+
+N_K = 8
+STEP = 2 * np.pi / N_K
+
+@pytest.fixture
+def kpoints():
+    grid = np.arange(N_K) / N_K
+    kx, ky, kz = np.meshgrid(grid, grid, grid, indexing='ij')
+    return np.stack([kx.ravel(), ky.ravel(), kz.ravel()], axis=1)
+
+def make_ebs(kpoints, bands, **kwargs):
+    return ElectronicBandStructure(kpoints=kpoints,
+                                   bands=bands,
+                                   efermi=0.0,
+                                   n_kx=N_K, n_ky=N_K, n_kz=N_K,
+                                   reciprocal_lattice=np.eye(3),
+                                   **kwargs)
+
+def cosine_bands(kpoints):
+    """cos(2 pi kx) and sin(2 pi kx) sin(2 pi ky), for both spins"""
+    x, y = 2 * np.pi * kpoints[:, 0], 2 * np.pi * kpoints[:, 1]
+    bands = np.stack([np.cos(x), np.sin(x) * np.sin(y)], axis=1)
+    return np.stack([bands, 2 * bands], axis=2)
+
+@pytest.mark.parametrize("method, factor", [('spectral', STEP), ('finite_difference', np.sin(STEP))])
+def test_gradient_of_cosines(kpoints, method, factor):
+    ebs = make_ebs(kpoints, cosine_bands(kpoints), derivative_method=method)
+    x, y = 2 * np.pi * kpoints[:, 0], 2 * np.pi * kpoints[:, 1]
+    gradient = ebs.bands_gradient / METER_ANGSTROM
+    assert gradient.shape == (N_K**3, 2, 2, 3)
+    assert np.allclose(gradient[:, 0, 0], np.stack([-factor * np.sin(x), 0 * x, 0 * x], axis=1))
+    assert np.allclose(gradient[:, 1, 1], 2 * factor * np.stack([np.cos(x) * np.sin(y), np.sin(x) * np.cos(y), 0 * x], axis=1))
+
+@pytest.mark.parametrize("method, factor", [('spectral', STEP), ('finite_difference', np.sin(STEP))])
+def test_hessian_of_cosines(kpoints, method, factor):
+    ebs = make_ebs(kpoints, cosine_bands(kpoints), derivative_method=method)
+    x, y = 2 * np.pi * kpoints[:, 0], 2 * np.pi * kpoints[:, 1]
+    hessian = ebs.bands_hessian / METER_ANGSTROM**2
+    assert hessian.shape == (N_K**3, 2, 2, 3, 3)
+    expected = np.zeros((N_K**3, 3, 3))
+    expected[:, 0, 0] = -factor**2 * np.cos(x)
+    assert np.allclose(hessian[:, 0, 0], expected)
+    expected = np.zeros((N_K**3, 3, 3))
+    expected[:, 0, 0] = expected[:, 1, 1] = -factor**2 * np.sin(x) * np.sin(y)
+    expected[:, 0, 1] = expected[:, 1, 0] = factor**2 * np.cos(x) * np.cos(y)
+    assert np.allclose(hessian[:, 1, 0], expected)
+
+def test_finite_differences_match_the_central_differences(kpoints):
+    rng = np.random.default_rng(0)
+    reciprocal_lattice = rng.random((3, 3))
+    ebs = make_ebs(kpoints, rng.random((N_K**3, 3, 1)))
+    ebs._reciprocal_lattice = reciprocal_lattice
+    diffs = np.stack([calculate_central_differences_on_meshgrid_axis(ebs.bands_mesh, axis) for axis in range(3)], axis=-1)
+    expected = np.einsum('ij,uvwbsj->uvwbsi', reciprocal_lattice, diffs) * METER_ANGSTROM
+    assert np.allclose(ebs.bands_gradient_mesh / METER_ANGSTROM, expected / METER_ANGSTROM)
+
+def test_single_precision(kpoints):
+    ebs = make_ebs(kpoints, cosine_bands(kpoints), derivative_method='spectral')
+    single = make_ebs(kpoints, cosine_bands(kpoints), derivative_method='spectral', derivative_dtype=np.float32)
+    assert single.bands_hessian.dtype == np.float32
+    assert np.allclose(single.bands_gradient / METER_ANGSTROM, ebs.bands_gradient / METER_ANGSTROM, atol=1e-5)
+    assert np.all(np.isfinite(single.harmonic_average_effective_mass[:, 0]))
+
+def test_derived_properties_follow_the_bands(kpoints):
+    ebs = make_ebs(kpoints, cosine_bands(kpoints), derivative_method='spectral')
+    gradient = ebs.bands_gradient / METER_ANGSTROM
+    hessian = ebs.bands_hessian / METER_ANGSTROM**2
+    ebs.bands = 2 * ebs.bands
+    assert np.allclose(ebs.bands_gradient / METER_ANGSTROM, 2 * gradient)
+    assert np.allclose(ebs.bands_hessian / METER_ANGSTROM**2, 2 * hessian)
+    ebs.derivative_method = 'finite_difference'
+    assert not np.allclose(ebs.bands_gradient / METER_ANGSTROM, 2 * gradient)
+    with pytest.raises(ValueError):
+        ebs.derivative_method = 'spline'
+
+def test_interpolate_mesh_grid(kpoints):
+    ebs = make_ebs(kpoints, cosine_bands(kpoints))
+    interpolated = ebs.interpolate_mesh_grid(ebs.bands_mesh, interpolation_factor=2)
+    assert interpolated.shape == (2 * N_K, 2 * N_K, 2 * N_K, 2, 2)
+    # the bands are band limited, the interpolation is exact on the finer mesh
+    grid = np.arange(2 * N_K) / (2 * N_K)
+    kx, ky, kz = np.meshgrid(grid, grid, grid, indexing='ij')
+    fine_kpoints = np.stack([kx.ravel(), ky.ravel(), kz.ravel()], axis=1)
+    expected = ebs.array_to_mesh(cosine_bands(fine_kpoints), nkx=2 * N_K, nky=2 * N_K, nkz=2 * N_K)
+    assert np.allclose(interpolated, expected)
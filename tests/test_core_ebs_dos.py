@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure
+from pyprocar.io import vasp
+
+EFERMI = 5.0
+SIGMA = 0.1
+# The bands in absolute energies, like the parsers read them
+BAND_ENERGIES = np.array([4.5, 6.0])
+
+def gaussian_dos(energies):
+    """Density of states of the flat bands, 2 electrons per state"""
+    x = (energies[:, np.newaxis] - BAND_ENERGIES[np.newaxis, :]) / SIGMA
+    return 2 * np.sum(np.exp(-x**2), axis=1) / (SIGMA * np.sqrt(np.pi))
+
+@pytest.fixture
+def doscar_dos(tmp_path):
+    energies = np.linspace(3.0, 7.0, 401)
+    total = gaussian_dos(energies)
+    lines = ["   1   1   0   1\n"] + ["  header\n"] * 4
+    lines.append(f"  {energies[-1]:.8f}  {energies[0]:.8f}  {len(energies)}  {EFERMI:.8f}  1.00000000\n")
+    for energy, dos in zip(energies, total):
+        lines.append(f"  {energy:.8f}  {dos:.8E}  0.00000000E+00\n")
+    filename = tmp_path / "DOSCAR"
+    filename.write_text("".join(lines))
+    return vasp.Doscar(filename).dos
+
+@pytest.fixture
+def flat_bands_ebs():
+    n_kpoints = 8
+    kpoints = np.zeros((n_kpoints, 3))
+    kpoints[:, 0] = np.arange(n_kpoints) / n_kpoints
+    bands = np.tile(BAND_ENERGIES, (n_kpoints, 1))[:, :, np.newaxis]
+    return ElectronicBandStructure(kpoints=kpoints,
+                                   bands=bands,
+                                   efermi=EFERMI,
+                                   reciprocal_lattice=np.eye(3))
+
+def test_get_dos_energies_are_relative_to_efermi(flat_bands_ebs):
+    dos = flat_bands_ebs.get_dos(sigma=SIGMA, project=False)
+    peaks = dos.energies[np.argsort(dos.total[0])[-2:]]
+    assert np.allclose(np.sort(peaks), BAND_ENERGIES - EFERMI, atol=dos.energies[1] - dos.energies[0])
+
+def test_get_dos_matches_parser_dos(flat_bands_ebs, doscar_dos):
+    dos = flat_bands_ebs.get_dos(energies=doscar_dos.energies, sigma=SIGMA, project=False)
+    assert np.allclose(dos.energies, doscar_dos.energies)
+    assert dos.efermi == doscar_dos.efermi
+    assert np.allclose(dos.total, doscar_dos.total, atol=1e-2 * doscar_dos.total.max())
@@ -0,0 +1,89 @@
+import itertools
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure
+
+N_K = 6
+
+def cubic_rotations():
+    """The 48 signed permutation matrices of the cubic point group"""
+    rotations = []
+    for permutation in itertools.permutations(range(3)):
+        for signs in itertools.product([1, -1], repeat=3):
+            rotation = np.zeros((3, 3))
+            rotation[range(3), permutation] = signs
+            rotations.append(rotation)
+    return np.array(rotations)
+
+def wrap(kpoints, decimals=4):
+    return (-np.fmod(kpoints + 6.5, 1) + 0.5).round(decimals=decimals)
+
+def reference_ibz2fbz(kpoints, values, rotations, decimals=4):
+    """The unfolding of ElectronicBandStructure.ibz2fbz before the kpoint index map,
+    the values are copied once per rotation"""
+    n_rotations = len(rotations)
+    rotated = wrap(np.concatenate([kpoints.dot(rotation.T) for rotation in rotations]), decimals)
+    values = np.concatenate([values] * n_rotations)
+    _, unique_indices = np.unique(rotated, axis=0, return_index=True)
+    rotated, values = rotated[unique_indices], values[unique_indices]
+    sorted_indices = np.lexsort((rotated[:, 2], rotated[:, 1], rotated[:, 0]))
+    return rotated[sorted_indices], values[sorted_indices]
+
+@pytest.fixture
+def ibz_ebs():
+    rotations = cubic_rotations()
+    grid = np.arange(N_K) / N_K - 0.5
+    mesh = np.array(list(itertools.product(grid, repeat=3)))
+    # one kpoint per orbit of the rotations
+    orbits = wrap(np.einsum('rij,kj->kri', rotations, mesh))
+    kpoints = np.unique([min(map(tuple, orbit)) for orbit in orbits], axis=0)
+
+    rng = np.random.default_rng(0)
+    bands = np.cos(2 * np.pi * kpoints).sum(axis=1)[:, np.newaxis, np.newaxis] * np.array([1.0, 2.0])[np.newaxis, :, np.newaxis]
+    projected = rng.random((len(kpoints), 2, 2, 1, 3, 1))
+    ebs = ElectronicBandStructure(kpoints=kpoints, bands=bands, efermi=0.0, projected=projected, reciprocal_lattice=np.eye(3))
+    return ebs, rotations
+
+def test_ibz2fbz_matches_reference(ibz_ebs):
+    ebs, rotations = ibz_ebs
+    ibz_kpoints = ebs.kpoints.copy()
+    ibz_bands = ebs.bands.copy()
+    ibz_projected = ebs.projected.copy()
+
+    ebs.ibz2fbz(rotations)
+
+    expected_kpoints, expected_bands = reference_ibz2fbz(ibz_kpoints, ibz_bands, rotations)
+    _, expected_projected = reference_ibz2fbz(ibz_kpoints, ibz_projected, rotations)
+    assert len(ebs.kpoints) == N_K**3
+    assert np.array_equal(ebs.kpoints, expected_kpoints)
+    assert np.array_equal(ebs.bands, expected_bands)
+    assert np.array_equal(ebs.projected, expected_projected)
+    assert np.array_equal(ebs.ibz_kpoints, ibz_kpoints)
+
+def test_ibz2fbz_map_points_to_the_irreducible_kpoints(ibz_ebs):
+    ebs, rotations = ibz_ebs
+    fbz_kpoints, ibz_indices, rotation_indices = ebs.get_ibz2fbz_map(rotations)
+    rotated = np.einsum('kij,kj->ki', rotations[rotation_indices], ebs.kpoints[ibz_indices])
+    assert np.array_equal(wrap(rotated), fbz_kpoints)
+
+def test_ibz2fbz_map_is_cached(ibz_ebs):
+    ebs, rotations = ibz_ebs
+    first = ebs.get_ibz2fbz_map(rotations)
+    assert ebs.get_ibz2fbz_map(rotations) is first
+    assert ebs.get_ibz2fbz_map(rotations, decimals=3) is not first
+    assert ebs.get_ibz2fbz_map(rotations[:24]) is not first
+
+    # the kpoints changed in place are a different key
+    ebs.kpoints[0] += 0.01
+    changed = ebs.get_ibz2fbz_map(rotations)
+    assert changed is not first
+    assert not np.array_equal(changed[0], first[0])
+
+def test_ibz2fbz_map_cache_is_cleared_with_the_kpoints(ibz_ebs):
+    ebs, rotations = ibz_ebs
+    ebs.get_ibz2fbz_map(rotations)
+    ebs.ibz2fbz(rotations)
+    assert ebs._ibz2fbz_maps == {}
+    fbz_kpoints, ibz_indices, _ = ebs.get_ibz2fbz_map(rotations)
+    assert np.array_equal(fbz_kpoints, ebs.kpoints)
+    assert len(ibz_indices) == len(ebs.kpoints)
@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure
+from pyprocar.core import ebs as ebs_module
+
+N_KPOINTS, N_BANDS, N_ATOMS, N_PRINCIPALS, N_ORBITALS = 7, 3, 5, 2, 9
+
+def make_ebs(n_spins):
+    rng = np.random.default_rng(n_spins)
+    kpoints = rng.random((N_KPOINTS, 3))
+    bands = rng.random((N_KPOINTS, N_BANDS, 2 if n_spins == 2 else 1))
+    projected = rng.random((N_KPOINTS, N_BANDS, N_ATOMS, N_PRINCIPALS, N_ORBITALS, n_spins))
+    return ElectronicBandStructure(kpoints=kpoints, bands=bands, efermi=0.0, projected=projected)
+
+def ebs_sum_reference(ebs, atoms=None, principal_q_numbers=[-1], orbitals=None, spins=None, sum_noncolinear=True):
+    """The summation over the full projections"""
+    principal_q_numbers = np.array(principal_q_numbers)
+    if atoms is None:
+        atoms = np.arange(ebs.natoms, dtype=int)
+    if spins is None:
+        spins = np.arange(ebs.nspins, dtype=int)
+    if orbitals is None:
+        orbitals = np.arange(ebs.norbitals, dtype=int)
+    ret = np.sum(ebs.projected[:, :, :, :, orbitals, :], axis=-2)
+    ret = np.sum(ret[:, :, :, principal_q_numbers, :], axis=-2)
+    ret = np.sum(ret[:, :, atoms, :], axis=-2)
+    if ebs.is_non_collinear and sum_noncolinear:
+        ret = np.sum(ret[:, :, spins], axis=-1).reshape(ebs.nkpoints, ebs.nbands, 1)
+    return ret
+
+# species overlays share their orbitals, orbital overlays share their atoms
+SPECIES_SELECTIONS = [{'atoms':[0]}, {'atoms':[1, 2]}, {'atoms':[3, 4]}, {'atoms':[0, 2, 4]}]
+ORBITAL_SELECTIONS = [{'atoms':[1, 3], 'orbitals':[0]},
+                      {'atoms':[1, 3], 'orbitals':[1, 2, 3]},
+                      {'atoms':[1, 3], 'orbitals':[4, 5, 6, 7, 8]}]
+MIXED_SELECTIONS = [{},
+                    {'atoms':[2, 2, 4], 'orbitals':[3, 1]},
+                    {'principal_q_numbers':[0, -1], 'orbitals':[8]},
+                    {'atoms':[0], 'spins':[0]}]
+
+@pytest.mark.parametrize("n_spins", [1, 2, 4])
+@pytest.mark.parametrize("selections", [SPECIES_SELECTIONS, ORBITAL_SELECTIONS, MIXED_SELECTIONS])
+def test_ebs_sum_batch_matches_reference(n_spins, selections):
+    ebs = make_ebs(n_spins)
+    batch = ebs.ebs_sum_batch(selections)
+    for summed, selection in zip(batch, selections):
+        assert np.allclose(summed, ebs_sum_reference(ebs, **selection))
+        assert np.allclose(ebs.ebs_sum(**selection), ebs_sum_reference(ebs, **selection))
+
+def test_ebs_sum_batch_keeps_the_non_collinear_spins():
+    ebs = make_ebs(4)
+    batch = ebs.ebs_sum_batch(MIXED_SELECTIONS, sum_noncolinear=False)
+    for summed, selection in zip(batch, MIXED_SELECTIONS):
+        assert np.allclose(summed, ebs_sum_reference(ebs, sum_noncolinear=False, **selection))
+
+def test_ebs_sum_batch_chunks(monkeypatch):
+    ebs = make_ebs(2)
+    batch = ebs.ebs_sum_batch(SPECIES_SELECTIONS + ORBITAL_SELECTIONS)
+    monkeypatch.setattr(ebs_module, "PROJECTION_CHUNK_SIZE", 1)
+    assert np.array_equal(ebs.ebs_sum_batch(SPECIES_SELECTIONS + ORBITAL_SELECTIONS), batch)
@@ -0,0 +1,36 @@
+import inspect
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure
+from pyprocar.core.fermisurface3D import FermiSurface3D
+from pyprocar.cfg import ConfigFactory, PlotType
+
+N_K = 10
+
+@pytest.fixture
+def ebs():
+    grid = np.arange(N_K) / N_K - 0.5
+    kx, ky, kz = np.meshgrid(grid, grid, grid, indexing='ij')
+    kpoints = np.stack([kx.ravel(), ky.ravel(), kz.ravel()], axis=1)
+    dispersion = np.cos(2 * np.pi * kpoints).sum(axis=1)
+    bands = dispersion[:, np.newaxis] * np.array([1.0, 2.0, 3.0])[np.newaxis, :] + np.array([0.0, 0.5, -0.5])
+    return ElectronicBandStructure(kpoints=kpoints,
+                                   bands=bands,
+                                   efermi=0.0,
+                                   n_kx=N_K, n_ky=N_K, n_kz=N_K,
+                                   reciprocal_lattice=np.eye(3))
+
+def test_isosurface_workers_default_matches_the_config():
+    config = ConfigFactory.create_config(PlotType.FERMI_SURFACE_3D)
+    default = inspect.signature(FermiSurface3D).parameters['isosurface_workers'].default
+    assert default == config.isosurface_workers
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_concurrent_isosurfaces_match_serial(ebs, executor):
+    serial = FermiSurface3D(ebs, isosurface_workers=1)
+    concurrent = FermiSurface3D(ebs, isosurface_workers=3, isosurface_executor=executor)
+
+    assert serial.band_isosurface_index_map == concurrent.band_isosurface_index_map
+    assert np.array_equal(serial.points, concurrent.points)
+    assert np.array_equal(serial.faces, concurrent.faces)
+    assert np.array_equal(serial.point_data['band_index'], concurrent.point_data['band_index'])
@@ -0,0 +1,89 @@
+import pytest
+import numpy as np
+from pyprocar.core import isosurface
+from pyprocar.core.isosurface import Isosurface, map2matrix, map2matrix_mapping
+
+def map2matrix_loop(XYZ, V):
+    """The mapping of every cell of the regular grid, one cell at a time"""
+    X = np.unique(XYZ[:, 0])
+    Y = np.unique(XYZ[:, 1])
+    Z = np.unique(XYZ[:, 2])
+    mapped_func = np.zeros(shape=(len(X), len(Y), len(Z)))
+    for ix in range(len(X)):
+        condition1 = XYZ[:, 0] == X[ix]
+        for iy in range(len(Y)):
+            condition2 = XYZ[:, 1] == Y[iy]
+            for iz in range(len(Z)):
+                condition3 = XYZ[:, 2] == Z[iz]
+                tot_cond = np.all([condition1, condition2, condition3], axis=0)
+                if len(V[tot_cond]) != 0:
+                    mapped_func[ix, iy, iz] = V[tot_cond][0]
+                else:
+                    mapped_func[ix, iy, iz] = np.nan
+    return mapped_func
+
+@pytest.fixture
+def points():
+    """A shuffled 4x5x3 grid with missing and repeated points, with 2 bands"""
+    rng = np.random.default_rng(0)
+    grid = np.indices((4, 5, 3)).reshape(3, -1).T * np.array([0.25, 0.2, 1 / 3]) - 0.5
+    XYZ = rng.permutation(grid)[:50]
+    XYZ = np.concatenate([XYZ, XYZ[:5]])
+    V = rng.random((len(XYZ), 2))
+    return XYZ, V
+
+def test_map2matrix_matches_loop(points):
+    XYZ, V = points
+    mapped = map2matrix(XYZ, V[:, 0])
+    assert mapped.shape == (4, 5, 3)
+    assert np.array_equal(np.isnan(mapped), np.isnan(map2matrix_loop(XYZ, V[:, 0])))
+    assert np.allclose(mapped, map2matrix_loop(XYZ, V[:, 0]), equal_nan=True)
+
+def test_map2matrix_keeps_the_extra_dimensions(points):
+    XYZ, V = points
+    mapped = map2matrix(XYZ, V)
+    assert mapped.shape == (4, 5, 3, 2)
+    for iband in range(V.shape[1]):
+        assert np.allclose(mapped[..., iband], map2matrix_loop(XYZ, V[:, iband]), equal_nan=True)
+
+def test_map2matrix_shares_the_mapping(points):
+    XYZ, V = points
+    mapping = map2matrix_mapping(XYZ)
+    for iband in range(V.shape[1]):
+        assert np.array_equal(map2matrix(XYZ, V[:, iband], mapping=mapping),
+                              map2matrix(XYZ, V[:, iband]), equal_nan=True)
+
+@pytest.fixture
+def band_grid():
+    """A cubic band on a 8x8x8 grid of the first brillouin zone"""
+    grid = np.arange(8) / 8 - 0.5
+    kx, ky, kz = np.meshgrid(grid, grid, grid, indexing='ij')
+    XYZ = np.stack([kx.ravel(), ky.ravel(), kz.ravel()], axis=1)
+    V = np.cos(2 * np.pi * XYZ).sum(axis=1)
+    return XYZ, V
+
+def test_shared_cache_gives_the_same_surfaces(band_grid, monkeypatch):
+    XYZ, V = band_grid
+    n_interpolations = []
+    fft_interpolate = isosurface.fft_interpolate
+    def count_fft_interpolate(*args, **kwargs):
+        n_interpolations.append(1)
+        return fft_interpolate(*args, **kwargs)
+    monkeypatch.setattr(isosurface, "fft_interpolate", count_fft_interpolate)
+
+    isovalues = [-1.0, 0.0, 0.5, 1.5]
+    cache = {}
+    cached_surfaces = [Isosurface(XYZ=XYZ, V=V, isovalue=isovalue, interpolation_factor=2,
+                                  transform_matrix=np.eye(3), cache=cache)
+                       for isovalue in isovalues]
+    # the grids are interpolated once and shared by all the isovalues
+    assert len(n_interpolations) == 1
+    assert "V_matrix" in cache
+
+    for isovalue, cached_surface in zip(isovalues, cached_surfaces):
+        surface = Isosurface(XYZ=XYZ, V=V, isovalue=isovalue, interpolation_factor=2, transform_matrix=np.eye(3))
+        assert cached_surface.cache is None
+        assert surface.points.shape[0] != 0
+        assert np.array_equal(cached_surface.points, surface.points)
+        assert np.array_equal(cached_surface.faces, surface.faces)
+    assert len(n_interpolations) == 1 + len(isovalues)
@@ -0,0 +1,107 @@
+import os
+import glob
+import shutil
+
+import pytest
+import numpy as np
+from pyprocar.core import DensityOfStates
+from pyprocar.io import cache
+from pyprocar.io.cache import ParserCache
+from pyprocar.utils.config import CONFIG
+
+@pytest.fixture
+def calculation_dir(tmp_path):
+    dirname = tmp_path / "calculation"
+    dirname.mkdir()
+    (dirname / "DOSCAR").write_text("DOSCAR\n")
+    (dirname / "vasprun.xml").write_text("<modeling/>\n")
+    return dirname
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+@pytest.fixture
+def dos():
+    energies = np.linspace(-1.0, 1.0, 11)
+    return DensityOfStates(energies=energies, total=np.exp(-energies**2)[np.newaxis], efermi=0.5)
+
+def test_entry_roundtrip(calculation_dir, cache_dir, dos):
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=dos, artifacts=["dos"])
+    cached = ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load()
+
+    assert list(cached) == ["dos"]
+    assert np.array_equal(cached["dos"].energies, dos.energies)
+    assert np.array_equal(cached["dos"].total, dos.total)
+    assert cached["dos"].efermi == dos.efermi
+
+def test_entry_depends_on_the_parse_options(calculation_dir, cache_dir, dos, monkeypatch):
+    monkeypatch.setitem(CONFIG, "vasp_dos_source", "vasprun")
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=dos, artifacts=["dos"])
+
+    monkeypatch.setitem(CONFIG, "vasp_dos_source", "doscar")
+    assert ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load() is None
+
+    monkeypatch.setitem(CONFIG, "vasp_dos_source", "vasprun")
+    assert ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load() is not None
+
+def test_entry_is_discarded_when_a_source_file_changes(calculation_dir, cache_dir, dos):
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=dos, artifacts=["dos"])
+    (calculation_dir / "DOSCAR").write_text("DOSCAR of another calculation\n")
+    assert ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load() is None
+
+@pytest.mark.parametrize("full_hash", [True, False])
+def test_entry_hash_of_the_source_files(calculation_dir, cache_dir, dos, monkeypatch, full_hash):
+    monkeypatch.setattr(cache, "HASH_SAMPLE_SIZE", 4)
+    doscar = calculation_dir / "DOSCAR"
+    doscar.write_text("head-0123456789-tail\n")
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir, full_hash=full_hash).save(dos=dos, artifacts=["dos"])
+
+    # an edit in the middle of the file that keeps its size and modification time
+    stat = os.stat(doscar)
+    doscar.write_text("head-9876543210-tail\n")
+    os.utime(doscar, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    cached = ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir, full_hash=full_hash).load()
+    # only the head and the tail of the file are hashed when full_hash is False
+    assert (cached is None) == full_hash
+
+@pytest.fixture
+def locked_entry(monkeypatch):
+    """Simulates the files of an entry that are memory-mapped on Windows, 
+    they can be neither removed nor linked"""
+    rmtree = shutil.rmtree
+    def fake_rmtree(path, ignore_errors=False):
+        if os.path.basename(os.path.normpath(path)).startswith(".tmp-"):
+            return rmtree(path, ignore_errors=ignore_errors)
+        for filename in glob.glob(os.path.join(path, "*")):
+            if not filename.endswith(".npy"):
+                os.remove(filename)
+    def fake_link(src, dst):
+        raise OSError("links are not supported")
+    monkeypatch.setattr(shutil, "rmtree", fake_rmtree)
+    monkeypatch.setattr(os, "link", fake_link)
+
+def test_entry_is_copied_over_files_that_cannot_be_removed(calculation_dir, cache_dir, dos, locked_entry):
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=dos, artifacts=["dos"])
+    loaded = ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load()
+    assert loaded is not None
+
+    new_dos = DensityOfStates(energies=dos.energies, total=2 * dos.total, efermi=0.25)
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=new_dos, artifacts=["dos"])
+    cached = ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load()
+
+    assert np.array_equal(cached["dos"].total, new_dos.total)
+    assert cached["dos"].efermi == new_dos.efermi
+    assert glob.glob(os.path.join(cache_dir, ".tmp-*")) == []
+
+def test_entry_is_invalid_when_a_file_cannot_be_overwritten(calculation_dir, cache_dir, dos, locked_entry, monkeypatch):
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=dos, artifacts=["dos"])
+    def fake_copyfile(src, dst):
+        raise PermissionError("the file is memory-mapped")
+    monkeypatch.setattr(shutil, "copyfile", fake_copyfile)
+
+    new_dos = DensityOfStates(energies=dos.energies, total=2 * dos.total, efermi=0.25)
+    ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).save(dos=new_dos, artifacts=["dos"])
+    assert ParserCache("vasp", str(calculation_dir), cache_dir=cache_dir).load() is None
+    assert glob.glob(os.path.join(cache_dir, ".tmp-*")) == []
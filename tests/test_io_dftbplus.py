@@ -0,0 +1,74 @@
+import os
+import pytest
+import numpy as np
+from pyprocar.io import dftbplus, vasp
+
+KPOINTS = np.array([[0.0, 0.0, 0.0, 0.5],
+                    [0.5, 0.0, 0.0, 0.5]])
+BANDS = np.array([[-5.0, 1.0],
+                  [-4.0, 2.0]])
+ORBITALS = ["s", "px", "py", "pz"]
+# The coefficients, shape = (n_kpoints, n_bands, n_atoms, n_orbitals)
+COEFFICIENTS = (np.arange(32).reshape(2, 2, 2, 4) % 5 + 1) * (0.1 + 0.05j)
+
+def write_calculation(dirname):
+    (dirname / "detailed.out").write_text("Fermi level:      -0.1102471240 H           -3.0000 eV\n")
+    kpoints = " ".join(f"{x:.6f}" for x in KPOINTS.ravel())
+    (dirname / "detailed.xml").write_text(
+        "<detailedout>\n"
+        "<geometry>\n"
+        "<typenames> \"Si\" </typenames>\n"
+        "<typesandcoordinates>\n 1 0.000000 0.000000 0.000000\n 1 2.565000 2.565000 2.565000\n</typesandcoordinates>\n"
+        "<latticevectors>\n 0.000000 5.130000 5.130000\n 5.130000 0.000000 5.130000\n 5.130000 5.130000 0.000000\n</latticevectors>\n"
+        "</geometry>\n"
+        f"<kpointsandweights>\n{kpoints}\n</kpointsandweights>\n"
+        "</detailedout>\n")
+
+    lines = []
+    for ikpoint, (kpoint, energies) in enumerate(zip(KPOINTS, BANDS)):
+        lines.append(f" KPT            {ikpoint + 1}  SPIN            1  KWEIGHT    {kpoint[3]:.16f}\n")
+        for iband, energy in enumerate(energies):
+            lines.append(f"     {iband + 1}   {energy:.3f}  2.00000\n")
+        lines.append("\n")
+    (dirname / "band.out").write_text("".join(lines))
+
+    lines = []
+    for ikpoint, kpoint_coefficients in enumerate(COEFFICIENTS):
+        for iband, band_coefficients in enumerate(kpoint_coefficients):
+            lines.append(f" K-point:    {ikpoint + 1}    Eigenvector:   {iband + 1}    (up)\n\n")
+            for iatom, atom_coefficients in enumerate(band_coefficients):
+                for iorbital, (orbital, value) in enumerate(zip(ORBITALS, atom_coefficients)):
+                    label = f"{iatom + 1:6d}  Si" if iorbital == 0 else " " * 10
+                    lines.append(f"{label}  {orbital:6s} ( {value.real:.6f}  {value.imag:.6f} )  {abs(value)**2:.6f}\n")
+                lines.append("\n")
+    (dirname / "eigenvec.out").write_text("".join(lines))
+
+@pytest.fixture
+def calculation_dir(tmp_path):
+    dirname = tmp_path / "calculation"
+    dirname.mkdir()
+    write_calculation(dirname)
+    return dirname
+
+def test_ebs_is_built_in_memory(calculation_dir):
+    parser = dftbplus.DFTBParser(dirname=str(calculation_dir), n_workers=1)
+
+    assert parser.efermi == -3.0
+    assert np.allclose(parser.ebs.kpoints, KPOINTS[:, :3])
+    assert np.allclose(parser.ebs.bands[..., 0], BANDS - parser.efermi)
+    assert np.allclose(parser.ebs.projected[:, :, :, 0, :, 0], np.abs(COEFFICIENTS)**2)
+    assert sorted(os.listdir(calculation_dir)) == ["band.out", "detailed.out", "detailed.xml", "eigenvec.out"]
+
+def test_vasp_files_are_written_in_dirname(calculation_dir, tmp_path, monkeypatch):
+    working_dir = tmp_path / "working"
+    working_dir.mkdir()
+    monkeypatch.chdir(working_dir)
+
+    parser = dftbplus.DFTBParser(dirname=str(calculation_dir), n_workers=1, write_vasp_files=True)
+
+    assert os.listdir(working_dir) == []
+    for filename in ["PROCAR", "POSCAR", "OUTCAR"]:
+        assert (calculation_dir / filename).is_file()
+    # the PROCAR has the projections of the band structure built in memory
+    procar = vasp.Procar(str(calculation_dir / "PROCAR"), efermi=parser.efermi)
+    assert np.allclose(procar.ebs.projected, parser.ebs.projected, atol=1e-5)
@@ -0,0 +1,113 @@
+import pytest
+import numpy as np
+from pyprocar.io.elk import ElkParser, read_band_blocks, HARTREE_TO_EV
+
+N_ATOMS = 2
+N_ORBITALS = 16
+# the kpoints of the two segments of the path, the ticks are at 0, 3 and 6
+X_POINTS = np.array([0.0, 0.1, 0.2, 0.3, 0.45, 0.6, 0.75])
+TICKS = [0, 3, 6]
+HIGH_SYMMETRY_POINTS = np.array([[0.0, 0.0, 0.0], [0.5, 0.0, 0.0], [0.5, 0.5, 0.0]])
+
+def write_band_files(dirname, nspin, rng):
+    nkpoints = len(X_POINTS)
+    raw_nbands = 3 * nspin
+    bands = rng.random((raw_nbands, nkpoints)) - 0.5
+    lines = []
+    for band in bands:
+        lines.extend(f"  {x:.8E}  {energy:.8E}\n" for x, energy in zip(X_POINTS, band))
+        lines.append("     \n")
+    (dirname / "BANDS.OUT").write_text("".join(lines))
+
+    lines = []
+    for itick in TICKS:
+        lines.append(f"  {X_POINTS[itick]:.8E}  {-1.0:.8E}\n  {X_POINTS[itick]:.8E}  {1.0:.8E}\n     \n")
+    (dirname / "BANDLINES.OUT").write_text("".join(lines))
+
+    filenames = [str(dirname / "BANDS.OUT")]
+    for iatom in range(N_ATOMS):
+        lines = []
+        for band in bands:
+            for x, energy in zip(X_POINTS, band):
+                lines.append(f"  {x:.8E}  {energy:.8E}" + "".join(f"  {w:.8E}" for w in rng.random(N_ORBITALS)) + "\n")
+            lines.append("     \n")
+        filename = dirname / f"BAND_S01_A{iatom + 1:04d}.OUT"
+        filename.write_text("".join(lines))
+        filenames.append(str(filename))
+    return filenames
+
+def make_parser(dirname, filenames, nspin, n_workers):
+    parser = ElkParser.__new__(ElkParser)
+    parser.dir = str(dirname)
+    parser.elkin = "tasks\n  20\n\n"
+    parser.file_names = list(filenames)
+    parser.nkpoints = len(X_POINTS)
+    parser.nhigh_sym = len(HIGH_SYMMETRY_POINTS)
+    parser.high_symmetry_points = HIGH_SYMMETRY_POINTS
+    parser.kdirect = True
+    parser.reclat = np.eye(3)
+    parser.nspin = nspin
+    parser.fermi = 0.25
+    parser.natom = N_ATOMS
+    parser.n_workers = n_workers
+    return parser
+
+def read_bands_per_line(parser, filenames):
+    """The per-line loops the BANDS*.OUT files were read with before read_band_blocks"""
+    with open(filenames[0]) as rf:
+        lines = rf.readlines()
+    raw_nbands = int(len(lines) / (parser.nkpoints + 1))
+    iline = 0
+    raw_bands = np.zeros(shape=(parser.nkpoints, raw_nbands))
+    for iband in range(raw_nbands):
+        for ikpoint in range(parser.nkpoints):
+            raw_bands[ikpoint, iband] = float(lines[iline].split()[1])
+            iline += 1
+        iline += 1
+    raw_bands *= HARTREE_TO_EV
+
+    nbands = raw_nbands // parser.nspin
+    bands = np.zeros(shape=(parser.nkpoints, nbands, parser.nspin))
+    for ispin in range(parser.nspin):
+        bands[:, :, ispin] = raw_bands[:, ispin * nbands:(ispin + 1) * nbands]
+    bands += parser.fermi
+
+    spd = np.zeros(shape=(parser.nkpoints, nbands, parser.nspin, parser.natom + 1, N_ORBITALS + 2))
+    for ifile in range(parser.natom):
+        with open(filenames[ifile + 1]) as rf:
+            lines = rf.readlines()
+        iline = 0
+        for iband in range(nbands):
+            for ikpoint in range(parser.nkpoints):
+                temp = np.array([float(x) for x in lines[iline].split()])
+                spd[ikpoint, iband, 0, ifile, 0] = ifile + 1
+                spd[ikpoint, iband, 0, ifile, 1:-1] = temp[2:]
+                iline += 1
+            iline += 1
+    spd[:, :, :, :, -1] = np.sum(spd[:, :, :, :, 1:-1], axis=4)
+    spd[:, :, :, -1, :] = spd.sum(axis=3)
+    spd[:, :, 0, -1, 0] = 0
+    if parser.nspin == 2:
+        spd[:, :nbands // 2, 1] = spd[:, :nbands // 2, 0]
+        spd[:, nbands // 2:, 1] = -1 * spd[:, nbands // 2:, 0]
+    return bands, spd
+
+def test_read_band_blocks(tmp_path):
+    filenames = write_band_files(tmp_path, 1, np.random.default_rng(0))
+    values = read_band_blocks(filenames[1], len(X_POINTS), nbands=2)
+    assert values.shape == (len(X_POINTS), 2, N_ORBITALS + 2)
+    assert np.array_equal(values[:, 0, 0], X_POINTS)
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+@pytest.mark.parametrize("nspin", [1, 2])
+def test_bands_match_the_per_line_reader(tmp_path, nspin, n_workers):
+    filenames = write_band_files(tmp_path, nspin, np.random.default_rng(nspin))
+    parser = make_parser(tmp_path, filenames, nspin, n_workers)
+    parser._read_bands()
+
+    bands, spd = read_bands_per_line(parser, filenames)
+    assert parser.kticks == TICKS
+    assert np.allclose(parser.kpoints[TICKS], HIGH_SYMMETRY_POINTS)
+    assert np.array_equal(parser.bands, bands)
+    assert np.count_nonzero(spd[..., 1:-1]) != 0
+    assert np.array_equal(parser.spd, spd)
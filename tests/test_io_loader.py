@@ -0,0 +1,68 @@
+import time
+import threading
+
+import pytest
+from pyprocar.io.loader import ConcurrentLoader
+from pyprocar.utils.config import CONFIG
+
+def slow_square(x):
+    # the first items finish last
+    time.sleep(0.01 * (5 - x))
+    return x**2
+
+def fail(message):
+    raise RuntimeError(message)
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_results_by_name(n_workers):
+    with ConcurrentLoader(n_workers=n_workers) as loader:
+        for x in range(5):
+            loader.submit(f"square {x}", slow_square, x)
+        assert "square 0" in loader
+        assert [loader.result(f"square {x}") for x in range(5)] == [0, 1, 4, 9, 16]
+        # a result is kept after it is requested
+        assert loader.result("square 3") == 9
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_map_keeps_the_order_of_the_items(n_workers):
+    with ConcurrentLoader(n_workers=n_workers) as loader:
+        assert list(loader.map(slow_square, range(5))) == [0, 1, 4, 9, 16]
+
+def test_tasks_run_on_the_workers():
+    with ConcurrentLoader(n_workers=1) as loader:
+        loader.submit("thread", threading.get_ident)
+        assert loader.result("thread") == threading.get_ident()
+    with ConcurrentLoader(n_workers=2) as loader:
+        loader.submit("thread", threading.get_ident)
+        assert loader.result("thread") != threading.get_ident()
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_exceptions_are_raised_with_their_result(n_workers):
+    with ConcurrentLoader(n_workers=n_workers) as loader:
+        loader.submit("fail", fail, "the file is truncated")
+        loader.submit("square", slow_square, 2)
+        # the task that fails does not affect the others
+        assert loader.result("square") == 4
+        with pytest.raises(RuntimeError, match="the file is truncated"):
+            loader.result("fail")
+
+    with ConcurrentLoader(n_workers=n_workers) as loader:
+        results = loader.map(lambda x: fail(f"item {x}") if x == 2 else x, range(4))
+        assert next(results) == 0
+        assert next(results) == 1
+        with pytest.raises(RuntimeError, match="item 2"):
+            next(results)
+
+def test_task_names_are_unique():
+    with ConcurrentLoader(n_workers=1) as loader:
+        loader.submit("square", slow_square, 2)
+        with pytest.raises(ValueError):
+            loader.submit("square", slow_square, 3)
+        with pytest.raises(ValueError):
+            loader.result("cube")
+
+def test_default_number_of_workers(monkeypatch):
+    monkeypatch.setitem(CONFIG, "parser_workers", 4)
+    assert ConcurrentLoader().n_workers == 4
+    monkeypatch.setitem(CONFIG, "parser_workers", None)
+    assert ConcurrentLoader().n_workers == 1
@@ -0,0 +1,177 @@
+import re
+
+import pytest
+import numpy as np
+from pyprocar.io.lobster import LobsterParser, read_fatband_file
+
+N_EDOS = 6
+EFERMI = 0.75
+# the element and the orbitals of each projected block
+PROJECTIONS = [("Si1", "3s 3p_y 3p_z 3p_x"), ("O2", "2s 2p_y 2p_z 2p_x"), ("Fe3", "4s 3d_xy 3d_yz 3d_z^2 3d_xz 3d_x^2-y^2")]
+LOBSTEROUT = "".join(f"calculating FatBand for Element: {element} Orbital(s):  {orbitals}\n" for element, orbitals in PROJECTIONS)
+
+def write_doscar_lobster(filename, is_spin_polarized, rng):
+    n_spin = 2 if is_spin_polarized else 1
+    energies = np.linspace(-3, 3, N_EDOS)
+    header = f"  {3.0:.8f}  {-3.0:.8f}  {N_EDOS:4d}  {EFERMI:.8f}  {1.0:.8f}"
+    lines = [f"   {len(PROJECTIONS)}   {len(PROJECTIONS)}   1   {n_spin}\n",
+             "  0.1E+02  0.4E-09  0.4E-09  0.4E-09  0.5E-15\n",
+             "  1.0E-04\n",
+             "  CAR \n",
+             " LOBSTER\n",
+             header + "\n"]
+    total = np.column_stack([energies, rng.random((N_EDOS, 2 * n_spin))])
+    lines.extend("".join(f" {x:11.5f}" for x in row) + "\n" for row in total)
+    for iion, (_, orbitals) in enumerate(PROJECTIONS):
+        block = np.column_stack([energies, rng.random((N_EDOS, len(orbitals.split()) * n_spin))])
+        lines.append(f"{header}; Z= {iion + 1}; {orbitals}\n")
+        lines.extend("".join(f" {x:11.5f}" for x in row) + "\n" for row in block)
+    filename.write_text("".join(lines))
+
+def parse_doscar_per_line(filename, lobsterout):
+    """The per-line reader DOSCAR.lobster was parsed with before vasp.Doscar"""
+    with open(filename) as rf:
+        data = rf.readlines()
+    iline = 5
+    ndos = int(float(data[iline].split()[2]))
+    iline += 1
+    total_dos = np.array([[float(x) for x in y.split()] for y in data[iline:iline + ndos]])
+    iline += ndos
+    is_spin_polarized = total_dos.shape[1] == 5
+
+    labels = ['s', 'p_y', 'p_z', 'p_x', 'd_xy', 'd_yz', 'd_z^2', 'd_xz', 'd_x^2-y^2']
+    final_projected = []
+    while iline < len(data):
+        header = data[iline]
+        ndos = int(float(header.split(";")[0].split()[2]))
+        iline += 1
+        projected_dos = np.array([[float(x) for x in y.split()] for y in data[iline:iline + ndos]])
+        iline += ndos
+
+        tmp_dos = np.zeros(shape=[ndos, 10, 2])
+        for ilabel, label in enumerate(header.split(";")[2].split(), 1):
+            tmp_dos[:, 0, 0] = projected_dos[:, 0]
+            if is_spin_polarized:
+                tmp_dos[:, 0, 1] = projected_dos[:, 0]
+            for iorbital, orbital in enumerate(labels, 1):
+                if label.find(orbital) == True:
+                    if is_spin_polarized:
+                        tmp_dos[:, iorbital, 0] += projected_dos[:, 2 * ilabel - 1]
+                        tmp_dos[:, iorbital, 1] += projected_dos[:, 2 * ilabel]
+                    else:
+                        tmp_dos[:, iorbital, 0] += projected_dos[:, ilabel]
+                    break
+        final_projected.append(tmp_dos)
+    ions = [element for element, _ in PROJECTIONS]
+    return {'total': total_dos, 'projected': final_projected, 'projected_labels_info': ['energies'] + labels, 'ions': ions}
+
+@pytest.fixture
+def parser():
+    parser = LobsterParser.__new__(LobsterParser)
+    parser.lobsterout = LOBSTEROUT
+    return parser
+
+@pytest.mark.parametrize("is_spin_polarized", [False, True])
+def test_doscar_lobster_matches_the_per_line_reader(tmp_path, parser, is_spin_polarized):
+    filename = tmp_path / "DOSCAR.lobster"
+    write_doscar_lobster(filename, is_spin_polarized, np.random.default_rng(int(is_spin_polarized)))
+
+    data = parser._parse_doscar(str(filename))
+    expected = parse_doscar_per_line(filename, LOBSTEROUT)
+    assert np.array_equal(data["total"], expected["total"])
+    assert data["projected_labels_info"] == expected["projected_labels_info"]
+    assert data["ions"] == expected["ions"]
+    assert len(data["projected"]) == len(PROJECTIONS)
+    for projected, expected_projected in zip(data["projected"], expected["projected"]):
+        assert np.array_equal(projected, expected_projected)
+
+
+N_KPOINTS = 3
+N_BANDS = 4
+ORBITALS = ['s', 'p_y', 'p_z', 'p_x', 'd_xy', 'd_yz', 'd_z^2', 'd_xz', 'd_x^2-y^2']
+# The ion and orbital of each FATBAND file, the f orbitals are not in the spd array
+FATBANDS = [("Si1", "3s"), ("Si1", "3p_z"), ("O2", "2p_x"), ("Fe3", "3d_z^2"), ("Fe3", "4f_xyz")]
+
+def write_fatband_files(dirname, nspin, rng):
+    kpoints = rng.random((N_KPOINTS, 3)) - 0.5
+    bands = np.sort(rng.random((N_KPOINTS, nspin * N_BANDS)) * 10 - 5, axis=1)
+    filenames = []
+    for ion, orbital in FATBANDS:
+        lines = [f"# FATBAND for {ion} {orbital}\n", f"# Energy (eV) of the bands, NBANDS {N_BANDS}\n"]
+        for ik, kpoint in enumerate(kpoints):
+            lines.append(f"# K-Point {ik + 1} : " + " ".join(f"{x:.5f}" for x in kpoint) + "\n")
+            # the spin down bands follow the spin up bands of each kpoint
+            for energy, weight in zip(bands[ik], rng.random(nspin * N_BANDS)):
+                lines.append(f"  {ik / N_KPOINTS:.5f}  {energy:11.5f}  {weight:.5f}\n")
+        filename = dirname / f"FATBAND_{ion}_{orbital}.lobster"
+        filename.write_text("".join(lines))
+        filenames.append(str(filename))
+    return filenames
+
+def make_fatband_parser(filenames, nspin, n_workers):
+    parser = LobsterParser.__new__(LobsterParser)
+    parser.file_names = filenames
+    parser.nspin = nspin
+    parser.ionsList = ["Si1", "O2", "Fe3"]
+    parser.ionsCount = len(parser.ionsList)
+    parser.orbitals = ORBITALS
+    parser.n_workers = n_workers
+    return parser
+
+def read_fatbands_per_line(parser):
+    """The per-line reader the FATBAND files were parsed with before read_fatband_file"""
+    with open(parser.file_names[0]) as rf:
+        projFile = rf.read()
+    raw_kpoints = re.findall(r"# K-Point \d+ :\s*([-\.\d]*)\s*([-\.\d]*)\s*([-\.\d]*)", projFile)
+    kpoints = np.array(raw_kpoints, dtype=float)
+    bands_count = int(re.findall(r"NBANDS (\d*)", projFile)[0])
+    spd = np.zeros(shape=(len(kpoints), bands_count, parser.nspin, parser.ionsCount + 1, len(parser.orbitals) + 2))
+    bands = np.zeros(shape=(len(kpoints), bands_count, parser.nspin))
+    for filename in parser.file_names:
+        with open(filename) as rf:
+            projFile = rf.read()
+        current_ion, current_orbital = re.findall(r"#\sFATBAND\sfor(.*)", projFile)[0].split()[:2]
+        current_orbital = current_orbital[1:]
+        iion = 0
+        iorbital = 0
+        for i, ion in enumerate(parser.ionsList):
+            if ion == current_ion:
+                iion = i
+        for i, orbital in enumerate(parser.orbitals):
+            if orbital == current_orbital:
+                iorbital = i + 1
+        for ik, fatband in enumerate(re.split("# K-Point", projFile)[1:]):
+            lines = fatband.split("\n")[1:-1]
+            for iband, band in enumerate(lines):
+                if parser.nspin == 2:
+                    if iband < bands_count:
+                        bands[ik, iband, 0] = float(band.split()[1])
+                        bands[ik, iband, 1] = float(lines[iband + bands_count].split()[1])
+                        spd[ik, iband, 0, iion, iorbital] = float(band.split()[2])
+                        spd[ik, iband, 1, iion, iorbital] = float(lines[iband + bands_count].split()[2])
+                else:
+                    bands[ik, iband, 0] = float(band.split()[1])
+                    spd[ik, iband, 0, iion, iorbital] = float(band.split()[2])
+    spd[:, :, :, :, -1] = np.sum(spd[:, :, :, :, 1:-1], axis=4)
+    spd[:, :, :, -1, :] = np.sum(spd[:, :, :, 0:-1, :], axis=3)
+    spd[:, :, :, -1, 0] = 0
+    return kpoints, bands, spd
+
+def test_read_fatband_file(tmp_path):
+    filenames = write_fatband_files(tmp_path, 2, np.random.default_rng(0))
+    ion, orbital, values = read_fatband_file(filenames[3])
+    assert (ion, orbital) == ("Fe3", "d_z^2")
+    assert values.shape == (N_KPOINTS, 2 * N_BANDS, 2)
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+@pytest.mark.parametrize("nspin", [1, 2])
+def test_fatbands_match_the_per_line_reader(tmp_path, nspin, n_workers):
+    filenames = write_fatband_files(tmp_path, nspin, np.random.default_rng(nspin))
+    parser = make_fatband_parser(filenames, nspin, n_workers)
+    parser._readFatBands()
+
+    kpoints, bands, spd = read_fatbands_per_line(parser)
+    assert np.array_equal(parser.kpoints, kpoints)
+    assert np.array_equal(parser.bands, bands)
+    assert np.count_nonzero(spd[..., 1:-1]) != 0
+    assert np.array_equal(parser.spd, spd)
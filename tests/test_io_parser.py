@@ -0,0 +1,132 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+import numpy as np
+from pyprocar.core import DensityOfStates
+from pyprocar.io import vasp
+from pyprocar.io.parser import Parser
+from pyprocar.utils.config import CONFIG
+
+class FakeOutcar:
+    threads = []
+    error = None
+
+    def __init__(self, filename):
+        FakeOutcar.threads.append(threading.get_ident())
+        if FakeOutcar.error is not None:
+            raise FakeOutcar.error
+        self.rotations = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+        self.n_kx, self.n_ky, self.n_kz = 2, 3, 4
+        self.efermi = 1.5
+
+class FakePoscar:
+    def __init__(self, filename, rotations=None):
+        self.structure = SimpleNamespace(filename=filename, rotations=rotations, reciprocal_lattice=[[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+
+class FakeKpoints:
+    def __init__(self, filename):
+        self.kpath = SimpleNamespace(filename=filename)
+
+class FakeProcar:
+    def __init__(self, filename, **kwargs):
+        self.ebs = SimpleNamespace(filename=filename, **kwargs)
+
+class FakeVaspXML:
+    def __init__(self, filename, sections=None):
+        self.dos = SimpleNamespace(filename=filename, sections=sections)
+
+@pytest.fixture
+def fake_vasp(monkeypatch):
+    """Replaces the vasp readers by fakes recording the threads they run on"""
+    FakeOutcar.threads = []
+    FakeOutcar.error = None
+    monkeypatch.setattr(vasp, "Outcar", FakeOutcar)
+    monkeypatch.setattr(vasp, "Poscar", FakePoscar)
+    monkeypatch.setattr(vasp, "Kpoints", FakeKpoints)
+    monkeypatch.setattr(vasp, "Procar", FakeProcar)
+    monkeypatch.setattr(vasp, "VaspXML", FakeVaspXML)
+
+def test_parse_vasp_is_independent_of_the_number_of_workers(tmp_path, fake_vasp):
+    (tmp_path / "vasprun.xml").write_text("<modeling/>\n")
+    serial = Parser("vasp", str(tmp_path), use_cache=False, n_workers=1).parse_vasp()
+    concurrent = Parser("vasp", str(tmp_path), use_cache=False, n_workers=3).parse_vasp()
+
+    assert set(serial) == {"ebs", "dos", "structure", "kpath"}
+    assert serial == concurrent
+    # the OUTCAR is read on the calling thread, then on a worker thread
+    assert FakeOutcar.threads[0] == threading.get_ident()
+    assert FakeOutcar.threads[1] != threading.get_ident()
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_parse_vasp_raises_the_errors_of_the_workers(tmp_path, fake_vasp, n_workers):
+    FakeOutcar.error = ValueError("OUTCAR seems truncated")
+    parser = Parser("vasp", str(tmp_path), use_cache=False, n_workers=n_workers)
+    with pytest.raises(ValueError, match="OUTCAR seems truncated"):
+        parser.parse_vasp(["structure"])
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    """Replaces the vasp code parser by a mock recording the objects it is asked for. 
+    The mock also provides the structure along with the ebs, like the real one"""
+    calls = []
+    def parse_vasp(self, artifacts, parsed):
+        calls.append(list(artifacts))
+        energies = np.linspace(-1.0, 1.0, 5)
+        objects = {
+            "ebs": SimpleNamespace(bands=np.zeros((2, 3)), efermi=0.5),
+            "dos": DensityOfStates(energies=energies.copy(), total=np.ones((1, 5)), efermi=0.5),
+            "structure": SimpleNamespace(atoms=["Si"]),
+            "kpath": SimpleNamespace(knames=[]),
+        }
+        names = set(artifacts)
+        if "ebs" in names:
+            names.add("structure")
+        parsed.update({name: objects[name] for name in names})
+        return parsed
+    monkeypatch.setattr(Parser, "parse_vasp", parse_vasp)
+    return calls
+
+def test_only_the_accessed_objects_are_parsed(tmp_path, parse_calls):
+    parser = Parser("vasp", str(tmp_path), use_cache=False)
+    assert parse_calls == []
+
+    dos = parser.dos
+    assert parse_calls == [["dos"]]
+    # the energies are shifted back by the fermi energy once
+    assert np.allclose(dos.energies, np.linspace(-1.0, 1.0, 5) + 0.5)
+
+    assert parser.dos is dos
+    assert np.allclose(parser.dos.energies, np.linspace(-1.0, 1.0, 5) + 0.5)
+    assert parse_calls == [["dos"]]
+
+    ebs = parser.ebs
+    assert parse_calls == [["dos"], ["ebs"]]
+    assert np.allclose(ebs.bands, 0.5)
+    # the structure came with the ebs
+    parser.structure
+    assert parser.ebs is ebs
+    assert parse_calls == [["dos"], ["ebs"]]
+
+def test_requested_objects_are_parsed_together(tmp_path, parse_calls):
+    parser = Parser("vasp", str(tmp_path), use_cache=False, artifacts=["structure", "kpath"])
+    assert parse_calls == [["structure", "kpath"]]
+    parser.structure
+    parser.kpath
+    parser.parse(["kpath"])
+    assert parse_calls == [["structure", "kpath"]]
+
+    with pytest.raises(ValueError):
+        parser.parse(["bands"])
+
+def test_cached_objects_are_not_parsed_again(tmp_path, parse_calls, monkeypatch):
+    monkeypatch.setitem(CONFIG, "parser_cache_dir", str(tmp_path / "cache"))
+    (tmp_path / "vasprun.xml").write_text("<modeling/>\n")
+
+    dos = Parser("vasp", str(tmp_path), use_cache=True).dos
+    assert parse_calls == [["dos"]]
+    cached_dos = Parser("vasp", str(tmp_path), use_cache=True).dos
+    assert parse_calls == [["dos"]]
+    assert np.allclose(cached_dos.energies, dos.energies)
+    assert np.allclose(cached_dos.total, dos.total)
@@ -0,0 +1,209 @@
+import os
+import re
+
+import pytest
+import numpy as np
+import xml.etree.ElementTree as ET
+from pyprocar.io.qe import QEParser, COLINEAR_PDOS_ORBITALS, NONCOLINEAR_PDOS_ORBITALS
+
+N_KPOINTS = 3
+N_BANDS = 4
+N_ATOMS = 2
+
+# The (atom, orbital) of each wfc number, the last wfc maps to the same projection as another one
+COLINEAR_WFCS = [(1, 0), (1, 1), (1, 2), (1, 3), (2, 4), (2, 5), (2, 6), (2, 7), (2, 8), (2, 4)]
+NONCOLINEAR_WFCS = [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (2, 12), (2, 13), (2, 14), (2, 15), (2, 16), (2, 17)]
+
+def make_parser(is_non_colinear, n_spin, wfcs, n_orbitals):
+    parser = QEParser.__new__(QEParser)
+    parser.is_non_colinear = is_non_colinear
+    parser.n_k = N_KPOINTS
+    parser.n_band = N_BANDS
+    parser.n_spin = n_spin
+    parser.n_atoms = N_ATOMS
+    parser.ionsCount = N_ATOMS
+    parser.n_orbitals = n_orbitals
+    parser.n_workers = 1
+    parser.wfc_mapping = {f"wfc_{iwfc}": {"orbital": iorb, "atom": iatm} for iwfc, (iatm, iorb) in enumerate(wfcs, 1)}
+    return parser
+
+def projs_text(values):
+    return "\n" + "".join(f"  {x.real:.10E}  {x.imag:.10E}\n" for x in values) + "    "
+
+def write_atomic_proj(filename, is_non_colinear, n_spin, n_wfc, rng):
+    n_channels = 1 if is_non_colinear else n_spin
+    lines = ['<?xml version="1.0"?>\n<PROJECTIONS>\n',
+             f'  <HEADER NUMBER_OF_BANDS="{N_BANDS}" NUMBER_OF_K-POINTS="{N_KPOINTS}" NUMBER_OF_SPIN_COMPONENTS="{n_spin}" '
+             f'NUMBER_OF_ATOMIC_WFC="{n_wfc}" NUMBER_OF_ELECTRONS="8.0" FERMI_ENERGY="0.1"/>\n',
+             '  <EIGENSTATES>\n']
+    # the k-points of the second spin channel follow the ones of the first
+    for ispin in range(n_channels):
+        for ik in range(N_KPOINTS):
+            lines.append(f'    <K-POINT Weight="{1 / N_KPOINTS}"> {ik / N_KPOINTS} 0.0 0.0</K-POINT>\n')
+            lines.append("    <E>" + " ".join(f"{x:.6f}" for x in np.sort(rng.random(N_BANDS))) + "</E>\n    <PROJS>\n")
+            for iwfc in range(1, n_wfc + 1):
+                values = rng.random((3 if is_non_colinear else 1, N_BANDS)) - 0.5 + 1j * (rng.random((3 if is_non_colinear else 1, N_BANDS)) - 0.5)
+                if is_non_colinear:
+                    lines.append(f'      <ATOMIC_WFC index="{iwfc}" spin="1">{projs_text(np.abs(values).sum(axis=0))}</ATOMIC_WFC>\n')
+                    for ipol, ipol_values in enumerate(values, 1):
+                        lines.append(f'      <ATOMIC_SIGMA_PHI index="{iwfc}" ipol="{ipol}">{projs_text(ipol_values)}</ATOMIC_SIGMA_PHI>\n')
+                else:
+                    lines.append(f'      <ATOMIC_WFC index="{iwfc}" spin="{ispin + 1}">{projs_text(values[0])}</ATOMIC_WFC>\n')
+            lines.append("    </PROJS>\n")
+    lines.append("  </EIGENSTATES>\n</PROJECTIONS>\n")
+    filename.write_text("".join(lines))
+
+def parse_atomic_projections_per_element(parser, filename):
+    """The per-element parse atomic_proj.xml was read with before the streamed parse"""
+    root = ET.parse(filename).getroot()
+    nk = int(root.findall(".//HEADER")[0].get("NUMBER_OF_K-POINTS"))
+    spd = np.zeros(shape=(parser.n_k, parser.n_band, parser.n_spin, parser.n_atoms + 1, parser.n_orbitals + 2))
+    spd_phase = np.zeros(shape=spd.shape, dtype=np.complex128)
+    ik = -1
+    for element in root.findall(".//EIGENSTATES")[0]:
+        if element.tag == "K-POINT":
+            ik = 0 if ik == nk - 1 else ik + 1
+        if element.tag != "PROJS":
+            continue
+        for projs in element:
+            iwfc = int(projs.get("index"))
+            iorb = parser.wfc_mapping[f"wfc_{iwfc}"]["orbital"]
+            iatm = parser.wfc_mapping[f"wfc_{iwfc}"]["atom"]
+            if parser.is_non_colinear:
+                if projs.tag == "ATOMIC_WFC":
+                    continue
+                ispin = int(projs.get("ipol"))
+            else:
+                ispin = int(projs.get("spin")) - 1
+            for iband, band_projection in enumerate(projs.text.split("\n")[1:-1]):
+                real, imag = (float(x) for x in band_projection.split()[:2])
+                spd_phase[ik, iband, ispin, iatm - 1, iorb + 1] = complex(real, imag)
+                if parser.is_non_colinear:
+                    spd[ik, iband, ispin, iatm - 1, iorb + 1] = real
+                else:
+                    spd[ik, iband, ispin, iatm - 1, iorb + 1] = np.absolute(complex(real, imag))**2
+    if parser.is_non_colinear:
+        spd[:, :, 0] = (spd[:, :, 1]**2 + spd[:, :, 2]**2 + spd[:, :, 3]**2)**0.5
+        spd_phase[:, :, 0] = (spd_phase[:, :, 1]**2 + spd_phase[:, :, 2]**2 + spd_phase[:, :, 3]**2)**0.5
+    for ion in range(parser.ionsCount):
+        spd[:, :, :, ion, 0] = ion + 1
+    spd[:, :, :, :, -1] = np.sum(spd[:, :, :, :, 1:-1], axis=4)
+    spd[:, :, :, -1, :] = np.sum(spd[:, :, :, :-1, :], axis=3)
+    spd[:, :, :, -1, 0] = 0
+    return spd, spd_phase
+
+@pytest.mark.parametrize("is_non_colinear, n_spin", [(False, 1), (False, 2), (True, 4)])
+def test_atomic_projections_match_the_per_element_parse(tmp_path, is_non_colinear, n_spin):
+    wfcs = NONCOLINEAR_WFCS if is_non_colinear else COLINEAR_WFCS
+    parser = make_parser(is_non_colinear, n_spin, wfcs, 18 if is_non_colinear else 9)
+    filename = tmp_path / "atomic_proj.xml"
+    write_atomic_proj(filename, is_non_colinear, n_spin, len(wfcs), np.random.default_rng(n_spin))
+
+    parser._parse_atomic_projections(str(filename))
+    spd, spd_phase = parse_atomic_projections_per_element(parser, str(filename))
+    assert np.count_nonzero(spd[..., 1:-1]) != 0
+    assert np.array_equal(parser.spd, spd)
+    assert np.array_equal(parser.spd_phase, spd_phase)
+
+def test_atomic_projections_of_an_unknown_wfc(tmp_path):
+    parser = make_parser(False, 1, COLINEAR_WFCS[:-2], 9)
+    filename = tmp_path / "atomic_proj.xml"
+    write_atomic_proj(filename, False, 1, len(COLINEAR_WFCS), np.random.default_rng(0))
+    with pytest.raises(KeyError):
+        parser._parse_atomic_projections(str(filename))
+
+N_EDOS = 5
+PDOS_PREFIX = "si.pdos"
+# The atom and wfc of each pdos file, the noncolinear files without the total 
+# angular momentum are in the uncoupled basis and are not read
+COLINEAR_PDOS_FILES = [(1, "Si", 1, "s"), (1, "Si", 2, "p"), (2, "Fe", 3, "s"), (2, "Fe", 4, "d"), (2, "Fe", 12, "p")]
+NONCOLINEAR_PDOS_FILES = [(1, "Si", 1, "s_j0.5"), (1, "Si", 2, "p_j0.5"), (1, "Si", 3, "p_j1.5"), (1, "Si", 4, "p"),
+                          (2, "Fe", 5, "d_j1.5"), (2, "Fe", 6, "d_j2.5"), (2, "Fe", 10, "d_j0.5")]
+
+def n_pdos_orbitals(wfc):
+    return {"s": 1, "p": 3, "d": 5}.get(wfc, None) or int(2 * float(wfc.split("j")[-1]) + 1)
+
+def write_pdos_files(dirname, is_non_colinear, n_spin, rng):
+    files = NONCOLINEAR_PDOS_FILES if is_non_colinear else COLINEAR_PDOS_FILES
+    energies = np.linspace(-2, 2, N_EDOS)
+    # files that are not projections of a wfc
+    for suffix in [".pdos_tot", ".lowdin", ".projwfc_up"]:
+        (dirname / f"{PDOS_PREFIX}{suffix}").write_text("# E (eV)  dos(E)  pdos(E)\n")
+    for atm_num, atm, wfc_num, wfc in files:
+        n_orbital = n_pdos_orbitals(wfc)
+        lines = ["# E (eV)  ldos(E)  pdos(E)\n"]
+        for energy in energies:
+            if is_non_colinear:
+                # a block of lines per energy, the spin components are on its third to fifth lines
+                block = [f" {energy:7.3f}" + "".join(f" {x:.3E}" for x in rng.random(n_orbital + 1))]
+                block.append("         " + "".join(f" {x:.3E}" for x in rng.random(n_orbital + 1)))
+                block.extend(f"   {label}  " + "".join(f" {x:.3E}" for x in rng.random(n_orbital)) for label in ["x", "y", "z"])
+                lines.append("\n".join(block) + "\n \n")
+            else:
+                lines.append(f" {energy:7.3f}" + "".join(f" {x:.3E}" for x in rng.random(n_spin * (n_orbital + 1))) + "\n")
+        (dirname / f"{PDOS_PREFIX}.pdos_atm#{atm_num}({atm})_wfc#{wfc_num}({wfc})").write_text("".join(lines))
+
+def make_pdos_parser(dirname, is_non_colinear, n_spin, n_workers):
+    parser = make_parser(is_non_colinear, n_spin, [], 18 if is_non_colinear else 9)
+    parser.dirname = str(dirname)
+    parser.pdos_prefix = PDOS_PREFIX
+    parser.orbital_names = []
+    parser.n_workers = n_workers
+    return parser
+
+def parse_dos_projections_serially(parser, n_energy):
+    """The serial reader the pdos files were parsed with before the files were read in bulk"""
+    index = []
+    for file in os.listdir(parser.dirname):
+        if file.startswith(PDOS_PREFIX) and "_atm#" in file:
+            atm_num, atm, wfc_num, wfc = re.search(r"_atm#([0-9]*)\(([A-Za-z]*[0-9]*)\)_wfc#([0-9]*)\(([_A-Za-z0-9.]*)\)", file).groups()
+            index.append((int(atm_num), atm, int(wfc_num), wfc))
+
+    projected = np.zeros(shape=(parser.n_atoms, 1, parser.n_orbitals, parser.n_spin, n_energy))
+    for atm_num, atm, wfc_num, wfc in sorted(index, key=lambda x: x[0]):
+        with open(os.path.join(parser.dirname, f"{PDOS_PREFIX}.pdos_atm#{atm_num}({atm})_wfc#{wfc_num}({wfc})")) as f:
+            pdos_text = "".join(f.readlines()[1:])
+        if parser.is_non_colinear:
+            try:
+                orbital_nums = NONCOLINEAR_PDOS_ORBITALS[(wfc.split("_")[0], float(wfc.split("j")[-1]))]
+            except ValueError:
+                continue
+            raw_energy_blocks = list(filter(None, re.findall(r"([\s\S]*?)(?=\n \n)", pdos_text)))
+            for i_energy, raw_energy_block in enumerate(raw_energy_blocks):
+                raw_energy_block = raw_energy_block.strip()
+                for i_orbital, orbital_num in enumerate(orbital_nums):
+                    for i_spin, spin_comp in enumerate([1, 2, 3]):
+                        projected[atm_num - 1, 0, orbital_num, spin_comp, i_energy] += float(raw_energy_block.split("\n")[i_spin + 2].split()[1 + i_orbital])
+        else:
+            orbital_nums = COLINEAR_PDOS_ORBITALS[wfc]
+            for i_energy, raw_energy_block in enumerate(pdos_text.rstrip().split("\n")):
+                raw_projections = raw_energy_block.split()[1 + parser.n_spin:]
+                for i_orbital, orbital_num in enumerate(orbital_nums):
+                    for i_spin in range(parser.n_spin):
+                        projected[atm_num - 1, 0, orbital_num, i_spin, i_energy] += float(raw_projections[i_spin::parser.n_spin][i_orbital])
+    if parser.is_non_colinear:
+        projected[:, :, :, 0] = (projected[:, :, :, 1]**2 + projected[:, :, :, 2]**2 + projected[:, :, :, 3]**2)**0.5
+    return projected
+
+def test_pdos_files_are_indexed_by_atom_and_wfc(tmp_path):
+    write_pdos_files(tmp_path, False, 1, np.random.default_rng(0))
+    parser = make_pdos_parser(tmp_path, False, 1, 1)
+    wfc_index = parser._index_wfc_files(str(tmp_path))
+
+    expected = sorted(COLINEAR_PDOS_FILES, key=lambda x: (x[0], x[2]))
+    assert [os.path.basename(filename) for filename in wfc_index] == [
+        f"{PDOS_PREFIX}.pdos_atm#{atm_num}({atm})_wfc#{wfc_num}({wfc})" for atm_num, atm, wfc_num, wfc in expected]
+    assert list(wfc_index.values()) == [(atm_num - 1, wfc_num, wfc, None) for atm_num, _, wfc_num, wfc in expected]
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+@pytest.mark.parametrize("is_non_colinear, n_spin", [(False, 1), (False, 2), (True, 4)])
+def test_dos_projections_match_the_serial_reader(tmp_path, is_non_colinear, n_spin, n_workers):
+    write_pdos_files(tmp_path, is_non_colinear, n_spin, np.random.default_rng(n_spin))
+    parser = make_pdos_parser(tmp_path, is_non_colinear, n_spin, n_workers)
+
+    wfc_index = parser._index_wfc_files(str(tmp_path))
+    projected, _ = parser._parse_dos_projections(wfc_index=wfc_index, n_energy=N_EDOS)
+    expected = parse_dos_projections_serially(parser, N_EDOS)
+    assert projected.shape == expected.shape
+    assert np.count_nonzero(projected) != 0
+    assert np.allclose(projected, expected, rtol=0, atol=1e-12)
@@ -0,0 +1,163 @@
+import os
+import pytest
+import numpy as np
+from pyprocar.io import vasp
+from pyprocar.io.cache import mark_clean
+from pyprocar.utils.config import CONFIG
+
+ORBITALS = "s     py     pz     px    dxy    dyz    dz2    dxz  x2-y2    tot"
+N_KPOINTS = 3
+N_BANDS = 4
+N_IONS = 2
+
+def format_row(label, values):
+    return label + "".join(f" {x:7.3f}" for x in values) + f" {np.sum(values):7.3f}\n"
+
+def write_procar(filename, kpoints, bands, spd, spin_down=None):
+    """Writes a lm decomposed PROCAR, spin-polarized if the 
+    bands and spd of the spin down channel are given"""
+    header = f"# of k-points:  {len(kpoints):3d}         # of bands:  {bands.shape[1]:3d}         # of ions:  {spd.shape[2]:3d}\n\n"
+    lines = ["PROCAR lm decomposed\n"]
+    channels = [(bands, spd)] if spin_down is None else [(bands, spd), spin_down]
+    for channel_bands, channel_spd in channels:
+        lines.append(header)
+        for ikpoint, kpoint in enumerate(kpoints):
+            coordinates = "".join(f"{x:11.8f}" for x in kpoint)
+            lines.append(f" k-point  {ikpoint + 1:3d} :   {coordinates}     weight = {1 / len(kpoints):.8f}\n\n")
+            for iband, energy in enumerate(channel_bands[ikpoint]):
+                lines.append(f"band   {iband + 1:3d} # energy  {energy:12.8f} # occ.  1.00000000\n\n")
+                lines.append(f"ion      {ORBITALS}\n")
+                for iion, values in enumerate(channel_spd[ikpoint, iband]):
+                    lines.append(format_row(f"{iion + 1:5d}", values))
+                lines.append(format_row("tot  ", channel_spd[ikpoint, iband].sum(axis=0)) + "\n")
+    filename.write_text("".join(lines))
+
+@pytest.fixture
+def procar_data():
+    rng = np.random.default_rng(0)
+    # the negative coordinates run into each other like in the files of VASP
+    kpoints = rng.random((N_KPOINTS, 3)) - 0.5
+    bands = np.sort(rng.random((N_KPOINTS, N_BANDS)) * 10 - 5, axis=1)
+    spd = np.round(rng.random((N_KPOINTS, N_BANDS, N_IONS, 9)), 3)
+    return kpoints, bands, spd
+
+@pytest.fixture
+def procar_file(tmp_path, procar_data):
+    filename = tmp_path / "PROCAR"
+    write_procar(filename, *procar_data)
+    return filename
+
+def test_stream_matches_full_parser(procar_file, procar_data):
+    streamed = vasp.Procar(str(procar_file), efermi=0.0, stream=True)
+    full = vasp.Procar(str(procar_file), efermi=0.0, stream=False)
+
+    assert np.array_equal(streamed.kpoints, full.kpoints)
+    assert np.array_equal(streamed.bands, full.bands)
+    assert np.array_equal(streamed.spd, full.spd)
+    assert np.array_equal(streamed.ebs.projected, full.ebs.projected)
+    assert np.allclose(streamed.ebs.projected[:, :, :, 0, :, 0], procar_data[2])
+
+def test_stream_repair_keeps_exponents(tmp_path, procar_data):
+    kpoints, bands, spd = procar_data
+    filename = tmp_path / "PROCAR"
+    write_procar(filename, kpoints, bands, spd)
+    # s and py of the first ion run into each other and pz is written with an exponent
+    first_row = format_row("    1", spd[0, 0, 0])
+    fields = first_row.split()
+    malformed_row = f"    1  {spd[0, 0, 0, 0]:.3f}-0.500 1.2E-05 " + " ".join(fields[4:]) + "\n"
+    filename.write_text(filename.read_text().replace(first_row, malformed_row, 1))
+
+    procar = vasp.Procar(str(filename), efermi=0.0, stream=True)
+
+    assert procar.n_repaired_fields > 0
+    assert np.allclose(procar.spd[0, 0, 0, 0, 1:4], [spd[0, 0, 0, 0], -0.5, 1.2e-05])
+    assert np.allclose(procar.ebs.projected[1:, :, :, 0, :, 0], spd[1:])
+
+@pytest.fixture
+def clean_procar_file(tmp_path, procar_data):
+    kpoints, bands, spd = procar_data
+    filename = tmp_path / "PROCAR"
+    write_procar(filename, np.abs(kpoints), bands, spd)
+    return filename
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setitem(CONFIG, "parser_cache_dir", str(cache_dir))
+    return cache_dir
+
+def test_clean_marker_needs_the_cache(clean_procar_file, cache_dir):
+    vasp.Procar(str(clean_procar_file), efermi=0.0, stream=True, use_cache=False)
+    vasp.Procar(str(clean_procar_file), efermi=0.0, stream=False, use_cache=False)
+    assert not cache_dir.exists()
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_clean_marker_is_written_once(clean_procar_file, cache_dir, monkeypatch, stream):
+    procar_file = clean_procar_file
+    marked = []
+    monkeypatch.setattr(vasp, "mark_clean", marked.append)
+    first = vasp.Procar(str(procar_file), efermi=0.0, stream=stream, use_cache=True)
+    assert marked == [str(procar_file)] and not first.known_clean
+
+    mark_clean(str(procar_file))
+    second = vasp.Procar(str(procar_file), efermi=0.0, stream=stream, use_cache=True)
+    assert second.known_clean
+    assert len(marked) == 1
+    assert np.array_equal(first.spd, second.spd)
+
+def test_memmap_stream_unmaps_before_removing(tmp_path, procar_data, monkeypatch):
+    kpoints, bands, spd = procar_data
+    filename = tmp_path / "PROCAR"
+    write_procar(filename, np.abs(kpoints), bands, spd, spin_down=(bands + 1, spd[:, :, ::-1]))
+
+    # like on Windows, a file that is still mapped can not be removed
+    mapped = {}
+    open_memmap = np.lib.format.open_memmap
+    def record_memmap(path, *args, **kwargs):
+        mapped[os.path.abspath(path)] = array = open_memmap(path, *args, **kwargs)
+        return array
+    remove = os.remove
+    def remove_unmapped(path):
+        assert mapped[os.path.abspath(path)]._mmap.closed
+        remove(path)
+    monkeypatch.setattr(np.lib.format, "open_memmap", record_memmap)
+    monkeypatch.setattr(os, "remove", remove_unmapped)
+
+    memmap_dir = tmp_path / "memmap"
+    mapped_procar = vasp.Procar(str(filename), efermi=0.0, stream=True, memmap_dir=str(memmap_dir))
+    in_memory = vasp.Procar(str(filename), efermi=0.0, stream=True)
+
+    assert mapped_procar.ispin == 2
+    # the spin up array was moved to the spin polarized one and removed
+    assert os.path.dirname(mapped_procar.memmap_path) == str(memmap_dir)
+    assert "spd.npy" not in os.listdir(mapped_procar.memmap_path)
+    assert np.array_equal(mapped_procar.bands, in_memory.bands)
+    assert np.array_equal(mapped_procar.spd, in_memory.spd)
+
+def test_memmap_dir_is_shared(tmp_path, procar_data):
+    kpoints, bands, spd = procar_data
+    first_file, second_file = tmp_path / "PROCAR-1", tmp_path / "PROCAR-2"
+    write_procar(first_file, np.abs(kpoints), bands, spd)
+    write_procar(second_file, np.abs(kpoints), bands + 1, spd[:, :, ::-1])
+
+    memmap_dir = tmp_path / "memmap"
+    first = vasp.Procar(str(first_file), efermi=0.0, stream=True, memmap_dir=str(memmap_dir))
+    second = vasp.Procar(str(second_file), efermi=0.0, stream=True, memmap_dir=str(memmap_dir))
+
+    assert first.memmap_path != second.memmap_path
+    assert isinstance(first.spd, np.memmap)
+    assert np.allclose(first.spd[:, :, 0, :N_IONS, 1:-1], spd)
+    assert np.allclose(second.spd[:, :, 0, :N_IONS, 1:-1], spd[:, :, ::-1])
+
+def test_memmap_files_are_removed_on_fallback(procar_file, procar_data, tmp_path, monkeypatch):
+    def fail_after_allocating(self, rf):
+        self._allocate("spd", (2, 2))
+        raise ValueError("unexpected layout")
+    monkeypatch.setattr(vasp.Procar, "_read_stream_blocks", fail_after_allocating)
+
+    memmap_dir = tmp_path / "memmap"
+    procar = vasp.Procar(str(procar_file), efermi=0.0, stream=True, memmap_dir=str(memmap_dir))
+
+    assert os.listdir(memmap_dir) == []
+    assert procar.memmap_path is None
+    assert np.allclose(procar.ebs.projected[:, :, :, 0, :, 0], procar_data[2])
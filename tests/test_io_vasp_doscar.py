@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+from pyprocar.io import vasp
+
+N_IONS = 2
+N_EDOS = 7
+N_ORBITALS = 9
+EFERMI = 1.25
+
+def write_doscar(filename, n_spin_components, rng):
+    """Writes an lm decomposed DOSCAR, the spin components of an 
+    orbital are adjacent columns like in the files of VASP"""
+    n_total = 5 if n_spin_components == 2 else 3
+    energies = np.linspace(-5, 5, N_EDOS)
+    header = f"  {10.0:.8f}  {-5.0:.8f}  {N_EDOS:4d}  {EFERMI:.8f}  {1.0:.8f}\n"
+    total = np.column_stack([energies, rng.random((N_EDOS, n_total - 1))])
+    projected = [np.column_stack([energies, rng.random((N_EDOS, N_ORBITALS * n_spin_components))]) for _ in range(N_IONS)]
+
+    lines = [f"   {N_IONS}   {N_IONS}   1   {n_spin_components}\n",
+             "  0.1E+02  0.4E-09  0.4E-09  0.4E-09  0.5E-15\n",
+             "  1.0E-04\n",
+             "  CAR \n",
+             " unknown system\n"]
+    for block in [total] + projected:
+        lines.append(header)
+        lines.extend("".join(f" {x:11.4E}" for x in row) + "\n" for row in block)
+    filename.write_text("".join(lines))
+
+def read_doscar_per_line(filename):
+    """The per-line reader the blocks were parsed with before vasp.Doscar"""
+    with open(filename) as rf:
+        data = rf.readlines()
+    iline = 5
+    blocks = []
+    efermi = float(data[iline].split()[3])
+    while iline < len(data):
+        ndos = int(float(data[iline].split(";")[0].split()[2]))
+        iline += 1
+        blocks.append(np.array([[float(x) for x in y.split()] for y in data[iline:iline + ndos]]))
+        iline += ndos
+    return efermi, blocks[0], blocks[1:]
+
+@pytest.mark.parametrize("n_spin_components", [1, 2, 4])
+def test_doscar_matches_the_per_line_reader(tmp_path, n_spin_components):
+    filename = tmp_path / "DOSCAR"
+    write_doscar(filename, n_spin_components, np.random.default_rng(n_spin_components))
+    efermi, total, projected = read_doscar_per_line(filename)
+
+    doscar = vasp.Doscar(str(filename))
+    assert doscar.n_spin_components == n_spin_components
+    assert doscar.efermi == efermi
+    assert np.array_equal(doscar.total, total)
+    assert len(doscar.projected) == N_IONS
+    for block, expected in zip(doscar.projected, projected):
+        assert np.array_equal(block, expected)
+
+@pytest.mark.parametrize("n_spin_components", [1, 2, 4])
+def test_doscar_dos(tmp_path, n_spin_components):
+    filename = tmp_path / "DOSCAR"
+    write_doscar(filename, n_spin_components, np.random.default_rng(n_spin_components))
+    efermi, total, projected = read_doscar_per_line(filename)
+
+    dos = vasp.Doscar(str(filename)).dos
+    n_spin = 2 if n_spin_components == 2 else 1
+    assert np.allclose(dos.energies, total[:, 0] - efermi)
+    assert np.array_equal(dos.total, total[:, 1:1 + n_spin].T)
+
+    # (n_atoms, n_principals, n_orbitals, n_spin_components, n_energies)
+    assert dos.projected.shape == (N_IONS, 1, N_ORBITALS, n_spin_components, N_EDOS)
+    for iatom, block in enumerate(projected):
+        for iorbital in range(N_ORBITALS):
+            for ispin in range(n_spin_components):
+                column = 1 + iorbital * n_spin_components + ispin
+                assert np.array_equal(dos.projected[iatom, 0, iorbital, ispin], block[:, column])
+
+def test_truncated_doscar(tmp_path):
+    filename = tmp_path / "DOSCAR"
+    write_doscar(filename, 2, np.random.default_rng(0))
+    lines = filename.read_text().splitlines(keepends=True)
+    filename.write_text("".join(lines[:-1]))
+    with pytest.raises(ValueError):
+        vasp.Doscar(str(filename))
@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+from pyprocar.io import vasp
+
+N_KPOINTS, N_BANDS, N_EDOS = 2, 3, 5
+SYMBOLS = ["Si", "O"]
+ORBITALS = ["s", "py", "pz", "px"]
+# every section that parse_vasprun decodes from a calculation
+SECTIONS = ["structure", "eigenvalues", "projected", "dos", "forces", "stress", "orbital magnetization", "scstep"]
+
+def rows(values):
+    return "".join("<r>" + " ".join(f"{x:.6f}" for x in row) + "</r>\n" for row in values)
+
+def varray(name, values, tag="v"):
+    return f'<varray name="{name}">\n' + "".join(f"<{tag}>" + " ".join(f"{x:.6f}" for x in row) + f"</{tag}>\n" for row in values) + "</varray>\n"
+
+def structure(name, positions):
+    lattice = 4 * np.eye(3)
+    return (f'<structure name="{name}">\n<crystal>\n' + varray("basis", lattice) + '<i name="volume">64.0</i>\n'
+            + varray("rec_basis", np.eye(3) / 4) + "</crystal>\n" + varray("positions", positions) + "</structure>\n")
+
+def spin_sets(values, inner):
+    """The nested sets of an array, values has the shape (spin, ...)"""
+    return "".join(f'<set comment="spin {ispin + 1}">\n' + inner(spin_values) + "</set>\n" for ispin, spin_values in enumerate(values))
+
+def write_vasprun(filename, rng):
+    eigenvalues = np.sort(rng.random((2, N_KPOINTS, N_BANDS)) * 10 - 5, axis=-1)
+    occupancies = rng.random((2, N_KPOINTS, N_BANDS))
+    projected = rng.random((2, N_KPOINTS, N_BANDS, len(SYMBOLS), len(ORBITALS)))
+    total = rng.random((2, N_EDOS, 2))
+    partial = rng.random((len(SYMBOLS), 2, N_EDOS, len(ORBITALS)))
+    energies = np.linspace(-5, 5, N_EDOS)
+    forces = rng.random((2, len(SYMBOLS), 3))
+    stresses = rng.random((2, 3, 3))
+    positions = rng.random((2, len(SYMBOLS), 3))
+
+    calculations = []
+    for istep in range(2):
+        calculation = ['<calculation>\n',
+                       '<scstep>\n<time name="total">1.0 1.0</time>\n<energy>\n<i name="e_fr_energy">-10.0</i>\n</energy>\n</scstep>\n',
+                       structure("", positions[istep]),
+                       varray("forces", forces[istep]),
+                       varray("stress", stresses[istep])]
+        if istep == 1:
+            calculation.append('<separator name="orbital magnetization">\n<v name="MAGMOM">0.1 0.2 0.3</v>\n</separator>\n')
+            eigen = "".join(f'<set comment="kpoint {ik + 1}">\n' + rows(np.stack([e, o], axis=-1)) + "</set>\n"
+                            for ik, (e, o) in enumerate(zip(eigenvalues[0], occupancies[0])))
+            calculation.append('<eigenvalues>\n<array>\n<dimension dim="1">band</dimension>\n<dimension dim="2">kpoint</dimension>\n'
+                               '<dimension dim="3">spin</dimension>\n<field>eigene</field>\n<field>occ</field>\n<set>\n'
+                               + spin_sets(zip(eigenvalues, occupancies), lambda eo: "".join(
+                                   f'<set comment="kpoint {ik + 1}">\n' + rows(np.stack([e, o], axis=-1)) + "</set>\n"
+                                   for ik, (e, o) in enumerate(zip(*eo))))
+                               + "</set>\n</array>\n</eigenvalues>\n")
+            calculation.append('<projected>\n<array>\n<dimension dim="1">ion</dimension>\n<dimension dim="2">band</dimension>\n'
+                               '<dimension dim="3">kpoint</dimension>\n<dimension dim="4">spin</dimension>\n'
+                               + "".join(f"<field>{x}</field>\n" for x in ORBITALS) + "<set>\n"
+                               + spin_sets(projected, lambda spin_values: "".join(
+                                   f'<set comment="kpoint {ik + 1}">\n' + "".join(
+                                       f'<set comment="band {ib + 1}">\n' + rows(band) + "</set>\n" for ib, band in enumerate(kpoint))
+                                   + "</set>\n" for ik, kpoint in enumerate(spin_values)))
+                               + "</set>\n</array>\n</projected>\n")
+            calculation.append('<dos>\n<i name="efermi">1.5</i>\n<total>\n<array>\n<dimension dim="1">gridpoints</dimension>\n'
+                               '<dimension dim="2">spin</dimension>\n<field>energy</field>\n<field>total</field>\n<set>\n'
+                               + spin_sets(total, lambda spin_values: rows(np.column_stack([energies, spin_values[:, 0]])))
+                               + "</set>\n</array>\n</total>\n<partial>\n<array>\n<dimension dim=\"1\">gridpoints</dimension>\n"
+                               '<dimension dim="2">spin</dimension>\n<dimension dim="3">ion</dimension>\n<field>energy</field>\n'
+                               + "".join(f"<field>{x}</field>\n" for x in ORBITALS) + "<set>\n"
+                               + "".join(f'<set comment="ion {ia + 1}">\n' + spin_sets(atom, lambda spin_values: rows(np.column_stack([energies, spin_values])))
+                                         + "</set>\n" for ia, atom in enumerate(partial))
+                               + "</set>\n</array>\n</partial>\n</dos>\n")
+        calculation.append("</calculation>\n")
+        calculations.append("".join(calculation))
+
+    kpoints = rng.random((N_KPOINTS, 3))
+    text = ('<?xml version="1.0" encoding="ISO-8859-1"?>\n<modeling>\n'
+            '<generator>\n<i name="program" type="string">vasp</i>\n</generator>\n'
+            '<incar>\n<i type="int" name="ISPIN">2</i>\n</incar>\n'
+            '<kpoints>\n<generation param="Gamma">\n<v type="int" name="divisions">2 1 1</v>\n</generation>\n'
+            + varray("kpointlist", kpoints) + varray("weights", np.full((N_KPOINTS, 1), 1 / N_KPOINTS)) + '</kpoints>\n'
+            '<parameters>\n<separator name="electronic">\n<i type="int" name="NBANDS">3</i>\n'
+            '<separator name="electronic spin">\n<i type="int" name="ISPIN">2</i>\n</separator>\n</separator>\n'
+            '<separator name="dos">\n<i type="int" name="NEDOS">5</i>\n</separator>\n</parameters>\n'
+            '<atominfo>\n<atoms>2</atoms>\n<types>2</types>\n<array name="atoms">\n<field type="string">element</field>\n'
+            '<field type="int">atomtype</field>\n<set>\n'
+            + "".join(f"<rc><c>{x} </c><c>{i + 1}</c></rc>\n" for i, x in enumerate(SYMBOLS)) + "</set>\n</array>\n"
+            '<array name="atomtypes">\n<set>\n'
+            + "".join(f"<rc><c>1</c><c>{x} </c><c>28.0</c><c>4.0</c><c>PAW_PBE {x}</c></rc>\n" for x in SYMBOLS) + "</set>\n</array>\n</atominfo>\n"
+            + structure("initialpos", positions[0]) + "".join(calculations) + structure("finalpos", positions[1]) + "</modeling>\n")
+    filename.write_text(text)
+    return dict(eigenvalues=eigenvalues, projected=projected, total=total, partial=partial, forces=forces, stresses=stresses)
+
+@pytest.fixture
+def vasprun(tmp_path):
+    filename = tmp_path / "vasprun.xml"
+    expected = write_vasprun(filename, np.random.default_rng(0))
+    return str(filename), expected
+
+def test_stream_matches_full_parser(vasprun):
+    filename, expected = vasprun
+    full = vasp.VaspXML(filename)
+    streamed = vasp.VaspXML(filename, sections=SECTIONS)
+
+    assert full.fermi == streamed.fermi == 1.5
+    for key in ["forces", "stresses", "orbital_magnetization", "calculation"]:
+        assert streamed.data[key] == full.data[key]
+    assert np.allclose(streamed.forces, expected["forces"], atol=1e-6)
+    assert np.allclose(streamed.data["stresses"], expected["stresses"], atol=1e-6)
+    assert streamed.data["orbital_magnetization"] == {"MAGMOM": [0.1, 0.2, 0.3]}
+    assert np.allclose(streamed.structures[-1].fractional_coordinates, full.structures[-1].fractional_coordinates)
+
+    for spin in ["spin 1", "spin 2"]:
+        assert np.allclose(streamed.bands[spin]["eigen_values"], full.bands[spin]["eigen_values"])
+        assert np.allclose(streamed.bands[spin]["occupancies"], full.bands[spin]["occupancies"])
+    assert np.allclose(streamed.bands["spin 2"]["eigen_values"], expected["eigenvalues"][1].T - 1.5, atol=1e-6)
+    assert np.allclose(streamed.bands_projected["projection"], full.bands_projected["projection"])
+
+    assert np.allclose(streamed.dos.total, full.dos.total)
+    assert np.allclose(streamed.dos.projected, full.dos.projected)
+    assert np.allclose(streamed.dos.total, expected["total"][:, :, 0], atol=1e-6)
+
+@pytest.mark.parametrize("section, key", [("forces", "forces"), ("stress", "stresses")])
+def test_stream_dispatches_the_varrays_by_name(vasprun, section, key):
+    filename, expected = vasprun
+    streamed = vasp.VaspXML(filename, sections=["dos", "structure", section])
+    assert np.allclose(streamed.data[key], expected[key], atol=1e-6)
+    other = "stresses" if key == "forces" else "forces"
+    assert streamed.data[other] == []
+    assert streamed.data["orbital_magnetization"] == {}
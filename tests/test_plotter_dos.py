@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from pyprocar.core import DensityOfStates, Structure
+from pyprocar.plotter.dos_plot import DOSPlot
+
+ATOMS = ["Sr", "Ti", "O", "O", "O"]
+N_DOS = 40
+
+@pytest.fixture(params=[1, 2])
+def dos_plot(request):
+    n_spins = request.param
+    rng = np.random.default_rng(n_spins)
+    projected = rng.random((len(ATOMS), 1, 9, n_spins, N_DOS))
+    dos = DensityOfStates(energies=np.linspace(-5, 5, N_DOS),
+                          total=projected.sum(axis=(0, 1, 2)),
+                          efermi=0.0,
+                          projected=projected)
+    structure = Structure(atoms=ATOMS, fractional_coordinates=rng.random((len(ATOMS), 3)), lattice=4 * np.eye(3))
+    yield DOSPlot(dos=dos, structure=structure)
+    matplotlib.pyplot.close('all')
+
+def test_stack_dos_of_species(dos_plot):
+    species = dos_plot.structure.species
+    stack = dos_plot._stack_dos(species=species, orbitals=[[1, 2, 3]] * len(species), spins=[0])
+    for specie, dos in zip(species, stack):
+        atoms = [iatom for iatom, atom in enumerate(ATOMS) if atom == specie]
+        assert np.allclose(dos, dos_plot.dos.dos_sum(atoms=atoms, orbitals=[1, 2, 3], spins=[0]))
+
+def test_stack_dos_of_orbitals(dos_plot):
+    orbitals = [[0], [1, 2, 3], [4, 5, 6, 7, 8]]
+    stack = dos_plot._stack_dos(atoms=[0, 2], orbitals=orbitals, principal_q_numbers=[-1])
+    for orbital_group, dos in zip(orbitals, stack):
+        assert np.allclose(dos, dos_plot.dos.dos_sum(atoms=[0, 2], orbitals=orbital_group))
+
+@pytest.mark.parametrize("orientation", ["horizontal", "vertical"])
+def test_stacked_plots(dos_plot, orientation):
+    dos_plot.plot_stack_species(orientation=orientation)
+    dos_plot.plot_stack_orbitals(atoms=[2, 3, 4], orientation=orientation)
+    n_spins = dos_plot.dos.n_spins
+    assert len(dos_plot.handles) == n_spins * (3 + 3)
+
+def test_stack_of_items(dos_plot):
+    dos_plot.plot_stack(items={'Sr':[0], 'O':[1, 2, 3]})
+    assert len(dos_plot.handles) == dos_plot.dos.n_spins * 2
@@ -0,0 +1,84 @@
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure, isosurface
+from pyprocar.core.fermisurface3D import FermiSurface3D
+from pyprocar.plotter.fermi3d_plot import FermiDataHandler
+from pyprocar.cfg import ConfigFactory, ConfigManager, PlotType
+
+N_K = 10
+# Every band of every spin has a different fermi speed
+BAND_SCALES = np.array([[1.0, 5.0],
+                        [2.0, 6.0],
+                        [3.0, 7.0],
+                        [4.0, 8.0]])
+
+@pytest.fixture
+def spin_polarized_ebs():
+    grid = np.arange(N_K) / N_K - 0.5
+    kx, ky, kz = np.meshgrid(grid, grid, grid, indexing='ij')
+    kpoints = np.stack([kx.ravel(), ky.ravel(), kz.ravel()], axis=1)
+    dispersion = np.cos(2 * np.pi * kpoints).sum(axis=1)
+    bands = dispersion[:, None, None] * BAND_SCALES[None, :, :]
+    projected = np.ones((len(kpoints), BAND_SCALES.shape[0], 1, 1, 1, 2))
+    return ElectronicBandStructure(kpoints=kpoints,
+                                   bands=bands,
+                                   efermi=0.0,
+                                   n_kx=N_K, n_ky=N_K, n_kz=N_K,
+                                   projected=projected,
+                                   reciprocal_lattice=np.eye(3))
+
+@pytest.fixture
+def plain_config():
+    config = ConfigFactory.create_config(PlotType.FERMI_SURFACE_3D)
+    return ConfigManager.merge_config(config, 'mode', 'plain')
+
+def test_band_properties_follow_selected_bands_and_spin(spin_polarized_ebs, plain_config, monkeypatch):
+    projected_speeds = []
+    project_fermi_speed = FermiSurface3D.project_fermi_speed
+    def record_fermi_speed(self, fermi_speed):
+        projected_speeds.append(np.array(fermi_speed))
+        return project_fermi_speed(self, fermi_speed)
+    monkeypatch.setattr(FermiSurface3D, 'project_fermi_speed', record_fermi_speed)
+
+    data_handler = FermiDataHandler(spin_polarized_ebs, plain_config)
+    data_handler.process_data(bands=[2, 3], spins=[1])
+    data_handler.get_surface_data(property_name='fermi_speed', fermi=0.0)
+
+    assert len(projected_speeds) == 1
+    expected = spin_polarized_ebs.fermi_speed[..., [2, 3], 1]
+    assert np.allclose(projected_speeds[0], expected)
+
+@pytest.mark.parametrize("isosurface_workers, isosurface_executor", [(1, 'thread'), (2, 'thread'), (2, 'process')])
+def test_surfaces_from_the_shared_cache_match_the_uncached_ones(spin_polarized_ebs, plain_config, 
+                                                                 isosurface_workers, isosurface_executor, monkeypatch):
+    n_interpolations = []
+    fft_interpolate = isosurface.fft_interpolate
+    def count_fft_interpolate(*args, **kwargs):
+        n_interpolations.append(1)
+        return fft_interpolate(*args, **kwargs)
+    monkeypatch.setattr(isosurface, 'fft_interpolate', count_fft_interpolate)
+
+    config = ConfigManager.merge_config(plain_config, 'interpolation_factor', 2)
+    config = ConfigManager.merge_config(config, 'isosurface_workers', isosurface_workers)
+    config = ConfigManager.merge_config(config, 'isosurface_executor', isosurface_executor)
+    fermi_values = [-1.0, 0.0, 1.5]
+
+    data_handler = FermiDataHandler(spin_polarized_ebs, config)
+    data_handler.process_data(bands=[0, 1, 2])
+    cached_surfaces = data_handler.get_surfaces_data(fermi_values, property_name='fermi_speed')
+
+    assert len(cached_surfaces) == len(fermi_values)
+    if isosurface_executor == 'thread':
+        # every band of every spin is interpolated once for all the fermi values
+        assert len(n_interpolations) == 3 * 2
+    for fermi, cached_surface in zip(fermi_values, cached_surfaces):
+        data_handler = FermiDataHandler(spin_polarized_ebs, config)
+        data_handler.process_data(bands=[0, 1, 2])
+        surface = data_handler.get_surface_data(property_name='fermi_speed', fermi=fermi)
+
+        assert surface.n_points != 0
+        assert np.array_equal(cached_surface.points, surface.points)
+        assert np.array_equal(cached_surface.faces, surface.faces)
+        assert sorted(cached_surface.point_data.keys()) == sorted(surface.point_data.keys())
+        for name in surface.point_data.keys():
+            assert np.array_equal(cached_surface.point_data[name], surface.point_data[name])
@@ -0,0 +1,129 @@
+import os
+import sys
+import pytest
+import numpy as np
+import pyprocar
+
+# chg_raw is a script of pyposcar, it imports its siblings as top level modules
+sys.path.insert(0, os.path.dirname(pyprocar.pyposcar.__file__))
+import chg_raw
+
+NGF = (4, 5, 6)
+
+HEADER = ["test potential\n", "1.0\n",
+          " 4.0 0.0 0.0\n", " 0.0 5.0 0.0\n", " 0.0 0.0 6.0\n",
+          " Si\n", " 1\n", "Direct\n", " 0.0 0.0 0.0\n", "\n"]
+
+def data_lines(data):
+    """The grid lines of a block, data has the shape (NGFz, NGFy, NGFx)"""
+    lines = ["   {}   {}   {}\n".format(*NGF)]
+    values = data.ravel()
+    for start in range(0, len(values), 5):
+        lines.append(" ".join(f"{x:.11E}" for x in values[start:start + 5]) + "\n")
+    return lines
+
+def write_locpot(filename, data):
+    """Writes a LOCPOT-like file, data has the shape (NGFz, NGFy, NGFx)"""
+    filename.write_text("".join(HEADER + data_lines(data)))
+
+def write_chg(filename, frames):
+    """Writes a CHG-like file without augmentation occupancies, every
+    frame is a list of blocks and the NGF line of a block comes right
+    after the data of the previous one"""
+    lines = []
+    for blocks in frames:
+        lines += HEADER
+        for block in blocks:
+            lines += data_lines(block)
+    filename.write_text("".join(lines))
+
+@pytest.fixture
+def locpot(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.random(NGF[::-1])
+    filename = tmp_path / "LOCPOT"
+    write_locpot(filename, data)
+    return filename, data
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_planar_averages_and_cuts(locpot, lazy):
+    filename, data = locpot
+    chg = chg_raw.Chg(str(filename), is_chg=False, lazy=lazy)
+
+    for axis, data_axes in [('a', (0, 1)), ('b', (0, 2)), ('c', (1, 2))]:
+        _, average = chg.planar_average(axis)
+        assert np.allclose(average, data.mean(axis=data_axes))
+    assert np.allclose(chg.cut('c', 2), data[2])
+    assert np.allclose(chg.cut('b', 1), data[:, 1, :])
+    assert np.allclose(chg.cut('a', 3), data[:, :, 3])
+
+def test_reductions_belong_to_the_object(locpot):
+    filename, data = locpot
+    first = chg_raw.Chg(str(filename), is_chg=False, lazy=True)
+    first.cut('c', 2)
+    assert not hasattr(chg_raw, '_REDUCTIONS')
+
+    second = chg_raw.Chg(str(filename), is_chg=False, lazy=True)
+    assert second._reductions_cache == {}
+    assert list(first._reductions_cache) == [(0, 0)]
+
+def test_reductions_of_a_changed_file_are_dropped(locpot):
+    filename, data = locpot
+    chg = chg_raw.Chg(str(filename), is_chg=False, lazy=True)
+    _, average = chg.planar_average('c')
+
+    write_locpot(filename, 2 * data)
+    os.utime(filename, ns=(0, os.stat(filename).st_mtime_ns + 10**9))
+    _, changed_average = chg.planar_average('c')
+    assert np.allclose(changed_average, 2 * average)
+
+@pytest.fixture
+def chg(tmp_path):
+    """A spin-polarized CHG with two frames"""
+    rng = np.random.default_rng(1)
+    frames = [[rng.random(NGF[::-1]), rng.random(NGF[::-1]) - 0.5] for _ in range(2)]
+    filename = tmp_path / "CHG"
+    write_chg(filename, frames)
+    return filename, frames
+
+@pytest.mark.parametrize("frame", [0, 1])
+def test_spin_polarized_frames(chg, frame):
+    filename, frames = chg
+    base = chg_raw.Chg_base()
+    base.Load(str(filename), frame=frame, is_chg=False)
+    assert base.Ispin == 2
+    assert np.allclose(base.Data0, frames[frame][0])
+    assert np.allclose(base.Data1, frames[frame][1])
+
+def test_spin_selection(chg):
+    filename, frames = chg
+    base = chg_raw.Chg_base()
+    base.Load(str(filename), frame=1, is_chg=True, spin=1)
+    assert base.Data0.size == 0
+    assert np.allclose(base.Data1, frames[1][1] / np.prod(NGF))
+    with pytest.raises(RuntimeError):
+        base.Load(str(filename), spin=2)
+
+@pytest.mark.parametrize("nplanes", [1, 4, None])
+def test_streamed_planes(chg, nplanes, monkeypatch):
+    filename, frames = chg
+    monkeypatch.setattr(chg_raw, "READ_SIZE", 64)
+    base = chg_raw.Chg_base()
+    base.Load(str(filename), frame=1, is_chg=False, spin=[])
+    for spin in range(2):
+        planes = [values for _, values in base.iter_planes(spin, nplanes=nplanes)]
+        assert np.allclose(np.concatenate(planes), frames[1][spin])
+
+def test_sidecar_round_trip(chg, monkeypatch):
+    filename, frames = chg
+    chg_raw.Chg_base().Load(str(filename), frame=1, is_chg=False, sidecar=True)
+    assert os.path.isfile(str(filename) + ".frame1.raw.npy")
+
+    # the second load only maps the sidecar, the text is not decoded
+    def read_block(*args):
+        raise AssertionError("the grid was decoded again")
+    monkeypatch.setattr(chg_raw.Chg_base, "_read_block", read_block)
+    loaded = chg_raw.Chg_base()
+    loaded.Load(str(filename), frame=1, is_chg=False, sidecar=True)
+    assert np.allclose(loaded.Data0, frames[1][0])
+    assert np.allclose(loaded.Data1, frames[1][1])
@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+from scipy import signal
+from pyprocar.utils import mathematics
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(0)
+    return rng.random((5, 6, 4, 3))
+
+def resample(array, interpolation_factor, axes):
+    """Fourier interpolation one axis at a time"""
+    for iaxis in axes:
+        array = signal.resample(array, int(round(array.shape[iaxis] * interpolation_factor)), axis=iaxis)
+    return array
+
+@pytest.mark.parametrize("axes", [(0, 1, 2), (1, 2, 3), (0, 2)])
+def test_fft_interpolate_batch_matches_resample(values, axes):
+    interpolated = mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=axes, workers=1)
+    assert np.allclose(interpolated, resample(values, 2, axes))
+
+def test_fft_interpolate_batch_keeps_the_original_points(values):
+    interpolated = mathematics.fft_interpolate_batch(values, interpolation_factor=3, axes=(0, 1, 2))
+    assert interpolated.shape == (15, 18, 12, 3)
+    assert np.allclose(interpolated[::3, ::3, ::3], values)
+
+def test_fft_interpolate_batch_chunks(values, monkeypatch):
+    interpolated = mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(0, 1, 2))
+    monkeypatch.setattr(mathematics, "FFT_CHUNK_SIZE", 1)
+    chunked = mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(0, 1, 2))
+    assert np.array_equal(interpolated, chunked)
+
+def test_fft_interpolate_batch_slices_are_independent(values):
+    interpolated = mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(0, 1, 2))
+    for islice in range(values.shape[-1]):
+        single = mathematics.fft_interpolate_batch(values[..., islice], interpolation_factor=2, axes=(0, 1, 2))
+        assert np.allclose(interpolated[..., islice], single)
+
+def test_fft_interpolate_batch_axes(values):
+    negative = mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(-4, -3, -2))
+    positive = mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(0, 1, 2))
+    assert np.array_equal(negative, positive)
+    with pytest.raises(ValueError):
+        mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(0, 4))
+    with pytest.raises(ValueError):
+        mathematics.fft_interpolate_batch(values, interpolation_factor=2, axes=(-5,))
+
+def test_fft_interpolate_is_exact_for_band_limited_functions():
+    x = np.arange(9) / 9
+    function = np.cos(2 * np.pi * x) + 0.5 * np.sin(4 * np.pi * x)
+    interpolated = mathematics.fft_interpolate(function, interpolation_factor=2)
+    x_fine = np.arange(18) / 18
+    assert np.allclose(interpolated, np.cos(2 * np.pi * x_fine) + 0.5 * np.sin(4 * np.pi * x_fine))
+
+@pytest.mark.parametrize("index", [[1, 2, 3], [0, 2, 5], [3, 3, 4], [4], []])
+def test_take_indices_matches_take(values, index):
+    taken = mathematics.take_indices(values, index, axis=1)
+    assert np.array_equal(taken, np.take(values, np.array(index, dtype=int), axis=1))
+
+def test_take_indices_of_a_range_is_a_view(values):
+    assert np.shares_memory(mathematics.take_indices(values, [1, 2, 3], axis=1), values)
+    assert not np.shares_memory(mathematics.take_indices(values, [1, 3], axis=1), values)
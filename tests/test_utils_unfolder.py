@@ -0,0 +1,76 @@
+import pytest
+import numpy as np
+from pyprocar.core import ElectronicBandStructure, Structure
+from pyprocar.utils import unfolder
+from pyprocar.utils.unfolder import Unfolder
+
+LABELS = ["s", "py", "pz", "px"]
+N_KPOINTS, N_BANDS = 5, 4
+# a supercell doubled along a, with two species, and one with a non diagonal transformation
+CELLS = [(np.diag([2, 1, 1]), ["Si", "Si", "Ge", "Ge"],
+          [[0.0, 0.0, 0.0], [0.5, 0.0, 0.0], [0.25, 0.5, 0.5], [0.75, 0.5, 0.5]]),
+         (np.array([[1, 1, 0], [-1, 1, 0], [0, 0, 1]]), ["Si", "Si"],
+          [[0.0, 0.0, 0.0], [0.5, 0.5, 0.0]])]
+
+def make_unfolder(transformation_matrix, atoms, fractional_coordinates, n_spins):
+    rng = np.random.default_rng(n_spins)
+    natoms = len(atoms)
+    kpoints = rng.random((N_KPOINTS, 3))
+    bands = rng.random((N_KPOINTS, N_BANDS, n_spins))
+    shape = (N_KPOINTS, N_BANDS, natoms, 1, len(LABELS), n_spins)
+    projected_phase = rng.random(shape) + 1j * rng.random(shape)
+    ebs = ElectronicBandStructure(kpoints=kpoints,
+                                  bands=bands,
+                                  efermi=0.0,
+                                  projected=np.abs(projected_phase)**2,
+                                  projected_phase=projected_phase,
+                                  labels=LABELS)
+    structure = Structure(atoms=atoms, fractional_coordinates=fractional_coordinates, lattice=np.diag([8.0, 4.0, 4.0]))
+    return Unfolder(ebs=ebs, transformation_matrix=transformation_matrix, structure=structure)
+
+def translate_maps_loop(unfold):
+    """The mapping of every basis function, one pair at a time"""
+    positions = unfold.positions
+    indices = np.zeros([len(unfold.trans_rs), len(positions)], dtype="int32")
+    for i, ri in enumerate(unfold.trans_rs):
+        Tpositions = positions + np.array(ri)
+        for i_basis, pos in enumerate(positions):
+            for j_basis, Tpos in enumerate(Tpositions):
+                dpos = Tpos - pos
+                if np.all(np.abs(dpos - np.round(dpos)) < unfold.tol_radius) and unfold.basis[i_basis] == unfold.basis[j_basis]:
+                    indices[i, j_basis] = i_basis
+    return indices
+
+@pytest.mark.parametrize("transformation_matrix, atoms, fractional_coordinates", CELLS)
+def test_translate_maps_match_loop(transformation_matrix, atoms, fractional_coordinates):
+    unfold = make_unfolder(transformation_matrix, atoms, fractional_coordinates, n_spins=1)
+    assert len(unfold.trans_rs) == unfold.nfold
+    # every translation is a lattice vector of the unit cell
+    assert np.allclose(np.dot(unfold.trans_rs, transformation_matrix) % 1, 0)
+    assert np.array_equal(unfold.trans_indices, translate_maps_loop(unfold))
+
+@pytest.mark.parametrize("n_spins", [1, 2])
+@pytest.mark.parametrize("transformation_matrix, atoms, fractional_coordinates", CELLS)
+def test_weights_match_get_weight(transformation_matrix, atoms, fractional_coordinates, n_spins):
+    unfold = make_unfolder(transformation_matrix, atoms, fractional_coordinates, n_spins)
+    weights = unfold.weights
+    for ispin in range(n_spins):
+        for iqpt in range(N_KPOINTS):
+            for iband in range(N_BANDS):
+                weight = unfold._get_weight(unfold.eigenvectors[iqpt, iband, :, ispin], unfold.qpoints[iqpt])
+                assert np.isclose(weights[iqpt, iband, ispin], weight)
+
+def test_weights_with_reciprocal_vectors():
+    unfold = make_unfolder(*CELLS[0], n_spins=1)
+    G = np.array([[1, 0, 0], [0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]])
+    weights = unfold._get_weights(unfold.eigenvectors[:, :, :, 0], unfold.qpoints, G=G)
+    for iqpt in range(N_KPOINTS):
+        for iband in range(N_BANDS):
+            weight = unfold._get_weight(unfold.eigenvectors[iqpt, iband, :, 0], unfold.qpoints[iqpt], G=G[iqpt])
+            assert np.isclose(weights[iqpt, iband], weight)
+
+def test_weights_chunks(monkeypatch):
+    unfold = make_unfolder(*CELLS[0], n_spins=2)
+    weights = unfold.weights
+    monkeypatch.setattr(unfolder, "UNFOLD_CHUNK_SIZE", 1)
+    assert np.allclose(unfold.weights, weights)